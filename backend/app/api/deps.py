@@ -2,16 +2,20 @@
 API Dependencies
 共用的依賴注入函數
 """
+import hmac
+import time
 from typing import Optional
 from uuid import UUID
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_primary_read_db
+from app.core.exceptions import ServiceUnavailableError
+from app.core.webhook_signing import SIGNATURE_HEADER, TIMESTAMP_HEADER, webhook_signature
 from app.models.user import UserRole
 
 # HTTP Bearer token scheme
@@ -41,7 +45,7 @@ async def get_token_payload(
 
 async def get_current_user(
     payload: Optional[dict] = Depends(get_token_payload),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_primary_read_db),
 ):
     """
     獲取當前登入用戶
@@ -83,7 +87,7 @@ async def get_current_user(
 
 async def get_current_user_optional(
     payload: Optional[dict] = Depends(get_token_payload),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_primary_read_db),
 ):
     """
     獲取當前用戶 (可選)
@@ -130,3 +134,41 @@ async def get_current_admin_user(
             detail="Admin access required",
         )
     return current_user
+
+
+async def verify_worker_webhook(
+    request: Request,
+    timestamp: Optional[str] = Header(None, alias=TIMESTAMP_HEADER),
+    signature: Optional[str] = Header(None, alias=SIGNATURE_HEADER),
+) -> None:
+    """
+    驗證 worker Webhook 的 HMAC 簽章
+    時間戳與伺服器時間相差超過 WORKER_WEBHOOK_MAX_SKEW 秒時拒絕，避免重送舊請求
+    """
+    secret = settings.WORKER_WEBHOOK_SECRET
+    if not secret:
+        raise ServiceUnavailableError("worker_webhook", "WORKER_WEBHOOK_SECRET is not configured")
+
+    try:
+        sent_at = int(timestamp or "")
+    except ValueError:
+        sent_at = None
+    if sent_at is None or abs(time.time() - sent_at) > settings.WORKER_WEBHOOK_MAX_SKEW:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing or expired webhook timestamp",
+        )
+
+    expected = webhook_signature(
+        secret,
+        timestamp,
+        request.method,
+        request.url.path,
+        request.url.query,
+        await request.body(),
+    )
+    if not hmac.compare_digest(expected, signature or ""):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid webhook signature",
+        )
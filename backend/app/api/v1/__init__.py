@@ -4,7 +4,7 @@ API v1 Router Module
 """
 from fastapi import APIRouter
 
-from app.api.v1 import auth, users, courses, videos, enrollments, health
+from app.api.v1 import auth, users, courses, videos, stream, enrollments, health
 
 # Create main API router
 api_router = APIRouter()
@@ -15,4 +15,5 @@ api_router.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["Users"])
 api_router.include_router(courses.router, prefix="/courses", tags=["Courses"])
 api_router.include_router(videos.router, prefix="/videos", tags=["Videos"])
+api_router.include_router(stream.router, prefix="/stream", tags=["Streaming"])
 api_router.include_router(enrollments.router, prefix="/enrollments", tags=["Enrollments"])
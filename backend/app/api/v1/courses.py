@@ -8,7 +8,7 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_db, get_primary_read_db, get_read_db
 from app.schemas.course import (
     CourseCreateRequest,
     CourseUpdateRequest,
@@ -27,7 +27,7 @@ async def list_courses(
     limit: int = Query(20, ge=1, le=100),
     category: Optional[str] = None,
     search: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     獲取課程列表
@@ -43,7 +43,7 @@ async def list_courses(
 @router.get("/{course_id}", response_model=CourseDetailResponse)
 async def get_course_detail(
     course_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     獲取課程詳情
@@ -126,7 +126,7 @@ async def get_course_reviews(
     course_id: UUID,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_primary_read_db),
 ):
     """
     獲取課程評價列表
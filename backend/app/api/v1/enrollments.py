@@ -8,7 +8,7 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_db, get_primary_read_db, get_read_db
 from app.schemas.enrollment import (
     EnrollmentResponse,
     EnrollmentListResponse,
@@ -26,7 +26,7 @@ async def get_my_enrollments(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     current_user=Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     獲取我的課程列表 (已購買/註冊)
@@ -42,7 +42,7 @@ async def get_my_enrollments(
 async def get_enrollment_detail(
     enrollment_id: UUID,
     current_user=Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_primary_read_db),
 ):
     """
     獲取註冊詳情 (包含觀看進度)
@@ -76,7 +76,7 @@ async def get_my_orders(
     limit: int = Query(20, ge=1, le=100),
     status: Optional[str] = None,
     current_user=Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_primary_read_db),
 ):
     """
     獲取我的訂單列表
@@ -92,7 +92,7 @@ async def get_my_orders(
 async def get_order_detail(
     order_id: UUID,
     current_user=Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_primary_read_db),
 ):
     """
     獲取訂單詳情
@@ -6,9 +6,11 @@ from fastapi import APIRouter, Depends
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_primary_read_db, pool_metrics
 from app.core.config import settings
-from app.schemas.common import HealthResponse, DetailedHealthResponse
+from app.schemas.common import HealthResponse, DetailedHealthResponse, MetricsResponse
+from app.services.segment_cache import segment_cache
+from app.services.transcode_status import queue_metrics
 
 router = APIRouter()
 
@@ -27,7 +29,7 @@ async def health_check():
 
 
 @router.get("/ready", response_model=DetailedHealthResponse)
-async def readiness_check(db: AsyncSession = Depends(get_db)):
+async def readiness_check(db: AsyncSession = Depends(get_primary_read_db)):
     """
     就緒檢查 - 檢查所有依賴服務
     用於 Kubernetes readiness probe
@@ -52,3 +54,17 @@ async def readiness_check(db: AsyncSession = Depends(get_db)):
         version=settings.APP_VERSION,
         checks=checks,
     )
+
+
+@router.get("/metrics", response_model=MetricsResponse)
+async def runtime_metrics():
+    """
+    執行期統計
+    片段快取的命中率、資料庫連線池的使用量與取得連線等待時間，
+    以及轉碼排程佇列的長度與排隊等待時間，供監控系統定期擷取
+    """
+    return MetricsResponse(
+        segment_cache=segment_cache.metrics(),
+        database_pool=pool_metrics(),
+        transcode_queue=await queue_metrics(),
+    )
@@ -0,0 +1,63 @@
+"""
+Streaming API
+HLS 播放清單、片段與預覽圖端點：以 URL 上的短效簽章驗證，不查詢資料庫
+"""
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import Response
+
+from app.core.exceptions import ForbiddenError
+from app.core.storage import ObjectStorage, get_storage
+from app.core.stream_signing import StreamSigner, get_stream_signer
+from app.services.hls_manifest import (
+    PLAYLIST_CONTENT_TYPE,
+    STORYBOARD_CONTENT_TYPE,
+    load_playlist,
+    playlist_expiry,
+    render_playlist,
+    storage_key_for,
+)
+from app.services.hls_segments import serve_segment
+
+router = APIRouter()
+
+
+@router.get("/{output_id}/{path:path}")
+async def get_stream_file(
+    output_id: str,
+    path: str,
+    exp: int = Query(..., description="簽章到期時間 (Unix 秒)"),
+    sig: str = Query(..., description="串流簽章"),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None, alias="If-Range"),
+    storage: ObjectStorage = Depends(get_storage),
+    signer: StreamSigner = Depends(get_stream_signer),
+):
+    """
+    取得 HLS 播放清單、片段或預覽圖（previews/ 之下：封面、拼貼圖與 storyboard）
+    播放清單與 storyboard 中的 URI 改寫為帶簽章的本端點 URL；片段支援 Range / If-Range，優先自本機快取送出
+    """
+    if ".." in path.split("/") or not signer.verify(f"{output_id}/{path}", exp, sig):
+        raise ForbiddenError("Invalid or expired stream signature")
+
+    if path.endswith((".m3u8", ".vtt")):
+        playlist = await load_playlist(storage, output_id, path)
+        body = render_playlist(playlist, output_id, signer, playlist_expiry(playlist))
+        # 主播放列表與轉碼中的媒體播放清單會更新；媒體播放清單中的簽章有期限，不給共用快取保存
+        cache_control = "no-cache" if playlist.mutable else "private, max-age=60"
+        media_type = STORYBOARD_CONTENT_TYPE if path.endswith(".vtt") else PLAYLIST_CONTENT_TYPE
+        return Response(
+            content=body,
+            media_type=media_type,
+            headers={"Cache-Control": cache_control},
+        )
+
+    return await serve_segment(
+        storage,
+        storage_key_for(output_id, path),
+        range_header=range_header,
+        if_range=if_range,
+        max_age=exp - int(time.time()),
+    )
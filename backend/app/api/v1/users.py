@@ -8,7 +8,7 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_db, get_primary_read_db
 from app.schemas.user import UserResponse, UserUpdateRequest, UserListResponse
 from app.api.deps import get_current_user, get_current_admin_user
 
@@ -44,7 +44,7 @@ async def update_current_user_profile(
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user_by_id(
     user_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_primary_read_db),
 ):
     """
     根據 ID 獲取用戶資料 (公開資訊)
@@ -62,7 +62,7 @@ async def list_users(
     limit: int = Query(20, ge=1, le=100),
     role: Optional[str] = None,
     current_user=Depends(get_current_admin_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_primary_read_db),
 ):
     """
     列出所有用戶 (僅管理員)
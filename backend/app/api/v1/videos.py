@@ -2,19 +2,69 @@
 Videos API
 影片管理相關端點
 """
+import os
+import time
 from typing import Optional
-from uuid import UUID
+from uuid import UUID, uuid4
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, get_primary_read_db, get_read_db
+from app.core.exceptions import BadRequestError, ConflictError, NotFoundError
+from app.core.storage import ObjectStorage, get_storage
+from app.core.stream_signing import StreamSigner, get_stream_signer
+from app.models.course import Course
+from app.models.enrollment import Enrollment
+from app.models.video import Chapter, Video, VideoStatus
+from app.services.hls_manifest import (
+    OUTPUT_PREFIX,
+    PREVIEW_PREFIX,
+    load_playlist,
+    split_preview_key,
+    split_storage_key,
+    stream_url,
+    variant_names,
+)
+from app.services.storage_references import (
+    reconcile_assets,
+    referenced_outputs,
+    retained_sources,
+)
+from app.services.transcode_status import overall_progress, read_progress
+from app.services.video_assets import (
+    ensure_own_output,
+    record_transcode_result,
+    register_source,
+    release_asset,
+    should_transcode,
+)
+from app.services.video_uploads import (
+    MAX_PARTS,
+    complete_upload,
+    ensure_course_owner,
+    part_url_page,
+    plan_parts,
+    source_key,
+)
+from app.services.video_validation import probe_upload, validate_header
+from app.tasks.video import delete_transcoded_output, process_video
 from app.schemas.video import (
+    StorageReferenceRequest,
+    StorageReferenceResponse,
+    TranscodeProgressResponse,
     VideoResponse,
+    VideoStreamResponse,
+    VideoUploadCompleteRequest,
+    VideoUploadCompleteResponse,
     VideoUploadInitResponse,
+    VideoUploadPartsResponse,
     VideoProgressUpdateRequest,
 )
-from app.api.deps import get_current_user, get_current_instructor
+from app.api.deps import get_current_user, get_current_instructor, verify_worker_webhook
 
 router = APIRouter()
 
@@ -28,39 +78,151 @@ async def init_video_upload(
     file_size: int,
     current_user=Depends(get_current_instructor),
     db: AsyncSession = Depends(get_db),
+    storage: ObjectStorage = Depends(get_storage),
 ):
     """
     初始化影片上傳
-    返回預簽名 URL 用於分段上傳
+    建立分段上傳並返回第一頁分段的預簽名 URL，其餘分段以 /upload/{video_id}/parts 分頁取得
     """
-    # TODO: Implement upload initialization with MinIO presigned URL
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Video upload initialization not implemented yet",
+    if content_type not in settings.UPLOAD_ALLOWED_CONTENT_TYPES:
+        raise BadRequestError(f"Unsupported content type '{content_type}'")
+    if not 0 < file_size <= settings.UPLOAD_MAX_SIZE:
+        raise BadRequestError(
+            f"File size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes",
+            details={"max_size": settings.UPLOAD_MAX_SIZE},
+        )
+
+    chapter = await db.get(Chapter, chapter_id)
+    if chapter is None or chapter.course_id != course_id:
+        raise NotFoundError("Chapter", chapter_id)
+    course = await db.get(Course, course_id)
+    ensure_course_owner(course, current_user, "Only the course owner can upload videos")
+
+    order_index = await db.scalar(
+        select(func.coalesce(func.max(Video.order_index) + 1, 0))
+        .where(Video.chapter_id == chapter_id)
+    )
+    video_id = uuid4()
+    key = source_key(video_id, filename)
+    upload_id = await storage.create_multipart_upload(key, content_type)
+    video = Video(
+        id=video_id,
+        chapter_id=chapter_id,
+        title=os.path.splitext(os.path.basename(filename))[0][:200] or filename[:200],
+        order_index=order_index,
+        status=VideoStatus.UPLOADING,
+        storage_key=key,
+    )
+    db.add(video)
+
+    part_size, part_count = plan_parts(file_size)
+    parts, next_part_number = part_url_page(storage, key, upload_id, 1, part_count)
+    return VideoUploadInitResponse(
+        video_id=video_id,
+        upload_id=upload_id,
+        expires_in=settings.UPLOAD_URL_EXPIRE_SECONDS,
+        part_size=part_size,
+        part_count=part_count,
+        parts=parts,
+        next_part_number=next_part_number,
+    )
+
+
+@router.get("/upload/{video_id}/parts", response_model=VideoUploadPartsResponse)
+async def get_video_upload_parts(
+    video_id: UUID,
+    upload_id: str,
+    start: int = Query(1, ge=1, le=MAX_PARTS),
+    limit: int = Query(settings.UPLOAD_PART_URL_PAGE_SIZE, ge=1, le=settings.UPLOAD_PART_URL_PAGE_SIZE),
+    part_count: int = Query(MAX_PARTS, ge=1, le=MAX_PARTS),
+    current_user=Depends(get_current_instructor),
+    db: AsyncSession = Depends(get_primary_read_db),
+    storage: ObjectStorage = Depends(get_storage),
+):
+    """
+    分頁取得分段上傳的預簽名 URL
+    前端可在上傳前一頁分段時預先取得下一頁，URL 在本機計算，不呼叫物件儲存
+    """
+    video = await db.get(Video, video_id)
+    if video is None:
+        raise NotFoundError("Video", video_id)
+    if video.status != VideoStatus.UPLOADING:
+        raise BadRequestError("Video upload is already completed")
+
+    chapter = await db.get(Chapter, video.chapter_id)
+    course = await db.get(Course, chapter.course_id)
+    ensure_course_owner(course, current_user, "Only the course owner can upload videos")
+
+    parts, next_part_number = part_url_page(
+        storage, video.storage_key, upload_id, start, part_count, limit
+    )
+    return VideoUploadPartsResponse(
+        video_id=video_id,
+        upload_id=upload_id,
+        parts=parts,
+        next_part_number=next_part_number,
     )
 
 
-@router.post("/upload/{video_id}/complete")
+@router.post("/upload/{video_id}/complete", response_model=VideoUploadCompleteResponse)
 async def complete_video_upload(
     video_id: UUID,
+    request: VideoUploadCompleteRequest,
     current_user=Depends(get_current_instructor),
     db: AsyncSession = Depends(get_db),
+    storage: ObjectStorage = Depends(get_storage),
 ):
     """
     完成影片上傳
-    觸發轉碼任務
+    合併分段後以 Range 讀取檔頭驗證格式、ffprobe 讀取預簽名 URL 取得長度，不下載整個檔案；
+    驗證通過後觸發轉碼，未通過則刪除原始檔並將影片標記為 FAILED
     """
-    # TODO: Implement upload completion and trigger transcoding
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Video upload completion not implemented yet",
+    video = await db.get(Video, video_id)
+    if video is None:
+        raise NotFoundError("Video", video_id)
+    if video.status != VideoStatus.UPLOADING:
+        raise BadRequestError("Video upload is already completed")
+
+    chapter = await db.get(Chapter, video.chapter_id)
+    course = await db.get(Course, chapter.course_id)
+    ensure_course_owner(course, current_user, "Only the course owner can upload videos")
+
+    key = video.storage_key
+    metadata = await complete_upload(storage, key, request.upload_id)
+    try:
+        if metadata["ContentLength"] > settings.UPLOAD_MAX_SIZE:
+            raise BadRequestError(
+                f"File size must not exceed {settings.UPLOAD_MAX_SIZE} bytes",
+                details={"max_size": settings.UPLOAD_MAX_SIZE},
+            )
+        container = await validate_header(storage, key, metadata.get("ContentType", ""))
+        probe = await probe_upload(storage, key)
+    except BadRequestError:
+        await storage.delete_object(key)
+        video.status = VideoStatus.FAILED
+        # 例外會讓 get_db 回滾，失敗狀態需先提交
+        await db.commit()
+        raise
+
+    video.status = VideoStatus.PROCESSING
+    if probe is not None and probe.duration is not None:
+        video.duration = round(probe.duration)
+    # 提交後才分派，轉碼任務看到的一定是 PROCESSING；送出任務會阻塞，不在事件迴圈上執行
+    await db.commit()
+    await run_in_threadpool(process_video, video.id, key, current_user.get("id"))
+
+    return VideoUploadCompleteResponse(
+        video_id=video.id,
+        status=video.status.value,
+        container=container,
+        duration=video.duration if probe is not None and probe.duration is not None else None,
     )
 
 
 @router.get("/{video_id}", response_model=VideoResponse)
 async def get_video_info(
     video_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     獲取影片資訊
@@ -72,20 +234,82 @@ async def get_video_info(
     )
 
 
-@router.get("/{video_id}/stream")
+@router.get("/{video_id}/stream", response_model=VideoStreamResponse)
 async def get_video_stream_url(
     video_id: UUID,
     current_user=Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
+    storage: ObjectStorage = Depends(get_storage),
+    signer: StreamSigner = Depends(get_stream_signer),
 ):
     """
     獲取影片串流 URL (HLS)
-    需要驗證用戶是否有權限觀看
+    預覽影片、課程擁有者與已報名學生可觀看；返回帶短效簽章的主播放列表、封面與 storyboard URL
+    播放查詢由讀取副本處理；學生剛報名時讀取仍使用主資料庫（get_read_db 的 read-your-writes）
     """
-    # TODO: Implement video stream URL with access control
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Video streaming not implemented yet",
+    video = await db.get(Video, video_id)
+    if video is None:
+        raise NotFoundError("Video", video_id)
+    if video.status != VideoStatus.READY or not video.storage_key:
+        raise BadRequestError("Video is not ready for streaming")
+
+    if not video.is_preview:
+        chapter = await db.get(Chapter, video.chapter_id)
+        course = await db.get(Course, chapter.course_id)
+        enrolled = await db.scalar(
+            select(Enrollment.id).where(
+                Enrollment.user_id == UUID(current_user["id"]),
+                Enrollment.course_id == course.id,
+            )
+        )
+        if enrolled is None:
+            ensure_course_owner(course, current_user, "Enroll in the course to watch this video")
+
+    output_id, path = split_storage_key(video.storage_key)
+    master = await load_playlist(storage, output_id, path)
+    expires = int(time.time()) + settings.STREAM_TOKEN_TTL
+
+    def preview_url(key: Optional[str]) -> Optional[str]:
+        return stream_url(signer, *split_preview_key(key), expires) if key else None
+
+    return VideoStreamResponse(
+        video_id=video.id,
+        stream_url=stream_url(signer, output_id, path, expires),
+        expires_in=settings.STREAM_TOKEN_TTL,
+        resolutions=variant_names(master),
+        thumbnail_url=preview_url(video.thumbnail_url),
+        storyboard_url=preview_url(video.storyboard_key),
+    )
+
+
+@router.get("/{video_id}/transcode-progress", response_model=TranscodeProgressResponse)
+async def get_transcode_progress(
+    video_id: UUID,
+    current_user=Depends(get_current_instructor),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    獲取影片轉碼進度
+    worker 每個子任務最多每 VIDEO_PROGRESS_INTERVAL 秒更新一次；尚未開始或已過期時 steps 為空
+    """
+    video = await db.get(Video, video_id)
+    if video is None:
+        raise NotFoundError("Video", video_id)
+
+    chapter = await db.get(Chapter, video.chapter_id)
+    course = await db.get(Course, chapter.course_id)
+    ensure_course_owner(course, current_user, "Only the course owner can view transcode progress")
+
+    steps, plan = [], {}
+    if video.status == VideoStatus.PROCESSING:
+        steps, plan = await read_progress(str(video_id))
+    fraction, eta = overall_progress(steps, plan)
+    return TranscodeProgressResponse(
+        video_id=video.id,
+        status=video.status.value,
+        fraction=fraction,
+        eta=eta,
+        steps=steps,
     )
 
 
@@ -115,28 +339,109 @@ async def delete_video(
 ):
     """
     刪除影片 (僅課程擁有者)
+    轉碼產出仍被其他影片引用時保留物件儲存中的輸出；
+    輸出仍在轉碼中且無其他影片引用時返回 409，轉碼完成或失敗後再刪除，
+    避免轉碼任務在輸出刪除後繼續上傳而留下無人回收的物件
     """
-    # TODO: Implement video deletion
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Video deletion not implemented yet",
-    )
+    video = await db.get(Video, video_id)
+    if video is None:
+        raise NotFoundError("Video", video_id)
+
+    chapter = await db.get(Chapter, video.chapter_id)
+    course = await db.get(Course, chapter.course_id)
+    ensure_course_owner(course, current_user, "Only the course owner can delete its videos")
 
+    if video.asset_id is None and video.status == VideoStatus.PROCESSING:
+        # 尚未登記原始檔內容，轉碼任務隨時會開始寫入此影片的輸出
+        raise ConflictError("Video is still being transcoded", "Video")
+    if video.asset_id is not None:
+        freed = await release_asset(db, video)
+        output_owner = freed.source_video_id if freed is not None else None
+    else:
+        output_owner = video.id
 
-@router.post("/webhook/transcode-complete")
+    await db.delete(video)
+    # 提交後才刪除輸出，交易失敗時不會留下指向已刪除物件的影片
+    await db.commit()
+    if output_owner is not None:
+        await run_in_threadpool(delete_transcoded_output, output_owner)
+
+
+@router.post("/webhook/transcode-complete", dependencies=[Depends(verify_worker_webhook)])
 async def transcode_webhook(
     video_id: UUID,
     status: str,
     output_path: Optional[str] = None,
+    thumbnail: Optional[str] = None,
+    storyboard: Optional[str] = None,
     error_message: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
 ):
     """
     轉碼完成回調 Webhook
-    由 Worker 服務調用
+    由 Worker 服務調用 (process_video chord 的回呼任務)，需帶 worker 的 HMAC 簽章；
+    output_path 與封面、storyboard 必須位於影片自己的輸出目錄。
+    status 為 published 時最低畫質已發布、影片可播放，尚無封面與 storyboard；
+    completed 在所有畫質完成時送出一次並帶上封面與 storyboard
     """
-    # TODO: Implement transcode webhook handler
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Transcode webhook not implemented yet",
+    video = await db.get(Video, video_id)
+    if video is None:
+        raise NotFoundError("Video", video_id)
+
+    if status in ("published", "completed"):
+        if not output_path:
+            raise BadRequestError(f"output_path is required when status is '{status}'")
+        await ensure_own_output(db, video, output_path, OUTPUT_PREFIX)
+        for key in (thumbnail, storyboard):
+            if key:
+                await ensure_own_output(db, video, key, PREVIEW_PREFIX)
+    elif status != "failed":
+        raise BadRequestError(f"Unknown transcode status '{status}'")
+
+    await record_transcode_result(db, video, status, output_path, thumbnail, storyboard)
+    return {"video_id": video_id, "status": video.status.value}
+
+
+@router.post("/webhook/source-registered", dependencies=[Depends(verify_worker_webhook)])
+async def source_registered_webhook(
+    video_id: UUID,
+    content_hash: str = Query(..., pattern="^[0-9a-f]{64}$"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    原始檔雜湊登記 Webhook
+    由 Worker 在轉碼前調用（需帶 worker 的 HMAC 簽章）：相同內容已有轉碼產出時直接沿用，不再轉碼
+    """
+    video = await db.get(Video, video_id)
+    if video is None:
+        raise NotFoundError("Video", video_id)
+
+    asset = await register_source(db, video, content_hash)
+    return {
+        "video_id": video_id,
+        "status": video.status.value,
+        "transcode": should_transcode(asset, video),
+        "storage_key": asset.storage_key,
+    }
+
+
+@router.post(
+    "/webhook/storage-references",
+    response_model=StorageReferenceResponse,
+    dependencies=[Depends(verify_worker_webhook)],
+)
+async def storage_references_webhook(
+    request: StorageReferenceRequest,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    物件儲存引用檢查 Webhook
+    由 Worker 的儲存回收任務調用（需帶 worker 的 HMAC 簽章）：返回仍需保留的原始檔與轉碼輸出，其餘可刪除；
+    reconcile 時同時刪除已無影片指向的產出紀錄
+    """
+    if request.reconcile:
+        await reconcile_assets(db, request.outputs)
+    return StorageReferenceResponse(
+        sources=sorted(await retained_sources(db, request.sources), key=str),
+        outputs=sorted(await referenced_outputs(db, request.outputs), key=str),
     )
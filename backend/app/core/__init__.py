@@ -2,13 +2,18 @@
 Core module - Configuration and utilities
 """
 from app.core.config import settings, get_settings
-from app.core.database import get_db, engine, AsyncSessionLocal, Base
+from app.core.database import get_db, get_primary_read_db, get_read_db, engine, AsyncSessionLocal, Base
+from app.core.storage import ObjectStorage, get_storage
 
 __all__ = [
     "settings",
     "get_settings",
     "get_db",
+    "get_primary_read_db",
+    "get_read_db",
     "engine",
     "AsyncSessionLocal",
     "Base",
+    "ObjectStorage",
+    "get_storage",
 ]
@@ -2,41 +2,336 @@
 Database Configuration
 SQLAlchemy 2.0 Async Engine Setup
 """
+import asyncio
+import itertools
+import logging
+import re
+import time
+from bisect import bisect_left
+from collections.abc import AsyncIterator
+from contextlib import suppress
+from typing import Optional
+
+from fastapi import Request
+from jose import JWTError, jwt
+from sqlalchemy import TextClause, event, exc, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core.config import settings
+from app.core.redis import get_redis
 
+logger = logging.getLogger(__name__)
 
-# 建立異步引擎
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DATABASE_ECHO,
-    future=True,
+# 副本的複寫延遲（秒）；資料已全部重播時為 0，主資料庫查詢結果為 NULL
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
 )
 
+# 唯讀 Session 允許執行的文字 SQL
+READ_ONLY_TEXT = re.compile(r"\s*select\b", re.IGNORECASE)
+
+# 用戶最近寫入的標記（依 JWT 的 sub）
+RECENT_WRITE_KEY = "db:recent-write:{}"
+
+# 取得連線等待時間分佈的上界（毫秒）
+CHECKOUT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class CheckoutHistogram:
+    """取得連線的等待時間分佈與逾時次數"""
+
+    def __init__(self, buckets: tuple[int, ...] = CHECKOUT_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.timeouts = 0
+
+    def observe(self, elapsed_ms: float) -> None:
+        self.counts[bisect_left(self.buckets, elapsed_ms)] += 1
+        self.total += 1
+        self.sum_ms += elapsed_ms
+
+    def cumulative(self) -> dict[str, int]:
+        """累計分佈（等待時間 ≤ 各上界的次數）"""
+        result, running = {}, 0
+        for bound, count in zip((*self.buckets, "inf"), self.counts, strict=True):
+            running += count
+            result[f"le_{bound}"] = running
+        return result
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    記錄取得連線等待時間的連線池
+
+    等待時間包含池已滿時的排隊、建立新連線（overflow）與 pre-ping 的時間；
+    超過 DATABASE_POOL_TIMEOUT 仍取不到連線時計入逾時。
+    以公開的 Pool.connect() 計時：checkout / connect 事件在取得連線後才觸發，
+    看不到排隊的起點，逾時時也不會觸發。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.histogram = CheckoutHistogram()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.histogram.timeouts += 1
+            raise
+        finally:
+            self.histogram.observe((time.perf_counter() - start) * 1000)
+
+
+def build_engine(url: str, echo: bool = False):
+    """建立使用 DATABASE_POOL_* 設定與等待時間統計的異步引擎"""
+    return create_async_engine(
+        url,
+        echo=echo,
+        future=True,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+    )
+
+
+class PrimarySession(Session):
+    """主資料庫的讀寫 Session，寫入時在 info 中標記"""
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def _mark_flush(session: Session, flush_context) -> None:
+    session.info["wrote"] = True
+
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def _mark_statement(state) -> None:
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info["wrote"] = True
+
+
+class ReadOnlySession(Session):
+    """有待寫入的變更時拒絕 flush 的 Session"""
+
+    def flush(self, objects=None) -> None:
+        if self.new or self.dirty or self.deleted:
+            raise exc.InvalidRequestError(
+                "Cannot write through a read-only session; "
+                "use get_db for routes that write"
+            )
+        super().flush(objects)
+
+
+@event.listens_for(ReadOnlySession, "do_orm_execute")
+def _reject_statement(state) -> None:
+    # 唯讀 Session 以 AUTOCOMMIT 執行，寫入陳述式會立即生效；
+    # 文字 SQL 無法判斷是否寫入，只允許 SELECT
+    if isinstance(state.statement, TextClause):
+        writes = not READ_ONLY_TEXT.match(state.statement.text)
+    else:
+        writes = state.is_insert or state.is_update or state.is_delete
+    if writes:
+        raise exc.InvalidRequestError(
+            "Cannot write through a read-only session; "
+            "use get_db for routes that write"
+        )
+
+
+def ensure_no_pending_writes(session: AsyncSession) -> None:
+    """
+    唯讀 Session 結束時確認沒有未 flush 的變更
+
+    唯讀 Session 不 commit，路由 add 或修改物件而未 flush 時變更會在關閉時被丟棄；
+    改為拋出例外，讓誤用唯讀依賴的寫入路由在開發時就失敗。
+
+    Raises:
+        InvalidRequestError: Session 中仍有新增、修改或刪除的物件
+    """
+    if session.new or session.dirty or session.deleted:
+        raise exc.InvalidRequestError(
+            "Read-only session closed with pending changes that would be discarded; "
+            "use get_db for routes that write"
+        )
+
+
+def read_only_sessionmaker(bind) -> async_sessionmaker:
+    """唯讀 Session 工廠：連線以 AUTOCOMMIT 執行，每個查詢不需 BEGIN / COMMIT 往返"""
+    return async_sessionmaker(
+        bind.execution_options(isolation_level="AUTOCOMMIT"),
+        class_=AsyncSession,
+        sync_session_class=ReadOnlySession,
+        expire_on_commit=False,
+        autoflush=False,
+    )
+
+
+# 建立異步引擎
+engine = build_engine(settings.DATABASE_URL, echo=settings.DATABASE_ECHO)
+
 # 建立異步 Session 工廠
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=PrimarySession,
     expire_on_commit=False,
     autocommit=False,
     autoflush=False,
 )
 
+ReadOnlySessionLocal = read_only_sessionmaker(engine)
+
+
+class ReplicaSet:
+    """
+    讀取副本
+
+    健康的副本以輪詢分配；背景任務每 DATABASE_REPLICA_LAG_CHECK_INTERVAL 秒查詢各副本的
+    複寫延遲，超過 DATABASE_REPLICA_MAX_LAG 或無法連線的副本暫停分配，恢復後自動重新加入。
+    沒有可用副本時 choose() 返回 None，由呼叫端改用主資料庫。
+    """
+
+    def __init__(self, urls: list[str], max_lag: float, check_interval: float):
+        self.engines = [build_engine(url) for url in urls]
+        self.sessionmakers = [read_only_sessionmaker(replica) for replica in self.engines]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        # 最近一次量到的延遲；尚未檢查或無法連線時為 None
+        self.lags: list[Optional[float]] = [None] * len(self.engines)
+        self._counter = itertools.count()
+        self._monitor: Optional[asyncio.Task] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def available(self) -> list[int]:
+        return [
+            index for index, lag in enumerate(self.lags)
+            if lag is not None and lag <= self.max_lag
+        ]
+
+    def choose(self) -> Optional[async_sessionmaker]:
+        available = self.available()
+        if not available:
+            return None
+        return self.sessionmakers[available[next(self._counter) % len(available)]]
+
+    async def check(self) -> None:
+        """更新所有副本的複寫延遲"""
+        self.lags = list(await asyncio.gather(*map(self._lag, range(len(self.engines)))))
+
+    async def _query_lag(self, index: int) -> float:
+        async with self.engines[index].connect() as connection:
+            return float(await connection.scalar(REPLICA_LAG_QUERY) or 0)
+
+    async def _lag(self, index: int) -> Optional[float]:
+        previous = self.lags[index]
+        try:
+            lag = await asyncio.wait_for(self._query_lag(index), self.check_interval)
+        except Exception as error:
+            if previous is not None:
+                logger.warning("Database replica %d is unavailable: %s", index, error)
+            return None
+        if lag > self.max_lag and (previous is None or previous <= self.max_lag):
+            logger.warning("Database replica %d is lagging by %.1fs", index, lag)
+        return lag
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    async def start(self) -> None:
+        if self.engines and self._monitor is None:
+            await self.check()
+            for index, lag in enumerate(self.lags):
+                if lag is None:
+                    logger.warning("Database replica %d is unavailable", index)
+            self._monitor = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._monitor
+            self._monitor = None
+        for replica in self.engines:
+            await replica.dispose()
+
+
+replicas = ReplicaSet(
+    settings.DATABASE_REPLICA_URLS,
+    settings.DATABASE_REPLICA_MAX_LAG,
+    settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL,
+)
+
 
 class Base(DeclarativeBase):
     """SQLAlchemy 宣告式基礎類別"""
     pass
 
 
-async def get_db() -> AsyncSession:
+def _writer_key(request: Request) -> Optional[str]:
+    """
+    以 JWT 的 sub 識別用戶
+
+    同一用戶換發 token 或在多個裝置登入時仍視為同一人；
+    未登入或 token 無效的請求不追蹤。
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    subject = payload.get("sub")
+    return RECENT_WRITE_KEY.format(subject) if subject else None
+
+
+async def mark_recent_write(request: Request) -> None:
+    """記錄用戶剛寫入，DATABASE_READ_YOUR_WRITES_WINDOW 秒內的讀取改用主資料庫"""
+    key = _writer_key(request)
+    if key is None or not replicas:
+        return
+    try:
+        await get_redis().set(key, 1, ex=settings.DATABASE_READ_YOUR_WRITES_WINDOW)
+    except Exception as error:
+        logger.warning("Failed to record recent write: %s", error)
+
+
+async def wrote_recently(request: Request) -> bool:
+    """用戶是否在 DATABASE_READ_YOUR_WRITES_WINDOW 秒內寫入過；無法確認時視為是"""
+    key = _writer_key(request)
+    if key is None:
+        return False
+    try:
+        return bool(await get_redis().exists(key))
+    except Exception as error:
+        logger.warning("Failed to check recent write: %s", error)
+        return True
+
+
+async def get_db(request: Request) -> AsyncIterator[AsyncSession]:
     """
     依賴注入：獲取資料庫 Session
 
+    結束時 commit，例外時 rollback；有寫入時記錄用戶，
+    之後短時間內 get_read_db 的讀取仍使用主資料庫。
+    會寫入的路由（不論 HTTP 方法，例如 OAuth callback）使用此依賴；
+    只讀取的路由使用 get_primary_read_db 或 get_read_db。
+
     Usage:
-        @router.get("/items")
-        async def get_items(db: AsyncSession = Depends(get_db)):
+        @router.post("/items")
+        async def create_item(db: AsyncSession = Depends(get_db)):
             ...
     """
     async with AsyncSessionLocal() as session:
@@ -47,12 +342,109 @@ async def get_db() -> AsyncSession:
             await session.rollback()
             raise
         finally:
+            # 路由自行 commit 後才拋出例外時，寫入仍已生效
+            if session.info.get("wrote"):
+                await mark_recent_write(request)
             await session.close()
 
 
+async def get_primary_read_db() -> AsyncIterator[AsyncSession]:
+    """
+    依賴注入：獲取主資料庫的唯讀 Session
+
+    以 AUTOCOMMIT 執行查詢，不需 BEGIN / COMMIT 往返；寫入會拋出 InvalidRequestError，
+    結束時仍有未 flush 的變更同樣拋出。適用於需要讀到最新資料的唯讀路由。
+
+    Usage:
+        @router.get("/orders/{order_id}")
+        async def get_order(db: AsyncSession = Depends(get_primary_read_db)):
+            ...
+    """
+    async with ReadOnlySessionLocal() as session:
+        yield session
+        ensure_no_pending_writes(session)
+
+
+async def get_read_db(request: Request) -> AsyncIterator[AsyncSession]:
+    """
+    依賴注入：獲取讀取用的唯讀 Session
+
+    設定 DATABASE_REPLICA_URLS 時以輪詢分配到延遲未超過 DATABASE_REPLICA_MAX_LAG 的副本；
+    用戶剛寫入過、沒有可用副本或 Redis 無法連線時使用主資料庫。
+    適用於可容忍數秒延遲的目錄與播放查詢；需要讀到最新資料的路由使用 get_primary_read_db。
+
+    Usage:
+        @router.get("/courses")
+        async def list_courses(db: AsyncSession = Depends(get_read_db)):
+            ...
+    """
+    factory = ReadOnlySessionLocal
+    if replicas and not await wrote_recently(request):
+        factory = replicas.choose() or ReadOnlySessionLocal
+    async with factory() as session:
+        yield session
+        ensure_no_pending_writes(session)
+
+
 async def init_db():
     """初始化資料庫（開發用）"""
     async with engine.begin() as conn:
         # 在生產環境應使用 Alembic 遷移
         from app.models import Base
         await conn.run_sync(Base.metadata.create_all)
+
+
+def _pool_stats(pool: InstrumentedQueuePool) -> dict:
+    histogram = pool.histogram
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # overflow() 在常駐連線未建滿前為負值
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "checkouts": histogram.total,
+        "checkout_timeouts": histogram.timeouts,
+        "checkout_wait_ms_sum": round(histogram.sum_ms, 3),
+        "checkout_wait_ms": histogram.cumulative(),
+    }
+
+
+def pool_metrics() -> dict:
+    """連線池狀態與取得連線的等待時間分佈；設定副本時另列各副本的延遲與連線池"""
+    metrics = _pool_stats(engine.pool)
+    if replicas:
+        metrics["replicas"] = [
+            {
+                "lag_seconds": lag,
+                "available": lag is not None and lag <= replicas.max_lag,
+                **_pool_stats(replica.pool),
+            }
+            for replica, lag in zip(replicas.engines, replicas.lags, strict=True)
+        ]
+    return metrics
+
+
+async def init_db_pool() -> None:
+    """
+    預先建立連線並開始監控副本延遲（lifespan 啟動時）
+
+    同時取出 DATABASE_POOL_WARMUP 條連線，第一批請求不必等待建立連線。
+    資料庫尚未就緒時只記錄警告，由 readiness 檢查回報。
+    """
+    async def touch() -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    count = min(settings.DATABASE_POOL_WARMUP, settings.DATABASE_POOL_SIZE)
+    try:
+        await asyncio.gather(*(touch() for _ in range(count)))
+    except Exception as error:
+        logger.warning("Database pool warm-up failed: %s", error)
+    await replicas.start()
+
+
+async def close_db_pool() -> None:
+    """停止副本監控並關閉所有連線（lifespan 關閉時）"""
+    await replicas.stop()
+    await engine.dispose()
@@ -8,6 +8,7 @@ from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
 
 class AppException(Exception):
@@ -146,6 +147,19 @@ def setup_exception_handlers(app: FastAPI) -> None:
             },
         )
 
+    @app.exception_handler(PoolTimeoutError)
+    async def pool_timeout_handler(request: Request, exc: PoolTimeoutError) -> JSONResponse:
+        """資料庫連線池已滿且等待逾時"""
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "detail": "Database is busy, please retry",
+                "error_code": "SERVICE_UNAVAILABLE",
+                "service": "database",
+            },
+            headers={"Retry-After": "1"},
+        )
+
     @app.exception_handler(Exception)
     async def generic_exception_handler(request: Request, exc: Exception) -> JSONResponse:
         """處理未預期的例外"""
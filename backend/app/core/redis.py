@@ -0,0 +1,46 @@
+"""
+Redis
+共用的非同步 Redis 客戶端
+"""
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.core.exceptions import ServiceUnavailableError
+
+REDIS_SERVICE = "redis"
+
+_redis: Optional[Redis] = None
+
+
+async def init_redis() -> Redis:
+    """建立共用的 Redis 客戶端（lifespan 啟動時）"""
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+    return _redis
+
+
+async def close_redis() -> None:
+    """關閉共用的 Redis 客戶端（lifespan 關閉時）"""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+
+
+def get_redis() -> Redis:
+    """
+    取得共用的 Redis 客戶端
+
+    Raises:
+        ServiceUnavailableError: 客戶端尚未建立
+    """
+    if _redis is None:
+        raise ServiceUnavailableError(REDIS_SERVICE, "Redis client is not initialized")
+    return _redis
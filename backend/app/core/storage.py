@@ -0,0 +1,320 @@
+"""
+Object Storage
+MinIO / S3 非同步客戶端：boto3 在有上限的執行緒池中執行，不阻塞事件迴圈
+"""
+import asyncio
+import threading
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Optional
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from app.core.config import Settings, settings
+from app.core.exceptions import ServiceUnavailableError
+from app.core.presign import SigV4Presigner
+
+STORAGE_SERVICE = "object_storage"
+
+
+class ObjectStorage:
+    """
+    共用的物件儲存客戶端
+
+    boto3 client 可跨執行緒共用，連線池大小與執行緒池上限一致：
+    同時進行的操作不超過 STORAGE_MAX_CONNECTIONS，每個執行緒都能取得保持連線的 HTTP 連線，
+    超出的操作在執行緒池佇列中等待，不會額外建立連線。
+    每個操作另有整體逾時（含 botocore 重試），逾時或無法連線時拋出 ServiceUnavailableError。
+
+    由 main.lifespan 建立與關閉，路由以 Depends(get_storage) 取得。
+
+    Usage:
+        @router.get("/items/{key}")
+        async def get_item(key: str, storage: ObjectStorage = Depends(get_storage)):
+            metadata = await storage.head_object(key)
+    """
+
+    def __init__(self, config: Settings = settings):
+        scheme = "https" if config.MINIO_SECURE else "http"
+        self.bucket = config.MINIO_BUCKET_NAME
+        self.timeout = config.STORAGE_OPERATION_TIMEOUT
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=f"{scheme}://{config.MINIO_ENDPOINT}",
+            aws_access_key_id=config.MINIO_ACCESS_KEY,
+            aws_secret_access_key=config.MINIO_SECRET_KEY,
+            config=Config(
+                signature_version="s3v4",
+                max_pool_connections=config.STORAGE_MAX_CONNECTIONS,
+                connect_timeout=config.STORAGE_CONNECT_TIMEOUT,
+                read_timeout=config.STORAGE_READ_TIMEOUT,
+                retries={"max_attempts": config.STORAGE_MAX_ATTEMPTS, "mode": "standard"},
+                tcp_keepalive=True,
+            ),
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.STORAGE_MAX_CONNECTIONS,
+            thread_name_prefix="object-storage",
+        )
+        # 預簽名 URL 由瀏覽器直接使用，簽章需涵蓋對外的 Host
+        self.presigner = SigV4Presigner(
+            config.MINIO_PUBLIC_ENDPOINT or config.MINIO_ENDPOINT,
+            config.MINIO_ACCESS_KEY,
+            config.MINIO_SECRET_KEY,
+            region=config.MINIO_REGION,
+            secure=config.MINIO_SECURE,
+        )
+        # 後端程序（例如 ffprobe）自己讀取時使用內部位址
+        self.internal_presigner = SigV4Presigner(
+            config.MINIO_ENDPOINT,
+            config.MINIO_ACCESS_KEY,
+            config.MINIO_SECRET_KEY,
+            region=config.MINIO_REGION,
+            secure=config.MINIO_SECURE,
+        )
+
+    async def run(
+        self,
+        operation: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        在執行緒池中執行 boto3 操作
+
+        Args:
+            operation: boto3 client 的方法
+            timeout: 整體逾時秒數，預設 STORAGE_OPERATION_TIMEOUT
+
+        Raises:
+            ServiceUnavailableError: 逾時或無法連線
+            ClientError: 物件儲存回傳的錯誤（例如 NoSuchKey），由呼叫端處理
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, partial(operation, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except TimeoutError:
+            raise ServiceUnavailableError(STORAGE_SERVICE, "Object storage request timed out")
+        except BotoCoreError as exc:
+            raise ServiceUnavailableError(STORAGE_SERVICE, f"Object storage unavailable: {exc}")
+
+    async def head_object(self, key: str) -> Optional[dict]:
+        """物件的 metadata，物件不存在時返回 None"""
+        try:
+            return await self.run(self.client.head_object, Bucket=self.bucket, Key=key)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    async def get_object(self, key: str) -> Optional[bytes]:
+        """讀取整個小型物件（例如播放清單），物件不存在時返回 None"""
+        try:
+            response = await self.run(self.client.get_object, Bucket=self.bucket, Key=key)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return await self.run(response["Body"].read)
+
+    async def get_range(self, key: str, start: int, end: int) -> bytes:
+        """讀取物件的位元組範圍 [start, end]（含兩端）"""
+        response = await self.run(
+            self.client.get_object, Bucket=self.bucket, Key=key, Range=f"bytes={start}-{end}"
+        )
+        return await self.run(response["Body"].read)
+
+    async def open_object(self, key: str, byte_range: Optional[str] = None) -> Optional[dict]:
+        """
+        開啟物件串流讀取，物件不存在時返回 None
+
+        Args:
+            byte_range: HTTP Range 值（例如 "bytes=0-1023"），由物件儲存處理
+
+        Returns:
+            get_object 回應；呼叫端以 iter_body 讀取 Body
+
+        Raises:
+            ClientError: 範圍無法滿足（InvalidRange）等錯誤
+        """
+        params = {"Range": byte_range} if byte_range else {}
+        try:
+            return await self.run(
+                self.client.get_object, Bucket=self.bucket, Key=key, **params
+            )
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    async def iter_body(self, body: Any, chunk_size: int) -> AsyncIterator[bytes]:
+        """逐塊讀取 get_object 的 Body，結束或中斷時關閉連線"""
+        try:
+            while chunk := await self.run(body.read, chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    async def download_file(self, key: str, path: str, timeout: Optional[float] = None) -> dict:
+        """
+        下載物件到本機檔案
+
+        執行緒中的下載無法中斷：逾時或呼叫端取消時通知執行緒在下一個區塊停止，
+        並等待執行緒結束才拋出，返回後不會再有寫入 path 的動作，呼叫端可直接刪除檔案。
+
+        Returns:
+            get_object 回應的 metadata（ContentLength、LastModified、ETag 等）
+
+        Raises:
+            ServiceUnavailableError: 逾時或無法連線
+        """
+        stopped = threading.Event()
+
+        def download() -> dict:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+            try:
+                with open(path, "wb") as f:
+                    for chunk in response["Body"].iter_chunks(1024 * 1024):
+                        if stopped.is_set():
+                            break
+                        f.write(chunk)
+            finally:
+                response["Body"].close()
+            return response
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor, download)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except TimeoutError:
+            raise ServiceUnavailableError(STORAGE_SERVICE, "Object storage request timed out")
+        except BotoCoreError as exc:
+            raise ServiceUnavailableError(STORAGE_SERVICE, f"Object storage unavailable: {exc}")
+        finally:
+            if not future.done():
+                stopped.set()
+                # 讀取逾時（STORAGE_READ_TIMEOUT）限制了等待時間
+                await asyncio.wait((future,))
+                future.exception()  # 已放棄的結果，避免未取出例外的警告
+
+    async def put_object(self, key: str, body: bytes, content_type: str) -> None:
+        """上傳小型物件"""
+        await self.run(
+            self.client.put_object, Bucket=self.bucket, Key=key, Body=body, ContentType=content_type
+        )
+
+    async def delete_object(self, key: str) -> None:
+        """刪除物件（不存在時不視為錯誤）"""
+        await self.run(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def create_multipart_upload(self, key: str, content_type: str) -> str:
+        """建立分段上傳，返回 UploadId"""
+        response = await self.run(
+            self.client.create_multipart_upload, Bucket=self.bucket, Key=key, ContentType=content_type
+        )
+        return response["UploadId"]
+
+    async def complete_multipart_upload(self, key: str, upload_id: str, parts: list[dict]) -> None:
+        """
+        完成分段上傳
+
+        Args:
+            parts: [{"PartNumber": 1, "ETag": "..."}, ...]，依 PartNumber 排序
+        """
+        await self.run(
+            self.client.complete_multipart_upload,
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+
+    async def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        """放棄分段上傳並釋放已上傳的分段"""
+        await self.run(
+            self.client.abort_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id
+        )
+
+    async def list_parts(self, key: str, upload_id: str) -> list[dict]:
+        """已上傳的分段（PartNumber、ETag、Size），依 PartNumber 排序"""
+        parts = []
+        marker = 0
+        while True:
+            response = await self.run(
+                self.client.list_parts,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumberMarker=marker,
+            )
+            parts += response.get("Parts", [])
+            if not response.get("IsTruncated"):
+                return parts
+            marker = response["NextPartNumberMarker"]
+
+    def presign_upload_parts(
+        self,
+        key: str,
+        upload_id: str,
+        part_numbers: range,
+        expires_in: int,
+    ) -> list[dict]:
+        """
+        產生分段上傳的預簽名 URL（本機計算，不經過執行緒池）
+
+        Returns:
+            [{"part_number": 1, "upload_url": "..."}, ...]
+        """
+        urls = self.presigner.presign_parts(self.bucket, key, upload_id, part_numbers, expires_in)
+        return [
+            {"part_number": part_number, "upload_url": url}
+            for part_number, url in zip(part_numbers, urls, strict=True)
+        ]
+
+    def presign_get(self, key: str, expires_in: int) -> str:
+        """後端內部讀取物件的預簽名 URL（本機計算）"""
+        return self.internal_presigner.presign("GET", self.bucket, key, expires_in)
+
+    async def close(self) -> None:
+        """等待進行中的操作完成後關閉執行緒池與連線池"""
+        await asyncio.get_running_loop().run_in_executor(
+            None, partial(self._executor.shutdown, wait=True)
+        )
+        self.client.close()
+
+
+_storage: Optional[ObjectStorage] = None
+
+
+async def init_storage() -> ObjectStorage:
+    """建立共用的物件儲存客戶端（lifespan 啟動時）"""
+    global _storage
+    if _storage is None:
+        _storage = ObjectStorage()
+    return _storage
+
+
+async def close_storage() -> None:
+    """關閉共用的物件儲存客戶端（lifespan 關閉時）"""
+    global _storage
+    if _storage is not None:
+        await _storage.close()
+        _storage = None
+
+
+def get_storage() -> ObjectStorage:
+    """
+    依賴注入：取得共用的物件儲存客戶端
+
+    Usage:
+        @router.post("/upload")
+        async def upload(storage: ObjectStorage = Depends(get_storage)):
+            ...
+    """
+    if _storage is None:
+        raise ServiceUnavailableError(STORAGE_SERVICE, "Object storage client is not initialized")
+    return _storage
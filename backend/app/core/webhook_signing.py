@@ -0,0 +1,30 @@
+"""
+Worker Webhook Signing
+worker 呼叫後端 Webhook 的 HMAC 簽章，簽章方式須與 worker/backend_api.py 一致
+"""
+import hashlib
+import hmac
+
+TIMESTAMP_HEADER = "X-Webhook-Timestamp"
+SIGNATURE_HEADER = "X-Webhook-Signature"
+
+
+def webhook_signature(
+    secret: str,
+    timestamp: str,
+    method: str,
+    path: str,
+    query: str,
+    body: bytes,
+) -> str:
+    """
+    計算 Webhook 請求的簽章
+
+    簽章涵蓋時間戳、方法、路徑、原始查詢字串與本文，
+    參數或本文被改動、或簽章被拿去呼叫其他 Webhook 時都無法通過驗證。
+
+    Returns:
+        HMAC-SHA256 十六進位字串
+    """
+    message = f"{timestamp}\n{method.upper()}\n{path}\n{query}\n".encode() + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
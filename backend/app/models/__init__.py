@@ -10,7 +10,7 @@ from app.models.oauth import OAuthAccount
 
 # Course Models
 from app.models.course import Course, CourseStatus, CourseCategory
-from app.models.video import Chapter, Video, VideoStatus
+from app.models.video import Chapter, Video, VideoAsset, VideoStatus
 
 # Order Models
 from app.models.order import Order, Payment, OrderStatus
@@ -40,6 +40,7 @@ __all__ = [
     "CourseCategory",
     "Chapter",
     "Video",
+    "VideoAsset",
     "VideoStatus",
     # Order
     "Order",
@@ -25,6 +25,73 @@ class VideoStatus(str, PyEnum):
     FAILED = "FAILED"            # 失敗
 
 
+class VideoAsset(Base, TimestampMixin):
+    """
+    轉碼產出資料表（依原始檔內容雜湊去重）
+
+    相同內容的影片共用同一份 HLS 輸出，ref_count 記錄引用的影片數，
+    歸零時才可刪除物件儲存中的輸出。
+
+    Attributes:
+        id: 主鍵 UUID
+        content_hash: 原始檔 SHA-256（十六進位）
+        source_video_id: 負責轉碼的影片 ID，輸出位於 transcoded/{source_video_id}/
+        storage_key: 主播放清單物件鍵（轉碼完成後寫入）
+        thumbnail_key: 封面物件鍵（thumbnails/{source_video_id}/...）
+        storyboard_key: WebVTT storyboard 物件鍵
+        ref_count: 引用此產出的影片數
+        status: 轉碼狀態（PROCESSING / READY / FAILED）
+    """
+    __tablename__ = "video_assets"
+
+    id: Mapped[PyUUID] = mapped_column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid4,
+    )
+    content_hash: Mapped[str] = mapped_column(
+        String(64),
+        unique=True,
+        nullable=False,
+        index=True,
+    )
+    source_video_id: Mapped[PyUUID] = mapped_column(
+        UUID(as_uuid=True),
+        nullable=False,
+    )
+    storage_key: Mapped[Optional[str]] = mapped_column(
+        String(500),
+        nullable=True,
+    )
+    thumbnail_key: Mapped[Optional[str]] = mapped_column(
+        String(500),
+        nullable=True,
+    )
+    storyboard_key: Mapped[Optional[str]] = mapped_column(
+        String(500),
+        nullable=True,
+    )
+    ref_count: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        nullable=False,
+    )
+    status: Mapped[VideoStatus] = mapped_column(
+        Enum(VideoStatus),
+        default=VideoStatus.PROCESSING,
+        nullable=False,
+    )
+
+    # Relationships
+    videos: Mapped[list["Video"]] = relationship(
+        "Video",
+        back_populates="asset",
+    )
+
+    def __repr__(self) -> str:
+        return f"<VideoAsset(id={self.id}, hash={self.content_hash[:12]}, refs={self.ref_count})>"
+
+
 class Chapter(Base, TimestampMixin):
     """
     章節資料表
@@ -82,11 +149,13 @@ class Video(Base, TimestampMixin):
         chapter_id: 所屬章節 ID
         title: 影片標題
         storage_key: MinIO 物件鍵
-        thumbnail_url: 縮圖網址
+        thumbnail_url: 封面物件鍵（thumbnails/{output_id}/...，經串流端點簽章後提供）
+        storyboard_key: 拖曳預覽的 WebVTT storyboard 物件鍵
         duration: 影片長度 (秒)
         order_index: 排序索引
         is_preview: 是否為預覽影片 (免費觀看)
         status: 影片狀態
+        asset_id: 共用的轉碼產出 ID (內容去重)
     """
     __tablename__ = "videos"
 
@@ -113,6 +182,10 @@ class Video(Base, TimestampMixin):
         String(500),
         nullable=True,
     )
+    storyboard_key: Mapped[Optional[str]] = mapped_column(
+        String(500),
+        nullable=True,
+    )
     duration: Mapped[int] = mapped_column(
         Integer,
         default=0,
@@ -132,12 +205,22 @@ class Video(Base, TimestampMixin):
         default=VideoStatus.UPLOADING,
         nullable=False,
     )
+    asset_id: Mapped[Optional[PyUUID]] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("video_assets.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )
 
     # Relationships
     chapter: Mapped["Chapter"] = relationship(
         "Chapter",
         back_populates="videos",
     )
+    asset: Mapped[Optional["VideoAsset"]] = relationship(
+        "VideoAsset",
+        back_populates="videos",
+    )
     progress_records: Mapped[List["VideoProgress"]] = relationship(
         "VideoProgress",
         back_populates="video",
@@ -7,6 +7,7 @@ from app.schemas.common import (
     TimestampSchema,
     HealthResponse,
     DetailedHealthResponse,
+    MetricsResponse,
     ErrorResponse,
     ValidationErrorResponse,
     PaginatedResponse,
@@ -45,10 +46,15 @@ from app.schemas.video import (
     VideoResponse,
     VideoDetailResponse,
     VideoUploadInitResponse,
+    VideoUploadPartsResponse,
+    VideoUploadCompleteRequest,
+    VideoUploadCompleteResponse,
     VideoStreamResponse,
     VideoProgressUpdateRequest,
     VideoProgressResponse,
     TranscodeCallbackRequest,
+    StorageReferenceRequest,
+    StorageReferenceResponse,
 )
 from app.schemas.enrollment import (
     EnrollmentResponse,
@@ -68,6 +74,7 @@ __all__ = [
     "TimestampSchema",
     "HealthResponse",
     "DetailedHealthResponse",
+    "MetricsResponse",
     "ErrorResponse",
     "ValidationErrorResponse",
     "PaginatedResponse",
@@ -102,10 +109,15 @@ __all__ = [
     "VideoResponse",
     "VideoDetailResponse",
     "VideoUploadInitResponse",
+    "VideoUploadPartsResponse",
+    "VideoUploadCompleteRequest",
+    "VideoUploadCompleteResponse",
     "VideoStreamResponse",
     "VideoProgressUpdateRequest",
     "VideoProgressResponse",
     "TranscodeCallbackRequest",
+    "StorageReferenceRequest",
+    "StorageReferenceResponse",
     # Enrollment
     "EnrollmentResponse",
     "EnrollmentDetailResponse",
@@ -42,6 +42,22 @@ class DetailedHealthResponse(HealthResponse):
     )
 
 
+class MetricsResponse(BaseSchema):
+    """執行期統計（行程啟動後累計，每個 API 實例各自計算）"""
+    segment_cache: dict[str, float] = Field(
+        default_factory=dict,
+        examples=[{"hits": 9120, "misses": 880, "hit_ratio": 0.912}],
+    )
+    database_pool: dict[str, Any] = Field(
+        default_factory=dict,
+        examples=[{"size": 10, "checked_out": 4, "overflow": 0, "checkout_timeouts": 0}],
+    )
+    transcode_queue: dict[str, Any] = Field(  # 所有 worker 共用，不分實例
+        default_factory=dict,
+        examples=[{"pending": 3, "running": 4, "oldest_pending_wait_seconds": 42.0}],
+    )
+
+
 class ErrorResponse(BaseSchema):
     """錯誤回應"""
     detail: str = Field(..., examples=["Resource not found"])
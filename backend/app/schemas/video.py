@@ -39,19 +39,44 @@ class VideoDetailResponse(VideoResponse):
     error_message: Optional[str] = None
 
 
+class VideoUploadPartResponse(BaseSchema):
+    """分段上傳回應"""
+    part_number: int
+    upload_url: str
+    expires_in: int = 3600
+
+
 class VideoUploadInitResponse(BaseSchema):
     """影片上傳初始化回應"""
     video_id: UUID
-    upload_url: str  # Presigned URL for upload
+    upload_url: Optional[str] = None  # Presigned URL for single PUT upload
     upload_id: Optional[str] = None  # For multipart upload
     expires_in: int = 3600  # URL expiration in seconds
+    part_size: Optional[int] = None  # 每個分段的位元組數 (最後一段可較小)
+    part_count: Optional[int] = None
+    parts: list[VideoUploadPartResponse] = Field(default_factory=list)  # 第一頁分段 URL
+    next_part_number: Optional[int] = None  # 尚有分段 URL 時，下一頁的起始分段
 
 
-class VideoUploadPartResponse(BaseSchema):
-    """分段上傳回應"""
-    part_number: int
-    upload_url: str
-    expires_in: int = 3600
+class VideoUploadPartsResponse(BaseSchema):
+    """分段上傳 URL 分頁回應"""
+    video_id: UUID
+    upload_id: str
+    parts: list[VideoUploadPartResponse]
+    next_part_number: Optional[int] = None
+
+
+class VideoUploadCompleteRequest(BaseSchema):
+    """完成分段上傳請求"""
+    upload_id: str
+
+
+class VideoUploadCompleteResponse(BaseSchema):
+    """完成上傳回應"""
+    video_id: UUID
+    status: str = Field(..., examples=["PROCESSING"])
+    container: str = Field(..., examples=["mp4"])
+    duration: Optional[int] = None  # 秒；ffprobe 逾時時由轉碼任務補上
 
 
 class VideoStreamResponse(BaseSchema):
@@ -60,6 +85,27 @@ class VideoStreamResponse(BaseSchema):
     stream_url: str  # HLS manifest URL
     expires_in: int = 3600
     resolutions: list[str] = Field(default_factory=list, examples=[["720p", "1080p"]])
+    thumbnail_url: Optional[str] = None  # 封面（與 stream_url 同時到期）
+    storyboard_url: Optional[str] = None  # 拖曳預覽的 WebVTT storyboard
+
+
+class TranscodeStepProgress(BaseSchema):
+    """轉碼子任務進度"""
+    step: str = Field(..., examples=["rendition:720p"])
+    fraction: float = Field(..., ge=0, le=1)
+    out_time: float = 0  # 已輸出的媒體時間（秒）
+    speed: Optional[float] = None  # 媒體秒 / 實際秒
+    eta: Optional[float] = None  # 預估剩餘秒數
+    done: bool = False
+
+
+class TranscodeProgressResponse(BaseSchema):
+    """轉碼進度回應"""
+    video_id: UUID
+    status: str = Field(..., examples=["PROCESSING"])
+    fraction: Optional[float] = None  # 依分派時的工作量加權的整體完成比例
+    eta: Optional[float] = None  # 最慢子任務的預估剩餘秒數
+    steps: list[TranscodeStepProgress] = Field(default_factory=list)
 
 
 class VideoProgressUpdateRequest(BaseSchema):
@@ -85,3 +131,16 @@ class TranscodeCallbackRequest(BaseSchema):
     duration: Optional[int] = None
     resolutions: list[str] = Field(default_factory=list)
     error_message: Optional[str] = None
+
+
+class StorageReferenceRequest(BaseSchema):
+    """物件儲存回收：待確認的原始檔與轉碼輸出 ID"""
+    sources: list[UUID] = Field(default_factory=list, max_length=1000)
+    outputs: list[UUID] = Field(default_factory=list, max_length=1000)
+    reconcile: bool = False  # 一併刪除已無影片指向的產出紀錄並校正 ref_count
+
+
+class StorageReferenceResponse(BaseSchema):
+    """物件儲存回收：仍需保留的 ID（未列出的可刪除）"""
+    sources: list[UUID] = Field(default_factory=list)
+    outputs: list[UUID] = Field(default_factory=list)
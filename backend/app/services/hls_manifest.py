@@ -0,0 +1,286 @@
+"""
+HLS Manifest Service
+讀取並快取私有 bucket 中的播放清單與 storyboard，改寫其中的 URI 為帶短效簽章的串流端點
+"""
+import math
+import posixpath
+import re
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from app.core.config import settings
+from app.core.exceptions import NotFoundError
+from app.core.storage import ObjectStorage
+from app.core.stream_signing import StreamSigner
+
+# 轉碼輸出的物件鍵前綴：transcoded/{output_id}/...
+OUTPUT_PREFIX = "transcoded"
+
+# 封面、拼貼預覽圖與 storyboard 的物件鍵前綴：thumbnails/{output_id}/...，
+# 串流端點以 {output_id}/previews/... 提供
+PREVIEW_PREFIX = "thumbnails"
+PREVIEW_PATH = "previews"
+
+PLAYLIST_CONTENT_TYPE = "application/vnd.apple.mpegurl"
+STORYBOARD_CONTENT_TYPE = "text/vtt"
+
+# 共用音訊的目錄名稱（與 worker 的輸出一致），不列為畫質
+AUDIO_RENDITION = "audio"
+
+# 標籤屬性中的 URI（EXT-X-MEDIA、EXT-X-MAP、EXT-X-I-FRAME-STREAM-INF 等）
+URI_ATTRIBUTE = re.compile(r'URI="([^"]+)"')
+
+
+class ParsedPlaylist(NamedTuple):
+    """
+    預先切好的播放清單
+
+    pieces 與 uris 交錯組成原始內容：pieces[0] uris[0] pieces[1] ... pieces[-1]，
+    改寫時只需把每個 URI 換成簽章後的 URL 再串接。
+
+    Attributes:
+        pieces: URI 之間的原文片段
+        uris: 以輸出根目錄為基準的相對路徑
+        is_master: 是否為主播放列表
+        duration: 媒體播放清單的總長度（秒）
+        ended: 媒體播放清單是否已結束（EXT-X-ENDLIST）；轉碼途中發布的 EVENT 播放清單為 False
+    """
+    pieces: list[str]
+    uris: list[str]
+    is_master: bool
+    duration: float
+    ended: bool = True
+
+    @property
+    def mutable(self) -> bool:
+        """內容之後仍會改變（主播放列表會加入畫質，未結束的媒體播放清單會加入片段）"""
+        return self.is_master or not self.ended
+
+
+def parse_playlist(text: str, playlist_path: str) -> ParsedPlaylist:
+    """
+    解析播放清單中的 URI
+
+    Args:
+        text: 播放清單內容
+        playlist_path: 播放清單在輸出根目錄下的相對路徑，用於解析相對 URI
+    """
+    base = posixpath.dirname(playlist_path)
+    pieces: list[str] = []
+    uris: list[str] = []
+    buffer: list[str] = []
+    is_master = False
+    ended = False
+    duration = 0.0
+
+    def add_uri(uri: str) -> None:
+        pieces.append("".join(buffer))
+        buffer.clear()
+        uris.append(posixpath.normpath(posixpath.join(base, uri)))
+
+    for line in text.splitlines():
+        if line.startswith("#"):
+            if line.startswith("#EXT-X-STREAM-INF"):
+                is_master = True
+            elif line.startswith("#EXTINF:"):
+                duration += float(line[len("#EXTINF:"):].split(",", 1)[0])
+            elif line.startswith("#EXT-X-ENDLIST"):
+                ended = True
+            position = 0
+            for match in URI_ATTRIBUTE.finditer(line):
+                buffer.append(line[position:match.start(1)])
+                add_uri(match.group(1))
+                position = match.end(1)
+            buffer.append(line[position:] + "\n")
+        elif line.strip():
+            add_uri(line.strip())
+            buffer.append("\n")
+        else:
+            buffer.append("\n")
+    pieces.append("".join(buffer))
+    return ParsedPlaylist(pieces, uris, is_master, duration, ended=is_master or ended)
+
+
+def _vtt_seconds(timestamp: str) -> float:
+    hours, minutes, seconds = timestamp.strip().split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def parse_storyboard(text: str, storyboard_path: str) -> ParsedPlaylist:
+    """
+    解析 WebVTT storyboard 中各 cue 指向的拼貼圖
+
+    cue 內容為拼貼圖 URI 加上 #xywh 片段，只改寫 # 之前的 URI；
+    duration 為最後一個 cue 的結束時間，簽章需涵蓋整段播放時間。
+    """
+    base = posixpath.dirname(storyboard_path)
+    pieces: list[str] = []
+    uris: list[str] = []
+    buffer: list[str] = []
+    duration = 0.0
+    in_cue = False
+
+    for line in text.splitlines():
+        if "-->" in line:
+            duration = max(duration, _vtt_seconds(line.split("-->", 1)[1].split()[0]))
+            in_cue = True
+            buffer.append(line + "\n")
+        elif in_cue and line.strip():
+            uri, hash_mark, fragment = line.strip().partition("#")
+            pieces.append("".join(buffer))
+            buffer.clear()
+            uris.append(posixpath.normpath(posixpath.join(base, uri)))
+            buffer.append(hash_mark + fragment + "\n")
+            in_cue = False
+        else:
+            in_cue = False
+            buffer.append(line + "\n")
+    pieces.append("".join(buffer))
+    return ParsedPlaylist(pieces, uris, False, duration)
+
+
+class PlaylistCache:
+    """
+    解析後播放清單的記憶體 LRU 快取
+
+    已結束的媒體播放清單不再變動，只依 LRU 淘汰；
+    主播放列表會在較高畫質完成後改寫、轉碼途中發布的媒體播放清單會加入片段，以 ttl 限制保留時間。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[ParsedPlaylist, Optional[float]]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[ParsedPlaylist]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        playlist, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return playlist
+
+    def put(self, key: str, playlist: ParsedPlaylist, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (playlist, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+playlist_cache = PlaylistCache(settings.STREAM_PLAYLIST_CACHE_SIZE)
+
+
+def storage_key_for(output_id: str, path: str) -> str:
+    """串流端點路徑對應的物件鍵：previews/ 之下為縮圖目錄，其餘為轉碼輸出"""
+    head, _, rest = path.partition("/")
+    if head == PREVIEW_PATH and rest:
+        return f"{PREVIEW_PREFIX}/{output_id}/{rest}"
+    return f"{OUTPUT_PREFIX}/{output_id}/{path}"
+
+
+def split_preview_key(preview_key: str) -> tuple[str, str]:
+    """
+    將封面或 storyboard 物件鍵拆為串流端點的 (output_id, 相對路徑)
+
+    Raises:
+        NotFoundError: 物件鍵不在縮圖前綴之下
+    """
+    prefix, _, rest = preview_key.partition("/")
+    output_id, _, path = rest.partition("/")
+    if prefix != PREVIEW_PREFIX or not output_id or not path:
+        raise NotFoundError("Preview", preview_key)
+    return output_id, f"{PREVIEW_PATH}/{path}"
+
+
+def split_storage_key(storage_key: str) -> tuple[str, str]:
+    """
+    將主播放列表物件鍵拆為 (output_id, 相對路徑)
+
+    Raises:
+        NotFoundError: 物件鍵不在轉碼輸出前綴之下
+    """
+    prefix, _, rest = storage_key.partition("/")
+    output_id, _, path = rest.partition("/")
+    if prefix != OUTPUT_PREFIX or not output_id or not path:
+        raise NotFoundError("Stream", storage_key)
+    return output_id, path
+
+
+async def load_playlist(storage: ObjectStorage, output_id: str, path: str) -> ParsedPlaylist:
+    """
+    取得解析後的播放清單（或 .vtt storyboard），快取未命中時自物件儲存讀取
+
+    Raises:
+        NotFoundError: 播放清單不存在
+    """
+    key = storage_key_for(output_id, path)
+    playlist = playlist_cache.get(key)
+    if playlist is not None:
+        return playlist
+
+    data = await storage.get_object(key)
+    if data is None:
+        raise NotFoundError("Playlist", path)
+    parse = parse_storyboard if path.endswith(".vtt") else parse_playlist
+    playlist = parse(data.decode(), path)
+    playlist_cache.put(
+        key, playlist, ttl=settings.STREAM_MASTER_CACHE_TTL if playlist.mutable else None
+    )
+    return playlist
+
+
+def stream_url(signer: StreamSigner, output_id: str, path: str, expires: int) -> str:
+    """串流端點的簽章 URL（絕對路徑，播放器以播放清單的來源解析）"""
+    signed_path = f"{output_id}/{path}"
+    signature = signer.sign(signed_path, expires)
+    return f"{settings.API_V1_PREFIX}/stream/{signed_path}?exp={expires}&sig={signature}"
+
+
+def playlist_expiry(playlist: ParsedPlaylist, now: Optional[float] = None) -> int:
+    """
+    播放清單中 URI 的到期時間
+
+    主播放列表中的媒體播放清單只需在起播時取得；
+    VOD 媒體播放清單只載入一次，片段簽章需涵蓋整段播放時間。
+    """
+    now = time.time() if now is None else now
+    lifetime = settings.STREAM_TOKEN_TTL
+    if not playlist.is_master:
+        lifetime += math.ceil(playlist.duration)
+    return int(now) + lifetime
+
+
+def render_playlist(
+    playlist: ParsedPlaylist,
+    output_id: str,
+    signer: StreamSigner,
+    expires: int,
+) -> str:
+    """
+    將播放清單中的 URI 改寫為簽章 URL
+
+    單檔 fMP4 的所有片段指向同一 URI，同一 URI 只簽一次。
+    """
+    urls: dict[str, str] = {}
+    out = [playlist.pieces[0]]
+    for uri, piece in zip(playlist.uris, playlist.pieces[1:], strict=True):
+        url = urls.get(uri)
+        if url is None:
+            url = urls[uri] = stream_url(signer, output_id, uri, expires)
+        out.append(url)
+        out.append(piece)
+    return "".join(out)
+
+
+def variant_names(playlist: ParsedPlaylist) -> list[str]:
+    """主播放列表中各變體的目錄名稱（例如 360p、720p），不含共用音訊"""
+    names = []
+    for uri in playlist.uris:
+        name = posixpath.dirname(uri)
+        if name and name not in names and name != AUDIO_RENDITION:
+            names.append(name)
+    return names
@@ -0,0 +1,224 @@
+"""
+HLS Segment Delivery
+串流片段的 Range 回應與零複製傳送，片段不必經由公開的 MinIO 提供
+"""
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import BinaryIO, Optional
+
+import anyio
+from botocore.exceptions import ClientError
+from fastapi.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.exceptions import NotFoundError
+from app.core.storage import ObjectStorage
+from app.services.segment_cache import SegmentInfo, segment_cache
+
+SEGMENT_CONTENT_TYPES = {
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".aac": "audio/aac",
+    ".vtt": "text/vtt",
+    ".jpg": "image/jpeg",
+}
+
+# 只處理單一範圍；多重範圍依 RFC 9110 忽略並回傳整個檔案
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def parse_range(header: Optional[str]) -> Optional[tuple[Optional[int], Optional[int]]]:
+    """
+    解析 Range 標頭
+
+    Returns:
+        (start, end)，suffix 範圍（bytes=-500）的 start 為 None；
+        沒有 Range、格式不符或多重範圍時返回 None
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.fullmatch(header.strip())
+    if match is None or match.group(0) == "bytes=-":
+        return None
+    start, end = (int(value) if value else None for value in match.groups())
+    if start is not None and end is not None and end < start:
+        return None
+    return start, end
+
+
+def resolve_range(
+    byte_range: tuple[Optional[int], Optional[int]], size: int
+) -> Optional[tuple[int, int]]:
+    """將範圍套用到檔案大小，返回含兩端的 (start, end)；無法滿足時返回 None"""
+    start, end = byte_range
+    if start is None:
+        if not end or not size:
+            return None
+        return max(size - end, 0), size - 1
+    if start >= size:
+        return None
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+def if_range_matches(header: Optional[str], info: SegmentInfo) -> bool:
+    """If-Range 的驗證值（強 ETag 或 HTTP 日期）是否與片段相符；沒有 If-Range 時為 True"""
+    if not header:
+        return True
+    header = header.strip()
+    if header.startswith(('"', "W/")):
+        return header == info.etag
+    try:
+        return int(parsedate_to_datetime(header).timestamp()) == int(info.mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+def segment_headers(path: str, info: SegmentInfo, max_age: int) -> dict[str, str]:
+    """片段回應的共用標頭"""
+    return {
+        "Accept-Ranges": "bytes",
+        "ETag": info.etag,
+        "Last-Modified": formatdate(info.mtime, usegmt=True),
+        "Cache-Control": f"private, max-age={max(max_age, 0)}",
+        "Content-Type": SEGMENT_CONTENT_TYPES.get(
+            os.path.splitext(path)[1], "application/octet-stream"
+        ),
+    }
+
+
+def range_not_satisfiable(size: int) -> Response:
+    return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+
+class SegmentFileResponse(Response):
+    """
+    自已開啟的本機檔案回應一段位元組範圍
+
+    伺服器支援 ASGI zerocopysend 擴充時交由核心以 sendfile 傳送；
+    否則在執行緒中以 pread 分塊讀取。檔案在建立回應前開啟，
+    開啟後即使被快取淘汰，仍能完整送出。
+    """
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        start: int,
+        end: int,
+        status_code: int,
+        headers: dict[str, str],
+    ):
+        super().__init__(status_code=status_code, headers=headers)
+        self.file = file
+        self.start = start
+        self.length = end - start + 1
+        self.headers["Content-Length"] = str(self.length)
+
+    async def __call__(self, scope: Scope, _receive: Receive, send: Send) -> None:
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            })
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": self.file,
+                    "offset": self.start,
+                    "count": self.length,
+                })
+                return
+
+            fd = self.file.fileno()
+            offset, remaining = self.start, self.length
+            while remaining:
+                chunk = await anyio.to_thread.run_sync(
+                    os.pread, fd, min(settings.STREAM_CHUNK_SIZE, remaining), offset
+                )
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            self.file.close()
+
+
+async def serve_segment(
+    storage: ObjectStorage,
+    key: str,
+    range_header: Optional[str],
+    if_range: Optional[str],
+    max_age: int,
+) -> Response:
+    """
+    回應片段或其位元組範圍
+
+    片段在本機快取中時自磁碟送出；同一片段正在背景寫入快取時等待寫入完成後自磁碟送出；
+    否則將 Range 轉交物件儲存並串流回應，首個位元組不必等待整個物件下載，
+    並依得知的物件大小在背景寫入快取。
+
+    Args:
+        storage: 物件儲存客戶端
+        key: 片段的物件鍵
+        range_header: Range 標頭
+        if_range: If-Range 標頭，與片段不符時忽略 Range 回傳整個檔案
+        max_age: 回應可被瀏覽器快取的秒數（簽章剩餘有效時間）
+
+    Raises:
+        NotFoundError: 片段不存在
+    """
+    byte_range = parse_range(range_header)
+
+    cached = segment_cache.get(key)
+    if cached is None:
+        cached = await segment_cache.wait_for_fill(key)
+    if cached is not None:
+        file, info = cached
+        headers = segment_headers(key, info, max_age)
+        if byte_range is None or not if_range_matches(if_range, info):
+            return SegmentFileResponse(file, 0, info.size - 1, 200, headers)
+        resolved = resolve_range(byte_range, info.size)
+        if resolved is None:
+            file.close()
+            return range_not_satisfiable(info.size)
+        start, end = resolved
+        headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+        return SegmentFileResponse(file, start, end, 206, headers)
+
+    if byte_range is not None and if_range:
+        metadata = await storage.head_object(key)
+        if metadata is None:
+            raise NotFoundError("Segment", key)
+        info = SegmentInfo(metadata["ContentLength"], metadata["LastModified"].timestamp())
+        if not if_range_matches(if_range, info):
+            byte_range = None
+
+    try:
+        response = await storage.open_object(key, range_header if byte_range else None)
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] != "InvalidRange":
+            raise
+        metadata = await storage.head_object(key)
+        if metadata is None:
+            raise NotFoundError("Segment", key)
+        return range_not_satisfiable(metadata["ContentLength"])
+    if response is None:
+        raise NotFoundError("Segment", key)
+
+    content_range = response.get("ContentRange")
+    size = int(content_range.rsplit("/", 1)[1]) if content_range else response["ContentLength"]
+    segment_cache.schedule_fill(storage, key, size)
+    headers = segment_headers(key, SegmentInfo(size, response["LastModified"].timestamp()), max_age)
+    headers["Content-Length"] = str(response["ContentLength"])
+    if content_range:
+        headers["Content-Range"] = content_range
+    return StreamingResponse(
+        storage.iter_body(response["Body"], settings.STREAM_CHUNK_SIZE),
+        status_code=206 if content_range else 200,
+        headers=headers,
+    )
@@ -0,0 +1,287 @@
+"""
+Segment Cache
+串流片段的本機磁碟快取：位元組預算、依大小的 TinyLFU 准入、背景寫入與命中率統計
+"""
+import asyncio
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from contextlib import ExitStack, suppress
+from dataclasses import asdict, dataclass
+from typing import BinaryIO, NamedTuple, Optional
+
+from botocore.exceptions import ClientError
+
+from app.core.config import settings
+from app.core.storage import ObjectStorage
+
+logger = logging.getLogger(__name__)
+
+# 估算快取可容納的片段數（只決定頻率計數器的寬度，准入依實際大小判斷）
+AVERAGE_SEGMENT_BYTES = 1024 * 1024
+
+TEMP_PREFIX = ".fill-"
+
+
+class SegmentInfo(NamedTuple):
+    """片段的大小與最後修改時間（物件的 LastModified）"""
+    size: int
+    mtime: float
+
+    @property
+    def etag(self) -> str:
+        # 由大小與修改時間組成，本機快取與物件儲存兩條路徑的值一致
+        return f'"{self.size:x}-{int(self.mtime):x}"'
+
+
+class FrequencySketch:
+    """
+    近期存取頻率的估計（TinyLFU 的 Count-Min Sketch）
+
+    4 列計數器各以不同雜湊定位，頻率取最小值，計數上限 15；
+    累計 10 倍寬度次存取後全部減半，過去的熱門片段會逐漸降溫。
+    記憶體用量約為每個可快取片段 4 bytes。
+    """
+
+    MAX_COUNT = 15
+    SEEDS = (
+        0x9E3779B97F4A7C15,
+        0xC2B2AE3D27D4EB4F,
+        0x165667B19E3779F9,
+        0xD6E8FEB86659FD93,
+    )
+
+    def __init__(self, capacity: int):
+        width = 1 << max(capacity - 1, 1).bit_length()
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in self.SEEDS]
+        self._sample_size = 10 * width
+        self._additions = 0
+
+    def _indexes(self, key: str) -> list[int]:
+        h = hash(key)
+        return [((h * seed) & 0xFFFFFFFFFFFFFFFF) >> 32 & self._mask for seed in self.SEEDS]
+
+    def frequency(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key), strict=True))
+
+    def increment(self, key: str) -> None:
+        for row, index in zip(self._rows, self._indexes(key), strict=True):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            for row in self._rows:
+                row[:] = bytes(count >> 1 for count in row)
+            self._additions //= 2
+
+
+@dataclass
+class SegmentCacheStats:
+    """快取計數（行程啟動後累計）"""
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0  # 未命中但等到同一物件的背景寫入完成，未另外讀取物件儲存
+    admitted: int = 0
+    rejected: int = 0  # 頻率不足或物件過大，不寫入快取
+    evictions: int = 0
+    fill_errors: int = 0
+    filled_bytes: int = 0  # 為寫入快取自物件儲存下載的位元組數
+
+
+class SegmentDiskCache:
+    """
+    片段的本機磁碟快取
+
+    片段發布後不再變動，檔案以物件鍵為路徑存放，mtime 設為物件的 LastModified。
+    下載先寫入同目錄的暫存檔再 rename，讀取端不會看到寫到一半的檔案。
+
+    總大小超過 max_bytes 時依 LRU 淘汰。快取已滿時，未命中的物件只有在
+    近期存取頻率高於為騰出其大小而須淘汰的每個 LRU 末端物件時才寫入（TinyLFU），
+    一次性的整門課掃描不會擠掉熱門的開頭片段，單一大檔也不會一次清空快取。
+
+    第一個未命中的請求不等待寫入：直接以 Range 自物件儲存串流，
+    同時以 schedule_fill 在背景下載整個物件（fMP4 單檔輸出的 stream.mp4 是整個畫質的串流，
+    等待整檔下載會讓首個位元組延遲數十秒）。下載進行中再次未命中的請求以 wait_for_fill
+    短暫等待同一次下載完成後自磁碟送出，熱門片段剛發布時不會對物件儲存重複讀取。
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stats = SegmentCacheStats()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._bytes = 0
+        self._sketch = FrequencySketch(max(max_bytes // AVERAGE_SEGMENT_BYTES, 64))
+        # 背景寫入的工作（保留參照，避免未完成即被回收）
+        self._fills: dict[str, asyncio.Task] = {}
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def load(self) -> None:
+        """
+        索引磁碟上既有的片段（啟動時，於執行緒中執行）
+
+        重新啟動後沿用先前的快取，依存取時間排入 LRU，超出預算的刪除，並清除殘留的暫存檔。
+        """
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if name.startswith(TEMP_PREFIX):
+                    os.unlink(path)
+                    continue
+                stat = os.stat(path)
+                files.append((stat.st_atime, os.path.relpath(path, self.root), stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+        self._evict(0)
+
+    def get(self, key: str) -> Optional[tuple[BinaryIO, SegmentInfo]]:
+        """
+        取得快取中已開啟的片段
+
+        未命中時返回 None，由呼叫端自物件儲存串流並以 schedule_fill 排入背景寫入。
+        """
+        self._sketch.increment(key)
+        if key in self._entries:
+            opened = self._open(key)
+            if opened is not None:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return opened
+            self._bytes -= self._entries.pop(key)
+        self.stats.misses += 1
+        return None
+
+    async def wait_for_fill(self, key: str) -> Optional[tuple[BinaryIO, SegmentInfo]]:
+        """
+        等待同一物件進行中的背景寫入，完成後取得已開啟的片段
+
+        最多等待 STREAM_COALESCE_WAIT 秒，大型物件（例如 fMP4 單檔）下載較久時不拖延首個位元組；
+        請求中斷時只停止等待，不影響背景寫入。
+
+        Returns:
+            沒有進行中的寫入、等待逾時或寫入失敗時返回 None，由呼叫端自物件儲存讀取
+        """
+        task = self._fills.get(key)
+        if task is None:
+            return None
+        await asyncio.wait((task,), timeout=settings.STREAM_COALESCE_WAIT)
+        if not task.done() or task.cancelled() or not task.result():
+            return None
+        opened = self._open(key)
+        if opened is None:
+            return None
+        self._entries.move_to_end(key)
+        self.stats.coalesced += 1
+        return opened
+
+    def schedule_fill(self, storage: ObjectStorage, key: str, size: int) -> None:
+        """
+        未命中後在背景下載物件寫入快取
+
+        Args:
+            storage: 物件儲存客戶端
+            key: 物件鍵
+            size: 物件大小（自 Range 回應的 Content-Range 得知）
+        """
+        if key in self._fills:
+            return
+        if size > settings.STREAM_CACHE_MAX_OBJECT_BYTES or not self._admit(key, size):
+            self.stats.rejected += 1
+            return
+        self.stats.admitted += 1
+        task = self._fills[key] = asyncio.create_task(self._fill(storage, key))
+        task.add_done_callback(lambda _: self._fills.pop(key, None))
+
+    async def close(self) -> None:
+        """取消進行中的背景寫入（lifespan 關閉時，需在物件儲存客戶端關閉前）"""
+        tasks = list(self._fills.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def metrics(self) -> dict[str, float]:
+        """命中率與容量統計"""
+        lookups = self.stats.hits + self.stats.misses
+        return {
+            **asdict(self.stats),
+            "hit_ratio": self.stats.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "fills_in_progress": len(self._fills),
+        }
+
+    def _open(self, key: str) -> Optional[tuple[BinaryIO, SegmentInfo]]:
+        with ExitStack() as stack:
+            try:
+                file = stack.enter_context(open(self.path(key), "rb"))
+            except FileNotFoundError:
+                return None
+            stat = os.fstat(file.fileno())
+            # 檔案交由呼叫端關閉
+            stack.pop_all()
+        return file, SegmentInfo(stat.st_size, stat.st_mtime)
+
+    def _admit(self, key: str, size: int) -> bool:
+        """物件大小放得下，或頻率高於須淘汰的每個 LRU 末端物件時准入"""
+        if size > self.max_bytes:
+            return False
+        needed = self._bytes + size - self.max_bytes
+        if needed <= 0:
+            return True
+        frequency = self._sketch.frequency(key)
+        for victim, victim_size in self._entries.items():
+            if self._sketch.frequency(victim) >= frequency:
+                return False
+            needed -= victim_size
+            if needed <= 0:
+                return True
+        return False
+
+    async def _fill(self, storage: ObjectStorage, key: str) -> bool:
+        """下載物件並納入快取，失敗時返回 False"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TEMP_PREFIX)
+        os.close(fd)
+        try:
+            response = await storage.download_file(
+                key, temp_path, timeout=settings.STREAM_FILL_TIMEOUT
+            )
+            mtime = response["LastModified"].timestamp()
+            os.utime(temp_path, (mtime, mtime))
+            os.replace(temp_path, path)
+        except Exception as exc:
+            self.stats.fill_errors += 1
+            if not (isinstance(exc, ClientError) and exc.response["Error"]["Code"] == "NoSuchKey"):
+                logger.warning("Failed to cache segment %s: %s", key, exc)
+            return False
+        finally:
+            with suppress(FileNotFoundError):
+                os.unlink(temp_path)
+
+        size = response["ContentLength"]
+        self._bytes -= self._entries.pop(key, 0)
+        self._evict(size)
+        self._entries[key] = size
+        self._bytes += size
+        self.stats.filled_bytes += size
+        return True
+
+    def _evict(self, incoming: int) -> None:
+        while self._entries and self._bytes + incoming > self.max_bytes:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.stats.evictions += 1
+            # 已開啟的回應仍可讀完被刪除的檔案
+            with suppress(FileNotFoundError):
+                os.unlink(self.path(key))
+
+
+segment_cache = SegmentDiskCache(settings.STREAM_CACHE_DIR, settings.STREAM_CACHE_MAX_BYTES)
@@ -0,0 +1,102 @@
+"""
+Storage Reference Service
+物件儲存回收前的引用檢查：哪些原始檔與轉碼輸出仍被資料庫引用
+"""
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import func, or_, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.video import Video, VideoAsset, VideoStatus
+
+
+async def retained_sources(db: AsyncSession, video_ids: list[UUID]) -> set[UUID]:
+    """
+    原始檔仍需保留的影片
+
+    上傳或轉碼中的影片需要原始檔；完成或失敗的影片保留 SOURCE_RETENTION_SECONDS
+    供重試與排查，之後原始檔可刪除。影片已不存在時原始檔一律可刪除。
+    """
+    if not video_ids:
+        return set()
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.SOURCE_RETENTION_SECONDS)
+    rows = await db.execute(
+        select(Video.id).where(
+            Video.id.in_(video_ids),
+            or_(
+                Video.status.in_([VideoStatus.UPLOADING, VideoStatus.PROCESSING]),
+                Video.updated_at > cutoff,
+            ),
+        )
+    )
+    return set(rows.scalars())
+
+
+async def referenced_outputs(db: AsyncSession, output_ids: list[UUID]) -> set[UUID]:
+    """
+    仍被引用的轉碼輸出（transcoded/{id}/ 與 thumbnails/{id}/）
+
+    輸出以負責轉碼的影片 ID 命名：仍有影片指向該輸出的產出紀錄，或該影片仍存在
+    （轉碼中、或未經去重登記的舊影片）時保留。
+    刪除課程或章節時影片由資料庫串聯刪除，不會經過 release_asset，
+    產出紀錄的 ref_count 因此不可信，只以實際指向的影片判斷。
+    """
+    if not output_ids:
+        return set()
+    rows = await db.execute(
+        union(
+            select(VideoAsset.source_video_id).where(
+                VideoAsset.source_video_id.in_(output_ids),
+                select(Video.id).where(Video.asset_id == VideoAsset.id).exists(),
+            ),
+            select(Video.id).where(Video.id.in_(output_ids)),
+        )
+    )
+    return set(rows.scalars())
+
+
+async def reconcile_assets(db: AsyncSession, output_ids: list[UUID]) -> int:
+    """
+    校正輸出對應的產出紀錄
+
+    已無影片指向的產出紀錄刪除，其輸出隨後由回收任務刪除；
+    其餘產出的 ref_count 改為實際指向的影片數。
+    產出紀錄先以 FOR UPDATE 鎖定：與 register_source 同時執行時，
+    先取得鎖的一方完成後另一方才會繼續，不會刪除剛被新影片沿用的產出。
+
+    Returns:
+        刪除的產出紀錄數
+    """
+    if not output_ids:
+        return 0
+    assets = (
+        await db.execute(
+            select(VideoAsset)
+            .where(VideoAsset.source_video_id.in_(output_ids))
+            .with_for_update()
+        )
+    ).scalars().all()
+    if not assets:
+        return 0
+
+    counts = dict(
+        (
+            await db.execute(
+                select(Video.asset_id, func.count(Video.id))
+                .where(Video.asset_id.in_([asset.id for asset in assets]))
+                .group_by(Video.asset_id)
+            )
+        ).all()
+    )
+    deleted = 0
+    for asset in assets:
+        references = counts.get(asset.id, 0)
+        if references == 0:
+            await db.delete(asset)
+            deleted += 1
+        elif asset.ref_count != references:
+            asset.ref_count = references
+    await db.flush()
+    return deleted
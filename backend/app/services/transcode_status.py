@@ -0,0 +1,116 @@
+"""
+Transcode Status Service
+讀取 worker 寫入 Redis 的轉碼進度與排程佇列，鍵名須與 worker/progress.py、worker/scheduler.py 一致
+"""
+import json
+import logging
+import time
+from typing import Any, Optional
+
+from app.core.exceptions import ServiceUnavailableError
+from app.core.redis import REDIS_SERVICE, get_redis
+
+logger = logging.getLogger(__name__)
+
+# 排程佇列（worker/scheduler.py）
+SCHEDULER_PENDING_KEY = "video:scheduler:pending"
+SCHEDULER_RUNNING_KEY = "video:scheduler:running"
+SCHEDULER_WAITS_KEY = "video:scheduler:waits"
+
+
+def progress_key(video_id: str) -> str:
+    """各子任務最新進度的 hash（field 為子任務名稱，value 為 JSON 進度）"""
+    return f"video:{video_id}:progress:latest"
+
+
+def plan_key(video_id: str) -> str:
+    """分派時預計的子任務與工作量（JSON，子任務名稱對應媒體秒數乘畫質數）"""
+    return f"video:{video_id}:progress:plan"
+
+
+async def read_progress(video_id: str) -> tuple[list[dict], dict[str, float]]:
+    """
+    讀取影片各子任務的最新進度與分派時的工作量計畫
+
+    Returns:
+        (依子任務名稱排序的進度字典, 子任務工作量)；尚未開始或已過期時皆為空
+
+    Raises:
+        ServiceUnavailableError: 無法連線 Redis
+    """
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hgetall(progress_key(video_id))
+        pipe.get(plan_key(video_id))
+        entries, plan = await pipe.execute()
+    except ServiceUnavailableError:
+        raise
+    except Exception as error:
+        logger.warning("Failed to read transcode progress of %s: %s", video_id, error)
+        raise ServiceUnavailableError(REDIS_SERVICE) from error
+    steps = [json.loads(entries[step]) for step in sorted(entries)]
+    return steps, json.loads(plan) if plan else {}
+
+
+def overall_progress(
+    steps: list[dict], plan: dict[str, float]
+) -> tuple[Optional[float], Optional[float]]:
+    """
+    彙整子任務進度
+
+    整體比例以計畫中各子任務的工作量加權，尚未回報的子任務以 0 計入；
+    分段轉碼的子任務分階段分派，只平均已回報者會讓比例隨新階段開始而倒退。
+    剩餘時間取未完成子任務中最長者。
+
+    Returns:
+        (完成比例, 預估剩餘秒數)，尚無法估計時為 None
+    """
+    etas = [step["eta"] for step in steps if not step["done"] and step.get("eta") is not None]
+    eta = max(etas, default=None)
+    total = sum(plan.values())
+    if not total:
+        return None, eta
+    fractions = {step["step"]: step["fraction"] for step in steps}
+    done = sum(weight * fractions.get(name, 0.0) for name, weight in plan.items())
+    return min(done / total, 1.0), eta
+
+
+async def queue_metrics() -> dict[str, Any]:
+    """
+    轉碼排程佇列指標
+
+    Returns:
+        pending / running 數量、目前最久的等待秒數，
+        以及最近開始轉碼的影片的等待時間統計（平均、p50、p95、最大）；
+        無法連線 Redis 時為空字典
+    """
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zcard(SCHEDULER_PENDING_KEY)
+        pipe.zcard(SCHEDULER_RUNNING_KEY)
+        pipe.zrange(SCHEDULER_PENDING_KEY, 0, 0, withscores=True)
+        pipe.lrange(SCHEDULER_WAITS_KEY, 0, -1)
+        pending, running, oldest, waits = await pipe.execute()
+    except Exception as error:
+        logger.warning("Failed to read transcode queue metrics: %s", error)
+        return {}
+
+    waits = sorted(float(wait) for wait in waits)
+
+    def percentile(fraction: float) -> Optional[float]:
+        if not waits:
+            return None
+        return waits[min(int(fraction * len(waits)), len(waits) - 1)]
+
+    return {
+        "pending": pending,
+        "running": running,
+        "oldest_pending_wait_seconds": time.time() - oldest[0][1] if oldest else 0.0,
+        "queue_wait_seconds": {
+            "samples": len(waits),
+            "avg": sum(waits) / len(waits) if waits else None,
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "max": waits[-1] if waits else None,
+        },
+    }
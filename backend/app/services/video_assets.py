@@ -0,0 +1,284 @@
+"""
+Video Asset Service
+依原始檔內容雜湊共用轉碼產出，並以引用計數保護刪除
+"""
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.exceptions import BadRequestError, ConflictError
+from app.models.video import Video, VideoAsset, VideoStatus
+
+
+def should_transcode(asset: VideoAsset, video: Video) -> bool:
+    """只有負責轉碼的影片且產出尚未完成時才需要轉碼"""
+    return asset.source_video_id == video.id and asset.status == VideoStatus.PROCESSING
+
+
+async def _lock_asset(db: AsyncSession, content_hash: str) -> Optional[VideoAsset]:
+    """以列鎖讀取內容雜湊對應的產出"""
+    return (
+        await db.execute(
+            select(VideoAsset)
+            .where(VideoAsset.content_hash == content_hash)
+            .with_for_update()
+        )
+    ).scalar_one_or_none()
+
+
+async def register_source(db: AsyncSession, video: Video, content_hash: str) -> VideoAsset:
+    """
+    以原始檔雜湊登記影片的轉碼產出
+
+    相同雜湊的產出已完成時，影片直接指向該產出並設為 READY；
+    轉碼中則等待負責的影片完成（最低畫質已發布時即可播放）；先前失敗則由此影片接手重新轉碼。
+    重複呼叫（例如任務重試）不會重複增加引用計數。
+
+    Args:
+        db: 資料庫 Session
+        video: 上傳完成的影片
+        content_hash: 原始檔 SHA-256（十六進位）
+
+    Returns:
+        影片引用的產出
+
+    Raises:
+        ConflictError: 影片先前已登記不同內容
+    """
+    asset = await _lock_asset(db, content_hash)
+    if asset is None:
+        # 同時上傳相同內容時只會有一筆產出勝出，落敗的一方以 savepoint 回復後沿用勝出的產出
+        try:
+            async with db.begin_nested():
+                db.add(
+                    VideoAsset(
+                        content_hash=content_hash,
+                        source_video_id=video.id,
+                        ref_count=0,
+                        status=VideoStatus.PROCESSING,
+                    )
+                )
+        except IntegrityError:
+            pass
+        asset = await _lock_asset(db, content_hash)
+
+    if video.asset_id is None:
+        video.asset_id = asset.id
+        asset.ref_count += 1
+    elif video.asset_id != asset.id:
+        # 影片的輸出目錄可能已被其他影片共用，不允許改指向不同內容
+        raise ConflictError("Video source was registered with different content", "Video")
+
+    if asset.status == VideoStatus.FAILED:
+        asset.source_video_id = video.id
+        asset.status = VideoStatus.PROCESSING
+        asset.storage_key = None
+
+    if asset.status == VideoStatus.READY:
+        video.status = VideoStatus.READY
+        video.storage_key = asset.storage_key
+        video.thumbnail_url = asset.thumbnail_key
+        video.storyboard_key = asset.storyboard_key
+    elif asset.storage_key is not None:
+        video.status = VideoStatus.READY
+        video.storage_key = asset.storage_key
+    else:
+        video.status = VideoStatus.PROCESSING
+    return asset
+
+
+async def ensure_own_output(db: AsyncSession, video: Video, key: str, prefix: str) -> None:
+    """
+    確認 worker 回報的物件鍵位於影片自己的輸出目錄
+
+    允許 {prefix}/{video_id}/ 與影片登記的產出的負責轉碼影片目錄
+    （{prefix}/{source_video_id}/），避免影片被指向其他影片（例如付費課程）的輸出。
+
+    Args:
+        db: 資料庫 Session
+        video: 回報結果的影片
+        key: 物件鍵
+        prefix: 輸出前綴（transcoded 或 thumbnails）
+
+    Raises:
+        BadRequestError: 物件鍵不在允許的目錄之下
+    """
+    owners = {str(video.id)}
+    if video.asset_id is not None:
+        asset = await db.get(VideoAsset, video.asset_id)
+        if asset is not None:
+            owners.add(str(asset.source_video_id))
+
+    parts = key.split("/")
+    if (
+        len(parts) < 3
+        or parts[0] != prefix
+        or parts[1] not in owners
+        or any(part in ("", ".", "..") for part in parts[2:])
+    ):
+        raise BadRequestError(
+            f"Output key must be under {prefix}/{video.id}/",
+            details={"key": key},
+        )
+
+
+async def publish_asset(db: AsyncSession, video: Video, storage_key: str) -> None:
+    """
+    負責轉碼的影片已發布最低畫質時，讓引用此產出的影片可播放
+
+    較高畫質仍在上傳，產出維持 PROCESSING 直到 finish_asset；
+    release_asset 依此拒絕刪除轉碼尚未結束的輸出。worker 在轉碼結束時必定回報
+    completed 或 failed（較高畫質失敗時亦同），產出不會停留在 PROCESSING。
+
+    Args:
+        db: 資料庫 Session
+        video: 回報發布的影片
+        storage_key: 主播放清單物件鍵
+    """
+    if video.asset_id is None:
+        return
+
+    asset = await db.get(VideoAsset, video.asset_id, with_for_update=True)
+    if asset is None or asset.source_video_id != video.id:
+        return
+
+    asset.storage_key = storage_key
+    await db.execute(
+        update(Video)
+        .where(Video.asset_id == asset.id, Video.status == VideoStatus.PROCESSING)
+        .values(status=VideoStatus.READY, storage_key=storage_key)
+    )
+
+
+async def finish_asset(
+    db: AsyncSession,
+    video: Video,
+    status: VideoStatus,
+    storage_key: Optional[str] = None,
+    thumbnail_key: Optional[str] = None,
+    storyboard_key: Optional[str] = None,
+) -> None:
+    """
+    負責轉碼的影片完成或失敗時，更新產出與所有等待中的影片
+
+    最低畫質先發布（publish_asset）時封面與 storyboard 尚未產生，完成時才回報；
+    屆時等待中的影片已是 READY，封面與 storyboard 另外寫入所有引用此產出的影片。
+
+    Args:
+        db: 資料庫 Session
+        video: 回報轉碼結果的影片
+        status: READY 或 FAILED
+        storage_key: 主播放清單物件鍵（READY 時）
+        thumbnail_key: 封面物件鍵
+        storyboard_key: storyboard 物件鍵
+    """
+    if video.asset_id is None:
+        return
+
+    asset = await db.get(VideoAsset, video.asset_id, with_for_update=True)
+    if asset is None or asset.source_video_id != video.id:
+        return
+
+    asset.status = status
+    if status == VideoStatus.READY:
+        asset.storage_key = storage_key
+    await db.execute(
+        update(Video)
+        .where(Video.asset_id == asset.id, Video.status == VideoStatus.PROCESSING)
+        .values(status=status, storage_key=asset.storage_key)
+    )
+
+    previews = {}
+    if thumbnail_key:
+        asset.thumbnail_key = previews["thumbnail_url"] = thumbnail_key
+    if storyboard_key:
+        asset.storyboard_key = previews["storyboard_key"] = storyboard_key
+    if previews:
+        await db.execute(update(Video).where(Video.asset_id == asset.id).values(**previews))
+
+
+async def record_transcode_result(
+    db: AsyncSession,
+    video: Video,
+    status: str,
+    storage_key: Optional[str] = None,
+    thumbnail_key: Optional[str] = None,
+    storyboard_key: Optional[str] = None,
+) -> None:
+    """
+    依 worker 回報的轉碼狀態更新影片與其產出
+
+    published 表示最低畫質已發布、影片可播放；completed 表示所有畫質完成，一併寫入封面與 storyboard；
+    兩者重複回報結果相同。failed 時產出標記失敗、等待中的影片改為 FAILED，
+    但已可播放的影片（最低畫質已發布，可能正在播放）保持 READY；相同內容再次上傳時會重新轉碼。
+
+    Args:
+        db: 資料庫 Session
+        video: 回報轉碼結果的影片
+        status: published、completed 或 failed
+        storage_key: 主播放清單物件鍵（published 與 completed 時）
+        thumbnail_key: 封面物件鍵
+        storyboard_key: storyboard 物件鍵
+    """
+    if status == "failed":
+        await finish_asset(db, video, VideoStatus.FAILED)
+        if video.status != VideoStatus.READY:
+            video.status = VideoStatus.FAILED
+        return
+
+    if status == "published":
+        await publish_asset(db, video, storage_key)
+    else:
+        await finish_asset(db, video, VideoStatus.READY, storage_key, thumbnail_key, storyboard_key)
+    video.status = VideoStatus.READY
+    video.storage_key = storage_key
+    if thumbnail_key:
+        video.thumbnail_url = thumbnail_key
+    if storyboard_key:
+        video.storyboard_key = storyboard_key
+
+
+async def release_asset(db: AsyncSession, video: Video) -> Optional[VideoAsset]:
+    """
+    解除影片對產出的引用
+
+    引用計數歸零時刪除產出紀錄並返回，呼叫端在提交後才可刪除物件儲存中的輸出；
+    仍有其他影片引用時輸出保留。負責轉碼的影片在完成前被移除時，
+    等待中的影片改為 FAILED，下一次上傳相同內容會重新轉碼。
+    產出在所有畫質完成前維持 PROCESSING（最低畫質已發布、影片可播放時亦同）。
+
+    Args:
+        db: 資料庫 Session
+        video: 即將刪除的影片
+
+    Returns:
+        已無引用、可刪除輸出的產出；否則為 None
+
+    Raises:
+        ConflictError: 影片是轉碼中產出的最後一個引用，輸出刪除後轉碼仍會繼續上傳
+    """
+    if video.asset_id is None:
+        return None
+
+    asset = await db.get(VideoAsset, video.asset_id, with_for_update=True)
+    if asset is not None and asset.ref_count <= 1 and asset.status == VideoStatus.PROCESSING:
+        raise ConflictError("Video is still being transcoded", "Video")
+    video.asset_id = None
+    if asset is None:
+        return None
+
+    asset.ref_count -= 1
+    if asset.ref_count <= 0:
+        await db.delete(asset)
+        return asset
+
+    if asset.source_video_id == video.id and asset.status != VideoStatus.READY:
+        asset.status = VideoStatus.FAILED
+        await db.execute(
+            update(Video)
+            .where(Video.asset_id == asset.id, Video.status == VideoStatus.PROCESSING)
+            .values(status=VideoStatus.FAILED)
+        )
+    return None
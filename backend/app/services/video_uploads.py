@@ -0,0 +1,116 @@
+"""
+Video Upload Service
+分段上傳的分段規劃、原始檔物件鍵與預簽名 URL 分頁
+"""
+import math
+import os
+import re
+from typing import Optional
+from uuid import UUID
+
+from botocore.exceptions import ClientError
+
+from app.core.config import settings
+from app.core.exceptions import BadRequestError, ForbiddenError
+from app.core.storage import ObjectStorage
+from app.models.course import Course
+
+# S3 分段上傳的分段數上限
+MAX_PARTS = 10000
+
+MB = 1024 * 1024
+
+
+def plan_parts(file_size: int, part_size: int = settings.UPLOAD_PART_SIZE) -> tuple[int, int]:
+    """
+    規劃分段大小與分段數
+
+    檔案大到超過 S3 分段數上限時，以整數 MB 放大分段。
+
+    Returns:
+        (分段大小, 分段數)
+    """
+    if file_size > part_size * MAX_PARTS:
+        part_size = math.ceil(file_size / MAX_PARTS / MB) * MB
+    return part_size, max(1, math.ceil(file_size / part_size))
+
+
+def source_key(video_id: UUID, filename: str) -> str:
+    """原始檔的物件鍵：uploads/{video_id}/{安全化的檔名}"""
+    name = re.sub(r"[^\w.\-]+", "_", os.path.basename(filename)).strip("._") or "source"
+    return f"uploads/{video_id}/{name[:200]}"
+
+
+def ensure_course_owner(course: Course, current_user: dict, message: str) -> None:
+    """
+    確認使用者為課程擁有者或管理員
+
+    Raises:
+        ForbiddenError: 非課程擁有者
+    """
+    if current_user.get("role") != "admin" and str(course.creator_id) != current_user.get("id"):
+        raise ForbiddenError(message)
+
+
+def part_url_page(
+    storage: ObjectStorage,
+    key: str,
+    upload_id: str,
+    start: int,
+    part_count: int,
+    limit: int = settings.UPLOAD_PART_URL_PAGE_SIZE,
+) -> tuple[list[dict], Optional[int]]:
+    """
+    產生一頁分段上傳 URL
+
+    Args:
+        storage: 物件儲存客戶端
+        key: 原始檔物件鍵
+        upload_id: 分段上傳 ID
+        start: 起始分段編號（從 1 開始）
+        part_count: 分段總數
+        limit: 本頁最多幾個分段
+
+    Returns:
+        (分段 URL 列表, 下一頁的起始分段編號；已無更多分段時為 None)
+    """
+    end = min(start + limit, part_count + 1)
+    parts = storage.presign_upload_parts(
+        key, upload_id, range(start, end), settings.UPLOAD_URL_EXPIRE_SECONDS
+    )
+    for part in parts:
+        part["expires_in"] = settings.UPLOAD_URL_EXPIRE_SECONDS
+    return parts, end if end <= part_count else None
+
+
+async def complete_upload(storage: ObjectStorage, key: str, upload_id: str) -> dict:
+    """
+    以已上傳的分段完成分段上傳
+
+    物件已存在時（例如前一次請求已合併但後續步驟失敗）直接返回，可安全重試。
+
+    Returns:
+        合併後物件的 metadata（ContentLength、ContentType 等）
+
+    Raises:
+        BadRequestError: 分段上傳不存在或沒有任何分段
+    """
+    metadata = await storage.head_object(key)
+    if metadata is not None:
+        return metadata
+
+    try:
+        parts = await storage.list_parts(key, upload_id)
+        if not parts:
+            raise BadRequestError("No parts have been uploaded")
+        await storage.complete_multipart_upload(
+            key,
+            upload_id,
+            [{"PartNumber": part["PartNumber"], "ETag": part["ETag"]} for part in parts],
+        )
+    except ClientError as exc:
+        raise BadRequestError(
+            "Multipart upload could not be completed",
+            details={"code": exc.response["Error"]["Code"]},
+        )
+    return await storage.head_object(key)
@@ -0,0 +1,139 @@
+"""
+Video Validation Service
+上傳完成時驗證原始檔：以 Range 讀取檔頭比對 magic bytes，ffprobe 直接讀取預簽名 URL，
+不必下載整個檔案
+"""
+import asyncio
+import json
+import logging
+from typing import NamedTuple, Optional
+
+from botocore.exceptions import ClientError
+
+from app.core.config import settings
+from app.core.exceptions import BadRequestError
+from app.core.storage import ObjectStorage
+
+logger = logging.getLogger(__name__)
+
+# 檔頭讀取的位元組數（足以涵蓋下列簽名與 Matroska 的 DocType）
+HEADER_BYTES = 64
+
+# 各 Content-Type 可接受的容器格式（MP4 與 QuickTime 同屬 ISO BMFF，常互相標示）
+CONTENT_TYPE_CONTAINERS = {
+    "video/mp4": {"mp4", "mov"},
+    "video/quicktime": {"mov", "mp4"},
+    "video/x-msvideo": {"avi"},
+    "video/x-matroska": {"matroska", "webm"},
+    "video/webm": {"webm", "matroska"},
+}
+
+
+class ProbeResult(NamedTuple):
+    """ffprobe 結果"""
+    duration: Optional[float]
+    video_codec: Optional[str]
+
+
+def detect_container(header: bytes) -> Optional[str]:
+    """
+    依檔頭的 magic bytes 判斷容器格式
+
+    Returns:
+        mp4、mov、matroska、webm、avi；無法辨識時返回 None
+    """
+    if header[4:8] == b"ftyp":
+        return "mov" if header[8:12] == b"qt  " else "mp4"
+    if header[4:8] in (b"moov", b"mdat", b"wide", b"free"):
+        # 沒有 ftyp 的舊 QuickTime 檔
+        return "mov"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm" if b"webm" in header else "matroska"
+    if header[:4] == b"RIFF" and header[8:12] == b"AVI ":
+        return "avi"
+    return None
+
+
+async def validate_header(storage: ObjectStorage, key: str, content_type: str) -> str:
+    """
+    以單次 Range 讀取驗證檔頭
+
+    Returns:
+        容器格式
+
+    Raises:
+        BadRequestError: 空檔案、不是支援的影片格式，或與宣告的 Content-Type 不符
+    """
+    try:
+        header = await storage.get_range(key, 0, HEADER_BYTES - 1)
+    except ClientError as exc:
+        # 比檔頭短的檔案只回傳實際內容，空檔案則沒有可滿足的範圍
+        if exc.response["Error"]["Code"] != "InvalidRange":
+            raise
+        raise BadRequestError("Uploaded file is empty") from exc
+    container = detect_container(header)
+    if container is None:
+        raise BadRequestError("Uploaded file is not a supported video format")
+    allowed = CONTENT_TYPE_CONTAINERS.get(content_type)
+    if allowed is not None and container not in allowed:
+        raise BadRequestError(
+            f"Uploaded file is {container}, which does not match '{content_type}'",
+            details={"container": container, "content_type": content_type},
+        )
+    return container
+
+
+async def probe_upload(storage: ObjectStorage, key: str) -> Optional[ProbeResult]:
+    """
+    以 ffprobe 讀取物件的預簽名 URL
+
+    ffprobe 只以 Range 讀取解析所需的部分（檔頭，moov 在檔尾時再讀檔尾），
+    通常數十毫秒內完成。逾時或找不到 ffprobe 時返回 None，由轉碼任務再取得長度。
+
+    Raises:
+        BadRequestError: 檔案無法解析或沒有視訊串流
+    """
+    url = storage.presign_get(key, settings.UPLOAD_PROBE_URL_EXPIRE_SECONDS)
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "ffprobe",
+            "-v", "error",
+            # HTTP 讀取逾時（微秒）
+            "-rw_timeout", str(int(settings.UPLOAD_PROBE_TIMEOUT * 1_000_000)),
+            "-show_entries", "format=duration:stream=codec_type,codec_name",
+            "-of", "json",
+            url,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        logger.warning("ffprobe is not installed; skipping upload probe")
+        return None
+
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(), settings.UPLOAD_PROBE_TIMEOUT
+        )
+    except TimeoutError:
+        process.kill()
+        await process.wait()
+        logger.warning("ffprobe timed out for %s", key)
+        return None
+
+    if process.returncode != 0:
+        logger.info("ffprobe rejected %s: %s", key, stderr.decode(errors="replace")[:500])
+        raise BadRequestError("Uploaded file could not be read as a video")
+
+    info = json.loads(stdout or b"{}")
+    video_codec = next(
+        (
+            stream.get("codec_name")
+            for stream in info.get("streams", [])
+            if stream.get("codec_type") == "video"
+        ),
+        None,
+    )
+    if video_codec is None:
+        raise BadRequestError("Uploaded file has no video stream")
+    duration = info.get("format", {}).get("duration")
+    return ProbeResult(float(duration) if duration else None, video_codec)
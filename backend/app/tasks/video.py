@@ -0,0 +1,52 @@
+"""
+Video Tasks
+分派影片相關任務至 Worker 的 video 佇列
+"""
+import posixpath
+from typing import Optional
+from uuid import UUID
+
+from celery import Celery
+
+from app.core.config import settings
+
+# 後端只負責送出任務，任務實作位於 worker 服務
+celery_app = Celery("learning_platform_api", broker=settings.REDIS_URL)
+
+VIDEO_QUEUE = "video"
+
+
+def delete_transcoded_output(video_id: UUID) -> None:
+    """
+    刪除 transcoded/{video_id}/ 與 thumbnails/{video_id}/ 下的物件
+
+    必須在解除引用的交易提交後才呼叫，避免刪除仍被引用的輸出。
+    """
+    celery_app.send_task(
+        "worker.tasks.video_processing.delete_transcoded_output",
+        args=[str(video_id)],
+        queue=VIDEO_QUEUE,
+    )
+
+
+def process_video(video_id: UUID, storage_key: str, owner_id: Optional[str] = None) -> None:
+    """
+    分派轉碼任務
+
+    必須在影片狀態改為 PROCESSING 的交易提交後才呼叫，轉碼完成的 Webhook 才找得到正確狀態。
+
+    Args:
+        video_id: 影片 ID
+        storage_key: 原始檔物件鍵（worker 下載至原始檔快取）
+        owner_id: 上傳的講師 ID（排程公平分配）
+    """
+    celery_app.send_task(
+        "worker.tasks.video_processing.process_video",
+        args=[
+            str(video_id),
+            storage_key,
+            posixpath.join(settings.TRANSCODE_OUTPUT_DIR, str(video_id)),
+        ],
+        kwargs={"owner_id": owner_id},
+        queue=VIDEO_QUEUE,
+    )
@@ -5,12 +5,18 @@ Learning Platform API - FastAPI Application Entry Point
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from starlette.types import Receive, Scope, Send
 
+from app.api.v1 import api_router
 from app.core.config import settings
+from app.core.database import close_db_pool, init_db_pool
 from app.core.exceptions import setup_exception_handlers
-from app.api.v1 import api_router
+from app.core.redis import close_redis, init_redis
+from app.core.storage import close_storage, init_storage
+from app.services.segment_cache import segment_cache
 
 
 @asynccontextmanager
@@ -24,16 +30,36 @@ async def lifespan(app: FastAPI):
     print(f"📝 Debug mode: {settings.DEBUG}")
     print(f"🔗 API Prefix: {settings.API_V1_PREFIX}")
 
-    # TODO: Initialize database connection pool
-    # TODO: Initialize Redis connection
-    # TODO: Initialize MinIO client
+    await init_db_pool()
+    await init_redis()
+    await init_storage()
+    await run_in_threadpool(segment_cache.load)
 
     yield
 
     # Shutdown
     print(f"👋 Shutting down {settings.APP_NAME}")
-    # TODO: Close database connections
-    # TODO: Close Redis connections
+    await close_db_pool()
+    await close_redis()
+    await segment_cache.close()
+    await close_storage()
+
+
+STREAM_PATH_PREFIX = f"{settings.API_V1_PREFIX}/stream/"
+
+
+class SegmentAwareGZipMiddleware(GZipMiddleware):
+    """
+    串流片段不經過 gzip
+    片段本身已壓縮，且 gzip 會破壞 Range 回應與零複製傳送；播放清單仍會壓縮
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        if path.startswith(STREAM_PATH_PREFIX) and not path.endswith(".m3u8"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
 
 
 # Create FastAPI application
@@ -71,14 +97,14 @@ Authorization: Bearer <your_token>
 setup_exception_handlers(app)
 
 # Middleware
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(SegmentAwareGZipMiddleware, minimum_size=1000)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Request-ID"],
+    expose_headers=["X-Request-ID", "Content-Range", "Accept-Ranges"],
 )
 
 
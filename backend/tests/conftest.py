@@ -0,0 +1,90 @@
+"""
+後端測試共用設定
+以 moto 的本機 S3 伺服器取代 MinIO，以 fakeredis 取代 Redis，以 SQLite 取代 PostgreSQL
+"""
+import pytest
+from fakeredis import aioredis
+from moto.server import ThreadedMotoServer
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+
+from app.core import redis
+from app.core.config import Settings
+from app.core.storage import ObjectStorage
+from app.models.base import Base
+from app.models.enrollment import VideoProgress
+from app.models.video import Video, VideoAsset
+
+TEST_BUCKET = "learning-platform-test"
+
+
+@pytest.fixture(scope="session")
+def s3_endpoint():
+    """整個測試階段共用的 moto S3 伺服器，返回 host:port"""
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def storage_settings(s3_endpoint) -> Settings:
+    """指向 moto 伺服器的物件儲存設定"""
+    return Settings(
+        MINIO_ENDPOINT=s3_endpoint,
+        MINIO_ACCESS_KEY="testing",
+        MINIO_SECRET_KEY="testing",
+        MINIO_BUCKET_NAME=TEST_BUCKET,
+        MINIO_SECURE=False,
+        STORAGE_MAX_CONNECTIONS=4,
+        STORAGE_OPERATION_TIMEOUT=5.0,
+    )
+
+
+@pytest.fixture
+async def storage(storage_settings):
+    """建立空 bucket 的 ObjectStorage，結束時清空並關閉"""
+    storage = ObjectStorage(storage_settings)
+    await storage.run(storage.client.create_bucket, Bucket=TEST_BUCKET)
+    yield storage
+    response = await storage.run(storage.client.list_objects_v2, Bucket=TEST_BUCKET)
+    for item in response.get("Contents", []):
+        await storage.delete_object(item["Key"])
+    await storage.run(storage.client.delete_bucket, Bucket=TEST_BUCKET)
+    await storage.close()
+
+
+@pytest.fixture
+async def fake_redis(monkeypatch):
+    """取代 lifespan 建立的共用 Redis 客戶端"""
+    client = aioredis.FakeRedis()
+    monkeypatch.setattr(redis, "_redis", client)
+    yield client
+    await client.aclose()
+
+
+@compiles(postgresql.UUID, "sqlite")
+def _compile_uuid(type_, compiler, **kwargs) -> str:
+    """SQLite 以 32 字元十六進位儲存 UUID"""
+    return "CHAR(32)"
+
+
+@pytest.fixture
+async def sqlite_engine():
+    """只含影片、產出與觀看進度資料表的 SQLite 記憶體資料庫"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(
+            Base.metadata.create_all,
+            tables=[VideoAsset.__table__, Video.__table__, VideoProgress.__table__],
+        )
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def db(sqlite_engine):
+    async with async_sessionmaker(sqlite_engine, expire_on_commit=False)() as session:
+        yield session
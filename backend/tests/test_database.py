@@ -0,0 +1,286 @@
+"""
+資料庫連線測試
+連線池的取得連線等待時間統計、讀寫 / 唯讀 Session 依賴與讀取副本的分配
+"""
+import os
+from typing import Optional
+from uuid import uuid4
+
+import pytest
+from jose import jwt
+from sqlalchemy import exc, select, text, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.requests import Request
+
+from app.core import database
+from app.core.config import settings
+from app.core.database import (
+    InstrumentedQueuePool,
+    PrimarySession,
+    ReplicaSet,
+    get_db,
+    get_primary_read_db,
+    get_read_db,
+    mark_recent_write,
+    pool_metrics,
+    read_only_sessionmaker,
+)
+from app.models.video import Video, VideoStatus
+
+
+def request(token: Optional[str] = None) -> Request:
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return Request({"type": "http", "method": "POST", "headers": headers})
+
+
+def token(subject: str, **claims) -> str:
+    return jwt.encode({"sub": subject, **claims}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def new_video() -> Video:
+    return Video(chapter_id=uuid4(), title="lecture", order_index=0, status=VideoStatus.PROCESSING)
+
+
+@pytest.fixture
+async def engine(tmp_path, monkeypatch):
+    """只有一條連線、不允許 overflow 的 SQLite 引擎，取代主資料庫引擎"""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'app.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    monkeypatch.setattr(database, "engine", engine)
+    yield engine
+    await engine.dispose()
+
+
+async def test_pool_metrics_count_checkouts(engine):
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+        metrics = pool_metrics()
+        assert (metrics["checked_out"], metrics["checked_in"]) == (1, 0)
+
+    metrics = pool_metrics()
+    assert (metrics["checked_out"], metrics["checked_in"]) == (0, 1)
+    assert metrics["checkouts"] == 1 and metrics["checkout_timeouts"] == 0
+    assert metrics["checkout_wait_ms"]["le_inf"] == 1
+    assert metrics["checkout_wait_ms_sum"] >= 0
+
+
+async def test_pool_metrics_count_checkout_timeouts(engine):
+    async with engine.connect():
+        # 唯一的連線被佔用，等待 pool_timeout 後逾時
+        with pytest.raises(exc.TimeoutError):
+            async with engine.connect():
+                pass
+
+    metrics = pool_metrics()
+    assert (metrics["checkouts"], metrics["checkout_timeouts"]) == (2, 1)
+    # 逾時的等待也計入分佈
+    wait = metrics["checkout_wait_ms"]
+    assert metrics["checkout_wait_ms_sum"] >= 50
+    assert wait["le_inf"] - wait["le_25"] >= 1
+
+
+@pytest.fixture
+def sessions(sqlite_engine, monkeypatch):
+    """主資料庫的讀寫與唯讀 Session 改用 SQLite"""
+    monkeypatch.setattr(
+        database, "AsyncSessionLocal",
+        async_sessionmaker(sqlite_engine, sync_session_class=PrimarySession, expire_on_commit=False),
+    )
+    monkeypatch.setattr(database, "ReadOnlySessionLocal", read_only_sessionmaker(sqlite_engine))
+
+
+@pytest.fixture
+def recent_writes(sessions, monkeypatch):
+    """記錄 get_db 標記最近寫入的請求"""
+    marked = []
+
+    async def mark(request):
+        marked.append(request)
+
+    monkeypatch.setattr(database, "mark_recent_write", mark)
+    return marked
+
+
+async def test_primary_read_session_rejects_writes(sessions):
+    dependency = get_primary_read_db()
+    session = await anext(dependency)
+
+    # 以 AUTOCOMMIT 執行，UPDATE 陳述式會立即生效，執行前就拒絕
+    with pytest.raises(exc.InvalidRequestError):
+        await session.execute(update(Video).values(title="renamed"))
+    with pytest.raises(exc.InvalidRequestError):
+        await session.execute(text("UPDATE videos SET title = 'renamed'"))
+    with pytest.raises(exc.InvalidRequestError):
+        await session.execute(text("  delete FROM videos"))
+    session.add(new_video())
+    with pytest.raises(exc.InvalidRequestError):
+        await session.flush()
+
+    session.expunge_all()
+    assert await session.scalar(text("SELECT count(*) FROM videos")) == 0
+    with pytest.raises(StopAsyncIteration):
+        await anext(dependency)
+
+
+async def test_primary_read_session_rejects_pending_changes_on_close(sessions):
+    dependency = get_primary_read_db()
+    session = await anext(dependency)
+    await session.execute(select(Video))
+    session.add(new_video())
+
+    # 未 flush 的變更會在關閉時被丟棄，改為拋出例外
+    with pytest.raises(exc.InvalidRequestError, match="pending changes"):
+        await anext(dependency)
+
+
+async def test_get_db_marks_recent_write_only_after_writing(sqlite_engine, recent_writes):
+    reader = request()
+    dependency = get_db(reader)
+    session = await anext(dependency)
+    await session.execute(select(Video))
+    with pytest.raises(StopAsyncIteration):
+        await anext(dependency)
+    assert recent_writes == []
+
+    writer = request()
+    dependency = get_db(writer)
+    (await anext(dependency)).add(new_video())
+    with pytest.raises(StopAsyncIteration):
+        await anext(dependency)
+
+    assert recent_writes == [writer]
+    async with sqlite_engine.connect() as connection:
+        assert await connection.scalar(select(Video.title)) == "lecture"
+
+
+async def test_get_db_marks_a_committed_write_when_the_route_fails(recent_writes):
+    writer = request()
+    dependency = get_db(writer)
+    session = await anext(dependency)
+    session.add(new_video())
+    await session.commit()
+
+    # 路由自行 commit 後才拋出例外，寫入已生效
+    with pytest.raises(RuntimeError):
+        await dependency.athrow(RuntimeError("route failed"))
+
+    assert recent_writes == [writer]
+
+
+@pytest.fixture
+async def replica_set(tmp_path, monkeypatch):
+    """
+    兩個 SQLite 副本，延遲由 replica_set.probe 提供（數值或例外）
+
+    主資料庫的唯讀 Session 指向 primary.db；副本與主資料庫都不會實際查詢延遲。
+    """
+    primary = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    replica_set = ReplicaSet(
+        [f"sqlite+aiosqlite:///{tmp_path / f'replica{index}.db'}" for index in range(2)],
+        max_lag=5.0,
+        check_interval=1.0,
+    )
+    replica_set.probe = [0.0, 0.0]
+
+    async def query_lag(index):
+        lag = replica_set.probe[index]
+        if isinstance(lag, Exception):
+            raise lag
+        return lag
+
+    monkeypatch.setattr(replica_set, "_query_lag", query_lag)
+    monkeypatch.setattr(database, "replicas", replica_set)
+    monkeypatch.setattr(database, "ReadOnlySessionLocal", read_only_sessionmaker(primary))
+    yield replica_set
+    await replica_set.stop()
+    await primary.dispose()
+
+
+async def read_target(request: Request) -> str:
+    """get_read_db 分配的資料庫檔名（不含副檔名）"""
+    dependency = get_read_db(request)
+    session = await anext(dependency)
+    with pytest.raises(StopAsyncIteration):
+        await anext(dependency)
+    return os.path.splitext(os.path.basename(session.bind.url.database))[0]
+
+
+async def test_replicas_are_chosen_round_robin(replica_set):
+    await replica_set.check()
+
+    chosen = [replica_set.choose() for _ in range(4)]
+
+    assert chosen == replica_set.sessionmakers * 2
+
+
+async def test_lagging_replicas_are_skipped_until_they_catch_up(replica_set):
+    replica_set.probe = [0.5, 5.5]
+    await replica_set.check()
+
+    assert replica_set.available() == [0]
+    assert {replica_set.choose() for _ in range(3)} == {replica_set.sessionmakers[0]}
+
+    replica_set.probe = [0.5, 5.0]  # 延遲等於上限仍可分配
+    await replica_set.check()
+    assert replica_set.available() == [0, 1]
+
+
+async def test_unreachable_replicas_are_not_chosen(replica_set):
+    replica_set.probe = [ConnectionRefusedError("replica0"), 0.0]
+    await replica_set.check()
+
+    assert replica_set.lags == [None, 0.0]
+    assert replica_set.available() == [1]
+
+
+async def test_reads_fall_back_to_the_primary_without_healthy_replicas(replica_set, fake_redis):
+    replica_set.probe = [ConnectionRefusedError("replica0"), 60.0]
+    await replica_set.check()
+
+    assert replica_set.choose() is None
+    assert await read_target(request()) == "primary"
+
+    replica_set.probe = [0.0, 60.0]
+    await replica_set.check()
+    assert await read_target(request()) == "replica0"
+
+
+async def test_recent_writes_stick_to_the_primary_by_subject(replica_set, fake_redis):
+    await replica_set.check()
+
+    await mark_recent_write(request(token("user-1", device="laptop")))
+
+    # 同一用戶換發 token 或換裝置仍讀主資料庫，其他用戶與未登入的請求讀副本
+    assert await read_target(request(token("user-1", device="phone"))) == "primary"
+    assert await read_target(request(token("user-2"))) == "replica0"
+    assert await read_target(request()) == "replica1"
+    assert await fake_redis.ttl("db:recent-write:user-1") == settings.DATABASE_READ_YOUR_WRITES_WINDOW
+
+
+async def test_invalid_tokens_are_not_tracked(replica_set, fake_redis):
+    await replica_set.check()
+
+    await mark_recent_write(request("not-a-jwt"))
+
+    assert await fake_redis.keys() == []
+    assert await read_target(request("not-a-jwt")) == "replica0"
+
+
+async def test_reads_use_the_primary_when_redis_is_down(replica_set, monkeypatch):
+    await replica_set.check()
+
+    def get_redis():
+        raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(database, "get_redis", get_redis)
+
+    # 記錄失敗只記錄警告；無法確認是否剛寫入時視為剛寫入
+    await mark_recent_write(request(token("user-1")))
+    assert await read_target(request(token("user-1"))) == "primary"
+    # 未登入的請求不需查詢 Redis
+    assert await read_target(request()) == "replica0"
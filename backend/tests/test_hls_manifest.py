@@ -0,0 +1,273 @@
+"""
+HLS 播放清單改寫測試
+解析、以 StreamSigner 簽章改寫 URI 與解析結果的 LRU 快取
+"""
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from app.core.config import settings
+from app.core.exceptions import NotFoundError
+from app.core.stream_signing import StreamSigner
+from app.services import hls_manifest
+from app.services.hls_manifest import (
+    PlaylistCache,
+    load_playlist,
+    parse_playlist,
+    parse_storyboard,
+    playlist_expiry,
+    render_playlist,
+    split_preview_key,
+    split_storage_key,
+    storage_key_for,
+    variant_names,
+)
+
+OUTPUT_ID = "3f0c9a"
+EXPIRES = 1_900_000_000
+
+MASTER = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-INDEPENDENT-SEGMENTS
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio",NAME="audio",DEFAULT=YES,AUTOSELECT=YES,URI="audio/playlist.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=1040000,RESOLUTION=640x360,CODECS="avc1.64001e,mp4a.40.2",AUDIO="audio"
+360p/playlist.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2940000,RESOLUTION=1280x720,CODECS="avc1.64001f,mp4a.40.2",AUDIO="audio"
+720p/playlist.m3u8
+"""
+
+FMP4_PLAYLIST = """#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:4
+#EXT-X-PLAYLIST-TYPE:VOD
+#EXT-X-MAP:URI="stream.mp4",BYTERANGE="800@0"
+#EXTINF:4.000,
+#EXT-X-BYTERANGE:40000@800
+stream.mp4
+#EXTINF:2.500,
+#EXT-X-BYTERANGE:20000@40800
+stream.mp4
+#EXT-X-ENDLIST
+"""
+
+STORYBOARD = """WEBVTT
+
+00:00:00.000 --> 00:00:10.000
+sprite_000.jpg#xywh=0,0,160,90
+
+00:00:10.000 --> 00:01:05.500
+sprite_000.jpg#xywh=160,0,160,90
+"""
+
+
+@pytest.fixture
+def signer() -> StreamSigner:
+    return StreamSigner("test-signing-key")
+
+
+def signed_uris(text: str) -> list[str]:
+    """改寫後內容中的所有串流 URL（獨立行與 URI 屬性）"""
+    urls = []
+    for line in text.splitlines():
+        if line.startswith(settings.API_V1_PREFIX):
+            urls.append(line)
+        elif 'URI="' in line:
+            urls.append(line.split('URI="', 1)[1].split('"', 1)[0])
+    return urls
+
+
+def assert_signed(signer: StreamSigner, url: str, path: str) -> None:
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    assert parts.path == f"{settings.API_V1_PREFIX}/stream/{OUTPUT_ID}/{path}"
+    assert query["exp"] == [str(EXPIRES)]
+    assert signer.verify(f"{OUTPUT_ID}/{path}", EXPIRES, query["sig"][0], now=EXPIRES - 1)
+
+
+def test_parse_master_playlist():
+    playlist = parse_playlist(MASTER, "master.m3u8")
+
+    assert playlist.is_master
+    assert playlist.mutable
+    assert playlist.uris == ["audio/playlist.m3u8", "360p/playlist.m3u8", "720p/playlist.m3u8"]
+    assert variant_names(playlist) == ["360p", "720p"]
+
+
+def test_parse_media_playlist_resolves_relative_uris():
+    text = "#EXTM3U\n#EXTINF:6.0,\nsegment_000.ts\n#EXTINF:4.5,\n../360p/segment_001.ts\n#EXT-X-ENDLIST\n"
+
+    playlist = parse_playlist(text, "720p/playlist.m3u8")
+
+    assert playlist.uris == ["720p/segment_000.ts", "360p/segment_001.ts"]
+    assert playlist.duration == 10.5
+    assert not playlist.is_master
+    assert not playlist.mutable
+
+
+def test_event_playlist_without_endlist_is_mutable():
+    text = "#EXTM3U\n#EXT-X-PLAYLIST-TYPE:EVENT\n#EXTINF:6.0,\nsegment_000.ts\n"
+
+    playlist = parse_playlist(text, "360p/playlist.m3u8")
+
+    assert not playlist.ended
+    assert playlist.mutable
+
+
+def test_pieces_and_uris_reassemble_the_original():
+    playlist = parse_playlist(FMP4_PLAYLIST, "360p/playlist.m3u8")
+    original = [playlist.pieces[0]]
+    for uri, piece in zip(playlist.uris, playlist.pieces[1:], strict=True):
+        original += [uri.removeprefix("360p/"), piece]
+
+    assert "".join(original) == FMP4_PLAYLIST
+
+
+def test_render_master_signs_media_and_variant_uris(signer):
+    playlist = parse_playlist(MASTER, "master.m3u8")
+
+    rendered = render_playlist(playlist, OUTPUT_ID, signer, EXPIRES)
+
+    urls = signed_uris(rendered)
+    assert len(urls) == 3
+    for url, path in zip(urls, playlist.uris, strict=True):
+        assert_signed(signer, url, path)
+    # 屬性內的 URI 改寫後其他屬性保持原樣
+    media = next(line for line in rendered.splitlines() if line.startswith("#EXT-X-MEDIA"))
+    assert media.startswith('#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio",NAME="audio",')
+    assert f'AUTOSELECT=YES,URI="{settings.API_V1_PREFIX}/stream/' in media
+
+
+def test_render_byterange_fmp4_signs_the_single_file_once(signer):
+    playlist = parse_playlist(FMP4_PLAYLIST, "360p/playlist.m3u8")
+
+    rendered = render_playlist(playlist, OUTPUT_ID, signer, EXPIRES)
+
+    urls = signed_uris(rendered)
+    assert len(urls) == 3  # EXT-X-MAP 與兩個片段
+    assert len(set(urls)) == 1
+    assert_signed(signer, urls[0], "360p/stream.mp4")
+    lines = rendered.splitlines()
+    assert lines[4].endswith('",BYTERANGE="800@0"')
+    assert lines[6] == "#EXT-X-BYTERANGE:40000@800"
+    assert lines[-1] == "#EXT-X-ENDLIST"
+
+
+def test_parse_and_render_storyboard(signer):
+    storyboard = parse_storyboard(STORYBOARD, "previews/storyboard.vtt")
+
+    rendered = render_playlist(storyboard, OUTPUT_ID, signer, EXPIRES)
+
+    assert storyboard.uris == ["previews/sprite_000.jpg", "previews/sprite_000.jpg"]
+    assert storyboard.duration == 65.5
+    cues = [line for line in rendered.splitlines() if line.startswith(settings.API_V1_PREFIX)]
+    assert [cue.rsplit("#", 1)[1] for cue in cues] == ["xywh=0,0,160,90", "xywh=160,0,160,90"]
+    assert_signed(signer, cues[0].rsplit("#", 1)[0], "previews/sprite_000.jpg")
+
+
+def test_playlist_expiry_covers_media_duration():
+    master = parse_playlist(MASTER, "master.m3u8")
+    media = parse_playlist(FMP4_PLAYLIST, "360p/playlist.m3u8")
+
+    assert playlist_expiry(master, now=1000.5) == 1000 + settings.STREAM_TOKEN_TTL
+    assert playlist_expiry(media, now=1000.5) == 1000 + settings.STREAM_TOKEN_TTL + 7
+
+
+def test_storage_keys():
+    assert storage_key_for(OUTPUT_ID, "360p/playlist.m3u8") == f"transcoded/{OUTPUT_ID}/360p/playlist.m3u8"
+    assert storage_key_for(OUTPUT_ID, "previews/sprite_000.jpg") == f"thumbnails/{OUTPUT_ID}/sprite_000.jpg"
+    assert split_storage_key(f"transcoded/{OUTPUT_ID}/master.m3u8") == (OUTPUT_ID, "master.m3u8")
+    assert split_preview_key(f"thumbnails/{OUTPUT_ID}/storyboard.vtt") == (
+        OUTPUT_ID, "previews/storyboard.vtt"
+    )
+    with pytest.raises(NotFoundError):
+        split_storage_key(f"uploads/{OUTPUT_ID}/source.mp4")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(hls_manifest.time, "monotonic", clock)
+    return clock
+
+
+def test_cache_evicts_least_recently_used(clock):
+    cache = PlaylistCache(max_entries=2)
+    a, b, c = (parse_playlist(f"#EXTM3U\n{name}.ts\n", "x.m3u8") for name in "abc")
+    cache.put("a", a)
+    cache.put("b", b)
+
+    assert cache.get("a") is a  # a 成為最近使用
+    cache.put("c", c)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is a
+    assert cache.get("c") is c
+
+
+def test_cache_expires_mutable_entries(clock):
+    cache = PlaylistCache(max_entries=2)
+    master = parse_playlist(MASTER, "master.m3u8")
+    cache.put("master", master, ttl=5.0)
+
+    clock.now += 5.0
+    assert cache.get("master") is master
+    clock.now += 0.1
+    assert cache.get("master") is None
+
+
+class FakeStorage:
+    def __init__(self, objects: dict[str, bytes]):
+        self.objects = objects
+        self.reads: list[str] = []
+
+    async def get_object(self, key: str):
+        self.reads.append(key)
+        return self.objects.get(key)
+
+
+@pytest.fixture
+def playlist_cache(monkeypatch) -> PlaylistCache:
+    cache = PlaylistCache(max_entries=8)
+    monkeypatch.setattr(hls_manifest, "playlist_cache", cache)
+    return cache
+
+
+async def test_load_playlist_reads_storage_once(playlist_cache, clock):
+    key = f"transcoded/{OUTPUT_ID}/360p/playlist.m3u8"
+    storage = FakeStorage({key: FMP4_PLAYLIST.encode()})
+
+    first = await load_playlist(storage, OUTPUT_ID, "360p/playlist.m3u8")
+    clock.now += 86400
+    second = await load_playlist(storage, OUTPUT_ID, "360p/playlist.m3u8")
+
+    assert second is first
+    assert storage.reads == [key]
+
+
+async def test_load_master_is_refreshed_after_ttl(playlist_cache, clock):
+    key = f"transcoded/{OUTPUT_ID}/master.m3u8"
+    storage = FakeStorage({key: MASTER.encode()})
+
+    await load_playlist(storage, OUTPUT_ID, "master.m3u8")
+    clock.now += settings.STREAM_MASTER_CACHE_TTL + 1
+    await load_playlist(storage, OUTPUT_ID, "master.m3u8")
+
+    assert storage.reads == [key, key]
+
+
+async def test_load_storyboard_and_missing_playlist(playlist_cache, clock):
+    storage = FakeStorage({f"thumbnails/{OUTPUT_ID}/storyboard.vtt": STORYBOARD.encode()})
+
+    storyboard = await load_playlist(storage, OUTPUT_ID, "previews/storyboard.vtt")
+
+    assert storyboard.duration == 65.5
+    with pytest.raises(NotFoundError):
+        await load_playlist(storage, OUTPUT_ID, "1080p/playlist.m3u8")
@@ -0,0 +1,173 @@
+"""
+HLS 片段傳送測試
+Range / If-Range 解析與 SegmentFileResponse 的傳送方式
+"""
+from email.utils import formatdate
+
+import pytest
+
+from app.core.config import settings
+from app.services import hls_segments
+from app.services.hls_segments import (
+    SegmentFileResponse,
+    if_range_matches,
+    parse_range,
+    resolve_range,
+    serve_segment,
+)
+from app.services.segment_cache import SegmentDiskCache, SegmentInfo
+
+MTIME = 1_767_323_045.0
+INFO = SegmentInfo(1000, MTIME)
+
+
+@pytest.mark.parametrize(("header", "expected"), [
+    ("bytes=0-499", (0, 499)),
+    ("bytes=500-", (500, None)),
+    ("bytes=-200", (None, 200)),
+    (" bytes=10-10 ", (10, 10)),
+    ("bytes=-", None),
+    ("bytes=500-100", None),  # end < start
+    ("bytes=0-1,5-9", None),  # 多重範圍回傳整個檔案
+    ("items=0-1", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header) == expected
+
+
+@pytest.mark.parametrize(("byte_range", "size", "expected"), [
+    ((0, 499), 1000, (0, 499)),
+    ((500, None), 1000, (500, 999)),
+    ((900, 5000), 1000, (900, 999)),  # end 超過檔案大小時截斷
+    ((None, 200), 1000, (800, 999)),
+    ((None, 5000), 1000, (0, 999)),  # suffix 大於檔案時回傳整個檔案
+    ((None, 0), 1000, None),
+    ((1000, None), 1000, None),  # start >= size → 416
+    ((1500, 1600), 1000, None),
+    ((0, None), 0, None),  # 空物件沒有可滿足的範圍
+    ((None, 10), 0, None),
+])
+def test_resolve_range(byte_range, size, expected):
+    assert resolve_range(byte_range, size) == expected
+
+
+def test_if_range_with_etag():
+    assert if_range_matches(None, INFO)
+    assert if_range_matches(INFO.etag, INFO)
+    assert not if_range_matches('"3e8-0"', INFO)
+    # 弱 ETag 不能用於 If-Range
+    assert not if_range_matches(f"W/{INFO.etag}", INFO)
+
+
+def test_if_range_with_http_date():
+    assert if_range_matches(formatdate(MTIME, usegmt=True), INFO)
+    assert if_range_matches(formatdate(MTIME + 0.9, usegmt=True), INFO)  # 秒以下忽略
+    assert not if_range_matches(formatdate(MTIME + 1, usegmt=True), INFO)
+    assert not if_range_matches("yesterday", INFO)
+
+
+class Recorder:
+    """收集 ASGI send 的訊息"""
+
+    def __init__(self):
+        self.messages: list[dict] = []
+
+    async def __call__(self, message: dict) -> None:
+        self.messages.append(message)
+
+    @property
+    def body(self) -> bytes:
+        return b"".join(m.get("body", b"") for m in self.messages if m["type"] == "http.response.body")
+
+
+async def receive() -> dict:
+    return {"type": "http.request"}
+
+
+@pytest.fixture
+def segment(tmp_path):
+    path = tmp_path / "segment_000.ts"
+    path.write_bytes(bytes(range(256)) * 4)
+    return path
+
+
+async def test_file_response_reads_range_with_pread(segment, monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_CHUNK_SIZE", 100)
+    send = Recorder()
+
+    with open(segment, "rb") as file:
+        response = SegmentFileResponse(file, 10, 259, 206, {"Content-Range": "bytes 10-259/1024"})
+        await response({"type": "http", "extensions": {}}, receive, send)
+        assert file.closed  # 回應送完即關閉檔案
+
+    start = send.messages[0]
+    assert start["status"] == 206
+    assert (b"content-length", b"250") in start["headers"]
+    assert send.body == segment.read_bytes()[10:260]
+    # 250 bytes 以 100 bytes 分塊，最後一則訊息結束回應
+    assert [len(m["body"]) for m in send.messages[1:]] == [100, 100, 50, 0]
+    assert not send.messages[-1].get("more_body", False)
+
+
+async def test_file_response_uses_zerocopysend_when_available(segment):
+    send = Recorder()
+
+    with open(segment, "rb") as file:
+        response = SegmentFileResponse(file, 0, 1023, 200, {})
+        await response({"type": "http", "extensions": {"http.response.zerocopysend": {}}}, receive, send)
+        assert file.closed
+
+    assert send.messages[1] == {
+        "type": "http.response.zerocopysend", "file": file, "offset": 0, "count": 1024,
+    }
+
+
+async def test_file_response_of_empty_file(tmp_path):
+    path = tmp_path / "empty.ts"
+    path.write_bytes(b"")
+    send = Recorder()
+
+    with open(path, "rb") as file:
+        await SegmentFileResponse(file, 0, -1, 200, {})({"type": "http"}, receive, send)
+
+    assert (b"content-length", b"0") in send.messages[0]["headers"]
+    assert send.body == b""
+
+
+@pytest.fixture
+def cached_segment(tmp_path, monkeypatch):
+    """已在本機快取中的片段"""
+    cache = SegmentDiskCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    monkeypatch.setattr(hls_segments, "segment_cache", cache)
+    key = "transcoded/v1/360p/segment_000.ts"
+    path = tmp_path / "cache" / key
+    path.parent.mkdir(parents=True)
+    path.write_bytes(bytes(range(256)) * 4)
+    cache.load()
+    return key
+
+
+async def test_cached_segment_range(cached_segment):
+    response = await serve_segment(None, cached_segment, "bytes=-24", None, 60)
+
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 1000-1023/1024"
+    assert response.headers["content-type"] == "video/mp2t"
+    response.file.close()
+
+
+async def test_cached_segment_if_range_mismatch_returns_whole_file(cached_segment):
+    response = await serve_segment(None, cached_segment, "bytes=0-9", '"stale"', 60)
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == "1024"
+    response.file.close()
+
+
+async def test_cached_segment_unsatisfiable_range(cached_segment):
+    response = await serve_segment(None, cached_segment, "bytes=1024-", None, 60)
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
@@ -0,0 +1,130 @@
+"""
+預簽名 URL 測試
+本機 SigV4 簽章與 botocore 一致，以及分段上傳 URL 的分頁
+"""
+import datetime
+import types
+from urllib.parse import parse_qsl, urlsplit
+
+import boto3
+import botocore.auth
+import pytest
+from botocore.config import Config
+
+from app.core.config import settings
+from app.core.presign import SigV4Presigner
+from app.core.storage import ObjectStorage
+from app.services.video_uploads import MAX_PARTS, MB, part_url_page, plan_parts
+
+ENDPOINT = "minio.example.com:9000"
+KEY = "uploads/3f0c/lecture (1) 第一講.mp4"
+UPLOAD_ID = "2~abc/def+ghi="
+SIGNED_AT = datetime.datetime(2026, 1, 2, 3, 4, 5)
+
+
+class FrozenDatetime(datetime.datetime):
+    @classmethod
+    def utcnow(cls):
+        return SIGNED_AT
+
+
+@pytest.fixture
+def botocore_client(monkeypatch):
+    """簽章時間固定的 botocore S3 客戶端（path-style，與 MinIO 相同）"""
+    monkeypatch.setattr(botocore.auth, "datetime", types.SimpleNamespace(datetime=FrozenDatetime))
+    return boto3.client(
+        "s3",
+        endpoint_url=f"http://{ENDPOINT}",
+        aws_access_key_id="AKIDEXAMPLE",
+        aws_secret_access_key="wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY",
+        region_name="us-east-1",
+        config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+    )
+
+
+@pytest.fixture
+def presigner() -> SigV4Presigner:
+    signed_at = SIGNED_AT.replace(tzinfo=datetime.UTC).timestamp()
+    return SigV4Presigner(
+        ENDPOINT, "AKIDEXAMPLE", "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY",
+        clock=lambda: signed_at,
+    )
+
+
+def split_url(url: str) -> tuple[str, list[tuple[str, str]]]:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}", sorted(parse_qsl(parts.query))
+
+
+def test_part_urls_match_botocore(botocore_client, presigner):
+    urls = presigner.presign_parts("videos", KEY, UPLOAD_ID, [1, 7, 10000], 3600)
+
+    for part_number, url in zip([1, 7, 10000], urls, strict=True):
+        expected = botocore_client.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": "videos", "Key": KEY, "UploadId": UPLOAD_ID, "PartNumber": part_number},
+            ExpiresIn=3600,
+        )
+        # botocore 依參數宣告順序排列查詢字串，簽章（含 X-Amz-Signature）須完全相同
+        assert split_url(url) == split_url(expected)
+
+
+def test_single_url_matches_botocore(botocore_client, presigner):
+    expected = botocore_client.generate_presigned_url(
+        "get_object", Params={"Bucket": "videos", "Key": KEY}, ExpiresIn=600
+    )
+
+    assert presigner.presign("GET", "videos", KEY, 600) == expected
+
+
+def test_signing_key_is_cached_per_day(presigner):
+    first = presigner.signing_key("20260102")
+
+    assert presigner.signing_key("20260102") is first
+    assert presigner.signing_key("20260103") != first
+
+
+@pytest.fixture
+async def storage(storage_settings):
+    """預簽名只在本機計算，不需要建立 bucket"""
+    storage = ObjectStorage(storage_settings)
+    yield storage
+    await storage.close()
+
+
+def page_numbers(parts: list[dict]) -> list[int]:
+    return [part["part_number"] for part in parts]
+
+
+def test_part_url_pages_cover_every_part_once(storage):
+    pages, start = [], 1
+    while start is not None:
+        parts, start = part_url_page(storage, KEY, UPLOAD_ID, start, part_count=25, limit=10)
+        pages.append(page_numbers(parts))
+
+    assert pages == [list(range(1, 11)), list(range(11, 21)), list(range(21, 26))]
+
+
+def test_last_full_page_has_no_next_part(storage):
+    parts, next_part_number = part_url_page(storage, KEY, UPLOAD_ID, 11, part_count=20, limit=10)
+
+    assert page_numbers(parts) == list(range(11, 21))
+    assert next_part_number is None
+
+
+def test_part_url_page_carries_expiry(storage):
+    (part,), next_part_number = part_url_page(storage, KEY, UPLOAD_ID, 1, part_count=1)
+
+    assert next_part_number is None
+    assert part["expires_in"] == settings.UPLOAD_URL_EXPIRE_SECONDS
+    assert dict(parse_qsl(urlsplit(part["upload_url"]).query))["partNumber"] == "1"
+
+
+def test_plan_parts_grows_part_size_past_the_part_limit():
+    assert plan_parts(0, 8 * MB) == (8 * MB, 1)
+    assert plan_parts(20 * MB + 1, 8 * MB) == (8 * MB, 3)
+
+    part_size, part_count = plan_parts(100_000 * MB, 8 * MB)
+
+    assert part_size == 10 * MB
+    assert part_count == MAX_PARTS
@@ -0,0 +1,212 @@
+"""
+片段磁碟快取測試
+頻率估計、位元組預算下的准入與淘汰、啟動時載入與未命中的合併
+"""
+import asyncio
+import os
+from datetime import UTC, datetime
+
+import pytest
+
+from app.core.config import settings
+from app.services import hls_segments
+from app.services.segment_cache import TEMP_PREFIX, FrequencySketch, SegmentDiskCache
+
+LAST_MODIFIED = datetime(2026, 1, 2, 3, 4, 5, tzinfo=UTC)
+
+
+def write(root, key: str, size: int, atime: float = 0.0) -> str:
+    path = os.path.join(root, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\x00" * size)
+    os.utime(path, (atime, atime))
+    return path
+
+
+def test_sketch_counts_and_saturates():
+    sketch = FrequencySketch(64)
+    for _ in range(3):
+        sketch.increment("a")
+
+    assert sketch.frequency("a") == 3
+    assert sketch.frequency("never-seen") == 0
+    for _ in range(20):
+        sketch.increment("a")
+    assert sketch.frequency("a") == FrequencySketch.MAX_COUNT
+
+
+def test_sketch_halves_counts_after_sample_period():
+    sketch = FrequencySketch(2)  # 寬度 2，每 20 次存取減半
+    for _ in range(8):
+        sketch.increment("hot")
+    for _ in range(11):
+        sketch.increment("other")
+    before = sketch.frequency("hot")
+
+    sketch.increment("other")  # 第 20 次
+
+    assert sketch.frequency("hot") == before // 2
+
+
+@pytest.fixture
+def cache(tmp_path) -> SegmentDiskCache:
+    return SegmentDiskCache(str(tmp_path / "cache"), max_bytes=1000)
+
+
+def test_load_indexes_existing_files_by_access_time(cache):
+    write(cache.root, "v1/b.ts", 300, atime=200.0)
+    write(cache.root, "v1/a.ts", 300, atime=100.0)
+    write(cache.root, "v1/c.ts", 300, atime=300.0)
+    temp = write(cache.root, f"v1/{TEMP_PREFIX}abc", 50)
+
+    cache.load()
+
+    assert list(cache._entries) == ["v1/a.ts", "v1/b.ts", "v1/c.ts"]
+    assert cache.metrics()["bytes"] == 900
+    assert not os.path.exists(temp)
+
+
+def test_load_evicts_past_the_budget(cache):
+    for index in range(4):
+        write(cache.root, f"v1/{index}.ts", 300, atime=float(index))
+
+    cache.load()
+
+    assert list(cache._entries) == ["v1/1.ts", "v1/2.ts", "v1/3.ts"]
+    assert not os.path.exists(cache.path("v1/0.ts"))
+    assert cache.stats.evictions == 1
+
+
+def test_admit_while_there_is_room(cache):
+    write(cache.root, "v1/a.ts", 600)
+    cache.load()
+
+    assert cache._admit("v1/new.ts", 400)
+    assert not cache._admit("v1/huge.ts", 1001)
+
+
+def test_admit_requires_higher_frequency_than_every_victim(cache):
+    write(cache.root, "v1/a.ts", 400, atime=1.0)
+    write(cache.root, "v1/b.ts", 400, atime=2.0)
+    cache.load()
+    for _ in range(2):
+        cache.get("v1/a.ts")[0].close()
+    cache.get("v1/b.ts")[0].close()  # LRU 順序：a、b；頻率 a=2、b=1
+    cache.get("v1/new.ts")
+    cache.get("v1/new.ts")
+
+    # 放入 300 bytes 需淘汰 a（頻率 2），新物件頻率 2 不高於 a
+    assert not cache._admit("v1/new.ts", 300)
+    cache.get("v1/new.ts")
+    assert cache._admit("v1/new.ts", 300)
+    # 放入 800 bytes 需再淘汰 b，新物件頻率 3 高於 b 的 1
+    assert cache._admit("v1/new.ts", 800)
+    for _ in range(3):
+        cache.get("v1/b.ts")[0].close()
+    assert not cache._admit("v1/new.ts", 800)
+
+
+def test_evict_frees_least_recently_used(cache):
+    write(cache.root, "v1/a.ts", 400, atime=1.0)
+    write(cache.root, "v1/b.ts", 400, atime=2.0)
+    cache.load()
+    cache.get("v1/a.ts")[0].close()  # a 成為最近使用
+
+    cache._evict(300)
+
+    assert list(cache._entries) == ["v1/a.ts"]
+    assert not os.path.exists(cache.path("v1/b.ts"))
+    assert cache.metrics()["bytes"] == 400
+
+
+class SlowStorage:
+    """背景下載需等待 release 的假物件儲存，記錄各操作的參數"""
+
+    def __init__(self, data: bytes, error: Exception | None = None):
+        self.data = data
+        self.error = error
+        self.release = asyncio.Event()
+        self.downloads: list[tuple[str, float | None]] = []
+        self.opens: list[tuple[str, str | None]] = []
+
+    async def download_file(self, key: str, path: str, timeout=None) -> dict:
+        self.downloads.append((key, timeout))
+        if self.error is not None:
+            raise self.error
+        await self.release.wait()
+        with open(path, "wb") as f:
+            f.write(self.data)
+        return {"ContentLength": len(self.data), "LastModified": LAST_MODIFIED}
+
+    async def open_object(self, key: str, byte_range=None) -> dict:
+        self.opens.append((key, byte_range))
+        return {"ContentLength": len(self.data), "LastModified": LAST_MODIFIED, "Body": None}
+
+
+async def test_concurrent_misses_wait_for_a_single_fill(cache):
+    storage = SlowStorage(b"segment-bytes")
+    key = "transcoded/v1/360p/segment_000.ts"
+    assert cache.get(key) is None
+    cache.schedule_fill(storage, key, len(storage.data))
+
+    assert cache.get(key) is None
+    waiters = [asyncio.create_task(cache.wait_for_fill(key)) for _ in range(3)]
+    await asyncio.sleep(0)
+    storage.release.set()
+    opened = await asyncio.gather(*waiters)
+
+    assert storage.downloads == [(key, settings.STREAM_FILL_TIMEOUT)]
+    for file, info in opened:
+        assert file.read() == b"segment-bytes"
+        assert info.mtime == LAST_MODIFIED.timestamp()
+        file.close()
+    assert cache.stats.coalesced == 3
+    assert cache.stats.misses == 2
+    assert cache.metrics()["fills_in_progress"] == 0
+
+
+async def test_slow_fill_is_not_waited_on(cache, monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_COALESCE_WAIT", 0.01)
+    storage = SlowStorage(b"x" * 10)
+    cache.schedule_fill(storage, "v1/stream.mp4", 10)
+
+    assert await cache.wait_for_fill("v1/stream.mp4") is None
+    assert cache.stats.coalesced == 0
+    await cache.close()
+
+
+async def test_failed_fill_falls_back_to_storage(cache):
+    cache.schedule_fill(SlowStorage(b"", error=OSError("connection reset")), "v1/a.ts", 10)
+
+    assert await cache.wait_for_fill("v1/a.ts") is None
+    assert cache.stats.fill_errors == 1
+    assert os.listdir(os.path.join(cache.root, "v1")) == []  # 暫存檔已刪除
+
+
+async def test_serve_segment_coalesces_behind_the_first_miss(cache, monkeypatch):
+    monkeypatch.setattr(hls_segments, "segment_cache", cache)
+    storage = SlowStorage(b"0123456789")
+    key = "transcoded/v1/360p/segment_000.ts"
+
+    def iter_body(body, chunk_size):
+        async def chunks():
+            assert body is None
+            yield storage.data[:chunk_size]
+        return chunks()
+
+    storage.iter_body = iter_body
+
+    first = await hls_segments.serve_segment(storage, key, None, None, 60)
+    second = asyncio.create_task(hls_segments.serve_segment(storage, key, "bytes=2-5", None, 60))
+    await asyncio.sleep(0)
+    storage.release.set()
+    second = await second
+
+    assert first.status_code == 200
+    assert storage.opens == [(key, None)]  # 第二個請求未讀取物件儲存
+    assert len(storage.downloads) == 1
+    assert second.status_code == 206
+    assert second.headers["content-range"] == "bytes 2-5/10"
+    second.file.close()
+    assert cache.stats.coalesced == 1
@@ -0,0 +1,210 @@
+"""
+ObjectStorage 測試
+以 moto 的 S3 伺服器驗證執行緒池包裝、逾時轉換與建立／關閉
+"""
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from app.core import storage as storage_module
+from app.core.exceptions import ServiceUnavailableError
+from app.core.storage import ObjectStorage, close_storage, get_storage, init_storage
+
+from .conftest import TEST_BUCKET
+
+
+async def test_init_sizes_pool_to_thread_limit(storage_settings):
+    storage = ObjectStorage(storage_settings)
+    try:
+        assert storage.bucket == TEST_BUCKET
+        assert storage.timeout == 5.0
+        assert storage._executor._max_workers == 4
+        assert storage.client.meta.config.max_pool_connections == 4
+        assert storage.client.meta.endpoint_url == f"http://{storage_settings.MINIO_ENDPOINT}"
+    finally:
+        await storage.close()
+
+
+async def test_put_get_head_and_delete(storage):
+    await storage.put_object("playlists/master.m3u8", b"#EXTM3U\n", "application/vnd.apple.mpegurl")
+
+    assert await storage.get_object("playlists/master.m3u8") == b"#EXTM3U\n"
+    metadata = await storage.head_object("playlists/master.m3u8")
+    assert metadata["ContentLength"] == 8
+    assert metadata["ContentType"] == "application/vnd.apple.mpegurl"
+
+    await storage.delete_object("playlists/master.m3u8")
+    assert await storage.head_object("playlists/master.m3u8") is None
+    assert await storage.get_object("playlists/master.m3u8") is None
+    assert await storage.open_object("playlists/master.m3u8") is None
+    # 刪除不存在的物件不視為錯誤
+    await storage.delete_object("playlists/master.m3u8")
+
+
+async def test_ranges_and_streaming(storage, tmp_path):
+    data = bytes(range(256)) * 16
+    await storage.put_object("segments/0.ts", data, "video/mp2t")
+
+    assert await storage.get_range("segments/0.ts", 10, 19) == data[10:20]
+
+    response = await storage.open_object("segments/0.ts", "bytes=100-")
+    assert response["ContentRange"] == f"bytes 100-{len(data) - 1}/{len(data)}"
+    chunks = [chunk async for chunk in storage.iter_body(response["Body"], 1000)]
+    assert b"".join(chunks) == data[100:]
+    assert max(len(chunk) for chunk in chunks) <= 1000
+
+    path = tmp_path / "0.ts"
+    metadata = await storage.download_file("segments/0.ts", str(path))
+    assert path.read_bytes() == data
+    assert metadata["ContentLength"] == len(data)
+    assert metadata["LastModified"] is not None
+
+
+async def test_multipart_upload_with_presigned_parts(storage):
+    upload_id = await storage.create_multipart_upload("uploads/video.mp4", "video/mp4")
+    part = b"\x00" * (5 * 1024 * 1024)
+    urls = storage.presign_upload_parts("uploads/video.mp4", upload_id, range(1, 3), 300)
+    assert [url["part_number"] for url in urls] == [1, 2]
+
+    async with httpx.AsyncClient() as client:
+        for url, body in zip(urls, (part, b"tail"), strict=True):
+            response = await client.put(url["upload_url"], content=body)
+            response.raise_for_status()
+
+    parts = await storage.list_parts("uploads/video.mp4", upload_id)
+    assert [(item["PartNumber"], item["Size"]) for item in parts] == [(1, len(part)), (2, 4)]
+
+    await storage.complete_multipart_upload(
+        "uploads/video.mp4",
+        upload_id,
+        [{"PartNumber": item["PartNumber"], "ETag": item["ETag"]} for item in parts],
+    )
+    metadata = await storage.head_object("uploads/video.mp4")
+    assert metadata["ContentLength"] == len(part) + 4
+
+    async with httpx.AsyncClient() as client:
+        response = await client.get(storage.presign_get("uploads/video.mp4", 300))
+    assert response.status_code == 200
+    assert response.content.endswith(b"tail")
+
+
+async def test_abort_multipart_upload(storage):
+    upload_id = await storage.create_multipart_upload("uploads/aborted.mp4", "video/mp4")
+    await storage.abort_multipart_upload("uploads/aborted.mp4", upload_id)
+
+    response = await storage.run(storage.client.list_multipart_uploads, Bucket=TEST_BUCKET)
+    assert response.get("Uploads", []) == []
+
+
+async def test_operations_run_on_storage_threads_without_blocking_loop(storage):
+    threads = []
+    ticks = 0
+
+    def blocking() -> str:
+        threads.append(threading.current_thread().name)
+        time.sleep(0.2)
+        return "done"
+
+    async def tick() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    try:
+        results = await asyncio.gather(*(storage.run(blocking) for _ in range(4)))
+    finally:
+        ticker.cancel()
+
+    assert results == ["done"] * 4
+    assert all(name.startswith("object-storage") for name in threads)
+    # 4 個執行緒同時執行，事件迴圈在等待期間持續運作
+    assert ticks >= 10
+
+
+async def test_timeout_raises_service_unavailable(storage):
+    with pytest.raises(ServiceUnavailableError):
+        await storage.run(time.sleep, 1, timeout=0.05)
+
+
+async def test_download_timeout_stops_the_thread_before_raising(storage, tmp_path, monkeypatch):
+    written = []
+
+    class SlowBody:
+        def iter_chunks(self, chunk_size):
+            for _ in range(100):
+                time.sleep(0.01)
+                written.append(chunk_size)
+                yield b"\x00" * 16
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(storage.client, "get_object", lambda **params: {**params, "Body": SlowBody()})
+    path = tmp_path / "partial.ts"
+
+    with pytest.raises(ServiceUnavailableError):
+        await storage.download_file("segments/slow.ts", str(path), timeout=0.05)
+
+    # 拋出時下載執行緒已結束，刪除檔案後不會再被寫回
+    stopped_at = len(written)
+    path.unlink()
+    await asyncio.sleep(0.05)
+    assert len(written) == stopped_at < 100
+    assert not path.exists()
+
+
+async def test_connection_error_raises_service_unavailable(storage_settings):
+    settings = storage_settings.model_copy(
+        update={
+            "MINIO_ENDPOINT": "127.0.0.1:1",
+            "STORAGE_MAX_ATTEMPTS": 1,
+            "STORAGE_CONNECT_TIMEOUT": 0.5,
+        }
+    )
+    storage = ObjectStorage(settings)
+    try:
+        with pytest.raises(ServiceUnavailableError):
+            await storage.head_object("missing")
+    finally:
+        await storage.close()
+
+
+async def test_close_waits_for_running_operations(storage_settings):
+    storage = ObjectStorage(storage_settings)
+    finished = threading.Event()
+
+    def slow() -> None:
+        time.sleep(0.1)
+        finished.set()
+
+    task = asyncio.create_task(storage.run(slow))
+    await asyncio.sleep(0.01)
+    await storage.close()
+
+    assert finished.is_set()
+    await task
+    with pytest.raises(RuntimeError):
+        storage._executor.submit(print)
+
+
+async def test_lifespan_helpers(storage_settings, monkeypatch):
+    monkeypatch.setattr(storage_module, "_storage", None)
+    monkeypatch.setattr(storage_module, "ObjectStorage", lambda: ObjectStorage(storage_settings))
+
+    with pytest.raises(ServiceUnavailableError):
+        get_storage()
+
+    storage = await init_storage()
+    assert await init_storage() is storage
+    assert get_storage() is storage
+    assert storage.bucket == TEST_BUCKET
+
+    await close_storage()
+    with pytest.raises(ServiceUnavailableError):
+        get_storage()
+    await close_storage()
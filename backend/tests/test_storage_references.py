@@ -0,0 +1,93 @@
+"""
+物件儲存引用檢查測試
+storage-references Webhook 依序執行的 reconcile_assets、retained_sources 與 referenced_outputs
+"""
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from app.core.config import settings
+from app.models.video import Video, VideoAsset, VideoStatus
+from app.services.storage_references import (
+    reconcile_assets,
+    referenced_outputs,
+    retained_sources,
+)
+
+
+async def add_video(db, status: VideoStatus = VideoStatus.READY, **fields) -> Video:
+    video = Video(chapter_id=uuid4(), title="lecture", order_index=0, status=status, **fields)
+    db.add(video)
+    await db.flush()
+    return video
+
+
+async def add_asset(db, source_video_id, ref_count: int) -> VideoAsset:
+    asset = VideoAsset(
+        content_hash=uuid4().hex * 2,
+        source_video_id=source_video_id,
+        ref_count=ref_count,
+        status=VideoStatus.READY,
+    )
+    db.add(asset)
+    await db.flush()
+    return asset
+
+
+async def storage_references(db, sources=(), outputs=(), reconcile: bool = False) -> dict:
+    """與 storage_references_webhook 相同的呼叫順序"""
+    if reconcile:
+        await reconcile_assets(db, list(outputs))
+    return {
+        "sources": await retained_sources(db, list(sources)),
+        "outputs": await referenced_outputs(db, list(outputs)),
+    }
+
+
+async def test_sources_are_kept_while_needed(db):
+    expired = datetime.utcnow() - timedelta(seconds=settings.SOURCE_RETENTION_SECONDS + 60)
+    uploading = await add_video(db, VideoStatus.UPLOADING, updated_at=expired)
+    processing = await add_video(db, VideoStatus.PROCESSING, updated_at=expired)
+    recent = await add_video(db, VideoStatus.READY)
+    old = await add_video(db, VideoStatus.FAILED, updated_at=expired)
+    deleted = uuid4()
+
+    references = await storage_references(
+        db, sources=[uploading.id, processing.id, recent.id, old.id, deleted]
+    )
+
+    assert references["sources"] == {uploading.id, processing.id, recent.id}
+
+
+async def test_outputs_are_kept_while_a_video_points_at_them(db):
+    source = await add_video(db)
+    shared_from_deleted = uuid4()  # 負責轉碼的影片已刪除，仍有其他影片沿用產出
+    asset = await add_asset(db, shared_from_deleted, ref_count=1)
+    await add_video(db, asset_id=asset.id)
+    abandoned = uuid4()
+    await add_asset(db, abandoned, ref_count=2)  # ref_count 未隨串聯刪除更新
+
+    references = await storage_references(db, outputs=[source.id, shared_from_deleted, abandoned])
+
+    assert references["outputs"] == {source.id, shared_from_deleted}
+
+
+async def test_reconcile_drops_unreferenced_assets_and_fixes_counts(db):
+    shared = uuid4()
+    asset = await add_asset(db, shared, ref_count=5)
+    for _ in range(2):
+        await add_video(db, asset_id=asset.id)
+    abandoned = uuid4()
+    stale = await add_asset(db, abandoned, ref_count=1)
+    untouched = await add_asset(db, uuid4(), ref_count=7)  # 不在本批，不校正
+
+    references = await storage_references(db, outputs=[shared, abandoned], reconcile=True)
+
+    assert references["outputs"] == {shared}
+    assert asset.ref_count == 2
+    assert await db.get(VideoAsset, stale.id) is None
+    assert untouched.ref_count == 7
+
+
+async def test_empty_batches(db):
+    assert await storage_references(db, reconcile=True) == {"sources": set(), "outputs": set()}
+    assert await reconcile_assets(db, []) == 0
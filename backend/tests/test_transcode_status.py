@@ -0,0 +1,104 @@
+"""
+轉碼進度與排程佇列讀取測試
+"""
+import json
+
+import pytest
+
+from app.core.exceptions import ServiceUnavailableError
+from app.services.transcode_status import (
+    SCHEDULER_PENDING_KEY,
+    SCHEDULER_RUNNING_KEY,
+    SCHEDULER_WAITS_KEY,
+    overall_progress,
+    plan_key,
+    progress_key,
+    queue_metrics,
+    read_progress,
+)
+
+
+def step(name: str, fraction: float, eta=None, done: bool = False) -> dict:
+    return {"video_id": "v1", "step": name, "fraction": fraction, "out_time": 0.0,
+            "speed": None, "eta": eta, "done": done}
+
+
+def test_overall_progress_weights_by_planned_work():
+    plan = {"audio": 600.0, "chunk:0:360p": 300.0, "chunk:1:360p": 300.0,
+            "chunk:0:720p": 600.0, "chunk:1:720p": 600.0}
+    steps = [step("audio", 1.0, done=True), step("chunk:0:360p", 1.0, done=True),
+             step("chunk:1:360p", 0.5, eta=20.0)]
+
+    fraction, eta = overall_progress(steps, plan)
+
+    # (600 + 300 + 150) / 2400；第二階段尚未開始的分段以 0 計入
+    assert fraction == pytest.approx(1050 / 2400)
+    assert eta == 20.0
+
+
+def test_overall_progress_does_not_drop_when_next_stage_starts():
+    plan = {"chunk:0:360p": 300.0, "chunk:0:720p": 600.0}
+    first_stage = [step("chunk:0:360p", 1.0, done=True)]
+    next_stage = first_stage + [step("chunk:0:720p", 0.0)]
+
+    before, _ = overall_progress(first_stage, plan)
+    after, _ = overall_progress(next_stage, plan)
+
+    assert before == after == pytest.approx(1 / 3)
+
+
+def test_overall_progress_eta_is_the_slowest_unfinished_step():
+    plan = {"rendition:360p": 2.0, "rendition:720p": 1.0, "rendition:1080p": 1.0}
+    steps = [step("rendition:360p", 1.0, eta=0.0, done=True),
+             step("rendition:720p", 0.4, eta=90.0),
+             step("rendition:1080p", 0.2, eta=None)]
+
+    fraction, eta = overall_progress(steps, plan)
+
+    assert fraction == pytest.approx((2.0 + 0.4 + 0.2) / 4.0)
+    assert eta == 90.0
+
+
+def test_overall_progress_without_plan_is_unknown():
+    assert overall_progress([step("ladder", 0.5, eta=10.0)], {}) == (None, 10.0)
+    assert overall_progress([], {}) == (None, None)
+
+
+async def test_read_progress_returns_sorted_steps_and_plan(fake_redis):
+    await fake_redis.hset(progress_key("v1"), mapping={
+        "rendition:720p": json.dumps(step("rendition:720p", 0.3)),
+        "audio": json.dumps(step("audio", 1.0, done=True)),
+    })
+    await fake_redis.set(plan_key("v1"), json.dumps({"audio": 10.0, "rendition:720p": 10.0}))
+
+    steps, plan = await read_progress("v1")
+
+    assert [entry["step"] for entry in steps] == ["audio", "rendition:720p"]
+    assert plan == {"audio": 10.0, "rendition:720p": 10.0}
+
+
+async def test_read_progress_before_dispatch_is_empty(fake_redis):
+    assert await read_progress("v2") == ([], {})
+
+
+async def test_read_progress_requires_redis(monkeypatch):
+    monkeypatch.setattr("app.core.redis._redis", None)
+
+    with pytest.raises(ServiceUnavailableError):
+        await read_progress("v1")
+
+
+async def test_queue_metrics(fake_redis, monkeypatch):
+    monkeypatch.setattr("app.services.transcode_status.time.time", lambda: 1000.0)
+    await fake_redis.zadd(SCHEDULER_PENDING_KEY, {"job-a": 940.0, "job-b": 990.0})
+    await fake_redis.zadd(SCHEDULER_RUNNING_KEY, {"job-c": 2000.0})
+    await fake_redis.rpush(SCHEDULER_WAITS_KEY, *[str(wait) for wait in (1, 2, 3, 4, 30)])
+
+    metrics = await queue_metrics()
+
+    assert metrics["pending"] == 2
+    assert metrics["running"] == 1
+    assert metrics["oldest_pending_wait_seconds"] == 60.0
+    assert metrics["queue_wait_seconds"] == {
+        "samples": 5, "avg": 8.0, "p50": 3.0, "p95": 30.0, "max": 30.0
+    }
@@ -0,0 +1,251 @@
+"""
+轉碼產出測試
+原始檔雜湊登記、worker 回報的轉碼狀態與刪除影片時對共用產出的更新
+"""
+from uuid import uuid4
+
+import pytest
+
+from app.core.exceptions import ConflictError
+from app.models.video import Video, VideoAsset, VideoStatus
+from app.services import video_assets
+from app.services.video_assets import (
+    finish_asset,
+    record_transcode_result,
+    register_source,
+    release_asset,
+    should_transcode,
+)
+
+CONTENT_HASH = "ab" * 32
+
+
+async def add_video(db, status: VideoStatus = VideoStatus.PROCESSING, **fields) -> Video:
+    video = Video(chapter_id=uuid4(), title="lecture", order_index=0, status=status, **fields)
+    db.add(video)
+    await db.flush()
+    return video
+
+
+async def add_transcoding(db, waiting: int = 0) -> tuple[Video, VideoAsset, list[Video]]:
+    """負責轉碼的影片、其產出與等待相同內容的影片"""
+    video = await add_video(db)
+    asset = VideoAsset(
+        content_hash=uuid4().hex * 2,
+        source_video_id=video.id,
+        ref_count=1 + waiting,
+        status=VideoStatus.PROCESSING,
+    )
+    db.add(asset)
+    await db.flush()
+    video.asset_id = asset.id
+    others = [await add_video(db, asset_id=asset.id) for _ in range(waiting)]
+    await db.flush()
+    return video, asset, others
+
+
+def master_key(video: Video) -> str:
+    return f"transcoded/{video.id}/master.m3u8"
+
+
+async def test_published_makes_waiting_videos_playable(db):
+    video, asset, (waiting,) = await add_transcoding(db, waiting=1)
+
+    # 單次解碼時最低畫質先以快照發布，完成後再以實測資訊發布
+    for _ in range(2):
+        await record_transcode_result(db, video, "published", master_key(video))
+
+    await db.refresh(waiting)
+    assert (video.status, video.storage_key) == (VideoStatus.READY, master_key(video))
+    assert (waiting.status, waiting.storage_key) == (VideoStatus.READY, master_key(video))
+    assert video.thumbnail_url is None
+
+
+async def test_completed_adds_previews_to_every_video(db):
+    video, asset, (waiting,) = await add_transcoding(db, waiting=1)
+    await record_transcode_result(db, video, "published", master_key(video))
+    thumbnail = f"thumbnails/{video.id}/thumbnail.jpg"
+    storyboard = f"thumbnails/{video.id}/storyboard.vtt"
+
+    await record_transcode_result(db, video, "completed", master_key(video), thumbnail, storyboard)
+
+    assert asset.status == VideoStatus.READY
+    for each in (video, waiting):
+        await db.refresh(each)
+        assert (each.thumbnail_url, each.storyboard_key) == (thumbnail, storyboard)
+
+
+async def test_failure_after_publish_keeps_the_video_playable(db):
+    video, asset, _ = await add_transcoding(db)
+    await record_transcode_result(db, video, "published", master_key(video))
+
+    await record_transcode_result(db, video, "failed")
+
+    assert video.status == VideoStatus.READY
+    # 產出標記失敗，相同內容再次上傳時重新轉碼
+    assert asset.status == VideoStatus.FAILED
+
+
+async def test_failure_before_publish_fails_waiting_videos(db):
+    video, asset, (waiting,) = await add_transcoding(db, waiting=1)
+
+    await record_transcode_result(db, video, "failed")
+
+    assert video.status == waiting.status == asset.status == VideoStatus.FAILED
+
+
+async def test_register_source_creates_the_asset_once(db):
+    video = await add_video(db, VideoStatus.UPLOADING)
+
+    # 任務重試時重複登記，不會重複增加引用
+    for _ in range(2):
+        asset = await register_source(db, video, CONTENT_HASH)
+
+    assert (asset.source_video_id, asset.ref_count) == (video.id, 1)
+    assert video.asset_id == asset.id and video.status == VideoStatus.PROCESSING
+    assert should_transcode(asset, video)
+
+
+async def test_register_source_reuses_a_finished_asset(db):
+    video, asset, _ = await add_transcoding(db)
+    await finish_asset(
+        db, video, VideoStatus.READY, master_key(video), f"thumbnails/{video.id}/thumbnail.jpg"
+    )
+    duplicate = await add_video(db, VideoStatus.UPLOADING)
+
+    assert await register_source(db, duplicate, asset.content_hash) is asset
+
+    assert asset.ref_count == 2
+    assert (duplicate.status, duplicate.storage_key) == (VideoStatus.READY, master_key(video))
+    assert duplicate.thumbnail_url == asset.thumbnail_key
+    # 相同內容已轉碼，不再轉碼
+    assert not should_transcode(asset, duplicate)
+
+
+async def test_register_source_joins_a_running_transcode(db):
+    video, asset, _ = await add_transcoding(db)
+    waiting = await add_video(db, VideoStatus.UPLOADING)
+    await register_source(db, waiting, asset.content_hash)
+    assert waiting.status == VideoStatus.PROCESSING
+
+    await record_transcode_result(db, video, "published", master_key(video))
+    late = await add_video(db, VideoStatus.UPLOADING)
+    await register_source(db, late, asset.content_hash)
+
+    # 最低畫質已發布時即可播放，由負責的影片繼續轉碼
+    assert (late.status, late.storage_key) == (VideoStatus.READY, master_key(video))
+    assert not should_transcode(asset, waiting) and not should_transcode(asset, late)
+    assert asset.ref_count == 3
+
+
+async def test_register_source_keeps_a_published_source_playable(db):
+    video, asset, _ = await add_transcoding(db)
+    await record_transcode_result(db, video, "published", master_key(video))
+
+    # 任務重新投遞時已發布的影片不退回 PROCESSING，仍需補齊較高畫質
+    await register_source(db, video, asset.content_hash)
+
+    assert video.status == VideoStatus.READY
+    assert should_transcode(asset, video)
+
+
+async def test_register_source_takes_over_a_failed_asset(db):
+    video, asset, _ = await add_transcoding(db)
+    await record_transcode_result(db, video, "published", master_key(video))
+    await record_transcode_result(db, video, "failed")
+    retry = await add_video(db, VideoStatus.UPLOADING)
+
+    await register_source(db, retry, asset.content_hash)
+
+    assert (asset.source_video_id, asset.status) == (retry.id, VideoStatus.PROCESSING)
+    assert asset.storage_key is None and retry.status == VideoStatus.PROCESSING
+    assert should_transcode(asset, retry)
+
+
+async def test_register_source_rejects_different_content(db):
+    video = await add_video(db, VideoStatus.UPLOADING)
+    await register_source(db, video, CONTENT_HASH)
+
+    with pytest.raises(ConflictError):
+        await register_source(db, video, "cd" * 32)
+
+
+async def test_register_source_uses_the_asset_that_won_the_insert(db, monkeypatch):
+    winner, asset, _ = await add_transcoding(db)
+    lock_asset = video_assets._lock_asset
+    lookups = []
+
+    async def racing_lookup(session, content_hash):
+        # 第一次查詢時另一個請求尚未提交，插入時才撞上唯一索引
+        lookups.append(content_hash)
+        return None if len(lookups) == 1 else await lock_asset(session, content_hash)
+
+    monkeypatch.setattr(video_assets, "_lock_asset", racing_lookup)
+    loser = await add_video(db, VideoStatus.UPLOADING)
+
+    assert await register_source(db, loser, asset.content_hash) is asset
+    assert asset.ref_count == 2 and asset.source_video_id == winner.id
+
+
+async def test_finish_asset_ignores_videos_that_do_not_own_the_transcode(db):
+    video, asset, (waiting,) = await add_transcoding(db, waiting=1)
+
+    await finish_asset(db, waiting, VideoStatus.READY, master_key(waiting))
+
+    assert asset.status == VideoStatus.PROCESSING and asset.storage_key is None
+
+
+async def test_release_refuses_while_higher_renditions_are_uploading(db):
+    video, asset, _ = await add_transcoding(db)
+    await record_transcode_result(db, video, "published", master_key(video))
+
+    # 影片已可播放，但轉碼仍在上傳較高畫質，刪除輸出後仍會繼續寫入
+    assert video.status == VideoStatus.READY
+    with pytest.raises(ConflictError):
+        await release_asset(db, video)
+
+    await record_transcode_result(db, video, "completed", master_key(video))
+    assert await release_asset(db, video) is asset
+    assert video.asset_id is None
+
+
+async def test_release_keeps_an_asset_that_is_still_referenced(db):
+    video, asset, (other,) = await add_transcoding(db, waiting=1)
+    await record_transcode_result(db, video, "completed", master_key(video))
+
+    assert await release_asset(db, other) is None
+
+    assert asset.ref_count == 1 and asset.status == VideoStatus.READY
+
+
+async def test_release_source_before_completion_fails_waiting_videos(db):
+    video, asset, (waiting,) = await add_transcoding(db, waiting=1)
+
+    assert await release_asset(db, video) is None
+
+    await db.refresh(waiting)
+    assert asset.ref_count == 1
+    assert asset.status == waiting.status == VideoStatus.FAILED
+
+
+async def test_failed_backfill_can_be_deleted_and_uploaded_again(db):
+    video, asset, _ = await add_transcoding(db)
+    content_hash = asset.content_hash
+    await record_transcode_result(db, video, "published", master_key(video))
+
+    # 較高畫質轉碼失敗，worker 仍回報 failed 結束轉碼
+    await record_transcode_result(db, video, "failed")
+    assert (video.status, asset.status) == (VideoStatus.READY, VideoStatus.FAILED)
+
+    # 刪除影片不再被拒絕，呼叫端提交後刪除此影片的輸出
+    freed = await release_asset(db, video)
+    assert freed is asset and freed.source_video_id == video.id
+    await db.delete(video)
+    await db.commit()
+
+    reupload = await add_video(db, VideoStatus.UPLOADING)
+    new_asset = await register_source(db, reupload, content_hash)
+
+    assert new_asset.source_video_id == reupload.id and new_asset.ref_count == 1
+    assert (reupload.status, reupload.storage_key) == (VideoStatus.PROCESSING, None)
+    assert should_transcode(new_asset, reupload)
@@ -0,0 +1,70 @@
+"""
+上傳檔頭驗證測試
+magic bytes 判斷容器格式，並以 moto 驗證 Range 讀取短檔與空檔
+"""
+import pytest
+
+from app.core.exceptions import BadRequestError
+from app.services.video_validation import HEADER_BYTES, detect_container, validate_header
+
+MP4_HEADER = b"\x00\x00\x00\x20ftypisom\x00\x00\x02\x00isomiso2avc1mp41"
+QUICKTIME_HEADER = b"\x00\x00\x00\x14ftypqt  \x20\x05\x03\x00qt  "
+MATROSKA_HEADER = b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\x82\x88matroska"
+WEBM_HEADER = b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\x82\x84webm"
+AVI_HEADER = b"RIFF\x24\x00\x10\x00AVI LIST"
+
+
+@pytest.mark.parametrize(
+    ("header", "container"),
+    [
+        (MP4_HEADER, "mp4"),
+        (QUICKTIME_HEADER, "mov"),
+        (b"\x00\x00\x00\x08wide\x00\x10\x00\x00mdat", "mov"),
+        (b"\x00\x00\x10\x00moov\x00\x00\x00\x6cmvhd", "mov"),
+        (MATROSKA_HEADER, "matroska"),
+        (WEBM_HEADER, "webm"),
+        (AVI_HEADER, "avi"),
+        (b"RIFF\x24\x00\x10\x00WAVEfmt ", None),
+        (b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR", None),
+        (b"", None),
+    ],
+)
+def test_detect_container(header, container):
+    assert detect_container(header) == container
+
+
+async def test_validate_header_reads_files_shorter_than_the_probe(storage):
+    assert len(MP4_HEADER) < HEADER_BYTES
+    await storage.put_object("uploads/short.mp4", MP4_HEADER, "video/mp4")
+
+    assert await validate_header(storage, "uploads/short.mp4", "video/mp4") == "mp4"
+
+
+async def test_validate_header_accepts_related_content_types(storage):
+    await storage.put_object("uploads/clip.mov", QUICKTIME_HEADER + b"\x00" * 100, "video/mp4")
+
+    # MP4 與 QuickTime 常互相標示
+    assert await validate_header(storage, "uploads/clip.mov", "video/mp4") == "mov"
+
+
+async def test_validate_header_rejects_empty_file(storage):
+    await storage.put_object("uploads/empty.mp4", b"", "video/mp4")
+
+    with pytest.raises(BadRequestError, match="empty"):
+        await validate_header(storage, "uploads/empty.mp4", "video/mp4")
+
+
+async def test_validate_header_rejects_unknown_format(storage):
+    await storage.put_object("uploads/notes.mp4", b"not a video at all" * 8, "video/mp4")
+
+    with pytest.raises(BadRequestError, match="not a supported video format"):
+        await validate_header(storage, "uploads/notes.mp4", "video/mp4")
+
+
+async def test_validate_header_rejects_content_type_mismatch(storage):
+    await storage.put_object("uploads/clip.webm", WEBM_HEADER, "video/mp4")
+
+    with pytest.raises(BadRequestError) as info:
+        await validate_header(storage, "uploads/clip.webm", "video/mp4")
+
+    assert info.value.details == {"container": "webm", "content_type": "video/mp4"}
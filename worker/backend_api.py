@@ -0,0 +1,68 @@
+"""
+Backend API
+呼叫後端 Webhook：每個請求附上 HMAC 簽章，簽章方式須與 backend 的 app/core/webhook_signing.py 一致
+"""
+import hashlib
+import hmac
+import os
+import time
+from typing import Optional
+
+import httpx
+
+# 後端 API 位址
+BACKEND_API_URL = os.getenv("BACKEND_API_URL", "http://backend:8000/api/v1")
+
+# 與後端共用的 Webhook 簽章金鑰
+WORKER_WEBHOOK_SECRET = os.getenv("WORKER_WEBHOOK_SECRET", "")
+
+TIMESTAMP_HEADER = "X-Webhook-Timestamp"
+SIGNATURE_HEADER = "X-Webhook-Signature"
+
+
+def webhook_signature(
+    secret: str,
+    timestamp: str,
+    method: str,
+    path: str,
+    query: str,
+    body: bytes,
+) -> str:
+    """時間戳、方法、路徑、原始查詢字串與本文的 HMAC-SHA256"""
+    message = f"{timestamp}\n{method.upper()}\n{path}\n{query}\n".encode() + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def post_webhook(
+    path: str,
+    params: Optional[dict] = None,
+    json: Optional[dict] = None,
+    timeout: float = 10,
+) -> httpx.Response:
+    """
+    以簽章呼叫後端 Webhook
+
+    Args:
+        path: BACKEND_API_URL 之下的路徑，例如 /videos/webhook/transcode-complete
+        params: 查詢參數
+        json: JSON 本文
+        timeout: 逾時秒數
+
+    Raises:
+        httpx.HTTPStatusError: 後端回應錯誤狀態碼
+    """
+    request = httpx.Request("POST", f"{BACKEND_API_URL}{path}", params=params, json=json)
+    timestamp = str(int(time.time()))
+    request.headers[TIMESTAMP_HEADER] = timestamp
+    request.headers[SIGNATURE_HEADER] = webhook_signature(
+        WORKER_WEBHOOK_SECRET,
+        timestamp,
+        request.method,
+        request.url.path,
+        request.url.query.decode(),
+        request.content,
+    )
+    with httpx.Client(timeout=timeout) as client:
+        response = client.send(request)
+    response.raise_for_status()
+    return response
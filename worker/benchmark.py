@@ -0,0 +1,273 @@
+"""
+Transcode Benchmark
+以 FFmpeg lavfi 測試訊號產生合成影片，量測轉碼效能並檢查是否退步
+
+Usage:
+    python -m worker.benchmark --suite quick --output results.json
+    python -m worker.benchmark --suite full --baseline results.json --tolerance 0.1
+
+每個情境在獨立的子程序中轉碼（不上傳物件儲存），記錄：
+    realtime_ratio  轉碼耗時 / 影片長度（KPI：< 0.5）
+    cpu_seconds     FFmpeg 子程序的 user + system CPU 時間
+    peak_rss_mb     FFmpeg 子程序的最高常駐記憶體
+    rendition_bytes 各畫質與共用音訊的輸出位元組數
+任一情境超過 --max-ratio，或相對 --baseline 退步超過 --tolerance 時以結束碼 1 離開。
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, NamedTuple, Optional
+
+# 運動量對應的 lavfi 視訊來源：畫面越複雜、變化越大，編碼越吃重。
+# low 為靜止的色條；medium 為靜態背景上移動的圖案；
+# high 為整個畫面逐幀變化的生命遊戲，等同每幀都是場景切換
+MOTION_SOURCES = {
+    "low": "smptebars",
+    "medium": "testsrc2",
+    "high": "life=mold=10:ratio=0.5:life_color=#2ecc71:death_color=#c0392b",
+}
+# 高運動量另外疊加逐幀變化的雜訊，接近實拍畫面的編碼難度
+MOTION_FILTERS = {
+    "low": None,
+    "medium": None,
+    "high": "noise=alls=40:allf=t+u",
+}
+
+# 相對基準比較的指標（數值越大越差）
+COMPARED_METRICS = ("realtime_ratio", "cpu_seconds", "peak_rss_mb")
+
+
+class Scenario(NamedTuple):
+    """合成影片情境"""
+    duration: int
+    width: int
+    height: int
+    motion: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.height}p_{self.duration}s_{self.motion}"
+
+
+def _matrix(durations: List[int], sizes: List[tuple], motions: List[str]) -> List[Scenario]:
+    return [
+        Scenario(duration, width, height, motion)
+        for duration in durations
+        for width, height in sizes
+        for motion in motions
+    ]
+
+
+SUITES: Dict[str, List[Scenario]] = {
+    "quick": _matrix([30], [(854, 480), (1280, 720), (1920, 1080)], ["low", "high"]),
+    "full": _matrix(
+        [30, 120, 600],
+        [(854, 480), (1280, 720), (1920, 1080)],
+        ["low", "medium", "high"],
+    ),
+}
+
+
+def source_command(scenario: Scenario, path: str) -> List[str]:
+    """
+    產生合成影片的 FFmpeg 指令（含 440Hz 音軌）
+
+    以近乎無損的設定編碼，避免來源本身的壓縮失真影響量測。
+    部分 lavfi 來源（例如 life）沒有 duration 參數，長度一律以輸入的 -t 限制。
+    """
+    source = MOTION_SOURCES[scenario.motion]
+    separator = ":" if "=" in source else "="
+    video = f"{source}{separator}size={scenario.width}x{scenario.height}:rate=30"
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "lavfi", "-t", str(scenario.duration), "-i", video,
+        "-f", "lavfi", "-t", str(scenario.duration), "-i", "sine=frequency=440:sample_rate=48000",
+    ]
+    if MOTION_FILTERS[scenario.motion]:
+        cmd += ["-vf", MOTION_FILTERS[scenario.motion]]
+    cmd += [
+        "-c:v", "libx264", "-preset", "ultrafast", "-crf", "10", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "192k",
+        "-shortest",
+        path,
+    ]
+    return cmd
+
+
+def generate_source(scenario: Scenario, source_dir: str) -> str:
+    """以 lavfi 產生合成影片，已存在時直接沿用"""
+    os.makedirs(source_dir, exist_ok=True)
+    path = os.path.join(source_dir, f"{scenario.name}.mp4")
+    if os.path.exists(path):
+        return path
+
+    subprocess.run(source_command(scenario, path), check=True, capture_output=True)
+    return path
+
+
+def run_scenario(scenario: Scenario, source_path: str, mode: str) -> dict:
+    """
+    在目前程序中轉碼一個情境並量測
+
+    必須在全新的子程序中執行：RUSAGE_CHILDREN 涵蓋程序內所有已結束的子程序，
+    峰值記憶體也只能取所有子程序的最大值。
+    """
+    # 量測純轉碼效能，不上傳物件儲存、不發布進度
+    os.environ["VIDEO_UPLOAD_TO_STORAGE"] = "false"
+    from worker.media.ladder import Rendition, plan_ladder
+    from worker.media.playlist import AUDIO_NAME
+    from worker.media.probe import probe_source
+    from worker.media.storyboard import PREVIEW_DIR_NAME, preview_spec
+    from worker.tasks.video_processing import transcode_ladder_to_hls, transcode_to_hls
+
+    source = probe_source(source_path)
+    ladder: List[Rendition] = plan_ladder(source)
+
+    with tempfile.TemporaryDirectory(prefix="transcode-bench-") as output_dir:
+        previews = preview_spec(
+            os.path.join(output_dir, PREVIEW_DIR_NAME),
+            ladder[0].width,
+            ladder[0].height,
+            source.duration,
+        )
+        started = time.monotonic()
+        if mode == "single_pass":
+            transcode_ladder_to_hls(source_path, output_dir, ladder, previews=previews)
+        else:
+            for index, rendition in enumerate(ladder):
+                # 與 worker 相同：最低畫質的指令一併輸出共用音訊
+                transcode_to_hls(
+                    source_path,
+                    os.path.join(output_dir, rendition.name),
+                    rendition,
+                    previews=previews if index == 0 else None,
+                    audio_dir=os.path.join(output_dir, AUDIO_NAME) if index == 0 else None,
+                )
+        elapsed = time.monotonic() - started
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        rendition_bytes = {
+            name: _directory_bytes(os.path.join(output_dir, name))
+            for name in [rendition.name for rendition in ladder] + [AUDIO_NAME]
+        }
+
+    return {
+        "scenario": scenario.name,
+        "mode": mode,
+        "duration": source.duration,
+        "wall_seconds": round(elapsed, 3),
+        "realtime_ratio": round(elapsed / source.duration, 4),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+        # Linux 的 ru_maxrss 單位為 KB
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "rendition_bytes": rendition_bytes,
+    }
+
+
+def _directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def check_result(
+    result: dict,
+    max_ratio: float,
+    baseline: Optional[dict],
+    tolerance: float,
+) -> List[str]:
+    """
+    檢查量測結果
+
+    Returns:
+        違規說明列表，空列表表示通過
+    """
+    failures = []
+    if result["realtime_ratio"] > max_ratio:
+        failures.append(
+            f"{result['scenario']}: realtime_ratio {result['realtime_ratio']:.3f} > {max_ratio:.3f}"
+        )
+    if baseline is None:
+        return failures
+
+    limit = 1 + tolerance
+    for metric in COMPARED_METRICS:
+        if baseline.get(metric) and result[metric] > baseline[metric] * limit:
+            failures.append(
+                f"{result['scenario']}: {metric} {result[metric]} regressed "
+                f"from {baseline[metric]} (> {tolerance:.0%})"
+            )
+    for name, size in result["rendition_bytes"].items():
+        expected = baseline.get("rendition_bytes", {}).get(name)
+        if expected and size > expected * limit:
+            failures.append(
+                f"{result['scenario']}: {name} output {size} bytes regressed "
+                f"from {expected} (> {tolerance:.0%})"
+            )
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Transcode benchmark with synthetic sources")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument(
+        "--mode",
+        choices=["parallel", "single_pass"],
+        default=os.getenv("VIDEO_RENDITION_MODE", "single_pass"),
+        help="parallel 逐畫質轉碼（加總為單一 worker 的成本）；single_pass 單次解碼所有畫質",
+    )
+    parser.add_argument(
+        "--source-dir",
+        default=os.path.join(tempfile.gettempdir(), "transcode-bench-sources"),
+        help="合成影片快取目錄",
+    )
+    parser.add_argument("--max-ratio", type=float, default=0.5, help="轉碼耗時 / 影片長度上限")
+    parser.add_argument("--baseline", help="先前 --output 產生的結果檔")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="相對基準允許的退步比例")
+    parser.add_argument("--output", help="將結果寫入 JSON 檔，可作為下次的 --baseline")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {
+                (entry["scenario"], entry["mode"]): entry for entry in json.load(f)["results"]
+            }
+
+    results = []
+    failures = []
+    spawn = get_context("spawn")
+    for scenario in SUITES[args.suite]:
+        source_path = generate_source(scenario, args.source_dir)
+        # 每個情境使用全新的子程序，資源用量互不累計
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            result = executor.submit(run_scenario, scenario, source_path, args.mode).result()
+        results.append(result)
+        failures += check_result(
+            result, args.max_ratio, baseline.get((result["scenario"], result["mode"])), args.tolerance
+        )
+        print(
+            f"{result['scenario']:<22} ratio={result['realtime_ratio']:.3f} "
+            f"cpu={result['cpu_seconds']:.1f}s rss={result['peak_rss_mb']:.0f}MB "
+            f"bytes={sum(result['rendition_bytes'].values())}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"suite": args.suite, "mode": args.mode, "results": results}, f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,7 @@ celery_app = Celery(
     include=[
         "worker.tasks.video_processing",
         "worker.tasks.ai_review",
+        "worker.tasks.storage_gc",
     ],
 )
 
@@ -45,6 +46,19 @@ celery_app.conf.update(
     task_routes={
         "worker.tasks.video_processing.*": {"queue": "video"},
         "worker.tasks.ai_review.*": {"queue": "ai"},
+        "worker.tasks.storage_gc.*": {"queue": "maintenance"},
+    },
+
+    # 定期任務：由 docker-compose 的 beat 服務排程，同時只能執行一個 beat
+    beat_schedule={
+        "collect-storage-garbage": {
+            "task": "worker.tasks.storage_gc.collect_storage_garbage",
+            "schedule": float(os.getenv("STORAGE_GC_INTERVAL", "3600")),
+        },
+        "dispatch-pending-transcodes": {
+            "task": "worker.tasks.video_processing.dispatch_pending_transcodes",
+            "schedule": float(os.getenv("VIDEO_SCHEDULER_DISPATCH_INTERVAL", "60")),
+        },
     },
 
     # 任務重試設定
@@ -0,0 +1,70 @@
+"""
+Transcode Checkpoints
+轉碼檢查點：記錄已完成的子任務結果，任務重試或重新分派時跳過已完成的工作
+"""
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Optional
+
+import redis
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# 檢查點保留時間（秒），涵蓋 Celery 重試與人工重新分派的間隔
+CHECKPOINT_TTL = int(os.getenv("VIDEO_CHECKPOINT_TTL", str(7 * 86400)))
+
+
+@lru_cache
+def get_redis() -> redis.Redis:
+    """取得共用的 Redis 連線"""
+    return redis.Redis.from_url(REDIS_URL)
+
+
+def checkpoint_key(video_id: str) -> str:
+    """每部影片的檢查點存放在同一個 hash，完成後可一次清除"""
+    return f"video:{video_id}:checkpoints"
+
+
+def load_checkpoint(video_id: str, step: str) -> Optional[dict]:
+    """
+    讀取子任務的檢查點
+
+    Args:
+        video_id: 影片 ID
+        step: 子任務名稱，例如 "thumbnail"、"rendition:720p"、"chunk:3"
+
+    Returns:
+        子任務完成時儲存的結果，尚未完成時返回 None
+    """
+    data = get_redis().hget(checkpoint_key(video_id), step)
+    return json.loads(data) if data is not None else None
+
+
+def load_checkpoints(video_id: str, prefix: str) -> Dict[str, dict]:
+    """
+    讀取名稱以 prefix 開頭的所有檢查點
+
+    Returns:
+        去除 prefix 後的子任務名稱對應的結果
+    """
+    entries = get_redis().hgetall(checkpoint_key(video_id))
+    return {
+        step.decode()[len(prefix):]: json.loads(data)
+        for step, data in entries.items()
+        if step.decode().startswith(prefix)
+    }
+
+
+def save_checkpoint(video_id: str, step: str, result: dict) -> None:
+    """子任務完成後記錄結果"""
+    key = checkpoint_key(video_id)
+    pipe = get_redis().pipeline()
+    pipe.hset(key, step, json.dumps(result))
+    pipe.expire(key, CHECKPOINT_TTL)
+    pipe.execute()
+
+
+def clear_checkpoints(video_id: str) -> None:
+    """轉碼全部完成後清除檢查點"""
+    get_redis().delete(checkpoint_key(video_id))
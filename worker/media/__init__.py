@@ -0,0 +1,4 @@
+"""
+Media Helpers
+FFmpeg/ffprobe 與 HLS 播放清單的共用工具
+"""
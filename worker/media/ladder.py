@@ -0,0 +1,57 @@
+"""
+Bitrate Ladder
+依原始影片解析度規劃 HLS 畫質階梯
+"""
+from typing import List, NamedTuple
+
+from worker.media.probe import SourceInfo
+
+
+class Rendition(NamedTuple):
+    """HLS 畫質設定"""
+    name: str
+    width: int
+    height: int
+    bitrate: str
+    maxrate: str
+    bufsize: str
+
+    @property
+    def resolution(self) -> str:
+        return f"{self.width}x{self.height}"
+
+
+# ABR 畫質階梯 (docs/Video_Streaming_Architecture.md 3.2)，由低到高排列
+LADDER: List[Rendition] = [
+    Rendition("360p", 640, 360, "800k", "856k", "1200k"),
+    Rendition("720p", 1280, 720, "2500k", "2675k", "3750k"),
+    Rendition("1080p", 1920, 1080, "5000k", "5350k", "7500k"),
+]
+
+
+def _even(value: float) -> int:
+    """H.264 4:2:0 需要偶數寬高"""
+    return max(2, int(round(value / 2)) * 2)
+
+
+def plan_ladder(source: SourceInfo, ladder: List[Rendition] = LADDER) -> List[Rendition]:
+    """
+    依原始影片選擇畫質階梯，絕不放大
+
+    以短邊比較畫質高度（直式影片同樣適用），輸出尺寸保持原始比例。
+    原始影片低於最低畫質時，以原始短邊輸出一個使用最低畫質位元率的畫質。
+    """
+    short_side = min(source.width, source.height)
+    rungs = [rendition for rendition in ladder if rendition.height <= short_side]
+    if not rungs:
+        lowest = ladder[0]
+        rungs = [lowest._replace(name=f"{_even(short_side)}p", height=_even(short_side))]
+
+    planned = []
+    for rendition in rungs:
+        scale = rendition.height / short_side
+        planned.append(rendition._replace(
+            width=_even(source.width * scale),
+            height=_even(source.height * scale),
+        ))
+    return planned
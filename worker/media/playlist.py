@@ -0,0 +1,277 @@
+"""
+HLS Playlists
+媒體播放清單讀寫與主播放列表生成
+"""
+import math
+import os
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from worker.media.ladder import Rendition
+from worker.media.probe import probe_codecs
+
+# 共用音訊的輸出子目錄（同時作為 EXT-X-MEDIA 的 NAME）與音訊群組 ID
+AUDIO_NAME = "audio"
+AUDIO_GROUP_ID = "audio"
+
+
+class Segment(NamedTuple):
+    """
+    媒體播放清單中的片段
+
+    byterange 與 init_section 保留播放清單中的原始屬性字串
+    （EXT-X-BYTERANGE 與 EXT-X-MAP），單檔 fMP4 輸出時才會出現。
+    """
+    duration: float
+    uri: str
+    byterange: Optional[str] = None
+    init_section: Optional[str] = None
+
+    @property
+    def length(self) -> Optional[int]:
+        """EXT-X-BYTERANGE 指定的位元組數"""
+        if self.byterange is None:
+            return None
+        return int(self.byterange.split("@", 1)[0])
+
+
+def read_media_playlist(playlist_path: str) -> List[Segment]:
+    """讀取 HLS 媒體播放清單"""
+    segments = []
+    duration = None
+    byterange = None
+    init_section = None
+    with open(playlist_path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXT-X-MAP:"):
+                init_section = line[len("#EXT-X-MAP:"):]
+            elif line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+            elif line.startswith("#EXT-X-BYTERANGE:"):
+                byterange = line[len("#EXT-X-BYTERANGE:"):]
+            elif line and not line.startswith("#") and duration is not None:
+                segments.append(Segment(duration, line, byterange, init_section))
+                duration = None
+                byterange = None
+    return segments
+
+
+def live_playlist(content: str) -> str:
+    """
+    轉碼途中的 EVENT 播放清單快照
+
+    尚未結束的播放清單預設從最新的片段起播，加上 EXT-X-START 讓播放器從頭播放。
+    """
+    if "#EXT-X-ENDLIST" in content or "#EXT-X-START:" in content:
+        return content
+    header, _, rest = content.partition("\n")
+    return f"{header}\n#EXT-X-START:TIME-OFFSET=0\n{rest}"
+
+
+def write_media_playlist(playlist_path: str, segments: List[Segment]) -> None:
+    """
+    寫入 VOD 類型的 HLS 媒體播放清單
+
+    初始化區段改變時（例如串接多個單檔 fMP4 分段）會重新寫出 EXT-X-MAP。
+    """
+    target_duration = math.ceil(max((segment.duration for segment in segments), default=0))
+    fragmented = any(segment.init_section for segment in segments)
+    lines = [
+        "#EXTM3U",
+        f"#EXT-X-VERSION:{7 if fragmented else 3}",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+    init_section = None
+    for segment in segments:
+        if segment.init_section and segment.init_section != init_section:
+            init_section = segment.init_section
+            lines.append(f"#EXT-X-MAP:{init_section}")
+        lines.append(f"#EXTINF:{segment.duration:.6f},")
+        if segment.byterange:
+            lines.append(f"#EXT-X-BYTERANGE:{segment.byterange}")
+        lines.append(segment.uri)
+    lines.append("#EXT-X-ENDLIST")
+
+    with open(playlist_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def measure_playlist(
+    rendition_dir: str,
+    size_of: Callable[[str], int] = os.path.getsize,
+    codecs: Optional[str] = None,
+) -> dict:
+    """
+    由實際輸出的片段計算播放清單的位元率與 CODECS
+
+    BANDWIDTH 取單一片段的最高位元率，AVERAGE-BANDWIDTH 為整體平均，
+    CODECS 未提供時由第一個片段探測而得。
+    片段已上傳並自本機刪除時，以 size_of 提供上傳時記錄的大小；
+    單檔 fMP4 的片段大小直接取自 EXT-X-BYTERANGE。
+    """
+    segments = read_media_playlist(os.path.join(rendition_dir, "playlist.m3u8"))
+
+    peak = 0.0
+    total_bits = 0
+    total_duration = 0.0
+    for segment in segments:
+        length = segment.length
+        if length is None:
+            length = size_of(os.path.join(rendition_dir, segment.uri))
+        bits = length * 8
+        total_bits += bits
+        total_duration += segment.duration
+        if segment.duration > 0:
+            peak = max(peak, bits / segment.duration)
+
+    if codecs is None and segments:
+        codecs = probe_codecs(os.path.join(rendition_dir, segments[0].uri))
+
+    return {
+        "bandwidth": math.ceil(peak),
+        "average_bandwidth": math.ceil(total_bits / total_duration) if total_duration else 0,
+        "codecs": codecs,
+    }
+
+
+def measure_variant(
+    rendition_dir: str,
+    rendition: Rendition,
+    size_of: Callable[[str], int] = os.path.getsize,
+    codecs: Optional[str] = None,
+) -> dict:
+    """由實際輸出的片段計算主播放列表所需的變體資訊"""
+    return {
+        "name": rendition.name,
+        "resolution": rendition.resolution,
+        **measure_playlist(rendition_dir, size_of, codecs),
+    }
+
+
+def measure_audio(
+    audio_dir: str,
+    size_of: Callable[[str], int] = os.path.getsize,
+    codecs: Optional[str] = None,
+) -> dict:
+    """由實際輸出的片段計算共用音訊的資訊"""
+    return {"name": AUDIO_NAME, **measure_playlist(audio_dir, size_of, codecs)}
+
+
+class SegmentStats:
+    """
+    記錄片段大小與各畫質目錄的 CODECS
+
+    串流上傳會在片段上傳後刪除本機檔案，須在刪除前記錄 measure_variant 所需的資訊。
+    """
+
+    def __init__(self, sizes: Optional[Dict[str, int]] = None, codecs: Optional[Dict[str, str]] = None):
+        self.sizes: Dict[str, int] = dict(sizes or {})
+        self.codecs: Dict[str, str] = dict(codecs or {})
+
+    def record(self, path: str) -> None:
+        """記錄片段大小；每個目錄只探測第一個片段的 CODECS"""
+        self.sizes[path] = os.path.getsize(path)
+        directory = os.path.dirname(path)
+        if directory not in self.codecs:
+            self.codecs[directory] = probe_codecs(path)
+
+    def size_of(self, path: str) -> int:
+        return self.sizes[path] if path in self.sizes else os.path.getsize(path)
+
+    def merge(self, data: Optional[dict]) -> None:
+        """合併其他任務以 to_dict() 傳回的記錄"""
+        if data:
+            self.sizes.update(data.get("sizes", {}))
+            for directory, codecs in data.get("codecs", {}).items():
+                self.codecs.setdefault(directory, codecs)
+
+    def to_dict(self) -> dict:
+        return {"sizes": self.sizes, "codecs": self.codecs}
+
+    def measure(self, rendition_dir: str, rendition: Rendition) -> dict:
+        """以記錄的資訊計算變體資訊"""
+        return measure_variant(
+            rendition_dir,
+            rendition,
+            size_of=self.size_of,
+            codecs=self.codecs.get(rendition_dir),
+        )
+
+    def measure_audio(self, audio_dir: str) -> dict:
+        """以記錄的資訊計算共用音訊的資訊"""
+        return measure_audio(audio_dir, size_of=self.size_of, codecs=self.codecs.get(audio_dir))
+
+
+def generate_master_playlist(
+    output_dir: str,
+    variants: List[dict],
+    audio: Optional[dict] = None,
+    audio_only: bool = False,
+) -> str:
+    """
+    依實測的變體資訊生成 HLS 主播放列表，畫質由低到高排列
+
+    各畫質只含視訊，音訊只編碼一次並以 EXT-X-MEDIA 音訊群組供所有畫質引用；
+    BANDWIDTH 與 CODECS 須涵蓋視訊加上音訊。
+    audio_only 時另外列出純音訊變體供極低頻寬使用，放在最後，
+    避免以第一個變體起播的播放器從純音訊開始。
+
+    Args:
+        output_dir: 輸出目錄
+        variants: 各畫質的變體資訊
+        audio: 共用音訊的資訊，影片無音訊時為 None
+        audio_only: 是否列出純音訊變體
+    """
+    master_path = os.path.join(output_dir, "master.m3u8")
+
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-INDEPENDENT-SEGMENTS", ""]
+    if audio is not None:
+        lines += [
+            f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="{AUDIO_GROUP_ID}",NAME="{AUDIO_NAME}",'
+            f'DEFAULT=YES,AUTOSELECT=YES,URI="{AUDIO_NAME}/playlist.m3u8"',
+            "",
+        ]
+
+    for variant in sorted(variants, key=lambda v: v["bandwidth"]):
+        bandwidth = variant["bandwidth"]
+        average_bandwidth = variant["average_bandwidth"]
+        codecs = [variant.get("codecs")]
+        if audio is not None:
+            bandwidth += audio["bandwidth"]
+            average_bandwidth += audio["average_bandwidth"]
+            codecs.append(audio.get("codecs"))
+        attributes = [
+            f"BANDWIDTH={bandwidth}",
+            f"AVERAGE-BANDWIDTH={average_bandwidth}",
+            f"RESOLUTION={variant['resolution']}",
+        ]
+        # 任一部分無法辨識時省略 CODECS，由播放器自行判斷
+        if all(codecs):
+            attributes.append(f'CODECS="{",".join(codecs)}"')
+        if audio is not None:
+            attributes.append(f'AUDIO="{AUDIO_GROUP_ID}"')
+        lines += [
+            f"#EXT-X-STREAM-INF:{','.join(attributes)}",
+            f"{variant['name']}/playlist.m3u8",
+            "",
+        ]
+
+    if audio is not None and audio_only:
+        attributes = [
+            f"BANDWIDTH={audio['bandwidth']}",
+            f"AVERAGE-BANDWIDTH={audio['average_bandwidth']}",
+        ]
+        if audio.get("codecs"):
+            attributes.append(f'CODECS="{audio["codecs"]}"')
+        lines += [
+            f"#EXT-X-STREAM-INF:{','.join(attributes)}",
+            f"{AUDIO_NAME}/playlist.m3u8",
+            "",
+        ]
+
+    with open(master_path, "w") as f:
+        f.write("\n".join(lines))
+
+    return master_path
@@ -0,0 +1,108 @@
+"""
+Media Probing
+以 ffprobe 讀取影片資訊
+"""
+import json
+import subprocess
+from typing import NamedTuple, Optional
+
+
+class SourceInfo(NamedTuple):
+    """原始影片資訊"""
+    width: int
+    height: int
+    duration: Optional[float]
+    has_audio: bool
+
+
+# H.264 profile 對應 RFC 6381 的 profile_idc 與 constraint flags
+H264_PROFILES = {
+    "Constrained Baseline": "42e0",
+    "Baseline": "4200",
+    "Main": "4d00",
+    "High": "6400",
+}
+
+# AAC profile 對應 mp4a object type
+AAC_PROFILES = {
+    "LC": "mp4a.40.2",
+    "HE-AAC": "mp4a.40.5",
+    "HE-AACv2": "mp4a.40.29",
+}
+
+
+def _probe_streams(input_path: str, entries: str) -> dict:
+    """執行 ffprobe 並返回 JSON 結果"""
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", entries,
+        "-of", "json",
+        input_path
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return json.loads(result.stdout)
+
+
+def probe_source(input_path: str) -> SourceInfo:
+    """取得原始影片的解析度、時長與是否有音訊"""
+    data = _probe_streams(input_path, "format=duration:stream=codec_type,width,height")
+    streams = data.get("streams", [])
+    video = next(s for s in streams if s.get("codec_type") == "video")
+    duration = data.get("format", {}).get("duration")
+
+    return SourceInfo(
+        width=int(video["width"]),
+        height=int(video["height"]),
+        duration=float(duration) if duration else None,
+        has_audio=any(s.get("codec_type") == "audio" for s in streams),
+    )
+
+
+def probe_codecs(segment_path: str) -> Optional[str]:
+    """
+    取得片段的 RFC 6381 CODECS 字串，例如 "avc1.64001f,mp4a.40.2"
+
+    無法辨識的編碼器會被略過；全部無法辨識時返回 None。
+    """
+    data = _probe_streams(segment_path, "stream=codec_type,codec_name,profile,level")
+    codecs = []
+    for stream in data.get("streams", []):
+        if stream.get("codec_name") == "h264":
+            profile = H264_PROFILES.get(stream.get("profile"))
+            level = stream.get("level")
+            if profile and level:
+                codecs.append(f"avc1.{profile}{int(level):02x}")
+        elif stream.get("codec_name") == "aac":
+            codecs.append(AAC_PROFILES.get(stream.get("profile"), "mp4a.40.2"))
+    return ",".join(codecs) or None
+
+
+def has_audio_stream(input_path: str) -> bool:
+    """檢查影片是否包含音訊串流"""
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "a",
+        "-show_entries", "stream=index",
+        "-of", "csv=p=0",
+        input_path
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return bool(result.stdout.strip())
+
+
+def probe_duration(input_path: str) -> Optional[float]:
+    """以 ffprobe 取得影片時長（秒），失敗時返回 None"""
+    try:
+        cmd = [
+            "ffprobe",
+            "-v", "error",
+            "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1",
+            input_path
+        ]
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        return float(result.stdout.strip())
+    except Exception:
+        return None
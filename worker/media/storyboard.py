@@ -0,0 +1,184 @@
+"""
+Seek Previews
+在轉碼的同一次解碼中輸出封面與拼貼縮圖，並生成 WebVTT storyboard
+"""
+import math
+import os
+from typing import List, NamedTuple, Optional
+
+# 每張預覽縮圖涵蓋的秒數
+STORYBOARD_INTERVAL = int(os.getenv("VIDEO_STORYBOARD_INTERVAL", "10"))
+
+# 預覽縮圖寬度，高度依原片比例計算
+THUMB_WIDTH = 160
+
+# 每張拼貼圖的欄列數
+TILE_COLUMNS = 10
+TILE_ROWS = 10
+
+# 封面寬度與擷取時間點（秒），影片較短時改取中間
+POSTER_WIDTH = 640
+POSTER_TIME = 5.0
+
+# 預覽圖輸出子目錄與封面檔名
+PREVIEW_DIR_NAME = "_previews"
+POSTER_NAME = "thumbnail.jpg"
+STORYBOARD_NAME = "storyboard.vtt"
+
+
+class StoryboardLayout(NamedTuple):
+    """拼貼圖版面"""
+    thumb_width: int
+    thumb_height: int
+    columns: int = TILE_COLUMNS
+    rows: int = TILE_ROWS
+    interval: int = STORYBOARD_INTERVAL
+
+    @property
+    def per_sheet(self) -> int:
+        return self.columns * self.rows
+
+
+def storyboard_layout(width: int, height: int) -> StoryboardLayout:
+    """依畫面比例計算預覽縮圖尺寸（偶數高度）"""
+    thumb_height = max(2, int(round(THUMB_WIDTH * height / width / 2)) * 2)
+    return StoryboardLayout(THUMB_WIDTH, thumb_height)
+
+
+class PreviewSpec(NamedTuple):
+    """
+    轉碼指令額外輸出的預覽圖
+
+    Attributes:
+        output_dir: 拼貼圖與封面的輸出目錄
+        layout: 拼貼圖版面
+        name_prefix: 拼貼圖檔名前綴（分段轉碼時區分各分段）
+        poster_time: 封面擷取時間點（秒），None 表示不輸出封面
+    """
+    output_dir: str
+    layout: StoryboardLayout
+    name_prefix: str = ""
+    poster_time: Optional[float] = None
+
+    def filters(self, source: str) -> List[str]:
+        """
+        由 source 標籤的解碼畫面產生 [sprite] 與 [poster] 的濾鏡
+
+        fps 依固定間隔取樣，tile 每滿 columns x rows 張輸出一張拼貼圖，
+        結束時不足一張的部分仍會輸出。
+        """
+        layout = self.layout
+        sprite = (
+            f"fps=1/{layout.interval},"
+            f"scale={layout.thumb_width}:{layout.thumb_height},"
+            f"tile={layout.columns}x{layout.rows}[sprite]"
+        )
+        if self.poster_time is None:
+            return [f"[{source}]{sprite}"]
+        return [
+            f"[{source}]split=2[sb][po]",
+            f"[sb]{sprite}",
+            f"[po]select='gte(t\\,{self.poster_time:.3f})',scale={POSTER_WIDTH}:-2[poster]",
+        ]
+
+    def outputs(self) -> List[str]:
+        """預覽圖輸出參數，需放在所有 HLS 輸出之後"""
+        args = [
+            "-map", "[sprite]",
+            "-c:v", "mjpeg",
+            "-q:v", "5",
+            "-f", "image2",
+            os.path.join(self.output_dir, f"{self.name_prefix}sprite_%03d.jpg"),
+        ]
+        if self.poster_time is not None:
+            args += [
+                "-map", "[poster]",
+                "-frames:v", "1",
+                "-c:v", "mjpeg",
+                "-q:v", "2",
+                "-f", "image2",
+                "-update", "1",
+                os.path.join(self.output_dir, POSTER_NAME),
+            ]
+        return args
+
+    def sprite_sheets(self) -> List[str]:
+        """已輸出的拼貼圖路徑（依序）"""
+        return sorted(
+            os.path.join(self.output_dir, name)
+            for name in os.listdir(self.output_dir)
+            if name.startswith(f"{self.name_prefix}sprite_") and name.endswith(".jpg")
+        )
+
+
+def preview_spec(
+    output_dir: str,
+    width: int,
+    height: int,
+    duration: Optional[float],
+    name_prefix: str = "",
+    poster: bool = True,
+) -> PreviewSpec:
+    """
+    建立預覽圖輸出設定並建立輸出目錄
+
+    Args:
+        output_dir: 預覽圖輸出目錄
+        width: 畫面寬度（用於計算比例）
+        height: 畫面高度
+        duration: 影片時長（秒），用於決定封面時間點
+        name_prefix: 拼貼圖檔名前綴
+        poster: 是否輸出封面
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    poster_time = None
+    if poster:
+        poster_time = min(POSTER_TIME, duration / 2) if duration else 0.0
+    return PreviewSpec(output_dir, storyboard_layout(width, height), name_prefix, poster_time)
+
+
+def _timestamp(seconds: float) -> str:
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+
+def write_storyboard(path: str, sections: List[dict], layout: StoryboardLayout) -> str:
+    """
+    生成 WebVTT storyboard，每個 cue 以 #xywh 指向拼貼圖中的一格
+
+    Args:
+        path: 輸出路徑
+        sections: 依時間排序的區段，每筆包含 sheets（拼貼圖 URI 列表）、
+            start（區段起點秒數）與 duration（區段長度秒數）
+        layout: 拼貼圖版面
+
+    Returns:
+        輸出路徑
+    """
+    lines = ["WEBVTT", ""]
+    for section in sections:
+        sheets = section["sheets"]
+        start = section["start"]
+        end = start + (section["duration"] or 0)
+        count = min(
+            math.ceil((section["duration"] or 0) / layout.interval),
+            len(sheets) * layout.per_sheet,
+        )
+        for index in range(count):
+            sheet, cell = divmod(index, layout.per_sheet)
+            row, column = divmod(cell, layout.columns)
+            cue_start = start + index * layout.interval
+            cue_end = min(cue_start + layout.interval, end)
+            lines += [
+                f"{_timestamp(cue_start)} --> {_timestamp(cue_end)}",
+                f"{sheets[sheet]}#xywh={column * layout.thumb_width},{row * layout.thumb_height},"
+                f"{layout.thumb_width},{layout.thumb_height}",
+                "",
+            ]
+
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+    return path
@@ -0,0 +1,163 @@
+"""
+Transcode Progress
+解析 FFmpeg `-progress` 輸出，節流後經 Redis pub/sub 發布轉碼進度
+"""
+import json
+import os
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+import redis
+
+from worker.checkpoint import get_redis
+
+# 同一子任務兩次發布之間的最短間隔（秒）
+PROGRESS_INTERVAL = float(os.getenv("VIDEO_PROGRESS_INTERVAL", "2"))
+
+# 最新進度的保留時間（秒），轉碼結束後自動過期
+PROGRESS_TTL = int(os.getenv("VIDEO_PROGRESS_TTL", "3600"))
+
+
+class Progress(NamedTuple):
+    """
+    單次進度快照
+
+    Attributes:
+        fraction: 完成比例 0.0 ~ 1.0
+        out_time: 已輸出的媒體時間（秒）
+        speed: 編碼速度（媒體秒 / 實際秒），尚無法估計時為 None
+        eta: 預估剩餘秒數，尚無法估計時為 None
+        done: FFmpeg 是否已回報 progress=end
+    """
+    fraction: float
+    out_time: float
+    speed: Optional[float]
+    eta: Optional[float]
+    done: bool
+
+
+class ProgressParser:
+    """
+    將 FFmpeg `-progress` 的 key=value 行彙整為進度快照
+
+    FFmpeg 每個區塊以 progress=continue / progress=end 結尾，
+    feed 在區塊結尾時返回 Progress，其他行返回 None。
+    FFmpeg 回報的 speed 為 N/A 時改以實際經過時間估算。
+    """
+
+    def __init__(self, duration: Optional[float], clock: Callable[[], float] = time.monotonic):
+        self.duration = duration
+        self._clock = clock
+        self._started = clock()
+        self._out_time = 0.0
+        self._speed: Optional[float] = None
+
+    def feed(self, line: str) -> Optional[Progress]:
+        key, _, value = line.strip().partition("=")
+        value = value.strip()
+        if key == "out_time_us" and value.isdigit():
+            self._out_time = int(value) / 1_000_000
+        elif key == "speed":
+            try:
+                self._speed = float(value.rstrip("x")) or None
+            except ValueError:
+                self._speed = None
+        elif key == "progress":
+            return self._snapshot(done=value == "end")
+        return None
+
+    def _snapshot(self, done: bool) -> Progress:
+        if done:
+            return Progress(1.0, self.duration or self._out_time, self._speed, 0.0, True)
+
+        speed = self._speed
+        elapsed = self._clock() - self._started
+        if speed is None and elapsed > 0 and self._out_time > 0:
+            speed = self._out_time / elapsed
+
+        if not self.duration:
+            return Progress(0.0, self._out_time, speed, None, False)
+
+        fraction = min(self._out_time / self.duration, 1.0)
+        eta = max(self.duration - self._out_time, 0.0) / speed if speed else None
+        return Progress(fraction, self._out_time, speed, eta, False)
+
+
+def progress_channel(video_id: str) -> str:
+    """即時進度的 pub/sub 頻道"""
+    return f"video:{video_id}:progress"
+
+
+def progress_key(video_id: str) -> str:
+    """各子任務最新進度的 hash，供晚訂閱的前端經後端 transcode-progress API 讀取"""
+    return f"video:{video_id}:progress:latest"
+
+
+def plan_key(video_id: str) -> str:
+    """分派時預計的子任務與工作量，後端據此加權整體進度"""
+    return f"video:{video_id}:progress:plan"
+
+
+def publish_plan(video_id: str, weights: Dict[str, float]) -> None:
+    """
+    記錄預計執行的子任務與各自的工作量
+
+    工作量以需要編碼的媒體秒數乘上輸出的畫質數計算（共用音訊算一個畫質），
+    尚未回報進度的子任務以 0 計入，整體比例不會因先完成的子任務而跳動。
+    多階段轉碼在分派第一階段時即列出所有階段的子任務。
+    """
+    try:
+        get_redis().set(plan_key(video_id), json.dumps(weights), ex=PROGRESS_TTL)
+    except redis.RedisError:
+        pass
+
+
+class ProgressReporter:
+    """
+    節流後發布子任務進度
+
+    取代每次更新都寫入 Celery result backend 的 update_state：
+    每個子任務最多每 interval 秒發布一次（結束時一定發布），
+    訊息送到 pub/sub 頻道並覆寫最新進度。進度僅供顯示與排程參考，
+    Redis 暫時無法連線時直接略過，不影響轉碼。
+
+    Usage:
+        reporter = ProgressReporter(video_id, "rendition:720p")
+        run_ffmpeg_with_progress(cmd, duration, on_progress=reporter)
+    """
+
+    def __init__(
+        self,
+        video_id: str,
+        step: str,
+        interval: float = PROGRESS_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.video_id = video_id
+        self.step = step
+        self.interval = interval
+        self._clock = clock
+        self._last_published: Optional[float] = None
+
+    def __call__(self, progress: Progress) -> None:
+        now = self._clock()
+        if (
+            not progress.done
+            and self._last_published is not None
+            and now - self._last_published < self.interval
+        ):
+            return
+        self._last_published = now
+
+        message = json.dumps({"video_id": self.video_id, "step": self.step, **progress._asdict()})
+        key = progress_key(self.video_id)
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.publish(progress_channel(self.video_id), message)
+            pipe.hset(key, self.step, message)
+            pipe.expire(key, PROGRESS_TTL)
+            # 超過 PROGRESS_TTL 的長轉碼仍需工作量計劃才能算出整體進度，隨進度一併延長
+            pipe.expire(plan_key(self.video_id), PROGRESS_TTL)
+            pipe.execute()
+        except redis.RedisError:
+            pass
@@ -0,0 +1,196 @@
+"""
+Transcode Scheduler
+video 佇列的轉碼排程：短片優先（含等待老化）與講師間公平分配
+"""
+import json
+import logging
+import os
+import time
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional
+
+from worker.checkpoint import get_redis
+
+logger = logging.getLogger(__name__)
+
+# 同時進行轉碼的影片數上限，其餘影片在排程佇列中等待
+SCHEDULER_SLOTS = int(os.getenv("VIDEO_SCHEDULER_SLOTS", "4"))
+
+# 老化速率：每等待 1 秒，排序上相當於影片縮短幾秒，避免長影片永遠等不到
+AGING_RATE = float(os.getenv("VIDEO_SCHEDULER_AGING_RATE", "1.0"))
+
+# 轉碼租約（秒）：worker 異常中止而未釋放的名額在租約到期後收回
+LEASE_SECONDS = int(os.getenv("VIDEO_SCHEDULER_LEASE", str(6 * 3600)))
+
+# 無法取得時長的影片以此長度排序
+DEFAULT_DURATION = 3600.0
+
+# 等待時間統計保留的最近筆數
+RECENT_WAITS = 1000
+
+# 後端 /health/metrics 讀取 pending、running 與 waits（app/services/transcode_status.py）
+PENDING_KEY = "video:scheduler:pending"
+RUNNING_KEY = "video:scheduler:running"
+RUNNING_OWNERS_KEY = "video:scheduler:running:owners"
+WAITS_KEY = "video:scheduler:waits"
+LOCK_KEY = "video:scheduler:lock"
+
+
+def job_key(video_id: str) -> str:
+    return f"video:scheduler:job:{video_id}"
+
+
+class Job(NamedTuple):
+    """等待轉碼的影片"""
+    video_id: str
+    owner_id: str
+    duration: float
+    enqueued_at: float
+    payload: dict
+
+    def priority(self, now: float, running_by_owner: Dict[str, int]) -> tuple:
+        """
+        排序鍵，越小越先執行
+
+        先比較講師目前進行中的轉碼數（公平分配），
+        再比較以等待時間老化後的影片長度（短片優先）。
+        """
+        return (
+            running_by_owner.get(self.owner_id, 0),
+            self.duration - AGING_RATE * (now - self.enqueued_at),
+        )
+
+
+def enqueue(video_id: str, owner_id: Optional[str], duration: Optional[float], payload: dict) -> bool:
+    """
+    將影片加入排程佇列
+
+    已在等待或轉碼中的影片不會重複加入（process_video 重試時）。
+
+    Args:
+        video_id: 影片 ID
+        owner_id: 上傳的講師 ID，未知時影片自成一組
+        duration: 影片時長（秒）
+        payload: 開始轉碼時傳給 start_transcode 的參數
+
+    Returns:
+        是否新加入佇列
+    """
+    client = get_redis()
+    # 重新加入會重設等待時間，已在佇列中或轉碼中時保留原紀錄
+    if (
+        client.zscore(PENDING_KEY, video_id) is not None
+        or client.zscore(RUNNING_KEY, video_id) is not None
+    ):
+        return False
+
+    now = time.time()
+    job = {
+        "owner_id": owner_id or f"video:{video_id}",
+        "duration": duration or DEFAULT_DURATION,
+        "enqueued_at": now,
+        "payload": json.dumps(payload),
+    }
+    pipe = client.pipeline()
+    pipe.hset(job_key(video_id), mapping=job)
+    pipe.zadd(PENDING_KEY, {video_id: now})
+    pipe.execute()
+    return True
+
+
+def _load_jobs(client, video_ids: List[str]) -> List[Job]:
+    pipe = client.pipeline()
+    for video_id in video_ids:
+        pipe.hgetall(job_key(video_id))
+    jobs = []
+    for video_id, data in zip(video_ids, pipe.execute(), strict=True):
+        if not data:
+            continue
+        data = {key.decode(): value.decode() for key, value in data.items()}
+        jobs.append(Job(
+            video_id=video_id,
+            owner_id=data["owner_id"],
+            duration=float(data["duration"]),
+            enqueued_at=float(data["enqueued_at"]),
+            payload=json.loads(data["payload"]),
+        ))
+    return jobs
+
+
+def claim_jobs(slots: int = SCHEDULER_SLOTS) -> List[Job]:
+    """
+    依優先序取出可開始轉碼的影片並占用名額
+
+    以 Redis 鎖序列化，多個 worker 同時呼叫時不會超出名額。
+
+    Returns:
+        取出的影片，呼叫端負責分派轉碼任務
+    """
+    client = get_redis()
+    with client.lock(LOCK_KEY, timeout=30, blocking_timeout=10):
+        now = time.time()
+        expired = client.zrangebyscore(RUNNING_KEY, "-inf", now - LEASE_SECONDS)
+        if expired:
+            logger.warning("Reclaiming %d expired transcode leases", len(expired))
+            for video_id in expired:
+                release(video_id.decode())
+
+        free = slots - client.zcard(RUNNING_KEY)
+        if free <= 0:
+            return []
+
+        pending = [video_id.decode() for video_id in client.zrange(PENDING_KEY, 0, -1)]
+        jobs = _load_jobs(client, pending)
+        running_by_owner = Counter(
+            owner.decode() for owner in client.hvals(RUNNING_OWNERS_KEY)
+        )
+
+        claimed = []
+        while jobs and len(claimed) < free:
+            job = min(jobs, key=lambda j: j.priority(now, running_by_owner))
+            jobs.remove(job)
+            running_by_owner[job.owner_id] += 1
+            wait = now - job.enqueued_at
+
+            pipe = client.pipeline()
+            pipe.zrem(PENDING_KEY, job.video_id)
+            pipe.delete(job_key(job.video_id))
+            pipe.zadd(RUNNING_KEY, {job.video_id: now})
+            pipe.hset(RUNNING_OWNERS_KEY, job.video_id, job.owner_id)
+            pipe.lpush(WAITS_KEY, f"{wait:.3f}")
+            pipe.ltrim(WAITS_KEY, 0, RECENT_WAITS - 1)
+            pipe.execute()
+
+            logger.info(
+                "Starting transcode video_id=%s owner=%s duration=%.0fs queue_wait=%.1fs",
+                job.video_id, job.owner_id, job.duration, wait,
+            )
+            claimed.append(job)
+        return claimed
+
+
+def release(video_id: str) -> None:
+    """轉碼結束（成功或失敗）後釋放名額"""
+    pipe = get_redis().pipeline()
+    pipe.zrem(RUNNING_KEY, video_id)
+    pipe.hdel(RUNNING_OWNERS_KEY, video_id)
+    pipe.execute()
+
+
+def requeue(job: Job) -> None:
+    """
+    無法分派 start_transcode 時釋放名額並放回佇列
+
+    保留原本的加入時間，等待老化與等待時間統計不因分派失敗而重設。
+    """
+    pipe = get_redis().pipeline()
+    pipe.zrem(RUNNING_KEY, job.video_id)
+    pipe.hdel(RUNNING_OWNERS_KEY, job.video_id)
+    pipe.hset(job_key(job.video_id), mapping={
+        "owner_id": job.owner_id,
+        "duration": job.duration,
+        "enqueued_at": job.enqueued_at,
+        "payload": json.dumps(job.payload),
+    })
+    pipe.zadd(PENDING_KEY, {job.video_id: job.enqueued_at})
+    pipe.execute()
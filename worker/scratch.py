@@ -0,0 +1,283 @@
+"""
+Scratch Disk
+worker 暫存空間管理：轉碼前預留磁碟空間、原始檔 LRU 快取與上傳後清理
+"""
+import contextlib
+import fcntl
+import json
+import os
+import re
+import shutil
+import socket
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+MB = 1024 * 1024
+
+# 暫存根目錄：原始檔快取與預留紀錄存放於此；同一主機的 worker 須共用，
+# 預留紀錄依磁碟分別計算，轉碼輸出可位於其他磁碟
+SCRATCH_DIR = os.getenv("VIDEO_SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "video-scratch"))
+
+# 保留給系統與其他程序的最低剩餘空間
+SCRATCH_MIN_FREE = int(os.getenv("VIDEO_SCRATCH_MIN_FREE_MB", "1024")) * MB
+
+# 原始檔快取上限，超過時淘汰最久未使用的原始檔
+SOURCE_CACHE_BYTES = int(os.getenv("VIDEO_SOURCE_CACHE_MB", "20480")) * MB
+
+# 空間不足時重新排入佇列的間隔（秒）
+SCRATCH_RETRY_DELAY = int(os.getenv("VIDEO_SCRATCH_RETRY_DELAY", "120"))
+
+# 預留紀錄的最長效期（秒），超過視為持有者已異常中止
+RESERVATION_TTL = int(os.getenv("VIDEO_SCRATCH_RESERVATION_TTL", str(6 * 3600)))
+
+# 估算輸出大小時的容器與播放清單額外開銷
+OUTPUT_OVERHEAD = 1.1
+
+# 共用音訊的位元率（與轉碼指令的 -b:a 一致）
+AUDIO_BITS_PER_SECOND = 128_000
+
+SOURCE_DIR_NAME = "sources"
+
+
+class ScratchFull(Exception):
+    """暫存空間不足，任務應稍後重新排入佇列"""
+
+    def __init__(self, needed: int, available: int):
+        self.needed = needed
+        self.available = available
+        super().__init__(
+            f"Scratch space exhausted: need {needed // MB} MB, {max(available, 0) // MB} MB available"
+        )
+
+
+class ScratchTooLarge(Exception):
+    """預留量超過磁碟容量扣除最低保留空間，等待其他任務釋放也無法滿足，不應重試"""
+
+    def __init__(self, needed: int, capacity: int):
+        self.needed = needed
+        self.capacity = capacity
+        super().__init__(
+            f"Scratch space too small: need {needed // MB} MB, disk holds at most {max(capacity, 0) // MB} MB"
+        )
+
+
+def parse_bitrate(value: str) -> int:
+    """將 FFmpeg 位元率字串（例如 "2500k"、"5M"）轉為 bits/s"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([kKmM]?)", value)
+    if match is None:
+        raise ValueError(f"Invalid bitrate '{value}'")
+    number, unit = match.groups()
+    return int(float(number) * {"": 1, "k": 1000, "m": 1_000_000}[unit.lower()])
+
+
+def estimate_hls_bytes(maxrates: List[str], duration: Optional[float], audio: bool = False) -> int:
+    """
+    依各畫質的 maxrate 估算 HLS 輸出的最大位元組數
+
+    Args:
+        maxrates: 各畫質的 maxrate
+        duration: 影片時長（秒），未知時返回 0
+        audio: 是否一併輸出共用音訊
+    """
+    if not duration:
+        return 0
+    bits_per_second = sum(parse_bitrate(rate) for rate in maxrates)
+    if audio:
+        bits_per_second += AUDIO_BITS_PER_SECOND
+    return int(bits_per_second * duration / 8 * OUTPUT_OVERHEAD)
+
+
+class ScratchSpace:
+    """
+    以檔案鎖協調同一主機上所有 worker 程序的暫存空間
+
+    預留紀錄存於 {root}/reservations.json，以 fcntl 鎖保護，每筆記錄寫入的磁碟。
+    可用空間 = 寫入磁碟的剩餘空間 - 最低保留空間 - 同一磁碟上其他任務尚未釋放的預留；
+    預留量不扣除任務已寫入的部分，估算偏保守，但不會超賣。
+    空間不足時，若快取原始檔位於同一磁碟，先淘汰最久未使用、且未被預留使用中的原始檔，
+    仍不足則拋出 ScratchFull，由任務重新排入佇列，不會在轉碼途中寫滿磁碟；
+    預留量超過整個磁碟容量扣除最低保留空間時拋出 ScratchTooLarge，任務直接失敗。
+    預留紀錄只存在於本機，由預留的任務在離開 reserve 區塊時釋放（包含拋出例外時）；
+    程序被強制中止（例如超過 time_limit）時，同一主機下一次存取紀錄即依 pid 清除。
+
+    Usage:
+        scratch = ScratchSpace()
+        with scratch.reserve(f"{video_id}:720p", estimate_hls_bytes(...), path=output_dir):
+            transcode_to_hls(...)
+    """
+
+    def __init__(
+        self,
+        root: str = SCRATCH_DIR,
+        min_free: int = SCRATCH_MIN_FREE,
+        cache_bytes: int = SOURCE_CACHE_BYTES,
+    ):
+        self.root = root
+        self.min_free = min_free
+        self.cache_bytes = cache_bytes
+        self.source_dir = os.path.join(root, SOURCE_DIR_NAME)
+        os.makedirs(self.source_dir, exist_ok=True)
+        self._ledger_path = os.path.join(root, "reservations.json")
+        self._lock_path = os.path.join(root, ".lock")
+
+    @contextlib.contextmanager
+    def _ledger(self) -> Iterator[Dict[str, dict]]:
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self._ledger_path) as f:
+                        ledger = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    ledger = {}
+                self._drop_stale(ledger)
+                yield ledger
+                with open(f"{self._ledger_path}.tmp", "w") as f:
+                    json.dump(ledger, f)
+                os.replace(f"{self._ledger_path}.tmp", self._ledger_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _drop_stale(ledger: Dict[str, dict]) -> None:
+        now = time.time()
+        hostname = socket.gethostname()
+        for name, entry in list(ledger.items()):
+            if now - entry["created"] > RESERVATION_TTL or (
+                entry["host"] == hostname and not _pid_alive(entry["pid"])
+            ):
+                del ledger[name]
+
+    def _available(self, ledger: Dict[str, dict], path: str, device: int) -> int:
+        # 舊版紀錄沒有 device，視為位於暫存根目錄的磁碟
+        root_device = os.stat(self.root).st_dev
+        outstanding = sum(
+            entry["bytes"] for entry in ledger.values()
+            if entry.get("device", root_device) == device
+        )
+        return shutil.disk_usage(path).free - self.min_free - outstanding
+
+    @contextlib.contextmanager
+    def reserve(
+        self,
+        name: str,
+        size: int,
+        sources: Optional[List[str]] = None,
+        path: Optional[str] = None,
+    ) -> Iterator[None]:
+        """
+        預留暫存空間，離開區塊時釋放
+
+        Args:
+            name: 預留名稱（同名預留會被取代，任務重試時不會重複計算）
+            size: 預留的位元組數
+            sources: 任務使用中的快取原始檔，預留期間不會被淘汰
+            path: 寫入的目錄（可尚未建立），預設為暫存根目錄
+
+        Raises:
+            ScratchTooLarge: 磁碟容量扣除最低保留空間後仍小於預留量
+            ScratchFull: 淘汰快取後仍無足夠空間
+        """
+        path = _existing_ancestor(path or self.root)
+        device = os.stat(path).st_dev
+        capacity = shutil.disk_usage(path).total - self.min_free
+        if size > capacity:
+            raise ScratchTooLarge(size, capacity)
+        with self._ledger() as ledger:
+            ledger.pop(name, None)
+            available = self._available(ledger, path, device)
+            if size > available and device == os.stat(self.source_dir).st_dev:
+                available += self._evict(size - available, ledger, keep=set(sources or []))
+            if size > available:
+                raise ScratchFull(size, available)
+            ledger[name] = {
+                "bytes": size,
+                "device": device,
+                "sources": sources or [],
+                "created": time.time(),
+                "host": socket.gethostname(),
+                "pid": os.getpid(),
+            }
+        try:
+            yield
+        finally:
+            with self._ledger() as ledger:
+                ledger.pop(name, None)
+
+    def source(self, video_id: str, key: str, size: int, fetch: Callable[[str, str], None]) -> str:
+        """
+        取得原始檔的本機路徑，快取未命中時預留空間後下載
+
+        Args:
+            video_id: 影片 ID
+            key: 原始檔物件鍵
+            size: 原始檔位元組數
+            fetch: 下載函數 fetch(key, local_path)
+
+        Returns:
+            快取中的原始檔路徑
+
+        Raises:
+            ScratchTooLarge: 原始檔大於磁碟可用的容量
+            ScratchFull: 無足夠空間下載原始檔
+        """
+        path = os.path.join(self.source_dir, video_id, os.path.basename(key))
+        if os.path.exists(path):
+            # 以修改時間作為最近使用時間
+            os.utime(path)
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.reserve(f"{video_id}:source", size, sources=[path]):
+            partial = f"{path}.part"
+            fetch(key, partial)
+            os.replace(partial, path)
+
+        with self._ledger() as ledger:
+            over = self._cached_bytes() - self.cache_bytes
+            if over > 0:
+                self._evict(over, ledger, keep={path})
+        return path
+
+    def _cached_sources(self) -> List[str]:
+        paths = []
+        for root, _, files in os.walk(self.source_dir):
+            paths += [os.path.join(root, name) for name in files if not name.endswith(".part")]
+        return sorted(paths, key=os.path.getmtime)
+
+    def _cached_bytes(self) -> int:
+        return sum(os.path.getsize(path) for path in self._cached_sources())
+
+    def _evict(self, needed: int, ledger: Dict[str, dict], keep: set) -> int:
+        """依最久未使用順序刪除快取原始檔，返回釋放的位元組數"""
+        in_use = keep | {path for entry in ledger.values() for path in entry["sources"]}
+        freed = 0
+        for path in self._cached_sources():
+            if freed >= needed:
+                break
+            if path in in_use:
+                continue
+            freed += os.path.getsize(path)
+            os.remove(path)
+            with contextlib.suppress(OSError):
+                os.rmdir(os.path.dirname(path))
+        return freed
+
+
+def _existing_ancestor(path: str) -> str:
+    """path 本身或最近的已存在上層目錄"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
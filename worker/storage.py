@@ -0,0 +1,355 @@
+"""
+Object Storage
+MinIO / S3 物件儲存客戶端與 HLS 串流上傳
+"""
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+import boto3
+from botocore.config import Config
+
+from worker.media.playlist import live_playlist
+
+logger = logging.getLogger(__name__)
+
+# 從環境變數取得 MinIO 設定
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
+MINIO_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "learning-platform")
+MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() == "true"
+
+# 轉碼輸出是否上傳至物件儲存
+UPLOAD_ENABLED = os.getenv("VIDEO_UPLOAD_TO_STORAGE", "true").lower() == "true"
+
+# 每個轉碼任務的上傳執行緒數
+UPLOAD_WORKERS = int(os.getenv("VIDEO_UPLOAD_WORKERS", "4"))
+
+CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".jpg": "image/jpeg",
+    ".vtt": "text/vtt",
+}
+
+
+@lru_cache
+def get_s3_client():
+    """取得共用的 S3 客戶端（boto3 client 可跨執行緒共用）"""
+    scheme = "https" if MINIO_SECURE else "http"
+    return boto3.client(
+        "s3",
+        endpoint_url=f"{scheme}://{MINIO_ENDPOINT}",
+        aws_access_key_id=MINIO_ACCESS_KEY,
+        aws_secret_access_key=MINIO_SECRET_KEY,
+        config=Config(
+            signature_version="s3v4",
+            max_pool_connections=UPLOAD_WORKERS * 2,
+            retries={"max_attempts": 5, "mode": "standard"},
+        ),
+    )
+
+
+def upload_file(local_path: str, key: str, cache_control: Optional[str] = None) -> None:
+    """上傳單一檔案並設定 Content-Type（與 Cache-Control）"""
+    extension = os.path.splitext(local_path)[1]
+    extra_args = {"ContentType": CONTENT_TYPES.get(extension, "application/octet-stream")}
+    if cache_control:
+        extra_args["CacheControl"] = cache_control
+    get_s3_client().upload_file(local_path, MINIO_BUCKET_NAME, key, ExtraArgs=extra_args)
+
+
+def upload_bytes(data: bytes, key: str, cache_control: Optional[str] = None) -> None:
+    """上傳記憶體中的內容，Content-Type 依物件鍵的副檔名"""
+    extension = os.path.splitext(key)[1]
+    extra_args = {"ContentType": CONTENT_TYPES.get(extension, "application/octet-stream")}
+    if cache_control:
+        extra_args["CacheControl"] = cache_control
+    get_s3_client().put_object(Bucket=MINIO_BUCKET_NAME, Key=key, Body=data, **extra_args)
+
+
+def download_file(key: str, local_path: str) -> None:
+    """下載單一物件至本機路徑"""
+    get_s3_client().download_file(MINIO_BUCKET_NAME, key, local_path)
+
+
+def object_size(key: str) -> int:
+    """物件的位元組數"""
+    return get_s3_client().head_object(Bucket=MINIO_BUCKET_NAME, Key=key)["ContentLength"]
+
+
+def delete_prefix(prefix: str) -> int:
+    """
+    刪除前綴下的所有物件
+
+    Returns:
+        刪除的物件數
+    """
+    deleted = 0
+    # 每頁最多 1000 個物件，正好是 delete_objects 的上限
+    for page in iter_object_pages(prefix):
+        keys = [item["Key"] for item in page]
+        deleted += len(keys) - len(delete_objects(keys))
+    return deleted
+
+
+def _throttled(throttle: Optional[Callable[[], None]]) -> None:
+    if throttle is not None:
+        throttle()
+
+
+def iter_object_pages(
+    prefix: str, throttle: Optional[Callable[[], None]] = None
+) -> Iterator[List[dict]]:
+    """
+    逐頁列出前綴下的物件（每頁最多 1000 個，含 Key、Size、LastModified）
+
+    Args:
+        throttle: 每次請求前呼叫（速率限制）
+    """
+    client = get_s3_client()
+    params = {"Bucket": MINIO_BUCKET_NAME, "Prefix": prefix}
+    while True:
+        _throttled(throttle)
+        response = client.list_objects_v2(**params)
+        yield response.get("Contents", [])
+        if not response.get("IsTruncated"):
+            return
+        params["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def iter_child_prefixes(
+    prefix: str, throttle: Optional[Callable[[], None]] = None
+) -> Iterator[str]:
+    """前綴下一層的名稱（例如 uploads/ 下的影片 ID），不列出其中的物件"""
+    client = get_s3_client()
+    params = {"Bucket": MINIO_BUCKET_NAME, "Prefix": prefix, "Delimiter": "/"}
+    while True:
+        _throttled(throttle)
+        response = client.list_objects_v2(**params)
+        for common in response.get("CommonPrefixes", []):
+            yield common["Prefix"][len(prefix):].rstrip("/")
+        if not response.get("IsTruncated"):
+            return
+        params["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def delete_objects(keys: List[str]) -> List[str]:
+    """
+    以單次 multi-object delete 刪除最多 1000 個物件
+
+    Returns:
+        刪除失敗的物件鍵
+    """
+    if not keys:
+        return []
+    response = get_s3_client().delete_objects(
+        Bucket=MINIO_BUCKET_NAME,
+        Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+    )
+    return [error["Key"] for error in response.get("Errors", [])]
+
+
+def iter_multipart_uploads(
+    prefix: str, throttle: Optional[Callable[[], None]] = None
+) -> Iterator[dict]:
+    """前綴下尚未完成的分段上傳（含 Key、UploadId、Initiated）"""
+    client = get_s3_client()
+    params = {"Bucket": MINIO_BUCKET_NAME, "Prefix": prefix}
+    while True:
+        _throttled(throttle)
+        response = client.list_multipart_uploads(**params)
+        yield from response.get("Uploads", [])
+        if not response.get("IsTruncated"):
+            return
+        params["KeyMarker"] = response["NextKeyMarker"]
+        params["UploadIdMarker"] = response["NextUploadIdMarker"]
+
+
+def abort_multipart_upload(key: str, upload_id: str) -> None:
+    """放棄分段上傳並釋放已上傳的分段"""
+    get_s3_client().abort_multipart_upload(Bucket=MINIO_BUCKET_NAME, Key=key, UploadId=upload_id)
+
+
+def hls_key_prefix(video_id: str) -> str:
+    """HLS 輸出的物件鍵前綴"""
+    return f"transcoded/{video_id}"
+
+
+class HLSUploader:
+    """
+    在 FFmpeg 轉碼期間監看輸出目錄，將完成的片段上傳至物件儲存
+
+    FFmpeg 需搭配 `-hls_flags temp_file`：片段寫完才會從 .tmp 改名，
+    因此目錄中出現的片段檔一定是完整的。片段經由有上限的執行緒池上傳，
+    上傳後即刪除本機檔案；播放清單則在所有片段上傳完成後才發布，
+    讀取端不會看到指向尚未存在片段的播放清單。
+    單檔 fMP4 輸出無法邊寫邊傳，於轉碼結束後、播放清單發布前上傳。
+    多個任務共用同一目錄時（例如分段轉碼），以 name_prefix 只處理自己的檔案。
+
+    live_playlists 時（搭配 `-hls_playlist_type event`）在轉碼途中也發布播放清單快照：
+    快照只在其列出的片段都已上傳後才上傳，並於每次發布後呼叫 on_playlist。
+
+    Usage:
+        with HLSUploader(output_dir, hls_key_prefix(video_id)) as uploader:
+            run_ffmpeg(...)
+        uploader.sizes  # 各片段的位元組數
+    """
+
+    SEGMENT_EXTENSIONS = (".ts", ".m4s")
+    # 單檔 fMP4 直到轉碼結束前都在寫入，只能在 finish 時上傳
+    SINGLE_FILE_EXTENSIONS = (".mp4",)
+    PLAYLIST_EXTENSION = ".m3u8"
+
+    def __init__(
+        self,
+        local_dir: str,
+        key_prefix: str,
+        max_workers: int = UPLOAD_WORKERS,
+        poll_interval: float = 0.5,
+        publish_playlists: bool = True,
+        delete_segments: bool = True,
+        name_prefix: str = "",
+        on_segment: Optional[Callable[[str], None]] = None,
+        live_playlists: bool = False,
+        on_playlist: Optional[Callable[[str], None]] = None,
+    ):
+        self.local_dir = local_dir
+        self.key_prefix = key_prefix
+        self.poll_interval = poll_interval
+        self.publish_playlists = publish_playlists
+        self.delete_segments = delete_segments
+        self.on_segment = on_segment
+        self.name_prefix = name_prefix
+        self.live_playlists = live_playlists
+        self.on_playlist = on_playlist
+        self.sizes: Dict[str, int] = {}
+        self._uploaded: Set[str] = set()
+        # 已發布的播放清單快照內容
+        self._snapshots: Dict[str, str] = {}
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hls-upload")
+        # 限制尚未完成的上傳數量，避免轉碼速度遠快於上傳時佇列無限成長
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+        self._futures: List[Future] = []
+        self._stop = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+
+    def __enter__(self) -> "HLSUploader":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.finish()
+        else:
+            self.abort()
+
+    def key_for(self, local_path: str) -> str:
+        """本機路徑對應的物件鍵"""
+        relative = os.path.relpath(local_path, self.local_dir).replace(os.sep, "/")
+        return f"{self.key_prefix}/{relative}"
+
+    def start(self) -> None:
+        """開始監看輸出目錄"""
+        self._watcher.start()
+
+    def finish(self) -> Dict[str, int]:
+        """
+        等待所有片段上傳完成後發布播放清單
+
+        Returns:
+            本機片段路徑對應的位元組數
+        """
+        self._stop.set()
+        self._watcher.join()
+        try:
+            self._scan()
+            for path in self._list_files(*self.SINGLE_FILE_EXTENSIONS):
+                self._submit(path)
+            for future in self._futures:
+                future.result()
+
+            if self.publish_playlists:
+                for path in self._list_files(self.PLAYLIST_EXTENSION):
+                    upload_file(path, self.key_for(path))
+        finally:
+            self._executor.shutdown(wait=True)
+        return self.sizes
+
+    def abort(self) -> None:
+        """停止監看並取消尚未開始的上傳"""
+        self._stop.set()
+        self._watcher.join()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._scan()
+            except Exception:
+                # 監看執行緒若因此結束，片段會累積到 finish 才上傳；下一輪重新掃描，
+                # 持續的錯誤會在 finish 的最後一次掃描拋給呼叫端
+                logger.warning("Failed to scan HLS output", exc_info=True)
+            if self.live_playlists:
+                try:
+                    self._publish_snapshots()
+                except Exception:
+                    # 快照只是提早發布，失敗時仍會在 finish 發布完整的播放清單
+                    logger.warning("Failed to publish playlist snapshot", exc_info=True)
+
+    def _scan(self) -> None:
+        for path in self._list_files(*self.SEGMENT_EXTENSIONS):
+            if path not in self.sizes:
+                self._submit(path)
+
+    def _publish_snapshots(self) -> None:
+        # FFmpeg 以 temp_file 改名寫入播放清單，讀到的內容一定完整
+        for path in self._list_files(self.PLAYLIST_EXTENSION):
+            with open(path) as f:
+                content = f.read()
+            if content == self._snapshots.get(path):
+                continue
+            directory = os.path.dirname(path)
+            uris = [
+                line.strip() for line in content.splitlines()
+                if line.strip() and not line.startswith("#")
+            ]
+            if not uris or any(os.path.join(directory, uri) not in self._uploaded for uri in uris):
+                continue
+            upload_bytes(live_playlist(content).encode(), self.key_for(path), cache_control="no-cache")
+            self._snapshots[path] = content
+            if self.on_playlist:
+                self.on_playlist(path)
+
+    def _submit(self, path: str) -> None:
+        self.sizes[path] = os.path.getsize(path)
+        self._slots.acquire()
+        self._futures.append(self._executor.submit(self._upload_segment, path))
+
+    def _list_files(self, *extensions: str) -> List[str]:
+        paths = []
+        for root, _, files in os.walk(self.local_dir):
+            paths += [
+                os.path.join(root, name)
+                for name in sorted(files)
+                if name.startswith(self.name_prefix) and name.endswith(extensions)
+            ]
+        return paths
+
+    def _upload_segment(self, path: str) -> None:
+        try:
+            upload_file(path, self.key_for(path))
+            if self.on_segment:
+                self.on_segment(path)
+            self._uploaded.add(path)
+            if self.delete_segments:
+                os.remove(path)
+        finally:
+            self._slots.release()
@@ -0,0 +1,260 @@
+"""
+Storage Garbage Collection Tasks
+物件儲存回收：刪除已無引用的原始檔與轉碼輸出，並放棄逾期的分段上傳
+"""
+import logging
+import os
+import time
+import uuid
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+from typing import Callable, Iterator, List, Set
+
+from redis.exceptions import LockError
+
+from worker.backend_api import post_webhook
+from worker.celery_app import celery_app
+from worker.checkpoint import get_redis
+from worker.storage import (
+    abort_multipart_upload,
+    delete_objects,
+    iter_child_prefixes,
+    iter_multipart_uploads,
+    iter_object_pages,
+)
+
+logger = logging.getLogger(__name__)
+
+# 物件儲存請求速率上限（列出、刪除、放棄上傳合計，每秒）
+GC_REQUESTS_PER_SECOND = float(os.getenv("STORAGE_GC_REQUESTS_PER_SECOND", "10"))
+
+# 單次執行最多刪除的物件數，其餘留待下次執行
+GC_MAX_DELETES = int(os.getenv("STORAGE_GC_MAX_DELETES", "100000"))
+
+# 物件最後修改後至少經過多久才會回收，避免與進行中的寫入競爭
+GC_MIN_AGE = int(os.getenv("STORAGE_GC_MIN_AGE", "3600"))
+
+# 分段上傳開始後超過多久視為放棄
+GC_MULTIPART_MAX_AGE = int(os.getenv("STORAGE_GC_MULTIPART_MAX_AGE", str(24 * 3600)))
+
+# multi-object delete 與引用檢查每批的上限
+DELETE_BATCH_SIZE = 1000
+
+# 原始檔前綴；轉碼輸出與縮圖以負責轉碼的影片 ID 命名
+SOURCE_PREFIX = "uploads/"
+OUTPUT_PREFIXES = ("transcoded/", "thumbnails/")
+
+GC_LOCK_KEY = "storage:gc:lock"
+
+
+class RateLimiter:
+    """
+    以固定間隔限制每秒請求數
+
+    Usage:
+        limiter = RateLimiter(10)
+        limiter.wait()  # 每次請求前呼叫
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._next = 0.0
+
+    def wait(self) -> None:
+        now = self._clock()
+        if now < self._next:
+            self._sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+class BatchDeleter:
+    """
+    累積待刪除的物件鍵，每 1000 個以一次 multi-object delete 送出
+
+    多個小前綴（例如只有一個原始檔的上傳目錄）共用同一次刪除請求。
+    dry_run 時只計數不刪除。
+    """
+
+    def __init__(self, limiter: RateLimiter, max_deletes: int, dry_run: bool = False):
+        self.limiter = limiter
+        self.max_deletes = max_deletes
+        self.dry_run = dry_run
+        self.deleted = 0
+        self.bytes = 0
+        self.errors = 0
+        self._pending: List[dict] = []
+
+    @property
+    def exhausted(self) -> bool:
+        """已達單次執行的刪除上限"""
+        return self.deleted + len(self._pending) >= self.max_deletes
+
+    def add(self, item: dict) -> None:
+        self._pending.append(item)
+        if len(self._pending) >= DELETE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        failed: Set[str] = set()
+        if not self.dry_run:
+            self.limiter.wait()
+            failed = set(delete_objects([item["Key"] for item in batch]))
+        for item in batch:
+            if item["Key"] in failed:
+                self.errors += 1
+            else:
+                self.deleted += 1
+                self.bytes += item.get("Size", 0)
+        if failed:
+            logger.warning("Failed to delete %d objects, e.g. %s", len(failed), next(iter(failed)))
+
+
+def storage_ids(prefix: str, limiter: RateLimiter) -> Iterator[List[str]]:
+    """前綴下一層的 UUID 名稱，每 1000 個一批；非 UUID 的名稱不處理"""
+    batch: List[str] = []
+    for name in iter_child_prefixes(prefix, throttle=limiter.wait):
+        try:
+            uuid.UUID(name)
+        except ValueError:
+            continue
+        batch.append(name)
+        if len(batch) >= DELETE_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def retained_ids(kind: str, storage_ids: List[str], reconcile: bool = False) -> Set[str]:
+    """
+    呼叫後端 /videos/webhook/storage-references，返回仍需保留的 ID
+
+    Args:
+        kind: sources（原始檔）或 outputs（轉碼輸出）
+        storage_ids: 待確認的 ID（最多 1000 個）
+        reconcile: 後端一併刪除已無影片指向的產出紀錄（dry_run 時不刪除）
+    """
+    response = post_webhook(
+        "/videos/webhook/storage-references",
+        json={kind: storage_ids, "reconcile": reconcile},
+        timeout=30,
+    )
+    return set(response.json()[kind])
+
+
+def delete_orphans(
+    prefixes: tuple,
+    kind: str,
+    deleter: BatchDeleter,
+    limiter: RateLimiter,
+    cutoff: datetime,
+) -> int:
+    """
+    刪除前綴下已無引用的 ID 目錄中、早於 cutoff 的物件
+
+    Args:
+        prefixes: 以相同 ID 命名的前綴（例如 transcoded/ 與 thumbnails/）
+        kind: 引用檢查的類別（sources 或 outputs）
+
+    Returns:
+        已無引用的 ID 目錄數
+    """
+    orphaned = 0
+    for prefix in prefixes:
+        for batch in storage_ids(prefix, limiter):
+            retained = retained_ids(kind, batch, reconcile=not deleter.dry_run)
+            for storage_id in batch:
+                if storage_id in retained:
+                    continue
+                orphaned += 1
+                for page in iter_object_pages(f"{prefix}{storage_id}/", throttle=limiter.wait):
+                    for item in page:
+                        if item["LastModified"] < cutoff:
+                            deleter.add(item)
+                if deleter.exhausted:
+                    return orphaned
+    return orphaned
+
+
+def abort_stale_uploads(limiter: RateLimiter, cutoff: datetime, dry_run: bool) -> int:
+    """放棄 cutoff 之前開始、仍未完成的原始檔分段上傳"""
+    aborted = 0
+    for upload in iter_multipart_uploads(SOURCE_PREFIX, throttle=limiter.wait):
+        if upload["Initiated"] >= cutoff:
+            continue
+        if not dry_run:
+            limiter.wait()
+            abort_multipart_upload(upload["Key"], upload["UploadId"])
+        aborted += 1
+    return aborted
+
+
+@celery_app.task(bind=True, max_retries=3)
+def collect_storage_garbage(self, dry_run: bool = False) -> dict:
+    """
+    回收物件儲存空間
+
+    由 Celery beat 定期執行（STORAGE_GC_INTERVAL），同一時間只有一個執行：
+    1. 放棄開始超過 STORAGE_GC_MULTIPART_MAX_AGE 仍未完成的分段上傳
+    2. 刪除後端回報可刪除的原始檔（影片已刪除，或完成後已超過保留期）
+    3. 刪除已無影片或產出紀錄引用的轉碼輸出與縮圖（刪除影片或課程後遺留的 HLS 物件）
+
+    引用由後端依資料庫判斷，worker 只列出 ID 目錄並分批詢問；
+    刪除以每批 1000 個物件的 multi-object delete 送出，所有請求受
+    STORAGE_GC_REQUESTS_PER_SECOND 限制，單次最多刪除 STORAGE_GC_MAX_DELETES 個物件。
+    最後修改未滿 STORAGE_GC_MIN_AGE 的物件不刪除。
+
+    Args:
+        dry_run: 只統計，不刪除
+
+    Returns:
+        回收統計
+    """
+    lock = get_redis().lock(GC_LOCK_KEY, timeout=6 * 3600)
+    if not lock.acquire(blocking=False):
+        return {"status": "skipped"}
+
+    try:
+        now = datetime.now(UTC)
+        limiter = RateLimiter(GC_REQUESTS_PER_SECOND)
+        deleter = BatchDeleter(limiter, GC_MAX_DELETES, dry_run=dry_run)
+        cutoff = now - timedelta(seconds=GC_MIN_AGE)
+
+        aborted = abort_stale_uploads(
+            limiter, now - timedelta(seconds=GC_MULTIPART_MAX_AGE), dry_run
+        )
+        sources = delete_orphans((SOURCE_PREFIX,), "sources", deleter, limiter, cutoff)
+        outputs = 0
+        if not deleter.exhausted:
+            outputs = delete_orphans(OUTPUT_PREFIXES, "outputs", deleter, limiter, cutoff)
+        deleter.flush()
+
+        result = {
+            "status": "dry_run" if dry_run else "completed",
+            "multipart_aborted": aborted,
+            "orphaned_sources": sources,
+            "orphaned_outputs": outputs,
+            "objects_deleted": deleter.deleted,
+            "bytes_deleted": deleter.bytes,
+            "delete_errors": deleter.errors,
+        }
+        logger.info("Storage GC: %s", result)
+        return result
+
+    except Exception as exc:
+        self.retry(exc=exc, countdown=300)
+    finally:
+        # 執行超過鎖的效期時鎖已過期（可能已被下一次執行取得），不再釋放
+        with suppress(LockError):
+            lock.release()
@@ -2,124 +2,1572 @@
 Video Processing Tasks
 影片處理背景任務
 """
+import contextlib
+import csv
+import hashlib
+import logging
 import os
+import shutil
 import subprocess
-from typing import Optional
-from celery import shared_task
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Collection, List, Optional
 
+from celery import chord, group
+
+from worker import scheduler
+from worker.backend_api import post_webhook
 from worker.celery_app import celery_app
+from worker.checkpoint import (
+    CHECKPOINT_TTL,
+    clear_checkpoints,
+    get_redis,
+    load_checkpoint,
+    load_checkpoints,
+    save_checkpoint,
+)
+from worker.media.ladder import Rendition, plan_ladder
+from worker.media.playlist import (
+    AUDIO_NAME,
+    SegmentStats,
+    generate_master_playlist,
+    read_media_playlist,
+    write_media_playlist,
+)
+from worker.media.probe import has_audio_stream, probe_duration, probe_source
+from worker.media.storyboard import (
+    PREVIEW_DIR_NAME,
+    POSTER_NAME,
+    STORYBOARD_NAME,
+    PreviewSpec,
+    preview_spec,
+    storyboard_layout,
+    write_storyboard,
+)
+from worker.progress import Progress, ProgressParser, ProgressReporter, publish_plan
+from worker.scratch import (
+    SCRATCH_RETRY_DELAY,
+    ScratchFull,
+    ScratchSpace,
+    ScratchTooLarge,
+    estimate_hls_bytes,
+    parse_bitrate,
+)
+from worker.storage import (
+    UPLOAD_ENABLED,
+    HLSUploader,
+    delete_prefix,
+    download_file,
+    hls_key_prefix,
+    object_size,
+    upload_file,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SharedOutputMissing(Exception):
+    """切段轉碼找不到其他 worker 寫入 output_dir 的檔案：output_dir 未共用，重試無效"""
+
+
+class TranscodeAborted(Exception):
+    """同一轉碼的其他子任務已失敗，共用輸出目錄即將清理，不再繼續"""
+
+
+# HLS 片段長度（秒）
+HLS_SEGMENT_SECONDS = 10
+
+# 超過此長度（秒）的影片改為切段後由多個 worker 平行轉碼
+CHUNKED_MIN_DURATION = int(os.getenv("VIDEO_CHUNKED_MIN_DURATION", "1200"))
+
+# 所有 video worker 是否共用 output_dir 所在的檔案系統（同一主機的具名 volume、NFS 等）。
+# 切段的分割、各分段轉碼與串接由不同 worker 執行，彼此透過 output_dir 交換檔案；
+# 未共用時長影片改以單一任務轉碼
+SHARED_OUTPUT_DIR = os.getenv("VIDEO_SHARED_OUTPUT_DIR", "false").lower() == "true"
+
+# 平行轉碼的分段長度（秒），應為 HLS_SEGMENT_SECONDS 的倍數
+CHUNK_SECONDS = int(os.getenv("VIDEO_CHUNK_SECONDS", "120"))
+
+# 分段原始檔的暫存子目錄
+CHUNK_DIR_NAME = "_chunks"
+
+# 切段轉碼失敗後，每隔此秒數檢查寫入共用輸出目錄的子任務是否都已結束，結束後才清理；
+# 超過任務時限仍在執行的子任務已被終止，不再等待
+OUTPUT_CLEANUP_DELAY = 60
+OUTPUT_CLEANUP_MAX_RETRIES = celery_app.conf.task_time_limit // OUTPUT_CLEANUP_DELAY + 1
+
+# 畫質轉碼模式：single_pass 單一任務單次解碼所有畫質（預設）；parallel 每個畫質一個任務
+RENDITION_MODE = os.getenv("VIDEO_RENDITION_MODE", "single_pass")
+
+# HLS 輸出格式：ts 每個片段一個 MPEG-TS 檔；fmp4 每個畫質一個 fMP4 檔並以 EXT-X-BYTERANGE 定位片段
+HLS_FORMAT = os.getenv("VIDEO_HLS_FORMAT", "ts")
+
+# 已發布畫質的檢查點名稱前綴
+PUBLISHED_STEP_PREFIX = "published:"
+
+# 主播放列表會在較高畫質完成後改寫，不可被快取
+MASTER_CACHE_CONTROL = "no-cache"
+
+# 共用音訊的位元率（所有畫質引用同一份音訊）
+AUDIO_BITRATE = "128k"
+
+# 是否在主播放列表列出純音訊變體，供極低頻寬的使用者只聽講課內容
+AUDIO_ONLY_VARIANT = os.getenv("VIDEO_AUDIO_ONLY_VARIANT", "false").lower() == "true"
 
 
 @celery_app.task(bind=True, max_retries=3)
-def process_video(self, video_id: str, input_path: str, output_dir: str) -> dict:
+def process_video(
+    self,
+    video_id: str,
+    input_path: str,
+    output_dir: str,
+    owner_id: Optional[str] = None,
+) -> dict:
     """
     處理上傳的影片：轉碼為 HLS 格式
 
+    依 ffprobe 結果規劃畫質階梯（不放大）後加入轉碼排程：
+    同時轉碼的影片數以 VIDEO_SCHEDULER_SLOTS 為上限，
+    其餘依講師進行中的轉碼數與影片長度（短片優先、等待越久越優先）排序。
+    輪到時由 start_transcode 以 Celery chord 分派子任務：預設由單一任務單次解碼轉出所有畫質
+    （最低畫質在轉碼途中即發布），完成後由 finalize_video 生成主播放列表並呼叫轉碼完成 Webhook。
+    VIDEO_RENDITION_MODE=parallel 時各畫質改為平行執行的獨立任務，
+    各自解碼一次，換取多台 worker 同時處理單一影片。
+    VIDEO_SHARED_OUTPUT_DIR=true（所有 worker 共用 output_dir 所在的檔案系統）時，
+    長度超過 CHUNKED_MIN_DURATION 的影片會在關鍵幀處切段平行轉碼（分段只含視訊），
+    再由 stitch_chunks 串接播放清單；共用音訊由 transcode_audio 自完整原始檔編碼一次。
+    分段與分段播放清單經 output_dir 在 worker 間交換，找不到時直接失敗，不重試。
+    啟用物件儲存時，各任務在轉碼期間即將完成的片段上傳至 transcoded/{video_id}/。
+    每個子任務（縮圖、畫質、分段）完成後都會記錄檢查點，
+    任務重試或重新分派時只會重做尚未完成的部分。
+    轉碼前先向後端登記原始檔的 SHA-256，相同內容已有（或正在產生）轉碼產出時
+    直接沿用，不再轉碼。
+    封面、拼貼預覽圖與 WebVTT storyboard 在轉碼的同一次解碼中輸出
+    （分畫質模式由最低畫質任務負責），不另外解碼擷取縮圖。
+    各轉碼子任務的進度（完成比例、編碼速度、預估剩餘時間）節流後發布至
+    Redis 頻道 video:{video_id}:progress，不寫入 Celery result backend。
+
+    原始檔與輸出使用 worker 的暫存空間：開始前預留估算的磁碟空間，
+    空間暫時被其他任務占用時延後重新排入佇列，不會在轉碼途中寫滿磁碟；
+    超過整個暫存磁碟容量時直接失敗，不重試；
+    輸出上傳完成後即刪除本機檔案。
+
     Args:
         video_id: 影片 ID
-        input_path: 原始影片路徑
+        input_path: 原始影片的本機路徑或物件鍵（物件鍵會下載至原始檔快取）
         output_dir: 輸出目錄
+        owner_id: 上傳的講師 ID（排程公平分配）
 
     Returns:
-        處理結果字典
+        排程結果字典
     """
     try:
         # 更新任務狀態
         self.update_state(state="PROCESSING", meta={"video_id": video_id, "progress": 0})
 
+        source_path = local_source(video_id, input_path)
+
+        # 相同內容已轉碼過時由後端直接指向既有產出
+        registration = register_source(video_id, source_hash(video_id, source_path))
+        if not registration["transcode"]:
+            clear_checkpoints(video_id)
+            return {
+                "status": "deduplicated",
+                "video_id": video_id,
+                "video_status": registration["status"],
+            }
+
         # 建立輸出目錄
         os.makedirs(output_dir, exist_ok=True)
 
-        # 生成縮圖
-        thumbnail_path = os.path.join(output_dir, "thumbnail.jpg")
-        generate_thumbnail(input_path, thumbnail_path)
-        self.update_state(state="PROCESSING", meta={"video_id": video_id, "progress": 20})
+        source = probe_source(source_path)
+        ladder = [rendition._asdict() for rendition in plan_ladder(source)]
+
+        scheduler.enqueue(
+            video_id,
+            owner_id,
+            source.duration,
+            {
+                "input_path": input_path,
+                "output_dir": output_dir,
+                "ladder": ladder,
+                "duration": source.duration,
+            },
+        )
+        dispatch_transcodes()
+
+        return {"status": "queued", "video_id": video_id, "duration": source.duration}
+
+    except ScratchTooLarge as exc:
+        # 原始檔大於暫存磁碟，重試也無法下載
+        notify_transcode_webhook(video_id, "failed", error_message=str(exc))
+        raise
+    except ScratchFull as exc:
+        self.retry(exc=exc, countdown=SCRATCH_RETRY_DELAY, max_retries=None)
+    except Exception as exc:
+        self.retry(exc=exc, countdown=60)
+
 
-        # 轉碼為 HLS 720p
-        hls_720p_dir = os.path.join(output_dir, "720p")
-        transcode_to_hls(input_path, hls_720p_dir, "1280x720", "2500k")
-        self.update_state(state="PROCESSING", meta={"video_id": video_id, "progress": 60})
+def dispatch_transcodes() -> None:
+    """
+    取出排程中可開始的影片並分派 start_transcode
+
+    送出任務失敗（例如 broker 暫時無法連線）時將影片放回佇列，
+    由下一次分派（其他轉碼結束或定期的 dispatch_pending_transcodes）接手。
+    """
+    for job in scheduler.claim_jobs():
+        try:
+            start_transcode.delay(
+                job.video_id, queue_wait=time.time() - job.enqueued_at, **job.payload
+            )
+        except Exception:
+            logger.exception("Failed to dispatch transcode video_id=%s, requeueing", job.video_id)
+            scheduler.requeue(job)
+
+
+@celery_app.task
+def dispatch_pending_transcodes() -> None:
+    """定期分派：補上分派失敗而放回佇列的影片，並收回租約過期的名額"""
+    dispatch_transcodes()
+
+
+@celery_app.task(bind=True, max_retries=3)
+def start_transcode(
+    self,
+    video_id: str,
+    input_path: str,
+    output_dir: str,
+    ladder: List[dict],
+    duration: Optional[float],
+    queue_wait: float = 0.0,
+) -> dict:
+    """
+    排程輪到時分派轉碼子任務
+
+    Args:
+        video_id: 影片 ID
+        input_path: 原始影片路徑
+        output_dir: 輸出目錄
+        ladder: 畫質階梯（Rendition._asdict() 列表）
+        duration: 影片時長（秒）
+        queue_wait: 在排程佇列中等待的秒數
 
-        # 轉碼為 HLS 1080p
-        hls_1080p_dir = os.path.join(output_dir, "1080p")
-        transcode_to_hls(input_path, hls_1080p_dir, "1920x1080", "5000k")
-        self.update_state(state="PROCESSING", meta={"video_id": video_id, "progress": 90})
+    Returns:
+        分派結果字典
+    """
+    try:
+        # 重新轉碼時先前失敗留下的中止標記不再適用
+        get_redis().delete(aborted_key(video_id))
+        # 最低畫質完成即發布主播放列表並標記影片可播放，較高畫質完成後再加入
+        base_rendition = ladder[0]["name"]
+        if SHARED_OUTPUT_DIR and duration and duration >= CHUNKED_MIN_DURATION:
+            # 長影片切段平行轉碼；重試時沿用已切好的分段
+            checkpoint = load_checkpoint(video_id, "split")
+            if checkpoint is not None:
+                chunks = checkpoint["chunks"]
+            else:
+                # 分段以串流複製產生，大小約等於原始檔
+                source_path = local_source(video_id, input_path)
+                with get_scratch().reserve(
+                    f"{video_id}:split",
+                    os.path.getsize(source_path),
+                    sources=[source_path],
+                    path=output_dir,
+                ):
+                    chunks = split_into_chunks(
+                        source_path, os.path.join(output_dir, CHUNK_DIR_NAME), CHUNK_SECONDS
+                    )
+                save_checkpoint(video_id, "split", {"chunks": chunks})
+            # 先轉碼最低畫質的所有分段並發布，較高畫質由 stitch_chunks 接著分派。
+            # 音訊自完整原始檔編碼一次：逐段編碼 AAC 會在每個分段接縫留下 priming 空隙
+            header = [transcode_audio.s(video_id, input_path, output_dir)]
+            header += chunk_tasks(video_id, chunks, output_dir, ladder[:1], previews=True)
+            # 較高畫質由 stitch_chunks 以每個分段一個子任務補齊，名稱取第一個補齊的畫質
+            weights = {AUDIO_NAME: duration}
+            for chunk in chunks:
+                seconds = chunk["end"] - chunk["start"]
+                weights[f"chunk:{chunk['index']}:{base_rendition}"] = seconds
+                if len(ladder) > 1:
+                    backfill_step = f"chunk:{chunk['index']}:{ladder[1]['name']}"
+                    weights[backfill_step] = seconds * (len(ladder) - 1)
+            callback = stitch_chunks.s(
+                video_id, output_dir, len(chunks), ladder[:1], backfill=ladder[1:]
+            )
+        elif RENDITION_MODE == "single_pass":
+            # 單次解碼所有畫質；最低畫質的播放清單在轉碼途中即發布，不另外解碼一次
+            header = [
+                transcode_renditions.s(
+                    video_id, input_path, output_dir, ladder,
+                    previews=True, base_rendition=base_rendition, audio=True,
+                )
+            ]
+            weights = {"ladder": (duration or 1.0) * (len(ladder) + 1)}
+            callback = finalize_video.s(video_id, output_dir)
+        else:
+            header = [
+                # 音訊只由最低畫質的任務編碼一次，所有畫質共用
+                transcode_rendition.s(
+                    video_id, input_path, output_dir, rendition,
+                    previews=index == 0, base_rendition=base_rendition, audio=index == 0,
+                )
+                for index, rendition in enumerate(ladder)
+            ]
+            weights = {
+                f"rendition:{rendition['name']}": (duration or 1.0) * (2 if index == 0 else 1)
+                for index, rendition in enumerate(ladder)
+            }
+            callback = finalize_video.s(video_id, output_dir)
 
-        # 生成主播放列表
-        master_playlist = generate_master_playlist(output_dir)
-        self.update_state(state="PROCESSING", meta={"video_id": video_id, "progress": 100})
+        publish_plan(video_id, weights)
+        result = chord(group(header))(callback.on_error(transcode_failed.s(video_id, output_dir)))
 
         return {
-            "status": "success",
+            "status": "dispatched",
             "video_id": video_id,
-            "thumbnail": thumbnail_path,
-            "master_playlist": master_playlist,
-            "resolutions": ["720p", "1080p"],
+            "subtasks": len(header),
+            "callback_task_id": result.id,
+            "queue_wait": queue_wait,
         }
 
+    except ScratchTooLarge as exc:
+        transcode_failed(self.request, exc, None, video_id, output_dir)
+        raise
+    except ScratchFull as exc:
+        self.retry(exc=exc, countdown=SCRATCH_RETRY_DELAY, max_retries=None)
     except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            # 不再重試：釋放名額並通知後端轉碼失敗，否則名額要等租約到期才收回
+            transcode_failed(self.request, exc, None, video_id, output_dir)
+            raise
         self.retry(exc=exc, countdown=60)
 
 
-def generate_thumbnail(input_path: str, output_path: str, time: str = "00:00:05") -> None:
-    """從影片生成縮圖"""
+@celery_app.task(bind=True, max_retries=3)
+def transcode_rendition(
+    self,
+    video_id: str,
+    input_path: str,
+    output_dir: str,
+    rendition: dict,
+    previews: bool = False,
+    base_rendition: Optional[str] = None,
+    audio: bool = False,
+) -> dict:
+    """
+    轉碼單一畫質
+
+    Args:
+        video_id: 影片 ID
+        input_path: 原始影片路徑
+        output_dir: 輸出目錄
+        rendition: 畫質設定（Rendition._asdict()）
+        previews: 是否在同一次解碼中輸出封面與預覽圖
+        base_rendition: 最先發布的畫質名稱，指定時完成後即加入主播放列表
+        audio: 是否在同一指令中輸出所有畫質共用的音訊
+
+    Returns:
+        包含實測變體資訊（與預覽圖、共用音訊）的結果字典
+    """
+    try:
+        rendition = Rendition(**rendition)
+        step = f"rendition:{rendition.name}"
+        checkpoint = load_checkpoint(video_id, step)
+        if checkpoint is not None:
+            # 上次可能在發布前中止，重新發布不影響已發布的內容
+            if base_rendition:
+                publish_variants(
+                    video_id, output_dir, checkpoint["variants"], base_rendition,
+                    audio=checkpoint.get("audio"),
+                )
+            return checkpoint
+
+        rendition_dir = os.path.join(output_dir, rendition.name)
+        source_path = local_source(video_id, input_path)
+        duration = probe_duration(source_path)
+        spec = None
+        if previews:
+            spec = preview_spec(
+                os.path.join(output_dir, PREVIEW_DIR_NAME), rendition.width, rendition.height, duration
+            )
+
+        audio_dir = os.path.join(output_dir, AUDIO_NAME) if audio else None
+        names = [rendition.name] + ([AUDIO_NAME] if audio else [])
+        stats = SegmentStats()
+        with get_scratch().reserve(
+            f"{video_id}:{step}",
+            estimate_hls_bytes([rendition.maxrate], duration, audio=audio),
+            sources=[source_path],
+            path=output_dir,
+        ), rendition_uploaders(video_id, output_dir, names, on_segment=stats.record):
+            has_audio = transcode_to_hls(
+                source_path,
+                rendition_dir,
+                rendition,
+                on_progress=ProgressReporter(video_id, step),
+                previews=spec,
+                audio_dir=audio_dir,
+            )
+
+        result = {"video_id": video_id, "variants": [stats.measure(rendition_dir, rendition)]}
+        if has_audio:
+            result["audio"] = stats.measure_audio(audio_dir)
+        if spec is not None:
+            result.update(publish_storyboard(video_id, spec, [preview_section(spec, 0.0, duration)]))
+        save_checkpoint(video_id, step, result)
+        if base_rendition:
+            publish_variants(
+                video_id, output_dir, result["variants"], base_rendition, audio=result.get("audio")
+            )
+        return result
+
+    except ScratchTooLarge:
+        raise
+    except ScratchFull as exc:
+        self.retry(exc=exc, countdown=SCRATCH_RETRY_DELAY, max_retries=None)
+    except Exception as exc:
+        self.retry(exc=exc, countdown=60)
+
+
+@celery_app.task(bind=True, max_retries=3)
+def transcode_renditions(
+    self,
+    video_id: str,
+    input_path: str,
+    output_dir: str,
+    ladder: List[dict],
+    previews: bool = True,
+    base_rendition: Optional[str] = None,
+    audio: bool = True,
+) -> dict:
+    """
+    單次解碼轉碼所有畫質
+
+    指定 base_rendition 且為 ts 格式時，最低畫質與共用音訊以 EVENT 播放清單邊轉碼邊發布，
+    第一批片段上傳後即以標稱位元率加入主播放列表、影片可開始播放；
+    單檔 fMP4 直到轉碼結束才上傳，只能在完成後發布。
+
+    Args:
+        video_id: 影片 ID
+        input_path: 原始影片路徑
+        output_dir: 輸出目錄
+        ladder: 畫質階梯（Rendition._asdict() 列表）
+        previews: 是否在同一次解碼中輸出封面與預覽圖
+        base_rendition: 最先發布的畫質名稱，指定時完成後即加入主播放列表
+        audio: 是否在同一次解碼中輸出所有畫質共用的音訊
+
+    Returns:
+        包含實測變體資訊的結果字典
+    """
+    try:
+        checkpoint = load_checkpoint(video_id, "ladder")
+        if checkpoint is not None:
+            if base_rendition:
+                publish_variants(
+                    video_id, output_dir, checkpoint["variants"], base_rendition,
+                    audio=checkpoint.get("audio"),
+                )
+            return checkpoint
+
+        renditions = [Rendition(**rendition) for rendition in ladder]
+        source_path = local_source(video_id, input_path)
+        duration = probe_duration(source_path)
+        spec = None
+        if previews:
+            spec = preview_spec(
+                os.path.join(output_dir, PREVIEW_DIR_NAME),
+                renditions[0].width,
+                renditions[0].height,
+                duration,
+            )
+
+        audio = audio and has_audio_stream(source_path)
+        names = [rendition.name for rendition in renditions] + ([AUDIO_NAME] if audio else [])
+        stats = SegmentStats()
+        live_names, publisher = [], None
+        if base_rendition is not None and UPLOAD_ENABLED and HLS_FORMAT == "ts":
+            live_names = [base_rendition] + ([AUDIO_NAME] if audio else [])
+            base = next(rendition for rendition in renditions if rendition.name == base_rendition)
+            publisher = LiveBasePublisher(video_id, output_dir, base, stats, live_names)
+        with get_scratch().reserve(
+            f"{video_id}:ladder",
+            estimate_hls_bytes([rendition.maxrate for rendition in renditions], duration, audio=audio),
+            sources=[source_path],
+            path=output_dir,
+        ), rendition_uploaders(
+            video_id, output_dir, names,
+            on_segment=stats.record, live=live_names, on_playlist=publisher,
+        ):
+            has_audio = transcode_ladder_to_hls(
+                source_path,
+                output_dir,
+                renditions,
+                on_progress=ProgressReporter(video_id, "ladder"),
+                audio=audio,
+                previews=spec,
+                event_playlist=publisher is not None,
+            )
+        variants = [
+            stats.measure(os.path.join(output_dir, rendition.name), rendition)
+            for rendition in renditions
+        ]
+
+        result = {"video_id": video_id, "variants": variants}
+        if has_audio:
+            result["audio"] = stats.measure_audio(os.path.join(output_dir, AUDIO_NAME))
+        if spec is not None:
+            result.update(publish_storyboard(video_id, spec, [preview_section(spec, 0.0, duration)]))
+        save_checkpoint(video_id, "ladder", result)
+        if base_rendition:
+            publish_variants(video_id, output_dir, variants, base_rendition, audio=result.get("audio"))
+        return result
+
+    except ScratchTooLarge:
+        raise
+    except ScratchFull as exc:
+        self.retry(exc=exc, countdown=SCRATCH_RETRY_DELAY, max_retries=None)
+    except Exception as exc:
+        self.retry(exc=exc, countdown=60)
+
+
+class LiveBasePublisher:
+    """
+    最低畫質與共用音訊的播放清單快照都發布後，將最低畫質加入主播放列表
+
+    轉碼途中尚無實測位元率，以畫質的 maxrate 與音訊位元率作為標稱值，
+    轉碼完成後由 publish_variants 以實測資訊重寫。
+    標稱的變體標記 live，轉碼最終失敗時 transcode_failed 不視為已發布。
+    """
+
+    def __init__(
+        self,
+        video_id: str,
+        output_dir: str,
+        rendition: Rendition,
+        stats: SegmentStats,
+        names: List[str],
+    ):
+        self.video_id = video_id
+        self.output_dir = output_dir
+        self.rendition = rendition
+        self.stats = stats
+        self._waiting = set(names)
+        # 各目錄的上傳器在各自的監看執行緒呼叫
+        self._lock = threading.Lock()
+
+    def __call__(self, playlist_path: str) -> None:
+        directory = os.path.dirname(playlist_path)
+        with self._lock:
+            if not self._waiting:
+                return
+            self._waiting.discard(os.path.basename(directory))
+            if self._waiting:
+                return
+
+        rendition_dir = os.path.join(self.output_dir, self.rendition.name)
+        variant = {
+            "name": self.rendition.name,
+            "resolution": self.rendition.resolution,
+            "bandwidth": parse_bitrate(self.rendition.maxrate),
+            "average_bandwidth": parse_bitrate(self.rendition.bitrate),
+            "codecs": self.stats.codecs.get(rendition_dir),
+            "live": True,
+        }
+        audio_dir = os.path.join(self.output_dir, AUDIO_NAME)
+        audio = None
+        if audio_dir in self.stats.codecs:
+            audio = {
+                "name": AUDIO_NAME,
+                "bandwidth": parse_bitrate(AUDIO_BITRATE),
+                "average_bandwidth": parse_bitrate(AUDIO_BITRATE),
+                "codecs": self.stats.codecs[audio_dir],
+                "live": True,
+            }
+        publish_variants(self.video_id, self.output_dir, [variant], self.rendition.name, audio=audio)
+
+
+@celery_app.task(bind=True, max_retries=3)
+def transcode_audio(self, video_id: str, input_path: str, output_dir: str) -> dict:
+    """
+    自完整原始檔編碼所有畫質共用的音訊（分段轉碼時使用，分段只含視訊）
+
+    Args:
+        video_id: 影片 ID
+        input_path: 原始影片路徑
+        output_dir: 輸出目錄，音訊寫入 {output_dir}/audio/
+
+    Returns:
+        包含共用音訊資訊的結果字典（原始影片無音訊時不含 audio）
+    """
+    try:
+        checkpoint = load_checkpoint(video_id, AUDIO_NAME)
+        if checkpoint is not None:
+            return checkpoint
+
+        with shared_output_step(video_id, AUDIO_NAME):
+            result = {"video_id": video_id}
+            source_path = local_source(video_id, input_path)
+            if has_audio_stream(source_path):
+                audio_dir = os.path.join(output_dir, AUDIO_NAME)
+                duration = probe_duration(source_path)
+                stats = SegmentStats()
+                with get_scratch().reserve(
+                    f"{video_id}:{AUDIO_NAME}",
+                    estimate_hls_bytes([], duration, audio=True),
+                    sources=[source_path],
+                    path=output_dir,
+                ), rendition_uploaders(video_id, output_dir, [AUDIO_NAME], on_segment=stats.record):
+                    transcode_audio_to_hls(
+                        source_path, audio_dir, duration, on_progress=ProgressReporter(video_id, AUDIO_NAME)
+                    )
+                result["audio"] = stats.measure_audio(audio_dir)
+            ensure_not_aborted(video_id)
+        save_checkpoint(video_id, AUDIO_NAME, result)
+        return result
+
+    except (ScratchTooLarge, TranscodeAborted):
+        raise
+    except ScratchFull as exc:
+        self.retry(exc=exc, countdown=SCRATCH_RETRY_DELAY, max_retries=None)
+    except Exception as exc:
+        self.retry(exc=exc, countdown=60)
+
+
+@celery_app.task(bind=True, max_retries=3)
+def finalize_video(self, results: list, video_id: str, output_dir: str) -> dict:
+    """
+    chord 回呼：生成主播放列表並通知後端轉碼完成
+
+    Args:
+        results: chord 子任務的結果列表
+        video_id: 影片 ID
+        output_dir: 輸出目錄
+
+    Returns:
+        處理結果字典
+    """
+    try:
+        return complete_transcode(results, video_id, output_dir)
+
+    except Exception as exc:
+        self.retry(exc=exc, countdown=60)
+
+
+@celery_app.task
+def transcode_failed(request, exc, traceback, video_id: str, output_dir: str) -> None:
+    """
+    chord 錯誤回呼：清理暫存輸出、通知後端轉碼失敗並釋放排程名額
+
+    不論是否已發布都通知後端 failed，讓產出結束轉碼（可刪除、相同內容重新上傳時重新轉碼）；
+    最低畫質已完整發布時後端保留影片可播放，此處另外記錄未完成的較高畫質。
+    本機輸出刪除後分段與子任務檢查點即失效，一併清除，重新處理時從頭轉碼。
+    切段轉碼的其他分段可能仍在寫入共用輸出目錄：標記中止讓尚未開始的子任務不再執行，
+    目錄由 cleanup_shared_output 在執行中的子任務結束後才刪除。
+    """
+    published = load_checkpoints(video_id, PUBLISHED_STEP_PREFIX)
+    chunked = load_checkpoint(video_id, "split") is not None
+    if chunked:
+        get_redis().set(aborted_key(video_id), 1, ex=CHECKPOINT_TTL)
+    if UPLOAD_ENABLED:
+        clear_checkpoints(video_id)
+        if chunked:
+            cleanup_shared_output.apply_async((video_id, output_dir), countdown=OUTPUT_CLEANUP_DELAY)
+        else:
+            shutil.rmtree(output_dir, ignore_errors=True)
+    scheduler.release(video_id)
+    dispatch_transcodes()
+    if any(not variant.get("live") for variant in published.values()):
+        logger.error(
+            "Backfilling renditions failed video_id=%s published=%s: %s",
+            video_id, sorted(published), exc,
+        )
+    notify_transcode_webhook(video_id, "failed", error_message=str(exc))
+
+
+@celery_app.task(bind=True, max_retries=OUTPUT_CLEANUP_MAX_RETRIES)
+def cleanup_shared_output(self, video_id: str, output_dir: str) -> None:
+    """
+    切段轉碼失敗後清理共用輸出目錄
+
+    仍有子任務寫入時稍後再檢查；等待超過任務時限時視為子任務已終止，直接清理。
+    新的轉碼已開始（中止標記被清除）時不清理，避免刪除新轉碼的輸出。
+    """
+    client = get_redis()
+    if not client.exists(aborted_key(video_id)):
+        return
+    running = client.smembers(running_key(video_id))
+    if running:
+        if self.request.retries < self.max_retries:
+            raise self.retry(countdown=OUTPUT_CLEANUP_DELAY)
+        logger.warning(
+            "Cleaning up shared output with unfinished subtasks video_id=%s steps=%s",
+            video_id, sorted(step.decode() for step in running),
+        )
+    # 中止前已開始的子任務可能在清除後才記錄檢查點
+    clear_checkpoints(video_id)
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def aborted_key(video_id: str) -> str:
+    """轉碼失敗後的中止標記，寫入共用輸出目錄的子任務據此停止"""
+    return f"video:{video_id}:aborted"
+
+
+def running_key(video_id: str) -> str:
+    """正在寫入共用輸出目錄的子任務"""
+    return f"video:{video_id}:running"
+
+
+def ensure_not_aborted(video_id: str) -> None:
+    """轉碼已失敗時拋出 TranscodeAborted"""
+    if get_redis().exists(aborted_key(video_id)):
+        raise TranscodeAborted(f"Transcode of video {video_id} has already failed")
+
+
+@contextlib.contextmanager
+def shared_output_step(video_id: str, step: str):
+    """
+    寫入共用輸出目錄的子任務：轉碼已失敗時不開始，執行期間記錄於 Redis
+
+    cleanup_shared_output 等待記錄的子任務都結束後才刪除目錄；
+    記錄保留至任務時限的兩倍，被強制終止的子任務不會永久阻擋清理。
+    """
+    ensure_not_aborted(video_id)
+    client = get_redis()
+    key = running_key(video_id)
+    pipe = client.pipeline()
+    pipe.sadd(key, step)
+    pipe.expire(key, celery_app.conf.task_time_limit * 2)
+    pipe.execute()
+    try:
+        yield
+    finally:
+        client.srem(key, step)
+
+
+def master_lock_key(video_id: str) -> str:
+    """改寫主播放列表時持有的鎖"""
+    return f"video:{video_id}:master:lock"
+
+
+def publish_master_playlist(
+    video_id: str,
+    output_dir: str,
+    variants: List[dict],
+    audio: Optional[dict] = None,
+) -> str:
+    """
+    生成並上傳主播放列表
+
+    主播放列表設為不快取，播放器重新載入時即可看到新加入的畫質；
+    各畫質的媒體播放清單發布後不再變動，正在播放的使用者不受影響。
+
+    Returns:
+        主播放列表物件鍵（未啟用物件儲存時為本機路徑）
+    """
+    master_playlist = generate_master_playlist(
+        output_dir, variants, audio=audio, audio_only=AUDIO_ONLY_VARIANT
+    )
+    if not UPLOAD_ENABLED:
+        return master_playlist
+    # 主播放列表最後發布，此時所列畫質的片段與播放清單皆已上傳
+    master_key = f"{hls_key_prefix(video_id)}/master.m3u8"
+    upload_file(master_playlist, master_key, cache_control=MASTER_CACHE_CONTROL)
+    return master_key
+
+
+def publish_variants(
+    video_id: str,
+    output_dir: str,
+    variants: List[dict],
+    base_rendition: str,
+    audio: Optional[dict] = None,
+) -> None:
+    """
+    將完成的畫質加入已發布的主播放列表
+
+    已完成的畫質記錄於檢查點；最低畫質（base_rendition）完成前只記錄不發布，
+    完成後以所有已完成的畫質重寫主播放列表，並在最低畫質加入時通知後端影片可播放（published）；
+    轉碼全部完成的 completed 只由 complete_transcode 通知一次。
+    各畫質任務可能在不同 worker 同時完成，以 Redis 鎖序列化，
+    避免較舊的畫質組合覆寫較新的主播放列表。
+
+    Args:
+        video_id: 影片 ID
+        output_dir: 輸出目錄
+        variants: 剛完成的畫質的實測變體資訊
+        base_rendition: 最先發布的畫質名稱
+        audio: 與最低畫質一同完成的共用音訊資訊
+    """
+    for variant in variants + ([audio] if audio else []):
+        save_checkpoint(video_id, f"{PUBLISHED_STEP_PREFIX}{variant['name']}", variant)
+
+    with get_redis().lock(master_lock_key(video_id), timeout=60, blocking_timeout=30):
+        published = load_checkpoints(video_id, PUBLISHED_STEP_PREFIX)
+        published_audio = published.pop(AUDIO_NAME, None)
+        if base_rendition not in published:
+            return
+        master_playlist = publish_master_playlist(
+            video_id, output_dir, list(published.values()), published_audio
+        )
+
+    if any(variant["name"] == base_rendition for variant in variants):
+        notify_transcode_webhook(video_id, "published", output_path=master_playlist)
+
+
+def complete_transcode(results: list, video_id: str, output_dir: str) -> dict:
+    """
+    由子任務結果中的實測變體資訊生成主播放列表、呼叫轉碼完成 Webhook
+    並組合處理結果
+    """
+    variants = [variant for r in results if r for variant in r.get("variants", [])]
+    audio = next((r["audio"] for r in results if r and r.get("audio")), None)
+    thumbnail = next((r["thumbnail"] for r in results if r and "thumbnail" in r), None)
+    storyboard = next((r["storyboard"] for r in results if r and "storyboard" in r), None)
+    with get_redis().lock(master_lock_key(video_id), timeout=60, blocking_timeout=30):
+        master_playlist = publish_master_playlist(video_id, output_dir, variants, audio)
+    notify_transcode_webhook(
+        video_id, "completed",
+        output_path=master_playlist, thumbnail=thumbnail, storyboard=storyboard,
+    )
+    clear_checkpoints(video_id)
+    if UPLOAD_ENABLED:
+        # 所有輸出皆已上傳，釋放暫存空間
+        shutil.rmtree(output_dir, ignore_errors=True)
+    scheduler.release(video_id)
+    dispatch_transcodes()
+
+    return {
+        "status": "success",
+        "video_id": video_id,
+        "thumbnail": thumbnail,
+        "storyboard": storyboard,
+        "master_playlist": master_playlist,
+        "resolutions": [variant["name"] for variant in variants],
+    }
+
+
+def preview_key(video_id: str, filename: str) -> str:
+    """封面與預覽圖的物件鍵"""
+    return f"thumbnails/{video_id}/{filename}"
+
+
+def upload_previews(video_id: str, paths: List[str]) -> List[str]:
+    """上傳預覽圖檔案；未啟用物件儲存時返回本機路徑"""
+    if not UPLOAD_ENABLED:
+        return list(paths)
+    keys = []
+    for path in paths:
+        key = preview_key(video_id, os.path.basename(path))
+        upload_file(path, key)
+        keys.append(key)
+    return keys
+
+
+def preview_section(spec: PreviewSpec, start: float, duration: Optional[float]) -> dict:
+    """storyboard 的一個區段：拼貼圖檔名（與 storyboard 同目錄的相對 URI）與時間範圍"""
+    return {
+        "sheets": [os.path.basename(path) for path in spec.sprite_sheets()],
+        "start": start,
+        "duration": duration,
+    }
+
+
+def publish_storyboard(video_id: str, spec: PreviewSpec, sections: List[dict]) -> dict:
+    """
+    上傳拼貼圖與封面，寫入並上傳 storyboard
+
+    Returns:
+        封面與 storyboard 的物件鍵（未啟用物件儲存時為本機路徑）
+    """
+    upload_previews(video_id, spec.sprite_sheets())
+    poster = os.path.join(spec.output_dir, POSTER_NAME)
+    storyboard = write_storyboard(
+        os.path.join(spec.output_dir, STORYBOARD_NAME), sections, spec.layout
+    )
+    thumbnail, storyboard = upload_previews(video_id, [poster, storyboard])
+    return {"thumbnail": thumbnail, "storyboard": storyboard}
+
+
+def hls_uploader(local_dir: str, key_prefix: str, **options):
+    """轉碼期間串流上傳 HLS 片段；未啟用物件儲存時返回空的 context"""
+    if not UPLOAD_ENABLED:
+        return contextlib.nullcontext()
+    return HLSUploader(local_dir, key_prefix, **options)
+
+
+def notify_transcode_webhook(
+    video_id: str,
+    status: str,
+    output_path: Optional[str] = None,
+    error_message: Optional[str] = None,
+    thumbnail: Optional[str] = None,
+    storyboard: Optional[str] = None,
+) -> None:
+    """
+    呼叫後端 /videos/webhook/transcode-complete
+
+    status 為 published（最低畫質已發布，影片可播放）、completed（所有畫質完成）或 failed。
+    thumbnail 與 storyboard 為封面與 WebVTT storyboard 的物件鍵，轉碼全部完成時才回報
+    """
+    params = {"video_id": video_id, "status": status}
+    if output_path:
+        params["output_path"] = output_path
+    if thumbnail:
+        params["thumbnail"] = thumbnail
+    if storyboard:
+        params["storyboard"] = storyboard
+    if error_message:
+        params["error_message"] = error_message
+
+    post_webhook("/videos/webhook/transcode-complete", params=params)
+
+
+def rendition_uploaders(
+    video_id: str,
+    output_dir: str,
+    names: List[str],
+    live: Collection[str] = (),
+    on_playlist: Optional[Callable[[str], None]] = None,
+    **options,
+) -> contextlib.ExitStack:
+    """
+    各畫質目錄各自串流上傳，不會處理同一輸出目錄中其他任務的檔案
+
+    live 中的畫質在轉碼途中也發布播放清單快照，發布後呼叫 on_playlist。
+    """
+    stack = contextlib.ExitStack()
+    for name in names:
+        if name in live:
+            options_for_name = {**options, "live_playlists": True, "on_playlist": on_playlist}
+        else:
+            options_for_name = options
+        stack.enter_context(
+            hls_uploader(
+                os.path.join(output_dir, name), f"{hls_key_prefix(video_id)}/{name}", **options_for_name
+            )
+        )
+    return stack
+
+
+@lru_cache
+def get_scratch() -> ScratchSpace:
+    """取得 worker 的暫存空間管理"""
+    return ScratchSpace()
+
+
+def local_source(video_id: str, input_path: str) -> str:
+    """原始檔的本機路徑：input_path 為物件鍵時下載至暫存空間的原始檔快取"""
+    if os.path.exists(input_path):
+        return input_path
+    return get_scratch().source(video_id, input_path, object_size(input_path), download_file)
+
+
+def register_source(video_id: str, content_hash: str) -> dict:
+    """呼叫後端 /videos/webhook/source-registered，返回是否需要轉碼"""
+    response = post_webhook(
+        "/videos/webhook/source-registered",
+        params={"video_id": video_id, "content_hash": content_hash},
+    )
+    return response.json()
+
+
+def source_hash(video_id: str, input_path: str) -> str:
+    """
+    計算原始檔 SHA-256
+
+    以固定大小的緩衝區串流讀取，不會將檔案載入記憶體；
+    結果記錄於檢查點，任務重試時不必重新讀取整個檔案。
+    """
+    checkpoint = load_checkpoint(video_id, "source")
+    if checkpoint is not None:
+        return checkpoint["content_hash"]
+
+    with open(input_path, "rb") as source:
+        content_hash = hashlib.file_digest(source, "sha256").hexdigest()
+    save_checkpoint(video_id, "source", {"content_hash": content_hash})
+    return content_hash
+
+
+@celery_app.task(bind=True, max_retries=3)
+def delete_transcoded_output(self, video_id: str) -> dict:
+    """
+    刪除影片的 HLS 輸出與縮圖
+
+    由後端在轉碼產出已無任何影片引用後分派。
+
+    Args:
+        video_id: 負責轉碼的影片 ID
+
+    Returns:
+        刪除的物件數
+    """
+    try:
+        deleted = delete_prefix(f"{hls_key_prefix(video_id)}/")
+        deleted += delete_prefix(f"thumbnails/{video_id}/")
+        clear_checkpoints(video_id)
+        return {"video_id": video_id, "deleted": deleted}
+
+    except Exception as exc:
+        self.retry(exc=exc, countdown=60)
+
+
+@celery_app.task(bind=True, max_retries=3)
+def transcode_chunk(
+    self,
+    video_id: str,
+    chunk_path: str,
+    chunk_index: int,
+    start_time: float,
+    output_dir: str,
+    ladder: List[dict],
+    previews: bool = True,
+) -> dict:
+    """
+    轉碼單一分段的指定畫質（只含視訊，共用音訊由 transcode_audio 編碼）
+
+    片段檔名加上分段前綴，時間戳平移至分段在原片中的起點，
+    讓 stitch_chunks 可直接串接各分段的播放清單。
+    輸出預覽圖時在同一次解碼輸出此分段的拼貼預覽圖，第一個分段另外輸出封面。
+
+    Args:
+        video_id: 影片 ID
+        chunk_path: 分段原始檔路徑
+        chunk_index: 分段序號
+        start_time: 分段在原片中的起始時間（秒）
+        output_dir: 輸出目錄
+        ladder: 此階段轉碼的畫質（Rendition._asdict() 列表）
+        previews: 是否輸出預覽圖
+
+    Returns:
+        分段處理結果
+    """
+    try:
+        renditions = [Rendition(**rendition) for rendition in ladder]
+        # 同一分段依畫質分階段轉碼，以階段的第一個畫質區分檢查點
+        step = f"chunk:{chunk_index}:{renditions[0].name}"
+        checkpoint = load_checkpoint(video_id, step)
+        if checkpoint is not None:
+            return checkpoint
+
+        with shared_output_step(video_id, step):
+            if not os.path.exists(chunk_path):
+                raise SharedOutputMissing(
+                    f"Chunk {chunk_path} is not visible on this worker; "
+                    "chunked transcoding requires VIDEO_SHARED_OUTPUT_DIR on a volume shared by all video workers"
+                )
+            prefix = chunk_prefix(chunk_index)
+            duration = probe_duration(chunk_path)
+            spec = None
+            if previews:
+                spec = preview_spec(
+                    os.path.join(output_dir, PREVIEW_DIR_NAME),
+                    renditions[0].width,
+                    renditions[0].height,
+                    duration,
+                    name_prefix=f"{prefix}_",
+                    poster=chunk_index == 0,
+                )
+
+            stats = SegmentStats()
+            # 分段播放清單只供 stitch_chunks 串接，不發布
+            with get_scratch().reserve(
+                f"{video_id}:{step}",
+                estimate_hls_bytes([rendition.maxrate for rendition in renditions], duration),
+                path=output_dir,
+            ), hls_uploader(
+                output_dir,
+                hls_key_prefix(video_id),
+                on_segment=stats.record,
+                publish_playlists=False,
+                name_prefix=f"{prefix}_",
+            ):
+                transcode_ladder_to_hls(
+                    chunk_path,
+                    output_dir,
+                    renditions,
+                    audio=False,
+                    playlist_name=f"{prefix}.m3u8",
+                    segment_pattern=segment_filename(f"{prefix}_"),
+                    ts_offset=start_time,
+                    on_progress=ProgressReporter(video_id, step),
+                    previews=spec,
+                )
+
+            result = {
+                "video_id": video_id,
+                "chunk_index": chunk_index,
+                "segment_stats": stats.to_dict(),
+            }
+            if spec is not None:
+                # storyboard 由 stitch_chunks 串接各分段的拼貼圖後生成
+                upload_previews(video_id, spec.sprite_sheets())
+                result["previews"] = preview_section(spec, start_time, duration)
+            if spec is not None and spec.poster_time is not None:
+                (result["thumbnail"],) = upload_previews(
+                    video_id, [os.path.join(spec.output_dir, POSTER_NAME)]
+                )
+            # 轉碼途中其他子任務失敗：輸出即將清理，不記錄檢查點
+            ensure_not_aborted(video_id)
+        save_checkpoint(video_id, step, result)
+        return result
+
+    except (SharedOutputMissing, ScratchTooLarge, TranscodeAborted):
+        raise
+    except ScratchFull as exc:
+        self.retry(exc=exc, countdown=SCRATCH_RETRY_DELAY, max_retries=None)
+    except Exception as exc:
+        self.retry(exc=exc, countdown=60)
+
+
+@celery_app.task(bind=True, max_retries=3)
+def stitch_chunks(
+    self,
+    chunk_results: list,
+    video_id: str,
+    output_dir: str,
+    chunk_count: int,
+    ladder: List[dict],
+    backfill: Optional[List[dict]] = None,
+    published: Optional[dict] = None,
+) -> dict:
+    """
+    chord 回呼：串接各分段的播放清單為每個畫質的完整播放清單
+
+    分段轉碼分兩階段：第一階段只有最低畫質（與自完整原始檔編碼的共用音訊），
+    串接後立即發布主播放列表
+    並通知後端影片可播放，再分派 backfill 畫質的分段轉碼；
+    最後一階段（無 backfill）以所有畫質生成主播放列表並通知後端轉碼完成。
+
+    Args:
+        chunk_results: transcode_chunk（與第一階段 transcode_audio）的結果列表（chord 傳入）
+        video_id: 影片 ID
+        output_dir: 輸出目錄
+        chunk_count: 分段數量
+        ladder: 此階段的畫質（Rendition._asdict() 列表）
+        backfill: 此階段發布後接著轉碼的畫質
+        published: 先前階段的串接結果
+
+    Returns:
+        處理結果字典
+    """
+    try:
+        renditions = [Rendition(**rendition) for rendition in ladder]
+        step = f"stitch:{renditions[0].name}"
+        # 分段播放清單在串接後即刪除，重試時直接沿用串接結果
+        stage = load_checkpoint(video_id, step)
+        if stage is None:
+            stage = stitch_stage(chunk_results, video_id, output_dir, chunk_count, renditions)
+            # 記錄串接結果後再清理，確保任何時點重試都能繼續
+            save_checkpoint(video_id, step, stage)
+            for name in [rendition.name for rendition in renditions]:
+                for index in range(chunk_count):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(os.path.join(output_dir, name, f"{chunk_prefix(index)}.m3u8"))
+            if not backfill:
+                shutil.rmtree(os.path.join(output_dir, CHUNK_DIR_NAME), ignore_errors=True)
+
+        if not backfill:
+            return complete_transcode(
+                chunk_results + [published or {}, stage], video_id, output_dir
+            )
+
+        publish_variants(
+            video_id, output_dir, stage["variants"], renditions[0].name, audio=stage.get("audio")
+        )
+        chunks = load_checkpoint(video_id, "split")["chunks"]
+        header = chunk_tasks(video_id, chunks, output_dir, backfill, previews=False)
+        callback = stitch_chunks.s(
+            video_id, output_dir, chunk_count, backfill, published=stage
+        )
+        result = chord(group(header))(callback.on_error(transcode_failed.s(video_id, output_dir)))
+        return {
+            "status": "published",
+            "video_id": video_id,
+            "resolutions": [variant["name"] for variant in stage["variants"]],
+            "backfill_task_id": result.id,
+        }
+
+    except SharedOutputMissing:
+        raise
+    except Exception as exc:
+        self.retry(exc=exc, countdown=60)
+
+
+def stitch_stage(
+    chunk_results: list,
+    video_id: str,
+    output_dir: str,
+    chunk_count: int,
+    renditions: List[Rendition],
+) -> dict:
+    """
+    串接並上傳一個階段各畫質的播放清單，有預覽圖時一併生成 storyboard；
+    共用音訊已由 transcode_audio 完整輸出並發布，只沿用其資訊
+
+    Returns:
+        實測變體資訊（與共用音訊、封面、storyboard 位置）
+    """
+    stats = SegmentStats()
+    for result in chunk_results:
+        stats.merge(result.get("segment_stats") if result else None)
+
+    def stitch(name: str) -> str:
+        directory = os.path.join(output_dir, name)
+        segments = []
+        for index in range(chunk_count):
+            chunk_playlist = os.path.join(directory, f"{chunk_prefix(index)}.m3u8")
+            if not os.path.exists(chunk_playlist):
+                raise SharedOutputMissing(
+                    f"Chunk playlist {chunk_playlist} is not visible on this worker; "
+                    "chunked transcoding requires VIDEO_SHARED_OUTPUT_DIR on a volume shared by all video workers"
+                )
+            segments += read_media_playlist(chunk_playlist)
+        playlist_path = os.path.join(directory, "playlist.m3u8")
+        write_media_playlist(playlist_path, segments)
+        if UPLOAD_ENABLED:
+            upload_file(playlist_path, f"{hls_key_prefix(video_id)}/{name}/playlist.m3u8")
+        return directory
+
+    stage = {
+        "variants": [stats.measure(stitch(rendition.name), rendition) for rendition in renditions],
+    }
+
+    audio = next((r["audio"] for r in chunk_results if r and r.get("audio")), None)
+    if audio:
+        stage["audio"] = audio
+
+    sections = sorted(
+        (result["previews"] for result in chunk_results if result and "previews" in result),
+        key=lambda section: section["start"],
+    )
+    if sections:
+        layout = storyboard_layout(renditions[0].width, renditions[0].height)
+        storyboard_path = write_storyboard(
+            os.path.join(output_dir, PREVIEW_DIR_NAME, STORYBOARD_NAME), sections, layout
+        )
+        (stage["storyboard"],) = upload_previews(video_id, [storyboard_path])
+    thumbnail = next((r["thumbnail"] for r in chunk_results if r and "thumbnail" in r), None)
+    if thumbnail:
+        stage["thumbnail"] = thumbnail
+    return stage
+
+
+def chunk_tasks(
+    video_id: str,
+    chunks: List[dict],
+    output_dir: str,
+    ladder: List[dict],
+    previews: bool,
+) -> list:
+    """各分段轉碼指定畫質的子任務簽名"""
+    return [
+        transcode_chunk.s(
+            video_id, chunk["path"], chunk["index"], chunk["start"], output_dir, ladder,
+            previews=previews,
+        )
+        for chunk in chunks
+    ]
+
+
+def chunk_prefix(chunk_index: int) -> str:
+    """分段輸出檔名前綴"""
+    return f"chunk_{chunk_index:04d}"
+
+
+def split_into_chunks(input_path: str, chunk_dir: str, chunk_seconds: int) -> List[dict]:
+    """
+    以串流複製將影片在關鍵幀處切成固定長度的分段（只含視訊，音訊由 transcode_audio 自原始檔編碼）
+
+    Returns:
+        分段資訊列表，每筆包含 index、path、start、end
+    """
+    os.makedirs(chunk_dir, exist_ok=True)
+    list_path = os.path.join(chunk_dir, "chunks.csv")
+
     cmd = [
         "ffmpeg", "-y",
         "-i", input_path,
-        "-ss", time,
-        "-vframes", "1",
-        "-vf", "scale=640:360",
-        output_path
+        "-map", "0:v:0",
+        "-c", "copy",
+        "-f", "segment",
+        "-segment_time", str(chunk_seconds),
+        "-reset_timestamps", "1",
+        "-segment_list", list_path,
+        "-segment_list_type", "csv",
+        os.path.join(chunk_dir, "chunk_%04d.mkv"),
     ]
     subprocess.run(cmd, check=True, capture_output=True)
 
+    chunks = []
+    with open(list_path, newline="") as f:
+        for index, (filename, start, end) in enumerate(csv.reader(f)):
+            chunks.append({
+                "index": index,
+                "path": os.path.join(chunk_dir, filename),
+                "start": float(start),
+                "end": float(end),
+            })
+    return chunks
+
 
 def transcode_to_hls(
     input_path: str,
     output_dir: str,
-    resolution: str,
-    bitrate: str
-) -> None:
-    """轉碼影片為 HLS 格式"""
+    rendition: Rendition,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+    previews: Optional[PreviewSpec] = None,
+    audio_dir: Optional[str] = None,
+) -> bool:
+    """
+    轉碼影片為單一畫質（僅視訊）的 HLS 格式，並以 on_progress 回報進度
+
+    指定 previews 時以 split 濾鏡將同一份解碼畫面另外輸出封面與拼貼預覽圖。
+    指定 audio_dir 時在同一指令中另外輸出共用音訊的 HLS 播放清單。
+
+    Returns:
+        是否輸出了共用音訊（原始影片無音訊時為 False）
+    """
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, "playlist.m3u8")
 
+    if previews is None:
+        video_args = ["-map", "0:v:0", "-vf", f"scale={rendition.resolution}"]
+    else:
+        filters = [
+            "[0:v]split=2[main][pv]",
+            f"[main]scale={rendition.resolution}[v]",
+            *previews.filters("pv"),
+        ]
+        video_args = ["-filter_complex", ";".join(filters), "-map", "[v]"]
+
     cmd = [
         "ffmpeg", "-y",
         "-i", input_path,
-        "-vf", f"scale={resolution}",
+        *video_args,
         "-c:v", "libx264",
         "-preset", "medium",
-        "-b:v", bitrate,
+        "-b:v", rendition.bitrate,
+        "-maxrate", rendition.maxrate,
+        "-bufsize", rendition.bufsize,
+        # 與其他畫質任務在相同時間點切出關鍵幀，確保 ABR 切換時片段對齊
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-progress", "pipe:1",
+        "-nostats",
+        *hls_output_args(output_dir),
+        output_path
+    ]
+    audio = audio_dir is not None and has_audio_stream(input_path)
+    if audio:
+        os.makedirs(audio_dir, exist_ok=True)
+        cmd += [
+            "-map", "0:a:0",
+            "-c:a", "aac",
+            "-b:a", AUDIO_BITRATE,
+            *hls_output_args(audio_dir),
+            os.path.join(audio_dir, "playlist.m3u8"),
+        ]
+    if previews is not None:
+        cmd += previews.outputs()
+    run_ffmpeg_with_progress(cmd, probe_duration(input_path), on_progress)
+    return audio
+
+
+def transcode_audio_to_hls(
+    input_path: str,
+    output_dir: str,
+    duration: Optional[float],
+    on_progress: Optional[Callable[[Progress], None]] = None,
+) -> None:
+    """只解碼音訊，將第一條音訊串流編碼為共用音訊的 HLS 格式"""
+    os.makedirs(output_dir, exist_ok=True)
+    cmd = [
+        "ffmpeg", "-y",
+        "-i", input_path,
+        "-map", "0:a:0",
         "-c:a", "aac",
-        "-b:a", "128k",
-        "-hls_time", "10",
+        "-b:a", AUDIO_BITRATE,
+        "-progress", "pipe:1",
+        "-nostats",
+        *hls_output_args(output_dir),
+        os.path.join(output_dir, "playlist.m3u8"),
+    ]
+    run_ffmpeg_with_progress(cmd, duration, on_progress)
+
+
+def hls_output_args(output_dir: str) -> List[str]:
+    """單一 HLS 輸出的 muxer 參數（每個輸出須各自指定）"""
+    return [
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
         "-hls_list_size", "0",
-        "-hls_segment_filename", os.path.join(output_dir, "segment_%03d.ts"),
+        *hls_muxer_options(),
+        "-hls_segment_filename", os.path.join(output_dir, segment_filename()),
         "-f", "hls",
-        output_path
     ]
-    subprocess.run(cmd, check=True, capture_output=True)
 
 
-def generate_master_playlist(output_dir: str) -> str:
-    """生成 HLS 主播放列表"""
-    master_path = os.path.join(output_dir, "master.m3u8")
+def segment_filename(prefix: str = "") -> str:
+    """片段檔名：ts 格式為逐片段編號的樣式，fmp4 格式為單一檔名"""
+    if HLS_FORMAT == "fmp4":
+        return f"{prefix}stream.mp4"
+    return f"{prefix}segment_%03d.ts"
 
-    content = """#EXTM3U
-#EXT-X-VERSION:3
 
-#EXT-X-STREAM-INF:BANDWIDTH=2628000,RESOLUTION=1280x720
-720p/playlist.m3u8
+def hls_muxer_options() -> List[str]:
+    """依 HLS_FORMAT 產生 HLS muxer 參數"""
+    if HLS_FORMAT == "fmp4":
+        # 單檔 fMP4 (CMAF)：初始化區段與所有片段寫在同一檔案，播放清單以 EXT-X-BYTERANGE 定位。
+        # temp_file 會讓播放清單引用 .tmp 檔名，單檔模式不使用，改由 HLSUploader 在結束後上傳
+        return ["-hls_segment_type", "fmp4", "-hls_flags", "single_file"]
+    # 片段寫完才改名，供 HLSUploader 判斷片段已完成
+    return ["-hls_flags", "temp_file"]
+
+
+def build_ladder_command(
+    input_path: str,
+    output_dir: str,
+    renditions: List[Rendition],
+    audio: bool = True,
+    playlist_name: str = "playlist.m3u8",
+    segment_pattern: Optional[str] = None,
+    ts_offset: float = 0.0,
+    previews: Optional[PreviewSpec] = None,
+    event_playlist: bool = False,
+) -> List[str]:
+    """
+    建立單次解碼、多畫質輸出的 FFmpeg 指令
+
+    以 split 濾鏡將同一份解碼畫面分給各畫質的縮放與編碼器，
+    再透過 var_stream_map 輸出到 {output_dir}/{name}/ 各自的播放清單。
+    各畫質只含視訊；audio 時音訊只編碼一次，輸出到 {output_dir}/audio/ 供所有畫質共用。
+    分段轉碼時以 ts_offset 平移時間戳，讓各分段的片段可直接串接。
+    指定 previews 時 split 多分出一路畫面輸出封面與拼貼預覽圖。
+    event_playlist 時輸出 EVENT 類型的播放清單，轉碼途中的快照可供播放。
+    """
+    count = len(renditions)
+    split_labels = "".join(f"[s{i}]" for i in range(count))
+    if previews is not None:
+        split_labels += "[pv]"
+    filters = [f"[0:v]split={count + (previews is not None)}{split_labels}"]
+    filters += [
+        f"[s{i}]scale={rendition.resolution}[v{i}]"
+        for i, rendition in enumerate(renditions)
+    ]
+    if previews is not None:
+        filters += previews.filters("pv")
+
+    cmd = [
+        "ffmpeg", "-y",
+        "-i", input_path,
+        "-filter_complex", ";".join(filters),
+    ]
+
+    stream_map = []
+    for i, rendition in enumerate(renditions):
+        cmd += [
+            "-map", f"[v{i}]",
+            f"-c:v:{i}", "libx264",
+            f"-b:v:{i}", rendition.bitrate,
+            f"-maxrate:v:{i}", rendition.maxrate,
+            f"-bufsize:v:{i}", rendition.bufsize,
+        ]
+        stream_map.append(f"v:{i},name:{rendition.name}")
+    if audio:
+        cmd += [
+            "-map", "0:a:0",
+            "-c:a:0", "aac",
+            "-b:a:0", AUDIO_BITRATE,
+        ]
+        stream_map.append(f"a:0,name:{AUDIO_NAME}")
+
+    if ts_offset:
+        cmd += ["-output_ts_offset", f"{ts_offset:.6f}"]
+
+    cmd += [
+        "-preset", "medium",
+        # 各畫質在相同時間點切出關鍵幀，確保片段對齊
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-progress", "pipe:1",
+        "-nostats",
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_list_size", "0",
+        *(["-hls_playlist_type", "event"] if event_playlist else []),
+        *hls_muxer_options(),
+        "-hls_segment_filename", os.path.join(output_dir, "%v", segment_pattern or segment_filename()),
+        "-var_stream_map", " ".join(stream_map),
+        os.path.join(output_dir, "%v", playlist_name),
+    ]
+    if previews is not None:
+        cmd += previews.outputs()
+    return cmd
 
-#EXT-X-STREAM-INF:BANDWIDTH=5128000,RESOLUTION=1920x1080
-1080p/playlist.m3u8
-"""
 
-    with open(master_path, "w") as f:
-        f.write(content)
+def transcode_ladder_to_hls(
+    input_path: str,
+    output_dir: str,
+    renditions: List[Rendition],
+    on_progress: Optional[Callable[[Progress], None]] = None,
+    audio: bool = True,
+    **output_options,
+) -> bool:
+    """
+    單次解碼轉碼所有畫質為 HLS 格式
 
-    return master_path
+    Args:
+        input_path: 原始影片路徑
+        output_dir: 輸出目錄，各畫質寫入 {output_dir}/{name}/
+        renditions: 畫質階梯
+        on_progress: 進度回呼，參數為 Progress
+        audio: 是否一併輸出共用音訊（寫入 {output_dir}/audio/）
+        **output_options: 傳給 build_ladder_command 的輸出設定
+
+    Returns:
+        是否輸出了共用音訊（原始影片無音訊時為 False）
+    """
+    audio = audio and has_audio_stream(input_path)
+    names = [rendition.name for rendition in renditions] + ([AUDIO_NAME] if audio else [])
+    for name in names:
+        os.makedirs(os.path.join(output_dir, name), exist_ok=True)
+
+    cmd = build_ladder_command(input_path, output_dir, renditions, audio=audio, **output_options)
+    run_ffmpeg_with_progress(cmd, probe_duration(input_path), on_progress)
+    return audio
+
+
+def run_ffmpeg_with_progress(
+    cmd: List[str],
+    duration: Optional[float],
+    on_progress: Optional[Callable[[Progress], None]] = None,
+) -> None:
+    """
+    執行帶有 `-progress pipe:1` 的 FFmpeg 指令並回報進度
+
+    每個 progress 區塊結束時以 Progress（完成比例、編碼速度、預估剩餘時間）呼叫 on_progress，
+    節流由呼叫端（ProgressReporter）負責。
+    stderr 寫入暫存檔，避免管線緩衝區塞滿造成死結；
+    失敗時以 CalledProcessError 拋出，與 subprocess.run(check=True) 行為一致。
+    """
+    parser = ProgressParser(duration)
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=stderr_file,
+            text=True,
+        )
+        for line in process.stdout:
+            progress = parser.feed(line)
+            if progress is not None and on_progress is not None:
+                on_progress(progress)
+
+        returncode = process.wait()
+        if returncode != 0:
+            stderr_file.seek(0)
+            raise subprocess.CalledProcessError(
+                returncode, cmd, stderr=stderr_file.read().decode(errors="replace")
+            )
 
 
 @celery_app.task(bind=True)
@@ -133,15 +1581,5 @@ def get_video_duration(self, input_path: str) -> Optional[int]:
     Returns:
         影片時長（秒）
     """
-    try:
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            input_path
-        ]
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        return int(float(result.stdout.strip()))
-    except Exception:
-        return None
+    duration = probe_duration(input_path)
+    return int(duration) if duration is not None else None
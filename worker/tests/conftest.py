@@ -0,0 +1,71 @@
+"""
+Worker 測試共用設定
+以 moto 的本機 S3 伺服器取代 MinIO，以 fakeredis 取代 Redis
+"""
+import boto3
+import fakeredis
+import pytest
+from moto.server import ThreadedMotoServer
+
+from worker import storage
+
+TEST_BUCKET = "learning-platform-test"
+
+
+@pytest.fixture(scope="session")
+def s3_server():
+    """整個測試階段共用的 moto S3 伺服器"""
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def s3_bucket(s3_server, monkeypatch):
+    """
+    指向 moto 伺服器的空 bucket
+
+    worker.storage 於匯入時讀取 MinIO 設定，這裡改寫模組常數並重建共用客戶端。
+    """
+    monkeypatch.setattr(storage, "MINIO_ENDPOINT", s3_server)
+    monkeypatch.setattr(storage, "MINIO_SECURE", False)
+    monkeypatch.setattr(storage, "MINIO_ACCESS_KEY", "testing")
+    monkeypatch.setattr(storage, "MINIO_SECRET_KEY", "testing")
+    monkeypatch.setattr(storage, "MINIO_BUCKET_NAME", TEST_BUCKET)
+    storage.get_s3_client.cache_clear()
+
+    client = storage.get_s3_client()
+    client.create_bucket(Bucket=TEST_BUCKET)
+    yield client
+
+    for page in storage.iter_object_pages(""):
+        storage.delete_objects([item["Key"] for item in page])
+    client.delete_bucket(Bucket=TEST_BUCKET)
+    storage.get_s3_client.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def aws_region(monkeypatch):
+    """boto3 需要區域設定，避免讀取開發機上的 AWS 設定"""
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.delenv("AWS_PROFILE", raising=False)
+    boto3.setup_default_session()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    取代共用 Redis 連線的 fakeredis
+
+    各模組以 `from worker.checkpoint import get_redis` 匯入，需在使用的模組上逐一替換。
+    """
+    client = fakeredis.FakeRedis()
+
+    def patch(*modules: str) -> fakeredis.FakeRedis:
+        for module in modules:
+            monkeypatch.setattr(f"{module}.get_redis", lambda: client)
+        return client
+
+    return patch
@@ -0,0 +1,98 @@
+"""
+轉碼效能基準測試
+情境矩陣、各情境的 FFmpeg 指令與退步檢查
+"""
+import pytest
+
+from worker.benchmark import (
+    MOTION_SOURCES,
+    SUITES,
+    Scenario,
+    check_result,
+    source_command,
+)
+from worker.media.ladder import plan_ladder
+from worker.media.probe import SourceInfo
+from worker.tasks.video_processing import build_ladder_command
+
+
+def arg(cmd: list[str], flag: str, occurrence: int = 0) -> str:
+    positions = [i for i, value in enumerate(cmd) if value == flag]
+    return cmd[positions[occurrence] + 1]
+
+
+def result(**metrics) -> dict:
+    entry = {
+        "scenario": "720p_30s_high",
+        "realtime_ratio": 0.3,
+        "cpu_seconds": 40.0,
+        "peak_rss_mb": 300.0,
+        "rendition_bytes": {"360p": 1000, "audio": 100},
+    }
+    entry.update(metrics)
+    return entry
+
+
+def test_suites_cover_every_combination_once():
+    assert len(SUITES["quick"]) == 3 * 2
+    assert len(SUITES["full"]) == 3 * 3 * 3
+    for scenarios in SUITES.values():
+        names = [scenario.name for scenario in scenarios]
+        assert len(set(names)) == len(names)
+    assert {scenario.motion for scenario in SUITES["full"]} == {"low", "medium", "high"}
+
+
+def test_each_motion_level_uses_its_own_source():
+    assert len(set(MOTION_SOURCES.values())) == len(MOTION_SOURCES)
+
+
+@pytest.mark.parametrize("scenario", SUITES["full"], ids=lambda scenario: scenario.name)
+def test_source_command_per_scenario(scenario):
+    cmd = source_command(scenario, f"/sources/{scenario.name}.mp4")
+
+    video = arg(cmd, "-i")
+    assert video.startswith(MOTION_SOURCES[scenario.motion].split("=")[0])
+    assert f"size={scenario.width}x{scenario.height}:rate=30" in video
+    # 視訊與音訊來源都以 -t 限制長度
+    assert arg(cmd, "-t") == arg(cmd, "-t", 1) == str(scenario.duration)
+    assert arg(cmd, "-i", 1) == "sine=frequency=440:sample_rate=48000"
+    assert ("-vf" in cmd) == (scenario.motion == "high")
+    assert cmd[-1] == f"/sources/{scenario.name}.mp4"
+
+
+def test_source_command_appends_options_to_parameterized_sources():
+    low = source_command(Scenario(30, 1280, 720, "low"), "/tmp/low.mp4")
+    high = source_command(Scenario(30, 1280, 720, "high"), "/tmp/high.mp4")
+
+    assert arg(low, "-i") == "smptebars=size=1280x720:rate=30"
+    assert arg(high, "-i") == f"{MOTION_SOURCES['high']}:size=1280x720:rate=30"
+
+
+@pytest.mark.parametrize("scenario", SUITES["quick"], ids=lambda scenario: scenario.name)
+def test_transcode_command_per_scenario(scenario):
+    ladder = plan_ladder(SourceInfo(scenario.width, scenario.height, scenario.duration, True))
+
+    cmd = build_ladder_command(f"/sources/{scenario.name}.mp4", "/out", ladder)
+
+    assert arg(cmd, "-filter_complex").startswith(f"[0:v]split={len(ladder)}")
+    assert arg(cmd, "-var_stream_map").split() == [
+        f"v:{i},name:{rendition.name}" for i, rendition in enumerate(ladder)
+    ] + ["a:0,name:audio"]
+    assert max(rendition.height for rendition in ladder) <= scenario.height
+
+
+def test_check_result_passes_within_limits():
+    baseline = result(realtime_ratio=0.29, cpu_seconds=38.0)
+
+    assert check_result(result(), max_ratio=0.5, baseline=baseline, tolerance=0.1) == []
+
+
+def test_check_result_reports_ratio_and_regressions():
+    baseline = result(cpu_seconds=30.0, rendition_bytes={"360p": 800, "audio": 100})
+
+    failures = check_result(result(realtime_ratio=0.6), max_ratio=0.5, baseline=baseline, tolerance=0.1)
+
+    # 超過上限與相對基準退步分別回報
+    assert [failure.split(": ", 1)[1].split()[0] for failure in failures] == [
+        "realtime_ratio", "realtime_ratio", "cpu_seconds", "360p"
+    ]
@@ -0,0 +1,111 @@
+"""
+轉碼檢查點測試
+子任務結果的記錄、讀取與清除，以及子任務重試時的續傳
+"""
+import pytest
+
+from worker.checkpoint import (
+    checkpoint_key,
+    clear_checkpoints,
+    load_checkpoint,
+    load_checkpoints,
+    save_checkpoint,
+)
+from worker.tasks import video_processing
+
+
+@pytest.fixture
+def redis_client(fake_redis):
+    return fake_redis("worker.checkpoint")
+
+
+def test_missing_checkpoint_is_none(redis_client):
+    assert load_checkpoint("v1", "rendition:720p") is None
+
+
+def test_saved_result_round_trips_with_ttl(redis_client):
+    result = {"video_id": "v1", "variants": [{"name": "720p", "bandwidth": 2_800_000}]}
+
+    save_checkpoint("v1", "rendition:720p", result)
+
+    assert load_checkpoint("v1", "rendition:720p") == result
+    assert load_checkpoint("v2", "rendition:720p") is None
+    assert redis_client.ttl(checkpoint_key("v1")) > 0
+
+
+def test_load_checkpoints_by_prefix(redis_client):
+    save_checkpoint("v1", "published:360p", {"name": "360p"})
+    save_checkpoint("v1", "published:audio", {"name": "audio"})
+    save_checkpoint("v1", "rendition:360p", {"video_id": "v1"})
+
+    assert load_checkpoints("v1", "published:") == {
+        "360p": {"name": "360p"},
+        "audio": {"name": "audio"},
+    }
+
+
+def test_clear_removes_every_step(redis_client):
+    save_checkpoint("v1", "split", {"chunks": []})
+    save_checkpoint("v1", "chunk:0:360p", {"chunk_index": 0})
+
+    clear_checkpoints("v1")
+
+    assert load_checkpoints("v1", "") == {}
+
+
+@pytest.fixture
+def no_transcode(monkeypatch):
+    """續傳時不應再執行任何轉碼"""
+    def transcode(*args, **kwargs):
+        raise AssertionError("resumed subtask must not transcode again")
+
+    for name in ("transcode_to_hls", "transcode_ladder_to_hls", "local_source"):
+        monkeypatch.setattr(video_processing, name, transcode)
+
+
+@pytest.fixture
+def published(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        video_processing, "publish_variants",
+        lambda video_id, output_dir, variants, base, audio=None: calls.append((variants, base, audio)),
+    )
+    return calls
+
+
+def test_rendition_resumes_and_republishes_from_checkpoint(redis_client, no_transcode, published):
+    result = {
+        "video_id": "v1",
+        "variants": [{"name": "360p", "bandwidth": 900_000}],
+        "audio": {"name": "audio", "bandwidth": 140_000},
+    }
+    save_checkpoint("v1", "rendition:360p", result)
+    rendition = {"name": "360p", "width": 640, "height": 360,
+                 "bitrate": "800k", "maxrate": "856k", "bufsize": "1200k"}
+
+    resumed = video_processing.transcode_rendition(
+        "v1", "/src/in.mp4", "/out", rendition, base_rendition="360p"
+    )
+
+    assert resumed == result
+    # 上次可能在發布前中止，續傳時重新發布
+    assert published == [(result["variants"], "360p", result["audio"])]
+
+
+def test_ladder_resumes_from_checkpoint(redis_client, no_transcode, published):
+    result = {"video_id": "v1", "variants": [{"name": "360p"}, {"name": "720p"}]}
+    save_checkpoint("v1", "ladder", result)
+
+    assert video_processing.transcode_renditions("v1", "/src/in.mp4", "/out", []) == result
+    assert published == []
+
+
+def test_source_hash_is_read_once(redis_client, tmp_path):
+    source = tmp_path / "in.mp4"
+    source.write_bytes(b"lecture")
+
+    first = video_processing.source_hash("v1", str(source))
+    source.unlink()  # 重試時不必重新讀取原始檔
+
+    assert video_processing.source_hash("v1", str(source)) == first
+    assert load_checkpoint("v1", "source") == {"content_hash": first}
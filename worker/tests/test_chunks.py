@@ -0,0 +1,308 @@
+"""
+分段轉碼測試
+分段邊界、分段播放清單串接與檢查點續傳
+"""
+import json
+import os
+
+import pytest
+from celery.exceptions import Retry
+
+from worker.checkpoint import load_checkpoint, save_checkpoint
+from worker.media.ladder import Rendition
+from worker.media.playlist import Segment, read_media_playlist, write_media_playlist
+from worker.tasks import video_processing
+from worker.tasks.video_processing import (
+    SharedOutputMissing,
+    TranscodeAborted,
+    cleanup_shared_output,
+    running_key,
+    split_into_chunks,
+    stitch_chunks,
+    stitch_stage,
+    transcode_chunk,
+    transcode_failed,
+)
+
+RENDITION_360 = Rendition("360p", 640, 360, "800k", "856k", "1200k")
+
+
+@pytest.fixture
+def redis_client(fake_redis):
+    return fake_redis("worker.checkpoint", "worker.tasks.video_processing", "worker.scheduler")
+
+
+@pytest.fixture
+def scratch(tmp_path, monkeypatch):
+    """本機輸出、不上傳，暫存空間指向測試目錄"""
+    space = video_processing.ScratchSpace(str(tmp_path / "scratch"), min_free=0)
+    monkeypatch.setattr(video_processing, "get_scratch", lambda: space)
+    monkeypatch.setattr(video_processing, "UPLOAD_ENABLED", False)
+    return space
+
+
+def ledger(space) -> dict:
+    with open(os.path.join(space.root, "reservations.json")) as file:
+        return json.load(file)
+
+
+def write_chunk_playlist(output_dir, index: int, durations: list[float]) -> list[Segment]:
+    """寫出 transcode_chunk 輸出的分段播放清單與片段，返回片段列表"""
+    directory = os.path.join(output_dir, RENDITION_360.name)
+    os.makedirs(directory, exist_ok=True)
+    prefix = video_processing.chunk_prefix(index)
+    segments = []
+    for number, duration in enumerate(durations):
+        name = f"{prefix}_segment_{number:03d}.ts"
+        with open(os.path.join(directory, name), "wb") as file:
+            file.write(b"\x00" * int(duration * 1000))
+        segments.append(Segment(duration, name))
+    write_media_playlist(os.path.join(directory, f"{prefix}.m3u8"), segments)
+    return segments
+
+
+def chunk_result(output_dir, index: int, segments: list[Segment]) -> dict:
+    """transcode_chunk 傳回的片段記錄"""
+    directory = os.path.join(output_dir, RENDITION_360.name)
+    return {
+        "video_id": "v1",
+        "chunk_index": index,
+        "segment_stats": {
+            "sizes": {
+                os.path.join(directory, segment.uri): int(segment.duration * 1000)
+                for segment in segments
+            },
+            "codecs": {directory: "avc1.64001e"},
+        },
+    }
+
+
+def test_split_reads_chunk_boundaries_from_the_segment_list(tmp_path, monkeypatch):
+    commands = []
+
+    def run(cmd, **kwargs):
+        commands.append(cmd)
+        list_path = cmd[cmd.index("-segment_list") + 1]
+        with open(list_path, "w") as file:
+            # 分段在關鍵幀處切開，邊界不一定落在 chunk_seconds 的整數倍
+            file.write(
+                "chunk_0000.mkv,0.000000,300.033333\n"
+                "chunk_0001.mkv,300.033333,600.066667\n"
+                "chunk_0002.mkv,600.066667,612.500000\n"
+            )
+
+    monkeypatch.setattr("worker.tasks.video_processing.subprocess.run", run)
+    chunk_dir = str(tmp_path / "chunks")
+
+    chunks = split_into_chunks("/src/lecture.mp4", chunk_dir, 300)
+
+    (cmd,) = commands
+    assert cmd[cmd.index("-segment_time") + 1] == "300"
+    assert cmd[cmd.index("-map") + 1] == "0:v:0"  # 分段只含視訊
+    assert [chunk["index"] for chunk in chunks] == [0, 1, 2]
+    assert chunks[1] == {
+        "index": 1,
+        "path": os.path.join(chunk_dir, "chunk_0001.mkv"),
+        "start": 300.033333,
+        "end": 600.066667,
+    }
+    # 相鄰分段首尾相接，涵蓋整部影片
+    assert all(prev["end"] == nxt["start"] for prev, nxt in zip(chunks, chunks[1:]))
+    assert chunks[0]["start"] == 0.0 and chunks[-1]["end"] == 612.5
+
+
+def test_transcode_chunk_offsets_timestamps_and_resumes(tmp_path, monkeypatch, redis_client, scratch):
+    calls = []
+
+    def transcode(chunk_path, output_dir, renditions, **options):
+        calls.append(options)
+
+    monkeypatch.setattr(video_processing, "transcode_ladder_to_hls", transcode)
+    monkeypatch.setattr(video_processing, "probe_duration", lambda path: 300.0)
+    chunk_path = tmp_path / "chunk_0001.mkv"
+    chunk_path.write_bytes(b"\x00")
+    args = ("v1", str(chunk_path), 1, 300.033333, str(tmp_path / "out"), [RENDITION_360._asdict()])
+
+    result = transcode_chunk(*args, previews=False)
+
+    (options,) = calls
+    assert options["ts_offset"] == 300.033333
+    assert options["playlist_name"] == "chunk_0001.m3u8"
+    assert options["segment_pattern"] == "chunk_0001_segment_%03d.ts"
+    assert options["audio"] is False
+    assert result["chunk_index"] == 1
+
+    # 重試時由檢查點返回，不再轉碼
+    assert transcode_chunk(*args, previews=False) == result
+    assert len(calls) == 1
+
+
+def test_failed_chunk_releases_its_reservation(tmp_path, monkeypatch, redis_client, scratch):
+    def transcode(chunk_path, output_dir, renditions, **options):
+        assert list(ledger(scratch)) == ["v1:chunk:0:360p"]
+        raise RuntimeError("ffmpeg failed")
+
+    monkeypatch.setattr(video_processing, "transcode_ladder_to_hls", transcode)
+    monkeypatch.setattr(video_processing, "probe_duration", lambda path: 300.0)
+    chunk_path = tmp_path / "chunk_0000.mkv"
+    chunk_path.write_bytes(b"\x00")
+
+    # 直接呼叫時 retry 拋出原本的例外
+    with pytest.raises(RuntimeError):
+        transcode_chunk(
+            "v1", str(chunk_path), 0, 0.0, str(tmp_path / "out"), [RENDITION_360._asdict()],
+            previews=False,
+        )
+
+    # 預留由執行轉碼的任務在同一主機釋放，不依賴其他主機上的錯誤回呼
+    assert ledger(scratch) == {}
+
+
+def test_transcode_chunk_requires_shared_output(tmp_path, redis_client, scratch):
+    with pytest.raises(SharedOutputMissing):
+        transcode_chunk(
+            "v1", str(tmp_path / "missing.mkv"), 0, 0.0, str(tmp_path / "out"),
+            [RENDITION_360._asdict()], previews=False,
+        )
+
+
+def test_stitch_concatenates_chunk_playlists_in_order(tmp_path, scratch):
+    output_dir = str(tmp_path / "out")
+    first = write_chunk_playlist(output_dir, 0, [6.0, 6.0])
+    second = write_chunk_playlist(output_dir, 1, [6.0, 3.0])
+    # chord 結果的順序與分段順序無關，串接依分段序號
+    results = [chunk_result(output_dir, 1, second), chunk_result(output_dir, 0, first)]
+
+    stage = stitch_stage(results, "v1", output_dir, 2, [RENDITION_360])
+
+    playlist = os.path.join(output_dir, RENDITION_360.name, "playlist.m3u8")
+    assert read_media_playlist(playlist) == first + second
+    (variant,) = stage["variants"]
+    assert variant["codecs"] == "avc1.64001e"
+    assert variant["bandwidth"] == variant["average_bandwidth"] == 8000
+
+
+def test_stitch_requires_every_chunk_playlist(tmp_path, scratch):
+    output_dir = str(tmp_path / "out")
+    segments = write_chunk_playlist(output_dir, 0, [6.0])
+
+    with pytest.raises(SharedOutputMissing):
+        stitch_stage([chunk_result(output_dir, 0, segments)], "v1", output_dir, 2, [RENDITION_360])
+
+
+def test_stitch_chunks_resumes_after_chunk_playlists_are_removed(
+    tmp_path, monkeypatch, redis_client, scratch
+):
+    completed = []
+    monkeypatch.setattr(
+        video_processing, "complete_transcode",
+        lambda results, video_id, output_dir: completed.append(results[-1]) or {"status": "success"},
+    )
+    output_dir = str(tmp_path / "out")
+    results = [
+        chunk_result(output_dir, index, write_chunk_playlist(output_dir, index, [6.0]))
+        for index in range(2)
+    ]
+    args = (results, "v1", output_dir, 2, [RENDITION_360._asdict()])
+
+    stitch_chunks(*args)
+
+    assert not os.path.exists(os.path.join(output_dir, RENDITION_360.name, "chunk_0000.m3u8"))
+    # 串接結果已記錄於檢查點，重試時不需要已刪除的分段播放清單
+    stitch_chunks(*args)
+    assert completed[0] == completed[1]
+    assert [variant["name"] for variant in completed[0]["variants"]] == ["360p"]
+
+
+@pytest.fixture
+def failed_chunk(tmp_path, monkeypatch, redis_client):
+    """上傳模式下一個分段失敗：記錄延後的清理，不通知後端"""
+    monkeypatch.setattr(video_processing, "UPLOAD_ENABLED", True)
+    monkeypatch.setattr(video_processing, "dispatch_transcodes", lambda: None)
+    monkeypatch.setattr(video_processing, "notify_transcode_webhook", lambda *args, **kwargs: None)
+    cleanups = []
+    monkeypatch.setattr(
+        cleanup_shared_output, "apply_async",
+        lambda args, countdown: cleanups.append(args),
+    )
+    output_dir = tmp_path / "out"
+    (output_dir / "360p").mkdir(parents=True)
+    save_checkpoint("v1", "split", {"chunks": []})
+    return str(output_dir), cleanups
+
+
+def test_failed_chunk_waits_for_running_siblings_before_cleanup(redis_client, failed_chunk):
+    output_dir, cleanups = failed_chunk
+    redis_client.sadd(running_key("v1"), "chunk:1:360p")
+
+    transcode_failed(None, RuntimeError("ffmpeg failed"), None, "v1", output_dir)
+
+    # 其他分段仍在寫入共用輸出目錄，清理延後
+    assert cleanups == [("v1", output_dir)]
+    assert os.path.isdir(output_dir)
+    with pytest.raises(Retry):
+        cleanup_shared_output("v1", output_dir)
+    assert os.path.isdir(output_dir)
+
+    redis_client.srem(running_key("v1"), "chunk:1:360p")
+    cleanup_shared_output("v1", output_dir)
+    assert not os.path.exists(output_dir)
+
+
+def test_chunks_stop_after_the_transcode_failed(tmp_path, monkeypatch, redis_client, scratch, failed_chunk):
+    output_dir, _ = failed_chunk
+    calls = []
+    monkeypatch.setattr(
+        video_processing, "transcode_ladder_to_hls",
+        lambda chunk_path, output_dir, renditions, **options: calls.append(chunk_path),
+    )
+    monkeypatch.setattr(video_processing, "probe_duration", lambda path: 300.0)
+    chunk_path = tmp_path / "chunk_0001.mkv"
+    chunk_path.write_bytes(b"\x00")
+    transcode_failed(None, RuntimeError("ffmpeg failed"), None, "v1", output_dir)
+
+    # 尚未開始的分段不再轉碼，也不記錄檢查點
+    with pytest.raises(TranscodeAborted):
+        transcode_chunk(
+            "v1", str(chunk_path), 1, 300.0, output_dir, [RENDITION_360._asdict()], previews=False,
+        )
+    assert calls == []
+    assert load_checkpoint("v1", "chunk:1:360p") is None
+    assert not redis_client.exists(running_key("v1"))
+
+
+def test_chunk_finishing_after_the_failure_is_not_checkpointed(
+    tmp_path, monkeypatch, redis_client, scratch, failed_chunk
+):
+    output_dir, _ = failed_chunk
+
+    def transcode(chunk_path, output_dir, renditions, **options):
+        assert redis_client.smembers(running_key("v1")) == {b"chunk:1:360p"}
+        # 轉碼途中其他分段失敗
+        transcode_failed(None, RuntimeError("ffmpeg failed"), None, "v1", output_dir)
+
+    monkeypatch.setattr(video_processing, "transcode_ladder_to_hls", transcode)
+    monkeypatch.setattr(video_processing, "probe_duration", lambda path: 300.0)
+    chunk_path = tmp_path / "chunk_0001.mkv"
+    chunk_path.write_bytes(b"\x00")
+
+    with pytest.raises(TranscodeAborted):
+        transcode_chunk(
+            "v1", str(chunk_path), 1, 300.0, output_dir, [RENDITION_360._asdict()], previews=False,
+        )
+
+    assert load_checkpoint("v1", "chunk:1:360p") is None
+    # 執行記錄已移除，清理不必再等待
+    assert not redis_client.exists(running_key("v1"))
+    cleanup_shared_output("v1", output_dir)
+    assert not os.path.exists(output_dir)
+
+
+def test_new_transcode_cancels_the_pending_cleanup(redis_client, failed_chunk):
+    output_dir, _ = failed_chunk
+    transcode_failed(None, RuntimeError("ffmpeg failed"), None, "v1", output_dir)
+
+    redis_client.delete(video_processing.aborted_key("v1"))  # start_transcode 重新開始轉碼
+    cleanup_shared_output("v1", output_dir)
+
+    assert os.path.isdir(output_dir)
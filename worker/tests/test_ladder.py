@@ -0,0 +1,151 @@
+"""
+畫質階梯規劃測試
+階梯規劃與單次解碼的多畫質 FFmpeg 指令
+"""
+import os
+
+from worker.media.ladder import LADDER, plan_ladder
+from worker.media.probe import SourceInfo
+from worker.media.storyboard import PreviewSpec, StoryboardLayout
+from worker.tasks import video_processing
+from worker.tasks.video_processing import build_ladder_command, transcode_audio_to_hls
+
+
+def source(width: int, height: int) -> SourceInfo:
+    return SourceInfo(width, height, 600.0, True)
+
+
+def test_full_ladder_for_1080p_source():
+    planned = plan_ladder(source(1920, 1080))
+
+    assert planned == LADDER
+
+
+def test_never_upscales_beyond_the_source():
+    planned = plan_ladder(source(1280, 720))
+
+    assert [rendition.name for rendition in planned] == ["360p", "720p"]
+    assert max(rendition.height for rendition in planned) == 720
+
+
+def test_rungs_keep_their_bitrate_caps():
+    planned = plan_ladder(source(3840, 2160))
+
+    # 高於最高畫質的原始影片不增加畫質，也不提高位元率上限
+    assert [rendition.name for rendition in planned] == ["360p", "720p", "1080p"]
+    for rendition, rung in zip(planned, LADDER, strict=True):
+        assert (rendition.bitrate, rendition.maxrate, rendition.bufsize) == (
+            rung.bitrate, rung.maxrate, rung.bufsize
+        )
+
+
+def test_keeps_source_aspect_ratio_with_even_dimensions():
+    planned = plan_ladder(source(1440, 1080))  # 4:3
+
+    assert [rendition.resolution for rendition in planned] == ["480x360", "960x720", "1440x1080"]
+
+
+def test_portrait_source_compares_short_side():
+    planned = plan_ladder(source(1080, 1920))
+
+    assert [rendition.name for rendition in planned] == ["360p", "720p", "1080p"]
+    assert planned[0].resolution == "360x640"
+    assert planned[-1].resolution == "1080x1920"
+
+
+def test_source_below_lowest_rung_uses_its_own_size():
+    planned = plan_ladder(source(426, 240))
+
+    assert len(planned) == 1
+    (rendition,) = planned
+    assert rendition.name == "240p"
+    assert (rendition.width, rendition.height) == (426, 240)
+    # 位元率沿用最低畫質，不為小尺寸另外調高
+    assert rendition.maxrate == LADDER[0].maxrate
+
+
+def arg(cmd: list[str], flag: str) -> str:
+    return cmd[cmd.index(flag) + 1]
+
+
+def test_ladder_command_splits_one_decode_into_every_rung():
+    cmd = build_ladder_command("/src/in.mp4", "/out", LADDER)
+
+    assert cmd.count("-i") == 1
+    assert arg(cmd, "-filter_complex").split(";") == [
+        "[0:v]split=3[s0][s1][s2]",
+        "[s0]scale=640x360[v0]",
+        "[s1]scale=1280x720[v1]",
+        "[s2]scale=1920x1080[v2]",
+    ]
+    maps = [cmd[i + 1] for i, value in enumerate(cmd) if value == "-map"]
+    assert maps == ["[v0]", "[v1]", "[v2]", "0:a:0"]
+    for i, rung in enumerate(LADDER):
+        assert arg(cmd, f"-b:v:{i}") == rung.bitrate
+        assert arg(cmd, f"-maxrate:v:{i}") == rung.maxrate
+        assert arg(cmd, f"-bufsize:v:{i}") == rung.bufsize
+
+
+def test_ladder_command_maps_rungs_and_shared_audio_to_named_playlists():
+    cmd = build_ladder_command("/src/in.mp4", "/out", LADDER)
+
+    assert arg(cmd, "-var_stream_map") == (
+        "v:0,name:360p v:1,name:720p v:2,name:1080p a:0,name:audio"
+    )
+    assert arg(cmd, "-hls_segment_filename") == os.path.join("/out", "%v", "segment_%03d.ts")
+    assert cmd[-1] == os.path.join("/out", "%v", "playlist.m3u8")
+    # 音訊只編碼一次
+    assert cmd.count("-c:a:0") == 1
+    assert "-output_ts_offset" not in cmd
+    assert "-hls_playlist_type" not in cmd
+
+
+def test_ladder_command_for_a_video_only_chunk():
+    cmd = build_ladder_command(
+        "/chunks/chunk_0002.mkv", "/out", LADDER[:1],
+        audio=False,
+        playlist_name="chunk_0002.m3u8",
+        segment_pattern="chunk_0002_segment_%03d.ts",
+        ts_offset=600.066667,
+    )
+
+    assert arg(cmd, "-filter_complex") == "[0:v]split=1[s0];[s0]scale=640x360[v0]"
+    assert arg(cmd, "-var_stream_map") == "v:0,name:360p"
+    assert "0:a:0" not in cmd
+    assert arg(cmd, "-output_ts_offset") == "600.066667"
+    assert arg(cmd, "-hls_segment_filename") == os.path.join(
+        "/out", "%v", "chunk_0002_segment_%03d.ts"
+    )
+    assert cmd[-1] == os.path.join("/out", "%v", "chunk_0002.m3u8")
+
+
+def test_ladder_command_adds_preview_branch_and_event_playlist():
+    previews = PreviewSpec("/out/_previews", StoryboardLayout(160, 90), poster_time=5.0)
+
+    cmd = build_ladder_command("/src/in.mp4", "/out", LADDER[:2], previews=previews, event_playlist=True)
+
+    filters = arg(cmd, "-filter_complex").split(";")
+    assert filters[0] == "[0:v]split=3[s0][s1][pv]"
+    assert filters[3:] == previews.filters("pv")
+    assert arg(cmd, "-hls_playlist_type") == "event"
+    # 預覽圖輸出接在 HLS 輸出之後
+    assert cmd[-len(previews.outputs()):] == previews.outputs()
+    assert cmd.index("-var_stream_map") < cmd.index("[sprite]")
+
+
+def test_shared_audio_is_encoded_once_without_video(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        video_processing, "run_ffmpeg_with_progress",
+        lambda cmd, duration, on_progress: commands.append(cmd),
+    )
+    audio_dir = str(tmp_path / "audio")
+
+    transcode_audio_to_hls("/src/in.mp4", audio_dir, 60.0)
+
+    (cmd,) = commands
+    assert arg(cmd, "-map") == "0:a:0"
+    assert arg(cmd, "-c:a") == "aac"
+    assert "-filter_complex" not in cmd and "-c:v" not in cmd
+    assert cmd[-1] == os.path.join(audio_dir, "playlist.m3u8")
+    assert os.path.isdir(audio_dir)
@@ -0,0 +1,92 @@
+"""
+轉碼子任務分派測試
+chord 的子任務組成、完成回呼與失敗回呼
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from worker.media.ladder import plan_ladder
+from worker.media.probe import SourceInfo
+from worker.tasks import video_processing
+from worker.tasks.video_processing import start_transcode, transcode_failed
+
+
+LADDER = [rendition._asdict() for rendition in plan_ladder(SourceInfo(1920, 1080, 60.0, True))]
+
+
+@pytest.fixture
+def redis_client(fake_redis):
+    return fake_redis(
+        "worker.checkpoint", "worker.progress", "worker.scheduler", "worker.tasks.video_processing"
+    )
+
+
+@pytest.fixture
+def chords(monkeypatch, redis_client):
+    """記錄 start_transcode 分派的 chord（子任務與回呼），不實際送出"""
+    dispatched = []
+
+    def chord(header):
+        def apply(callback):
+            dispatched.append((header.tasks, callback))
+            return SimpleNamespace(id="callback-id")
+        return apply
+
+    monkeypatch.setattr(video_processing, "chord", chord)
+    return dispatched
+
+
+@pytest.fixture
+def webhooks(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        video_processing, "notify_transcode_webhook",
+        lambda video_id, status, **kwargs: calls.append((video_id, status, kwargs)),
+    )
+    return calls
+
+
+def task_names(signatures) -> list[str]:
+    return [signature.task.rsplit(".", 1)[-1] for signature in signatures]
+
+
+def test_parallel_mode_runs_each_rendition_as_its_own_subtask(tmp_path, chords, monkeypatch):
+    monkeypatch.setattr(video_processing, "RENDITION_MODE", "parallel")
+
+    result = start_transcode("v1", "/src/in.mp4", str(tmp_path / "out"), LADDER, 60.0)
+
+    ((header, callback),) = chords
+    assert task_names(header) == ["transcode_rendition"] * 3
+    assert [signature.args[3]["name"] for signature in header] == ["360p", "720p", "1080p"]
+    assert task_names([callback]) == ["finalize_video"]
+    # 任一子任務最終失敗時由 transcode_failed 通知後端
+    (errback,) = callback.options["link_error"]
+    assert task_names([errback]) == ["transcode_failed"]
+    assert result == {
+        "status": "dispatched",
+        "video_id": "v1",
+        "subtasks": 3,
+        "callback_task_id": "callback-id",
+        "queue_wait": 0.0,
+    }
+
+
+def test_single_pass_mode_encodes_the_ladder_in_one_subtask(tmp_path, chords):
+    start_transcode("v1", "/src/in.mp4", str(tmp_path / "out"), LADDER, 60.0)
+
+    ((header, callback),) = chords
+    # 最低畫質由同一次解碼在轉碼途中發布
+    assert task_names(header) == ["transcode_renditions"]
+    assert header[0].kwargs["base_rendition"] == "360p"
+    assert task_names([callback]) == ["finalize_video"]
+
+
+def test_failure_is_reported_through_the_webhook(tmp_path, redis_client, webhooks, monkeypatch):
+    monkeypatch.setattr(
+        video_processing, "get_scratch", lambda: video_processing.ScratchSpace(str(tmp_path / "scratch"))
+    )
+
+    transcode_failed(None, RuntimeError("ffmpeg exited with 1"), None, "v1", str(tmp_path / "out"))
+
+    assert webhooks == [("v1", "failed", {"error_message": "ffmpeg exited with 1"})]
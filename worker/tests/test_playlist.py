@@ -0,0 +1,288 @@
+"""
+HLS 播放清單測試
+實測位元率、CODECS 與主播放列表的共用音訊群組
+"""
+import os
+
+import pytest
+
+from worker.media.ladder import Rendition
+from worker.media.playlist import (
+    Segment,
+    SegmentStats,
+    generate_master_playlist,
+    live_playlist,
+    measure_playlist,
+    measure_variant,
+    read_media_playlist,
+    write_media_playlist,
+)
+
+RENDITION_360 = Rendition("360p", 640, 360, "800k", "856k", "1200k")
+
+
+def write_rendition(directory, segments: list[tuple[float, int]]) -> str:
+    """寫出片段（指定長度與位元組數）與播放清單，返回畫質目錄"""
+    os.makedirs(directory, exist_ok=True)
+    playlist = []
+    for index, (duration, size) in enumerate(segments):
+        name = f"segment_{index:03d}.ts"
+        with open(os.path.join(directory, name), "wb") as file:
+            file.write(b"\x00" * size)
+        playlist.append(Segment(duration, name))
+    write_media_playlist(os.path.join(directory, "playlist.m3u8"), playlist)
+    return str(directory)
+
+
+def master_lines(path: str) -> list[str]:
+    with open(path) as file:
+        return [line for line in file.read().splitlines() if line]
+
+
+def test_media_playlist_round_trip(tmp_path):
+    path = str(tmp_path / "playlist.m3u8")
+    segments = [Segment(6.0, "segment_000.ts"), Segment(4.5, "segment_001.ts")]
+
+    write_media_playlist(path, segments)
+
+    assert read_media_playlist(path) == segments
+    with open(path) as file:
+        content = file.read()
+    assert "#EXT-X-TARGETDURATION:6" in content
+    assert content.rstrip().endswith("#EXT-X-ENDLIST")
+
+
+def test_media_playlist_round_trip_keeps_init_sections(tmp_path):
+    path = str(tmp_path / "playlist.m3u8")
+    segments = [
+        Segment(4.0, "c0.mp4", "1000@700", 'URI="c0.mp4",BYTERANGE="700@0"'),
+        Segment(4.0, "c1.mp4", "1000@700", 'URI="c1.mp4",BYTERANGE="700@0"'),
+    ]
+
+    write_media_playlist(path, segments)
+
+    assert read_media_playlist(path) == segments
+    with open(path) as file:
+        content = file.read()
+    assert content.count("#EXT-X-MAP:") == 2
+    assert "#EXT-X-VERSION:7" in content
+
+
+def test_measure_variant_peak_and_average(tmp_path, monkeypatch):
+    monkeypatch.setattr("worker.media.playlist.probe_codecs", lambda path: "avc1.64001e")
+    rendition_dir = write_rendition(
+        tmp_path / "360p", [(10.0, 100_000), (5.0, 75_000), (2.0, 10_000)]
+    )
+
+    variant = measure_variant(rendition_dir, RENDITION_360)
+
+    assert variant == {
+        "name": "360p",
+        "resolution": "640x360",
+        "bandwidth": 120_000,  # 第二個片段 75000 * 8 / 5
+        "average_bandwidth": 87_059,  # 185000 * 8 / 17，無條件進位
+        "codecs": "avc1.64001e",
+    }
+
+
+def test_master_playlist_orders_variants_by_bandwidth(tmp_path):
+    variants = [
+        {"name": "720p", "resolution": "1280x720", "bandwidth": 2_800_000,
+         "average_bandwidth": 2_400_000, "codecs": "avc1.64001f"},
+        {"name": "360p", "resolution": "640x360", "bandwidth": 900_000,
+         "average_bandwidth": 750_000, "codecs": "avc1.64001e"},
+    ]
+
+    lines = master_lines(generate_master_playlist(str(tmp_path), variants))
+
+    assert lines[3:] == [
+        "#EXT-X-STREAM-INF:BANDWIDTH=900000,AVERAGE-BANDWIDTH=750000,RESOLUTION=640x360,"
+        'CODECS="avc1.64001e"',
+        "360p/playlist.m3u8",
+        "#EXT-X-STREAM-INF:BANDWIDTH=2800000,AVERAGE-BANDWIDTH=2400000,RESOLUTION=1280x720,"
+        'CODECS="avc1.64001f"',
+        "720p/playlist.m3u8",
+    ]
+
+
+def test_master_playlist_omits_unknown_codecs(tmp_path):
+    variants = [{"name": "360p", "resolution": "640x360", "bandwidth": 900_000,
+                 "average_bandwidth": 750_000, "codecs": None}]
+
+    lines = master_lines(generate_master_playlist(str(tmp_path), variants))
+
+    assert lines[-2] == "#EXT-X-STREAM-INF:BANDWIDTH=900000,AVERAGE-BANDWIDTH=750000,RESOLUTION=640x360"
+
+
+def test_measure_playlist_peak_and_average(tmp_path):
+    write_media_playlist(
+        str(tmp_path / "playlist.m3u8"),
+        [Segment(10.0, "s0.ts"), Segment(5.0, "s1.ts"), Segment(2.0, "s2.ts")],
+    )
+    sizes = {"s0.ts": 100_000, "s1.ts": 75_000, "s2.ts": 10_000}
+
+    measured = measure_playlist(
+        str(tmp_path),
+        size_of=lambda path: sizes[os.path.basename(path)],
+        codecs="avc1.64001f",
+    )
+
+    # 峰值取 s1（120 kbps），平均為 1,480,000 bits / 17 秒
+    assert measured == {
+        "bandwidth": 120_000,
+        "average_bandwidth": 87_059,
+        "codecs": "avc1.64001f",
+    }
+
+
+def test_measure_audio_uses_recorded_sizes(tmp_path):
+    audio_dir = write_rendition(tmp_path / "audio", [(4.0, 64_000), (4.0, 64_000)])
+    stats = SegmentStats(codecs={audio_dir: "mp4a.40.2"})
+    for name in ("segment_000.ts", "segment_001.ts"):
+        path = os.path.join(audio_dir, name)
+        stats.record(path)
+        os.remove(path)
+
+    assert stats.measure_audio(audio_dir) == {
+        "name": "audio",
+        "bandwidth": 128_000,
+        "average_bandwidth": 128_000,
+        "codecs": "mp4a.40.2",
+    }
+
+
+def test_measure_variant_reads_local_segments(tmp_path):
+    rendition_dir = write_rendition(tmp_path / "360p", [(10.0, 12500)])
+
+    variant = measure_variant(rendition_dir, RENDITION_360, codecs="avc1.64001e")
+
+    assert variant["bandwidth"] == variant["average_bandwidth"] == 10_000
+
+
+def test_measure_variant_uses_byteranges_for_single_file(tmp_path):
+    (tmp_path / "playlist.m3u8").write_text(
+        "#EXTM3U\n"
+        '#EXT-X-MAP:URI="stream.mp4",BYTERANGE="800@0"\n'
+        "#EXTINF:4.000000,\n#EXT-X-BYTERANGE:40000@800\nstream.mp4\n"
+        "#EXTINF:4.000000,\n#EXT-X-BYTERANGE:20000@40800\nstream.mp4\n"
+        "#EXT-X-ENDLIST\n"
+    )
+
+    def size_of(path: str) -> int:
+        raise AssertionError("single-file segments are sized from EXT-X-BYTERANGE")
+
+    variant = measure_variant(str(tmp_path), RENDITION_360, size_of=size_of, codecs="avc1.4d401e")
+
+    assert variant["bandwidth"] == 80_000
+    assert variant["average_bandwidth"] == 60_000
+
+
+def test_master_playlist_adds_shared_audio_to_each_variant(tmp_path):
+    variants = [
+        {"name": "720p", "resolution": "1280x720", "bandwidth": 2_800_000,
+         "average_bandwidth": 2_400_000, "codecs": "avc1.64001f"},
+        {"name": "360p", "resolution": "640x360", "bandwidth": 900_000,
+         "average_bandwidth": 750_000, "codecs": "avc1.64001e"},
+    ]
+    audio = {"name": "audio", "bandwidth": 140_000, "average_bandwidth": 128_000, "codecs": "mp4a.40.2"}
+
+    lines = master_lines(generate_master_playlist(str(tmp_path), variants, audio=audio))
+
+    assert lines[3] == (
+        '#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio",NAME="audio",'
+        'DEFAULT=YES,AUTOSELECT=YES,URI="audio/playlist.m3u8"'
+    )
+    # 由低到高排列；BANDWIDTH 與 CODECS 涵蓋視訊加音訊
+    assert lines[4:] == [
+        "#EXT-X-STREAM-INF:BANDWIDTH=1040000,AVERAGE-BANDWIDTH=878000,RESOLUTION=640x360,"
+        'CODECS="avc1.64001e,mp4a.40.2",AUDIO="audio"',
+        "360p/playlist.m3u8",
+        "#EXT-X-STREAM-INF:BANDWIDTH=2940000,AVERAGE-BANDWIDTH=2528000,RESOLUTION=1280x720,"
+        'CODECS="avc1.64001f,mp4a.40.2",AUDIO="audio"',
+        "720p/playlist.m3u8",
+    ]
+
+
+def test_master_playlist_without_audio(tmp_path):
+    variants = [{"name": "360p", "resolution": "640x360", "bandwidth": 900_000,
+                 "average_bandwidth": 750_000, "codecs": "avc1.64001e"}]
+
+    lines = master_lines(generate_master_playlist(str(tmp_path), variants))
+
+    assert not any(line.startswith("#EXT-X-MEDIA") for line in lines)
+    assert lines[-2] == (
+        '#EXT-X-STREAM-INF:BANDWIDTH=900000,AVERAGE-BANDWIDTH=750000,RESOLUTION=640x360,'
+        'CODECS="avc1.64001e"'
+    )
+
+
+@pytest.mark.parametrize("audio_codecs", [None, "mp4a.40.2"])
+def test_master_playlist_omits_codecs_when_any_part_is_unknown(tmp_path, audio_codecs):
+    variants = [{"name": "360p", "resolution": "640x360", "bandwidth": 900_000,
+                 "average_bandwidth": 750_000, "codecs": None if audio_codecs else "avc1.64001e"}]
+    audio = {"name": "audio", "bandwidth": 140_000, "average_bandwidth": 128_000, "codecs": audio_codecs}
+
+    lines = master_lines(generate_master_playlist(str(tmp_path), variants, audio=audio))
+
+    stream_inf = next(line for line in lines if line.startswith("#EXT-X-STREAM-INF"))
+    assert "CODECS=" not in stream_inf
+    assert stream_inf.endswith('AUDIO="audio"')
+
+
+def test_audio_only_variant_is_listed_last(tmp_path):
+    variants = [{"name": "360p", "resolution": "640x360", "bandwidth": 900_000,
+                 "average_bandwidth": 750_000, "codecs": "avc1.64001e"}]
+    audio = {"name": "audio", "bandwidth": 140_000, "average_bandwidth": 128_000, "codecs": "mp4a.40.2"}
+
+    lines = master_lines(
+        generate_master_playlist(str(tmp_path), variants, audio=audio, audio_only=True)
+    )
+
+    assert lines[-2:] == [
+        '#EXT-X-STREAM-INF:BANDWIDTH=140000,AVERAGE-BANDWIDTH=128000,CODECS="mp4a.40.2"',
+        "audio/playlist.m3u8",
+    ]
+
+
+def test_segment_stats_measure_after_local_files_are_deleted(tmp_path, monkeypatch):
+    monkeypatch.setattr("worker.media.playlist.probe_codecs", lambda path: "avc1.64001e")
+    rendition_dir = write_rendition(tmp_path / "360p", [(6.0, 6000), (6.0, 12000)])
+    stats = SegmentStats()
+    for name in ("segment_000.ts", "segment_001.ts"):
+        path = os.path.join(rendition_dir, name)
+        stats.record(path)
+        os.remove(path)  # 上傳後刪除
+
+    variant = stats.measure(rendition_dir, RENDITION_360)
+
+    assert variant == {
+        "name": "360p",
+        "resolution": "640x360",
+        "bandwidth": 16_000,
+        "average_bandwidth": 12_000,
+        "codecs": "avc1.64001e",
+    }
+
+
+def test_segment_stats_round_trip_through_task_results(tmp_path, monkeypatch):
+    monkeypatch.setattr("worker.media.playlist.probe_codecs", lambda path: "avc1.64001e")
+    path = tmp_path / "360p" / "segment_000.ts"
+    path.parent.mkdir()
+    path.write_bytes(b"\x00" * 10)
+    first = SegmentStats()
+    first.record(str(path))
+
+    merged = SegmentStats()
+    merged.merge(first.to_dict())
+    merged.merge({"codecs": {str(path.parent): "ignored"}})
+
+    assert merged.size_of(str(path)) == 10
+    assert merged.codecs == {str(path.parent): "avc1.64001e"}
+
+
+def test_live_playlist_starts_from_the_beginning():
+    event = "#EXTM3U\n#EXT-X-PLAYLIST-TYPE:EVENT\n#EXTINF:6.0,\nsegment_000.ts\n"
+    ended = event + "#EXT-X-ENDLIST\n"
+
+    assert live_playlist(event).splitlines()[1] == "#EXT-X-START:TIME-OFFSET=0"
+    assert live_playlist(ended) == ended
@@ -0,0 +1,184 @@
+"""
+轉碼進度測試
+FFmpeg -progress 解析、發布節流、工作量計畫與 FFmpeg 執行
+"""
+import json
+import subprocess
+import sys
+
+import pytest
+
+from worker.progress import (
+    ProgressParser,
+    ProgressReporter,
+    plan_key,
+    progress_channel,
+    progress_key,
+    publish_plan,
+)
+from worker.tasks.video_processing import run_ffmpeg_with_progress
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def feed_block(parser: ProgressParser, out_time_us: int, speed: str = "2.00x", end: bool = False):
+    """送入一個 FFmpeg -progress 區塊，返回區塊結尾的快照"""
+    assert parser.feed(f"out_time_us={out_time_us}\n") is None
+    assert parser.feed(f"speed={speed}\n") is None
+    return parser.feed("progress=end\n" if end else "progress=continue\n")
+
+
+@pytest.fixture
+def redis_client(fake_redis):
+    return fake_redis("worker.progress")
+
+
+def test_parser_reports_fraction_and_eta():
+    parser = ProgressParser(duration=100.0, clock=FakeClock())
+
+    progress = feed_block(parser, 25_000_000, speed="2.5x")
+
+    assert progress.fraction == 0.25
+    assert progress.out_time == 25.0
+    assert progress.speed == 2.5
+    assert progress.eta == 30.0  # 剩餘 75 秒媒體 / 2.5 倍速
+    assert not progress.done
+
+
+def test_parser_estimates_speed_from_wall_clock_when_not_available():
+    clock = FakeClock()
+    parser = ProgressParser(duration=100.0, clock=clock)
+    clock.now += 10.0
+
+    progress = feed_block(parser, 20_000_000, speed="N/A")
+
+    assert progress.speed == 2.0
+    assert progress.eta == 40.0
+
+
+def test_parser_end_block_is_complete():
+    parser = ProgressParser(duration=100.0, clock=FakeClock())
+
+    progress = feed_block(parser, 99_000_000, end=True)
+
+    assert progress.fraction == 1.0
+    assert progress.eta == 0.0
+    assert progress.done
+
+
+def test_parser_without_duration_cannot_estimate():
+    parser = ProgressParser(duration=None, clock=FakeClock())
+
+    progress = feed_block(parser, 5_000_000)
+
+    assert progress.fraction == 0.0
+    assert progress.out_time == 5.0
+    assert progress.eta is None
+
+
+def test_parser_clamps_fraction_past_duration():
+    parser = ProgressParser(duration=10.0, clock=FakeClock())
+
+    assert feed_block(parser, 10_500_000).fraction == 1.0
+
+
+def test_reporter_throttles_until_interval_or_done(redis_client):
+    clock = FakeClock()
+    reporter = ProgressReporter("v1", "rendition:720p", interval=2.0, clock=clock)
+    parser = ProgressParser(duration=100.0, clock=clock)
+    pubsub = redis_client.pubsub()
+    pubsub.subscribe(progress_channel("v1"))
+    pubsub.get_message()
+
+    reporter(feed_block(parser, 10_000_000))
+    clock.now += 1.0
+    reporter(feed_block(parser, 20_000_000))  # 間隔內略過
+    clock.now += 1.0
+    reporter(feed_block(parser, 30_000_000))
+    clock.now += 0.5
+    reporter(feed_block(parser, 40_000_000, end=True))  # 結束時一定發布
+
+    published = []
+    while (message := pubsub.get_message()) is not None:
+        published.append(json.loads(message["data"]))
+    assert [(entry["out_time"], entry["done"]) for entry in published] == [
+        (10.0, False), (30.0, False), (100.0, True)
+    ]
+    latest = json.loads(redis_client.hget(progress_key("v1"), "rendition:720p"))
+    assert latest == published[-1]
+    assert latest["step"] == "rendition:720p"
+    assert redis_client.ttl(progress_key("v1")) > 0
+
+
+def test_reporters_for_different_steps_share_the_hash(redis_client):
+    clock = FakeClock()
+    for step, out_time in (("chunk:0:360p", 5_000_000), ("chunk:1:360p", 8_000_000)):
+        parser = ProgressParser(duration=10.0, clock=clock)
+        ProgressReporter("v1", step, clock=clock)(feed_block(parser, out_time))
+
+    latest = redis_client.hgetall(progress_key("v1"))
+
+    assert {json.loads(value)["fraction"] for value in latest.values()} == {0.5, 0.8}
+
+
+def test_publish_plan_stores_weights(redis_client):
+    publish_plan("v1", {"audio": 600.0, "chunk:0:360p": 300.0, "chunk:1:360p": 300.0})
+
+    assert json.loads(redis_client.get(plan_key("v1"))) == {
+        "audio": 600.0, "chunk:0:360p": 300.0, "chunk:1:360p": 300.0
+    }
+    assert redis_client.ttl(plan_key("v1")) > 0
+
+
+
+def test_progress_keeps_the_plan_alive(redis_client):
+    publish_plan("v1", {"chunk:0:360p": 300.0})
+    redis_client.expire(plan_key("v1"), 5)  # 已執行接近 PROGRESS_TTL 的轉碼
+    clock = FakeClock()
+    parser = ProgressParser(duration=10.0, clock=clock)
+
+    ProgressReporter("v1", "chunk:0:360p", clock=clock)(feed_block(parser, 5_000_000))
+
+    assert redis_client.ttl(plan_key("v1")) == redis_client.ttl(progress_key("v1")) > 5
+
+
+def fake_ffmpeg(script: str) -> list[str]:
+    """以 Python 程序模擬 FFmpeg 的 -progress pipe:1 輸出"""
+    return [sys.executable, "-c", script]
+
+
+def test_run_ffmpeg_reports_each_progress_block():
+    cmd = fake_ffmpeg(
+        "import sys\n"
+        "for out_time_us, state in ((2_500_000, 'continue'), (10_000_000, 'end')):\n"
+        "    print(f'out_time_us={out_time_us}')\n"
+        "    print('speed=5.0x')\n"
+        "    print(f'progress={state}')\n"
+        "    sys.stderr.write('frame= 1 fps=0.0\\n' * 2000)\n"  # 大量 stderr 不會塞住管線
+    )
+    reported = []
+
+    run_ffmpeg_with_progress(cmd, 10.0, reported.append)
+
+    assert [(progress.fraction, progress.done) for progress in reported] == [(0.25, False), (1.0, True)]
+
+
+def test_run_ffmpeg_without_callback_still_drains_output():
+    run_ffmpeg_with_progress(fake_ffmpeg("print('progress=end')"), None)
+
+
+def test_run_ffmpeg_failure_carries_stderr():
+    cmd = fake_ffmpeg("import sys; sys.stderr.write('Invalid data found'); sys.exit(1)")
+
+    with pytest.raises(subprocess.CalledProcessError) as raised:
+        run_ffmpeg_with_progress(cmd, 10.0)
+
+    assert raised.value.returncode == 1
+    assert raised.value.cmd == cmd
+    assert raised.value.stderr == "Invalid data found"
@@ -0,0 +1,75 @@
+"""
+分階段發布測試
+最低畫質發布、較高畫質補齊與轉碼完成時通知後端的狀態
+"""
+import pytest
+
+from worker.tasks import video_processing
+from worker.tasks.video_processing import (
+    complete_transcode,
+    publish_variants,
+    transcode_failed,
+)
+
+
+def variant(name: str, bandwidth: int, live: bool = False) -> dict:
+    entry = {"name": name, "resolution": "640x360", "bandwidth": bandwidth,
+             "average_bandwidth": bandwidth, "codecs": "avc1.64001e"}
+    if live:
+        entry["live"] = True
+    return entry
+
+
+@pytest.fixture
+def webhooks(fake_redis, monkeypatch):
+    """本機輸出、不上傳，記錄通知後端的狀態"""
+    fake_redis("worker.checkpoint", "worker.tasks.video_processing", "worker.scheduler")
+    monkeypatch.setattr(video_processing, "UPLOAD_ENABLED", False)
+    monkeypatch.setattr(video_processing, "dispatch_transcodes", lambda: None)
+    calls = []
+    monkeypatch.setattr(
+        video_processing, "notify_transcode_webhook",
+        lambda video_id, status, **kwargs: calls.append(status),
+    )
+    return calls
+
+
+def test_single_pass_reports_completed_once(tmp_path, webhooks):
+    output_dir = str(tmp_path)
+    # 轉碼途中以標稱位元率發布快照，完成後以實測資訊重新發布
+    publish_variants("v1", output_dir, [variant("360p", 856_000, live=True)], "360p")
+    final = [variant("360p", 800_000), variant("720p", 2_800_000)]
+    publish_variants("v1", output_dir, final[:1], "360p")
+
+    complete_transcode([{"video_id": "v1", "variants": final}], "v1", output_dir)
+
+    assert webhooks == ["published", "published", "completed"]
+
+
+def test_backfilled_rungs_do_not_report_again(tmp_path, webhooks):
+    output_dir = str(tmp_path)
+    publish_variants("v1", output_dir, [variant("720p", 2_800_000)], "360p")  # 最低畫質完成前只記錄
+    publish_variants("v1", output_dir, [variant("360p", 800_000)], "360p")
+    publish_variants("v1", output_dir, [variant("1080p", 5_000_000)], "360p")
+
+    assert webhooks == ["published"]
+    with open(tmp_path / "master.m3u8") as file:
+        assert file.read().count("#EXT-X-STREAM-INF") == 3
+
+
+def test_failure_after_live_publish_is_reported(tmp_path, webhooks):
+    publish_variants("v1", str(tmp_path), [variant("360p", 856_000, live=True)], "360p")
+
+    transcode_failed(None, RuntimeError("ffmpeg failed"), None, "v1", str(tmp_path / "out"))
+
+    # 快照不完整，仍回報失敗；後端不會將已可播放的影片改為失敗
+    assert webhooks == ["published", "failed"]
+
+
+def test_failure_while_backfilling_is_still_reported(tmp_path, webhooks):
+    publish_variants("v1", str(tmp_path), [variant("360p", 800_000)], "360p")
+
+    transcode_failed(None, RuntimeError("ffmpeg failed"), None, "v1", str(tmp_path / "out"))
+
+    # 最低畫質已完整發布，後端保留影片可播放，但須得知轉碼已結束
+    assert webhooks == ["published", "failed"]
@@ -0,0 +1,165 @@
+"""
+轉碼排程測試
+短片優先、等待老化、講師間公平分配與名額釋放
+"""
+import pytest
+
+from worker import scheduler
+from worker.tasks import video_processing
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 10_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("worker.scheduler.time.time", clock)
+    return clock
+
+
+@pytest.fixture
+def redis_client(fake_redis):
+    return fake_redis("worker.scheduler")
+
+
+def enqueue(video_id: str, owner_id: str, duration: float) -> None:
+    assert scheduler.enqueue(video_id, owner_id, duration, {"duration": duration})
+
+
+def claimed(slots: int) -> list[str]:
+    return [job.video_id for job in scheduler.claim_jobs(slots)]
+
+
+def test_shortest_video_first(redis_client, clock):
+    enqueue("long", "a", 3600.0)
+    enqueue("short", "b", 60.0)
+    enqueue("medium", "c", 600.0)
+
+    assert claimed(slots=2) == ["short", "medium"]
+    assert claimed(slots=2) == []  # 名額已滿
+
+
+def test_waiting_ages_long_videos_forward(redis_client, clock):
+    enqueue("long", "a", 3600.0)
+    clock.now += 3000.0
+    enqueue("short", "b", 900.0)
+
+    # 3600 - 3000 < 900：等待夠久的長影片排到新加入的短片前面
+    assert claimed(slots=1) == ["long"]
+
+
+def test_owner_with_running_transcodes_yields(redis_client, clock):
+    enqueue("a-1", "a", 60.0)
+    enqueue("a-2", "a", 60.0)
+    enqueue("a-3", "a", 60.0)
+    enqueue("b-1", "b", 1800.0)
+
+    # 講師 a 已有一部在轉碼時，講師 b 的長影片先於 a 的其他短片
+    assert claimed(slots=2) == ["a-1", "b-1"]
+
+
+def test_enqueue_is_idempotent_while_waiting_or_running(redis_client, clock):
+    enqueue("v1", "a", 60.0)
+
+    assert not scheduler.enqueue("v1", "a", 60.0, {})
+    claimed(slots=1)
+    assert not scheduler.enqueue("v1", "a", 60.0, {})
+
+
+def test_release_frees_the_slot(redis_client, clock):
+    enqueue("v1", "a", 60.0)
+    enqueue("v2", "a", 60.0)
+    assert claimed(slots=1) == ["v1"]
+
+    scheduler.release("v1")
+
+    assert claimed(slots=1) == ["v2"]
+    assert redis_client.hgetall(scheduler.RUNNING_OWNERS_KEY) == {b"v2": b"a"}
+
+
+def test_expired_lease_is_reclaimed(redis_client, clock):
+    enqueue("stuck", "a", 60.0)
+    enqueue("next", "b", 120.0)
+    assert claimed(slots=1) == ["stuck"]
+
+    clock.now += scheduler.LEASE_SECONDS + 1
+
+    assert claimed(slots=1) == ["next"]
+    assert redis_client.zscore(scheduler.RUNNING_KEY, "stuck") is None
+
+
+def test_claim_records_queue_wait(redis_client, clock):
+    enqueue("v1", "a", 60.0)
+    clock.now += 12.5
+
+    (job,) = scheduler.claim_jobs(slots=1)
+
+    assert job.payload == {"duration": 60.0}
+    assert redis_client.lrange(scheduler.WAITS_KEY, 0, -1) == [b"12.500"]
+
+
+def test_requeue_keeps_original_enqueue_time(redis_client, clock):
+    enqueue("v1", "a", 60.0)
+    enqueued_at = clock.now
+    (job,) = scheduler.claim_jobs(slots=1)
+    clock.now += 30.0
+
+    scheduler.requeue(job)
+
+    assert redis_client.zcard(scheduler.RUNNING_KEY) == 0
+    assert redis_client.zscore(scheduler.PENDING_KEY, "v1") == enqueued_at
+    (again,) = scheduler.claim_jobs(slots=1)
+    assert again == job
+
+
+def test_dispatch_requeues_when_task_cannot_be_sent(redis_client, clock, monkeypatch):
+    enqueue("v1", "a", 60.0)
+
+    def delay(*args, **kwargs):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(video_processing.start_transcode, "delay", delay)
+
+    video_processing.dispatch_transcodes()
+
+    assert redis_client.zcard(scheduler.RUNNING_KEY) == 0
+    assert redis_client.zrange(scheduler.PENDING_KEY, 0, -1) == [b"v1"]
+
+
+def test_start_transcode_final_failure_frees_the_slot(fake_redis, clock, monkeypatch, tmp_path):
+    redis_client = fake_redis(
+        "worker.scheduler", "worker.checkpoint", "worker.progress", "worker.tasks.video_processing"
+    )
+    enqueue("v1", "a", 60.0)
+    enqueue("v2", "b", 60.0)
+    assert claimed(slots=1) == ["v1"]
+    dispatched, webhooks = [], []
+    monkeypatch.setattr(scheduler, "SCHEDULER_SLOTS", 1)
+    monkeypatch.setattr(video_processing, "chord", lambda header: 1 / 0)
+    monkeypatch.setattr(
+        video_processing, "get_scratch", lambda: video_processing.ScratchSpace(str(tmp_path))
+    )
+    monkeypatch.setattr(
+        video_processing.start_transcode, "delay", lambda video_id, **kwargs: dispatched.append(video_id)
+    )
+    monkeypatch.setattr(
+        video_processing, "notify_transcode_webhook",
+        lambda video_id, status, **kwargs: webhooks.append((video_id, status)),
+    )
+    ladder = [{"name": "360p", "width": 640, "height": 360,
+               "bitrate": "800k", "maxrate": "856k", "bufsize": "1200k"}]
+
+    result = video_processing.start_transcode.apply(
+        args=("v1", "/tmp/missing.mp4", str(tmp_path / "out"), ladder, 60.0), retries=3
+    )
+
+    assert isinstance(result.result, ZeroDivisionError)
+    assert webhooks == [("v1", "failed")]
+    assert redis_client.zscore(scheduler.RUNNING_KEY, "v1") is None
+    assert dispatched == ["v2"]  # 釋放的名額立即分派給下一部影片
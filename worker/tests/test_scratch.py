@@ -0,0 +1,179 @@
+"""
+暫存空間管理測試
+預留紀錄、輸出大小估算與原始檔 LRU 快取
+"""
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+from worker import scratch
+from worker.scratch import (
+    MB,
+    ScratchFull,
+    ScratchSpace,
+    ScratchTooLarge,
+    estimate_hls_bytes,
+    parse_bitrate,
+)
+
+
+@pytest.fixture
+def disk(monkeypatch):
+    """以固定的磁碟容量與剩餘空間取代 shutil.disk_usage"""
+    usage = {"total": 1000 * MB, "free": 500 * MB}
+
+    def disk_usage(path):
+        return shutil._ntuple_diskusage(usage["total"], usage["total"] - usage["free"], usage["free"])
+
+    monkeypatch.setattr(scratch.shutil, "disk_usage", disk_usage)
+    return usage
+
+
+@pytest.fixture
+def space(tmp_path, disk) -> ScratchSpace:
+    return ScratchSpace(str(tmp_path / "scratch"), min_free=100 * MB, cache_bytes=300 * MB)
+
+
+def ledger(space: ScratchSpace) -> dict:
+    with open(os.path.join(space.root, "reservations.json")) as f:
+        return json.load(f)
+
+
+def cache_source(space: ScratchSpace, video_id: str, size: int, mtime: float) -> str:
+    """直接放入快取的原始檔（大小以稀疏檔模擬）"""
+    path = os.path.join(space.source_dir, video_id, "source.mp4")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.truncate(size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.mark.parametrize(("rate", "expected"), [
+    ("800k", 800_000), ("2.5M", 2_500_000), ("128000", 128_000), ("5m", 5_000_000),
+])
+def test_parse_bitrate(rate, expected):
+    assert parse_bitrate(rate) == expected
+
+
+def test_parse_bitrate_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_bitrate("fast")
+
+
+def test_estimate_hls_bytes_sums_maxrates_and_audio():
+    # (856k + 3M + 128k) * 100 秒 / 8 * 1.1
+    assert estimate_hls_bytes(["856k", "3M"], 100.0, audio=True) == 54_780_000
+    assert estimate_hls_bytes(["856k"], None) == 0
+
+
+def test_reservations_are_shared_through_the_ledger(space, disk):
+    other = ScratchSpace(space.root, min_free=space.min_free)
+
+    with space.reserve("v1:ladder", 300 * MB):
+        # 剩餘 500 - 最低保留 100 - 已預留 300
+        with pytest.raises(ScratchFull) as caught:
+            with other.reserve("v2:ladder", 150 * MB):
+                pass
+        assert caught.value.available == 100 * MB
+        with other.reserve("v2:ladder", 100 * MB):
+            assert set(ledger(space)) == {"v1:ladder", "v2:ladder"}
+
+    assert ledger(space) == {}
+
+
+def test_reserving_the_same_name_replaces_the_entry(space):
+    with space.reserve("v1:ladder", 300 * MB):
+        # 任務重試時同名預留不重複計算
+        with space.reserve("v1:ladder", 350 * MB):
+            assert ledger(space)["v1:ladder"]["bytes"] == 350 * MB
+
+
+def test_stale_and_dead_reservations_are_dropped(space, monkeypatch):
+    with space.reserve("stale", 300 * MB), space.reserve("dead", 100 * MB):
+        entries = ledger(space)
+    entries["stale"]["created"] = time.time() - scratch.RESERVATION_TTL - 1
+    entries["dead"]["pid"] = 2 ** 22 + 1  # 不存在的程序
+    with open(os.path.join(space.root, "reservations.json"), "w") as f:
+        json.dump(entries, f)
+
+    with space.reserve("v1:ladder", 400 * MB):
+        assert set(ledger(space)) == {"v1:ladder"}
+
+
+def test_reservation_is_released_when_the_task_fails(space):
+    with pytest.raises(RuntimeError):
+        with space.reserve("v1:ladder", 10 * MB):
+            raise RuntimeError("ffmpeg failed")
+
+    assert ledger(space) == {}
+
+
+def test_more_than_the_disk_holds_is_not_retryable(space, disk):
+    with pytest.raises(ScratchTooLarge) as caught:
+        with space.reserve("v1:source", 950 * MB):
+            pass
+
+    assert not isinstance(caught.value, ScratchFull)
+    assert caught.value.capacity == 900 * MB
+
+
+def test_full_disk_evicts_least_recently_used_sources(space, disk):
+    oldest = cache_source(space, "old", 100 * MB, mtime=1000.0)
+    in_use = cache_source(space, "busy", 100 * MB, mtime=500.0)
+    newest = cache_source(space, "new", 100 * MB, mtime=2000.0)
+
+    # 可用 400 MB，需要 450 MB：淘汰未被使用的最舊原始檔
+    with space.reserve("busy:ladder", 10 * MB, sources=[in_use]):
+        with space.reserve("v1:ladder", 440 * MB):
+            pass
+
+    assert not os.path.exists(oldest)
+    assert os.path.exists(in_use)
+    assert os.path.exists(newest)
+
+
+def test_source_cache_hits_skip_the_download(space):
+    fetched = []
+
+    def fetch(key, path):
+        fetched.append(key)
+        with open(path, "wb") as f:
+            f.write(b"video")
+
+    first = space.source("v1", "uploads/v1/lecture.mp4", 5, fetch)
+    second = space.source("v1", "uploads/v1/lecture.mp4", 5, fetch)
+
+    assert first == second == os.path.join(space.source_dir, "v1", "lecture.mp4")
+    assert fetched == ["uploads/v1/lecture.mp4"]
+    assert ledger(space) == {}  # 下載的預留在完成後釋放
+
+
+def test_source_cache_is_trimmed_to_its_budget(space):
+    oldest = cache_source(space, "old", 150 * MB, mtime=1000.0)
+    recent = cache_source(space, "recent", 100 * MB, mtime=2000.0)
+
+    def fetch(key, path):
+        with open(path, "wb") as f:
+            f.truncate(100 * MB)
+
+    path = space.source("v1", "uploads/v1/lecture.mp4", 100 * MB, fetch)
+
+    # 快取上限 300 MB：新下載的原始檔保留，淘汰最久未使用者
+    assert os.path.exists(path)
+    assert os.path.exists(recent)
+    assert not os.path.exists(oldest)
+    assert not os.path.exists(os.path.dirname(oldest))
+
+
+def test_failed_download_releases_its_reservation(space):
+    def fetch(key, path):
+        raise OSError("connection reset")
+
+    with pytest.raises(OSError):
+        space.source("v1", "uploads/v1/lecture.mp4", 5, fetch)
+
+    assert ledger(space) == {}
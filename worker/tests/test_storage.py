@@ -0,0 +1,251 @@
+"""
+HLSUploader 測試
+以 moto 的 S3 伺服器驗證上傳順序、錯誤處理與單檔 fMP4 的上傳時機
+"""
+import os
+import time
+
+import pytest
+from boto3.exceptions import S3UploadFailedError
+from botocore.awsrequest import AWSResponse
+
+from worker import storage
+from worker.storage import HLSUploader
+
+KEY_PREFIX = "transcoded/video-1"
+
+PLAYLIST = "#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXTINF:6.0,\nsegment_000.ts\n#EXT-X-ENDLIST\n"
+
+
+class RawBody:
+    """AWSResponse 需要可串流的原始本文"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def stream(self):
+        yield self.body
+
+
+def error_response(request, status: int, code: str) -> AWSResponse:
+    body = f"<Error><Code>{code}</Code><Message>{code}</Message></Error>".encode()
+    return AWSResponse(request.url, status, {"Content-Type": "application/xml"}, RawBody(body))
+
+
+def write_file(directory, name: str, content: bytes = b"\x47" * 188) -> str:
+    path = os.path.join(directory, name)
+    with open(path, "wb") as file:
+        file.write(content)
+    return path
+
+
+def object_keys(client) -> set:
+    response = client.list_objects_v2(Bucket=storage.MINIO_BUCKET_NAME)
+    return {item["Key"] for item in response.get("Contents", [])}
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def upload_log(monkeypatch):
+    """依完成順序記錄上傳的物件鍵"""
+    keys = []
+    upload_file = storage.upload_file
+
+    def record(local_path, key, cache_control=None):
+        upload_file(local_path, key, cache_control)
+        keys.append(key)
+
+    monkeypatch.setattr(storage, "upload_file", record)
+    return keys
+
+
+def test_playlists_are_published_after_all_segments(tmp_path, s3_bucket, upload_log):
+    for index in range(5):
+        write_file(tmp_path, f"segment_{index:03d}.ts")
+    write_file(tmp_path, "stream.m3u8", PLAYLIST.encode())
+
+    with HLSUploader(str(tmp_path), KEY_PREFIX, max_workers=2, poll_interval=0.01) as uploader:
+        write_file(tmp_path, "segment_005.ts")
+
+    playlist_index = upload_log.index(f"{KEY_PREFIX}/stream.m3u8")
+    assert playlist_index == len(upload_log) - 1
+    assert set(upload_log[:playlist_index]) == {
+        f"{KEY_PREFIX}/segment_{index:03d}.ts" for index in range(6)
+    }
+    assert object_keys(s3_bucket) == set(upload_log)
+    assert len(uploader.sizes) == 6
+
+    # 片段上傳後刪除，播放清單留在本機
+    assert sorted(os.listdir(tmp_path)) == ["stream.m3u8"]
+    head = s3_bucket.head_object(Bucket=storage.MINIO_BUCKET_NAME, Key=f"{KEY_PREFIX}/segment_000.ts")
+    assert head["ContentType"] == "video/mp2t"
+
+
+def test_segments_are_uploaded_while_transcoding(tmp_path, s3_bucket):
+    with HLSUploader(str(tmp_path), KEY_PREFIX, poll_interval=0.01):
+        write_file(tmp_path, "segment_000.ts")
+        assert wait_for(lambda: f"{KEY_PREFIX}/segment_000.ts" in object_keys(s3_bucket))
+        write_file(tmp_path, "stream.m3u8", PLAYLIST.encode())
+        time.sleep(0.05)
+        assert f"{KEY_PREFIX}/stream.m3u8" not in object_keys(s3_bucket)
+
+    assert f"{KEY_PREFIX}/stream.m3u8" in object_keys(s3_bucket)
+
+
+def test_watcher_keeps_scanning_after_an_error(tmp_path, s3_bucket):
+    uploader = HLSUploader(str(tmp_path), KEY_PREFIX, poll_interval=0.01)
+    scan = uploader._scan
+    calls = []
+
+    def fail_once():
+        calls.append(None)
+        if len(calls) == 1:
+            raise FileNotFoundError("segment_000.ts")
+        scan()
+
+    uploader._scan = fail_once
+    with uploader:
+        write_file(tmp_path, "segment_000.ts")
+        # 第一次掃描失敗後監看仍繼續，片段在轉碼期間上傳
+        assert wait_for(lambda: f"{KEY_PREFIX}/segment_000.ts" in object_keys(s3_bucket))
+
+
+def test_persistent_scan_error_is_raised_on_finish(tmp_path, s3_bucket):
+    uploader = HLSUploader(str(tmp_path), KEY_PREFIX, poll_interval=0.01)
+
+    def fail():
+        raise PermissionError(str(tmp_path))
+
+    uploader._scan = fail
+    uploader.start()
+    time.sleep(0.05)
+
+    with pytest.raises(PermissionError):
+        uploader.finish()
+    assert object_keys(s3_bucket) == set()
+
+
+def test_transient_errors_are_retried(tmp_path, s3_bucket):
+    attempts = []
+
+    def fail_once(request, **kwargs):
+        attempts.append(request.url)
+        if len(attempts) == 1:
+            return error_response(request, 503, "SlowDown")
+        return None
+
+    s3_bucket.meta.events.register("before-send.s3.PutObject", fail_once)
+    write_file(tmp_path, "segment_000.ts")
+    write_file(tmp_path, "stream.m3u8", PLAYLIST.encode())
+
+    with HLSUploader(str(tmp_path), KEY_PREFIX, poll_interval=0.01):
+        pass
+
+    assert len(attempts) == 3  # 片段重試一次 + 播放清單
+    assert object_keys(s3_bucket) == {f"{KEY_PREFIX}/segment_000.ts", f"{KEY_PREFIX}/stream.m3u8"}
+
+
+def test_failed_segment_withholds_playlists_until_rerun(tmp_path, s3_bucket):
+    def deny_second_segment(request, **kwargs):
+        if request.url.endswith("segment_001.ts"):
+            return error_response(request, 403, "AccessDenied")
+        return None
+
+    s3_bucket.meta.events.register("before-send.s3.PutObject", deny_second_segment)
+    for index in range(3):
+        write_file(tmp_path, f"segment_{index:03d}.ts")
+    write_file(tmp_path, "stream.m3u8", PLAYLIST.encode())
+
+    uploader = HLSUploader(str(tmp_path), KEY_PREFIX, poll_interval=0.01)
+    uploader.start()
+    with pytest.raises(S3UploadFailedError):
+        uploader.finish()
+
+    assert f"{KEY_PREFIX}/stream.m3u8" not in object_keys(s3_bucket)
+    # 上傳失敗的片段留在本機，重試時重新上傳
+    assert sorted(os.listdir(tmp_path)) == ["segment_001.ts", "stream.m3u8"]
+
+    s3_bucket.meta.events.unregister("before-send.s3.PutObject", deny_second_segment)
+    with HLSUploader(str(tmp_path), KEY_PREFIX, poll_interval=0.01):
+        pass
+
+    assert object_keys(s3_bucket) == {
+        f"{KEY_PREFIX}/segment_000.ts",
+        f"{KEY_PREFIX}/segment_001.ts",
+        f"{KEY_PREFIX}/segment_002.ts",
+        f"{KEY_PREFIX}/stream.m3u8",
+    }
+
+
+def test_exception_aborts_without_publishing(tmp_path, s3_bucket):
+    write_file(tmp_path, "stream.m3u8", PLAYLIST.encode())
+
+    uploader = HLSUploader(str(tmp_path), KEY_PREFIX, poll_interval=0.01)
+    with pytest.raises(RuntimeError), uploader:
+        write_file(tmp_path, "segment_000.ts")
+        raise RuntimeError("ffmpeg failed")
+
+    assert not uploader._watcher.is_alive()
+    assert f"{KEY_PREFIX}/stream.m3u8" not in object_keys(s3_bucket)
+    with pytest.raises(RuntimeError):
+        uploader._executor.submit(print)
+
+
+def test_single_file_is_uploaded_on_finish_before_playlist(tmp_path, s3_bucket, upload_log):
+    write_file(tmp_path, "stream.mp4", b"\x00" * 64)
+    write_file(tmp_path, "stream.m3u8", PLAYLIST.encode())
+
+    with HLSUploader(str(tmp_path), KEY_PREFIX, poll_interval=0.01):
+        # 單檔 fMP4 仍在寫入中，監看期間不上傳
+        with open(tmp_path / "stream.mp4", "ab") as file:
+            file.write(b"\x01" * 64)
+        time.sleep(0.05)
+        assert upload_log == []
+
+    assert upload_log == [f"{KEY_PREFIX}/stream.mp4", f"{KEY_PREFIX}/stream.m3u8"]
+    body = s3_bucket.get_object(Bucket=storage.MINIO_BUCKET_NAME, Key=f"{KEY_PREFIX}/stream.mp4")
+    assert body["ContentType"] == "video/mp4"
+    assert body["ContentLength"] == 128
+
+
+def test_live_playlists_publish_snapshots_of_uploaded_segments(tmp_path, s3_bucket):
+    published = []
+    event = "#EXTM3U\n#EXT-X-PLAYLIST-TYPE:EVENT\n#EXTINF:6.0,\nsegment_000.ts\n"
+    key = f"{KEY_PREFIX}/stream.m3u8"
+
+    def read_playlist() -> str:
+        response = s3_bucket.get_object(Bucket=storage.MINIO_BUCKET_NAME, Key=key)
+        return response["Body"].read().decode()
+
+    with HLSUploader(
+        str(tmp_path), KEY_PREFIX, poll_interval=0.01,
+        live_playlists=True, on_playlist=published.append,
+    ):
+        # 列出的片段尚未出現，不發布快照
+        write_file(tmp_path, "stream.m3u8", (event + "#EXTINF:6.0,\nsegment_001.ts\n").encode())
+        time.sleep(0.05)
+        assert key not in object_keys(s3_bucket)
+
+        write_file(tmp_path, "stream.m3u8", event.encode())
+        write_file(tmp_path, "segment_000.ts")
+        assert wait_for(lambda: key in object_keys(s3_bucket))
+        snapshot = read_playlist()
+        assert "#EXT-X-START:TIME-OFFSET=0" in snapshot
+        assert "#EXT-X-ENDLIST" not in snapshot
+        assert published == [str(tmp_path / "stream.m3u8")]
+
+        write_file(tmp_path, "segment_001.ts")
+        write_file(tmp_path, "stream.m3u8", (event + "#EXTINF:6.0,\nsegment_001.ts\n").encode())
+        assert wait_for(lambda: "segment_001.ts" in read_playlist())
+        write_file(tmp_path, "stream.m3u8", PLAYLIST.encode())
+
+    # 結束後發布 FFmpeg 寫出的完整播放清單
+    assert read_playlist() == PLAYLIST
@@ -0,0 +1,215 @@
+"""
+物件儲存回收測試
+請求速率限制、multi-object delete 分批與整體回收流程
+"""
+import uuid
+
+import pytest
+
+from worker.tasks import storage_gc
+from worker.tasks.storage_gc import (
+    DELETE_BATCH_SIZE,
+    GC_LOCK_KEY,
+    BatchDeleter,
+    RateLimiter,
+    collect_storage_garbage,
+)
+
+from .conftest import TEST_BUCKET
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_rate_limiter_spaces_requests():
+    clock = FakeClock()
+    limiter = RateLimiter(4, clock=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        limiter.wait()
+    clock.now += 1.0  # 閒置後不補發先前未用的額度
+    limiter.wait()
+    limiter.wait()
+
+    assert clock.sleeps == [0.25, 0.25, 0.25]
+
+
+def test_rate_limiter_without_limit_never_sleeps():
+    clock = FakeClock()
+    limiter = RateLimiter(0, clock=clock, sleep=clock.sleep)
+
+    for _ in range(5):
+        limiter.wait()
+
+    assert clock.sleeps == []
+
+
+@pytest.fixture
+def deleted_batches(monkeypatch):
+    """記錄每次 multi-object delete 的物件鍵，以 failing 指定刪除失敗的鍵"""
+    batches: list[list[str]] = []
+    failing: set[str] = set()
+
+    def delete_objects(keys):
+        batches.append(keys)
+        return [key for key in keys if key in failing]
+
+    monkeypatch.setattr(storage_gc, "delete_objects", delete_objects)
+    return batches, failing
+
+
+def no_limit() -> RateLimiter:
+    return RateLimiter(0)
+
+
+def test_batch_deleter_sends_1000_keys_per_request(deleted_batches):
+    batches, failing = deleted_batches
+    failing.add("uploads/a/1500")
+    deleter = BatchDeleter(no_limit(), max_deletes=10_000)
+
+    for index in range(2500):
+        deleter.add({"Key": f"uploads/a/{index}", "Size": 10})
+    assert [len(batch) for batch in batches] == [DELETE_BATCH_SIZE, DELETE_BATCH_SIZE]
+    deleter.flush()
+    deleter.flush()  # 沒有待刪除的物件時不送出請求
+
+    assert [len(batch) for batch in batches] == [1000, 1000, 500]
+    assert deleter.deleted == 2499
+    assert deleter.errors == 1
+    assert deleter.bytes == 24_990
+
+
+def test_batch_deleter_counts_pending_toward_the_limit(deleted_batches):
+    deleter = BatchDeleter(no_limit(), max_deletes=3)
+
+    deleter.add({"Key": "a"})
+    deleter.add({"Key": "b"})
+    assert not deleter.exhausted
+    deleter.add({"Key": "c"})
+
+    assert deleter.exhausted
+
+
+def test_dry_run_only_counts(deleted_batches):
+    batches, _ = deleted_batches
+    deleter = BatchDeleter(no_limit(), max_deletes=10, dry_run=True)
+
+    deleter.add({"Key": "a", "Size": 5})
+    deleter.flush()
+
+    assert batches == []
+    assert (deleter.deleted, deleter.bytes) == (1, 5)
+
+
+class FakeResponse:
+    def __init__(self, body: dict):
+        self.body = body
+
+    def json(self) -> dict:
+        return self.body
+
+
+@pytest.fixture
+def gc_environment(s3_bucket, fake_redis, monkeypatch):
+    """moto bucket、fakeredis 鎖與假的後端引用檢查"""
+    redis_client = fake_redis("worker.tasks.storage_gc")
+    monkeypatch.setattr(storage_gc, "GC_MIN_AGE", -60)  # 剛建立的物件也視為夠舊
+    monkeypatch.setattr(storage_gc, "GC_REQUESTS_PER_SECOND", 0)
+    retained = {"sources": set(), "outputs": set()}
+    requests = []
+
+    def post_webhook(path, json=None, timeout=10):
+        requests.append((path, json))
+        return FakeResponse({
+            kind: [storage_id for storage_id in json[kind] if storage_id in retained[kind]]
+            for kind in ("sources", "outputs") if kind in json
+        })
+
+    monkeypatch.setattr(storage_gc, "post_webhook", post_webhook)
+    return s3_bucket, redis_client, retained, requests
+
+
+def put(client, key: str) -> None:
+    client.put_object(Bucket=TEST_BUCKET, Key=key, Body=b"\x00" * 10)
+
+
+def remaining_keys(client) -> set[str]:
+    response = client.list_objects_v2(Bucket=TEST_BUCKET)
+    return {item["Key"] for item in response.get("Contents", [])}
+
+
+def test_collects_unreferenced_sources_and_outputs(gc_environment):
+    client, redis_client, retained, requests = gc_environment
+    kept_video, deleted_video = str(uuid.uuid4()), str(uuid.uuid4())
+    retained["sources"].add(kept_video)
+    retained["outputs"].add(kept_video)
+    for video_id in (kept_video, deleted_video):
+        put(client, f"uploads/{video_id}/lecture.mp4")
+        put(client, f"transcoded/{video_id}/master.m3u8")
+        put(client, f"thumbnails/{video_id}/poster.jpg")
+    put(client, "uploads/not-a-uuid/file.mp4")
+    client.create_multipart_upload(Bucket=TEST_BUCKET, Key=f"uploads/{deleted_video}/big.mp4")
+
+    result = collect_storage_garbage.apply().result
+
+    assert result["status"] == "completed"
+    assert result["multipart_aborted"] == 1  # moto 回報的 Initiated 固定為 2010 年
+    assert result["orphaned_sources"] == 1
+    assert result["orphaned_outputs"] == 2
+    assert result["objects_deleted"] == 3
+    assert remaining_keys(client) == {
+        f"uploads/{kept_video}/lecture.mp4",
+        f"transcoded/{kept_video}/master.m3u8",
+        f"thumbnails/{kept_video}/poster.jpg",
+        "uploads/not-a-uuid/file.mp4",
+    }
+    # 轉碼輸出的引用檢查要求後端一併校正產出紀錄
+    assert [(body.keys() - {"reconcile"}, body["reconcile"]) for _, body in requests] == [
+        ({"sources"}, True), ({"outputs"}, True), ({"outputs"}, True),
+    ]
+    assert redis_client.get(GC_LOCK_KEY) is None
+
+
+def test_dry_run_keeps_everything(gc_environment):
+    client, _, _, requests = gc_environment
+    put(client, f"uploads/{uuid.uuid4()}/lecture.mp4")
+
+    result = collect_storage_garbage.apply(kwargs={"dry_run": True}).result
+
+    assert result["status"] == "dry_run"
+    assert result["objects_deleted"] == 1
+    assert len(remaining_keys(client)) == 1
+    assert all(not body["reconcile"] for _, body in requests)
+
+
+def test_skips_while_another_run_holds_the_lock(gc_environment):
+    _, redis_client, _, requests = gc_environment
+    redis_client.set(GC_LOCK_KEY, "other-run")
+
+    assert collect_storage_garbage.apply().result == {"status": "skipped"}
+    assert requests == []
+
+
+def test_run_outlasting_the_lock_does_not_fail(gc_environment, monkeypatch):
+    _, redis_client, _, _ = gc_environment
+
+    def lock_expires(*args):
+        redis_client.delete(GC_LOCK_KEY)
+        return 0
+
+    monkeypatch.setattr(storage_gc, "abort_stale_uploads", lock_expires)
+
+    result = collect_storage_garbage.apply()
+
+    assert result.successful()
+    assert result.result["status"] == "completed"
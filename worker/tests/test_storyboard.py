@@ -0,0 +1,123 @@
+"""
+預覽圖測試
+拼貼圖版面、FFmpeg 濾鏡與輸出參數、WebVTT storyboard
+"""
+import os
+
+from worker.media.storyboard import (
+    POSTER_NAME,
+    PreviewSpec,
+    StoryboardLayout,
+    preview_spec,
+    storyboard_layout,
+    write_storyboard,
+)
+
+
+def cues(path: str) -> list[tuple[str, str]]:
+    """storyboard 中的 (時間範圍, 拼貼圖 URI) 列表"""
+    with open(path) as file:
+        lines = file.read().splitlines()
+    assert lines[0] == "WEBVTT"
+    return [(lines[i], lines[i + 1]) for i, line in enumerate(lines) if "-->" in line]
+
+
+def test_layout_keeps_aspect_ratio_with_even_height():
+    assert storyboard_layout(1920, 1080) == StoryboardLayout(160, 90)
+    assert storyboard_layout(1440, 1080).thumb_height == 120  # 4:3
+    assert storyboard_layout(1080, 1920).thumb_height == 284  # 直式影片，284.4 取偶數
+
+
+def test_preview_spec_poster_time(tmp_path):
+    long = preview_spec(str(tmp_path / "a"), 1280, 720, 600.0)
+    short = preview_spec(str(tmp_path / "b"), 1280, 720, 4.0)
+    unknown = preview_spec(str(tmp_path / "c"), 1280, 720, None)
+    chunk = preview_spec(str(tmp_path / "d"), 1280, 720, 300.0, name_prefix="chunk_0001_", poster=False)
+
+    assert (long.poster_time, short.poster_time, unknown.poster_time) == (5.0, 2.0, 0.0)
+    assert chunk.poster_time is None
+    assert os.path.isdir(chunk.output_dir)
+
+
+def test_filters_sample_and_tile_the_decoded_frames():
+    spec = PreviewSpec("/out/_previews", StoryboardLayout(160, 90))
+
+    assert spec.filters("pv") == ["[pv]fps=1/10,scale=160:90,tile=10x10[sprite]"]
+    assert spec.outputs() == [
+        "-map", "[sprite]", "-c:v", "mjpeg", "-q:v", "5", "-f", "image2",
+        "/out/_previews/sprite_%03d.jpg",
+    ]
+
+
+def test_filters_split_off_the_poster():
+    spec = PreviewSpec("/out/_previews", StoryboardLayout(160, 90), "chunk_0000_", poster_time=5.0)
+
+    assert spec.filters("pv") == [
+        "[pv]split=2[sb][po]",
+        "[sb]fps=1/10,scale=160:90,tile=10x10[sprite]",
+        "[po]select='gte(t\\,5.000)',scale=640:-2[poster]",
+    ]
+    outputs = spec.outputs()
+    assert outputs[8] == "/out/_previews/chunk_0000_sprite_%03d.jpg"
+    assert outputs[outputs.index("[poster]"):][:3] == ["[poster]", "-frames:v", "1"]
+    assert outputs[-1] == os.path.join("/out/_previews", POSTER_NAME)
+
+
+def test_sprite_sheets_are_listed_per_prefix_in_order(tmp_path):
+    for name in ("chunk_0001_sprite_000.jpg", "chunk_0000_sprite_001.jpg",
+                 "chunk_0000_sprite_000.jpg", POSTER_NAME):
+        (tmp_path / name).write_bytes(b"")
+    spec = PreviewSpec(str(tmp_path), StoryboardLayout(160, 90), "chunk_0000_")
+
+    assert spec.sprite_sheets() == [
+        str(tmp_path / "chunk_0000_sprite_000.jpg"),
+        str(tmp_path / "chunk_0000_sprite_001.jpg"),
+    ]
+
+
+def test_storyboard_cues_walk_the_tile_grid(tmp_path):
+    layout = StoryboardLayout(160, 90, columns=2, rows=2, interval=10)
+    sections = [{"sheets": ["sprite_000.jpg", "sprite_001.jpg"], "start": 0.0, "duration": 45.5}]
+
+    path = write_storyboard(str(tmp_path / "storyboard.vtt"), sections, layout)
+
+    assert cues(path) == [
+        ("00:00:00.000 --> 00:00:10.000", "sprite_000.jpg#xywh=0,0,160,90"),
+        ("00:00:10.000 --> 00:00:20.000", "sprite_000.jpg#xywh=160,0,160,90"),
+        ("00:00:20.000 --> 00:00:30.000", "sprite_000.jpg#xywh=0,90,160,90"),
+        ("00:00:30.000 --> 00:00:40.000", "sprite_000.jpg#xywh=160,90,160,90"),
+        # 每張拼貼圖 4 格，第 5 格起換下一張；最後一格截至影片結束
+        ("00:00:40.000 --> 00:00:45.500", "sprite_001.jpg#xywh=0,0,160,90"),
+    ]
+
+
+def test_storyboard_chains_chunk_sections(tmp_path):
+    layout = StoryboardLayout(160, 90, interval=10)
+    sections = [
+        {"sheets": ["chunk_0000_sprite_000.jpg"], "start": 0.0, "duration": 20.0},
+        {"sheets": ["chunk_0001_sprite_000.jpg"], "start": 20.0, "duration": 15.0},
+    ]
+
+    path = write_storyboard(str(tmp_path / "storyboard.vtt"), sections, layout)
+
+    assert cues(path) == [
+        ("00:00:00.000 --> 00:00:10.000", "chunk_0000_sprite_000.jpg#xywh=0,0,160,90"),
+        ("00:00:10.000 --> 00:00:20.000", "chunk_0000_sprite_000.jpg#xywh=160,0,160,90"),
+        # 每個分段的拼貼圖自第一格重新開始
+        ("00:00:20.000 --> 00:00:30.000", "chunk_0001_sprite_000.jpg#xywh=0,0,160,90"),
+        ("00:00:30.000 --> 00:00:35.000", "chunk_0001_sprite_000.jpg#xywh=160,0,160,90"),
+    ]
+
+
+def test_storyboard_never_points_past_the_written_sheets(tmp_path):
+    layout = StoryboardLayout(160, 90, columns=2, rows=1, interval=10)
+    sections = [
+        {"sheets": ["sprite_000.jpg"], "start": 0.0, "duration": 60.0},
+        {"sheets": [], "start": 60.0, "duration": None},
+    ]
+
+    path = write_storyboard(str(tmp_path / "storyboard.vtt"), sections, layout)
+
+    assert [uri for _, uri in cues(path)] == [
+        "sprite_000.jpg#xywh=0,0,160,90", "sprite_000.jpg#xywh=160,0,160,90"
+    ]